@@ -0,0 +1,10 @@
+'''
+Benchmarks for cyinterval, written in the format used by airspeed velocity (asv).  With asv
+installed they can be run with ``asv run`` using asv.conf.json in the repository root.  They
+can also be run without asv, and without network access, by the runner in benchmarks.run::
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json
+
+The runner stores the results of each run by commit in benchmarks/results.
+'''
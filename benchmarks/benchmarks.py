@@ -0,0 +1,190 @@
+from cyinterval.cyinterval import IntervalSet, ObjectIntervalSet, DateIntervalSet, IntIntervalSet, FloatIntervalSet,\
+    DateIntervalSet_from_buffers, IntIntervalSet_from_buffers, FloatIntervalSet_from_buffers
+from datetime import date
+from array import array
+import pickle
+import random
+
+sizes = [1, 100, 10000, 1000000, 10000000]
+kinds = ['object', 'date', 'int', 'float']
+
+# Sets of Python objects cost far more memory and time per interval than the typed sets, so
+# they are only benchmarked up to this size.  Dates run out at the end of year 9999, which
+# is before the largest size.
+object_max_size = 1000000
+date_max_size = 1000000
+
+# The bounds of interval i of the first set of each pair are 3*i and 3*i + 1, and those of
+# the second set are 3*i + 1 and 3*i + 2, so the two overlap at every interval.
+bound_codes = {'date': 'i', 'int': 'i', 'float': 'd'}
+from_buffers = {'date': DateIntervalSet_from_buffers, 'int': IntIntervalSet_from_buffers,
+                'float': FloatIntervalSet_from_buffers}
+set_classes = {'object': ObjectIntervalSet, 'date': DateIntervalSet, 'int': IntIntervalSet,
+               'float': FloatIntervalSet}
+date_base = date(1, 1, 1).toordinal()
+closed_bounded_flags = 15
+
+def check_size(kind, size):
+    '''
+    Raise NotImplementedError, which asv reports as a skipped benchmark, for combinations of
+    kind and size that are not benchmarked.
+    '''
+    if kind == 'object' and size > object_max_size:
+        raise NotImplementedError
+    if kind == 'date' and size > date_max_size:
+        raise NotImplementedError
+
+def to_values(kind, bounds):
+    '''
+    Convert an array of bounds to the Python values taken by the sets of kind.
+    '''
+    if kind == 'date':
+        return [date.fromordinal(bound) for bound in bounds]
+    elif kind == 'object':
+        return list(bounds)
+    return bounds
+
+cache = {}
+
+def make_bounds(kind, size, offset):
+    key = ('bounds', kind, size, offset)
+    if key not in cache:
+        code = bound_codes.get(kind, 'q')
+        base = date_base if kind == 'date' else 0
+        cache[key] = (array(code, range(base + offset, base + offset + 3 * size, 3)),
+                      array(code, range(base + offset + 1, base + offset + 1 + 3 * size, 3)))
+    return cache[key]
+
+def make_flags(size):
+    key = ('flags', size)
+    if key not in cache:
+        cache[key] = array('B', [closed_bounded_flags]) * size
+    return cache[key]
+
+def make_set(kind, size, offset):
+    '''
+    Return one of the two sets of the given kind and size, sharing any that were made
+    before in the same process.
+    '''
+    key = (kind, size, offset)
+    if key not in cache:
+        lower, upper = make_bounds(kind, size, offset)
+        if kind == 'object':
+            cache[key] = ObjectIntervalSet.from_arrays(list(lower), list(upper))
+        else:
+            cache[key] = from_buffers[kind](size, lower, upper, make_flags(size))
+    return cache[key]
+
+def make_points(kind, size, count):
+    '''
+    Return count sorted points spread across the sets of the given kind and size.
+    '''
+    base = date_base if kind == 'date' else 0
+    step = max(1, (3 * size) // count)
+    return to_values(kind, array(bound_codes.get(kind, 'q'), range(base, base + 3 * size, step)[:count]))
+
+class SetSuite(object):
+    params = (kinds, sizes)
+    param_names = ['kind', 'size']
+    timeout = 600
+
+    def setup(self, kind, size):
+        check_size(kind, size)
+        self.first = make_set(kind, size, 0)
+        self.second = make_set(kind, size, 1)
+
+class Construction(object):
+    params = (kinds, sizes)
+    param_names = ['kind', 'size']
+    timeout = 600
+
+    def setup(self, kind, size):
+        check_size(kind, size)
+        lower, upper = make_bounds(kind, size, 0)
+        self.lower = to_values(kind, lower)
+        self.upper = to_values(kind, upper)
+        self.intervals = None
+        self.shuffled = None
+        if size <= object_max_size:
+            self.intervals = make_set(kind, size, 0).intervals
+            self.shuffled = list(self.intervals)
+            random.Random(0).shuffle(self.shuffled)
+
+    def time_from_arrays(self, kind, size):
+        set_classes[kind].from_arrays(self.lower, self.upper)
+
+    def time_from_intervals(self, kind, size):
+        # The constructor takes intervals that are already sorted and disjoint
+        if self.intervals is None:
+            raise NotImplementedError
+        set_classes[kind](self.intervals)
+
+    def time_from_shuffled_intervals(self, kind, size):
+        # The factory sorts and fuses the intervals first
+        if self.shuffled is None:
+            raise NotImplementedError
+        IntervalSet(*self.shuffled)
+
+    def peakmem_from_arrays(self, kind, size):
+        set_classes[kind].from_arrays(self.lower, self.upper)
+
+class Contains(SetSuite):
+    def setup(self, kind, size):
+        SetSuite.setup(self, kind, size)
+        self.points = make_points(kind, size, 1000)
+        self.many_points = make_points(kind, size, 100000)
+
+    def time_contains(self, kind, size):
+        contains = self.first.contains
+        for point in self.points:
+            contains(point)
+
+    def time_contains_many(self, kind, size):
+        self.first.contains_many(self.many_points)
+
+class Operations(SetSuite):
+    def setup(self, kind, size):
+        SetSuite.setup(self, kind, size)
+        self.union = self.first.union(self.second)
+
+    def time_intersection(self, kind, size):
+        self.first.intersection(self.second)
+
+    def time_union(self, kind, size):
+        self.first.union(self.second)
+
+    def time_complement(self, kind, size):
+        self.first.complement()
+
+    def time_minus(self, kind, size):
+        self.first.minus(self.second)
+
+    def time_subset(self, kind, size):
+        self.first.subset(self.union)
+
+class Hashing(SetSuite):
+    # Sets cache their hash, so each timing hashes a new set
+    number = 1
+    repeat = 5
+
+    def setup(self, kind, size):
+        SetSuite.setup(self, kind, size)
+        if kind == 'object':
+            self.fresh = ObjectIntervalSet(self.first.intervals)
+        else:
+            lower, upper = make_bounds(kind, size, 0)
+            self.fresh = from_buffers[kind](size, lower, upper, make_flags(size))
+
+    def time_hash(self, kind, size):
+        hash(self.fresh)
+
+class Pickling(SetSuite):
+    def setup(self, kind, size):
+        SetSuite.setup(self, kind, size)
+        self.pickled = pickle.dumps(self.first, pickle.HIGHEST_PROTOCOL)
+
+    def time_dumps(self, kind, size):
+        pickle.dumps(self.first, pickle.HIGHEST_PROTOCOL)
+
+    def time_loads(self, kind, size):
+        pickle.loads(self.pickled)
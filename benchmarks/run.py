@@ -0,0 +1,125 @@
+'''
+Run the asv style benchmarks in benchmarks.benchmarks without asv, store the results as json
+and optionally compare them with the results of an earlier run.
+'''
+from benchmarks import benchmarks
+from argparse import ArgumentParser
+from itertools import product
+import subprocess
+import platform
+import inspect
+import timeit
+import json
+import sys
+import os
+import re
+
+results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+def current_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def benchmark_classes():
+    for name, cls in sorted(vars(benchmarks).items()):
+        if inspect.isclass(cls) and cls.__module__ == benchmarks.__name__ and hasattr(cls, 'params'):
+            yield name, cls
+
+def time_call(function, args, number, repeat, min_time):
+    '''
+    Return the best time per call over repeat timings of number calls, choosing number so
+    that each timing takes at least min_time if it is not given.
+    '''
+    timer = timeit.Timer(lambda: function(*args))
+    if number is None:
+        number = 1
+        while True:
+            elapsed = timer.timeit(number)
+            if elapsed >= min_time or number >= 1000000:
+                break
+            number *= 10
+    return min(timer.repeat(repeat, number)) / number
+
+def run(pattern, max_size, min_time, verbose):
+    results = {}
+    for class_name, cls in benchmark_classes():
+        methods = [name for name in sorted(dir(cls)) if name.startswith('time_')]
+        for params in product(*cls.params):
+            if 'size' in cls.param_names and params[cls.param_names.index('size')] > max_size:
+                continue
+            for method_name in methods:
+                key = '%s.%s(%s)' % (class_name, method_name, ', '.join(map(str, params)))
+                if not re.search(pattern, key):
+                    continue
+                instance = cls()
+                try:
+                    if hasattr(instance, 'setup'):
+                        instance.setup(*params)
+                    method = getattr(instance, method_name)
+                    if getattr(cls, 'number', None) == 1:
+                        # The benchmark needs a fresh setup for every call
+                        timings = []
+                        for _ in range(getattr(cls, 'repeat', 5)):
+                            instance.setup(*params)
+                            timings.append(time_call(method, params, 1, 1, min_time))
+                        result = min(timings)
+                    else:
+                        result = time_call(method, params, None, getattr(cls, 'repeat', 3), min_time)
+                except NotImplementedError:
+                    continue
+                results[key] = result
+                if verbose:
+                    print('%-70s %12.3g s' % (key, result))
+                    sys.stdout.flush()
+    return results
+
+def compare(results, baseline, threshold):
+    '''
+    Print the ratio of the new to the old time for each benchmark in both runs, marking
+    those that changed by more than the factor threshold.
+    '''
+    for key in sorted(set(results) & set(baseline)):
+        ratio = results[key] / baseline[key] if baseline[key] > 0 else float('inf')
+        mark = ''
+        if ratio > threshold:
+            mark = 'slower'
+        elif ratio < 1. / threshold:
+            mark = 'faster'
+        print('%-70s %12.3g %12.3g %8.2f %s' % (key, baseline[key], results[key], ratio, mark))
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--bench', default='', help='regular expression selecting benchmarks')
+    parser.add_argument('--max-size', type=int, default=max(benchmarks.sizes),
+                        help='skip benchmarks of sets larger than this')
+    parser.add_argument('--min-time', type=float, default=.1,
+                        help='minimum duration in seconds of each timing')
+    parser.add_argument('--output', help='json file for the results, by default '
+                        'benchmarks/results/<commit>.json')
+    parser.add_argument('--compare', help='json file of earlier results to compare with')
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help='factor by which a time must change to be marked')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    commit = current_commit()
+    results = run(args.bench, args.max_size, args.min_time, not args.quiet)
+    output = args.output or os.path.join(results_dir, '%s.json' % commit)
+    if os.path.dirname(output) and not os.path.isdir(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as outfile:
+        json.dump({'commit': commit, 'python': platform.python_version(),
+                   'machine': platform.platform(), 'results': results},
+                  outfile, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline = json.load(infile)
+        print('\nComparison with %s' % baseline.get('commit', args.compare))
+        compare(results, baseline['results'], args.threshold)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,800 @@
+from cpython cimport bool
+from cpython.array cimport array
+from libc.stdint cimport int32_t, int64_t, uint64_t
+
+# Bit flags describing the bounds of an interval, packed into a single byte per 
+# interval in the storage of an interval set.
+cdef enum:
+    LOWER_CLOSED = 1
+    UPPER_CLOSED = 2
+    LOWER_BOUNDED = 4
+    UPPER_BOUNDED = 8
+    LOWER_FLAGS = 5
+    UPPER_FLAGS = 10
+
+cdef unsigned char pack_flags(bint lower_closed, bint upper_closed, bint lower_bounded, bint upper_bounded)
+
+cdef class BaseInterval:
+    cdef unsigned char flags
+    cdef Py_hash_t hash_value
+
+cdef class BaseIntervalSet:
+    cdef readonly Py_ssize_t n_intervals
+    cdef unsigned char *flags
+    cdef tuple storage
+    cdef tuple cached_intervals
+    cdef Py_hash_t hash_value
+    cdef tuple materialize_intervals(BaseIntervalSet self)
+    cdef Py_hash_t compute_hash(BaseIntervalSet self) except -1
+
+cdef class BaseIntervalSetIterator:
+    cdef Py_ssize_t index
+
+
+
+
+cdef class ObjectInterval(BaseInterval):
+    cdef readonly object lower_bound
+    cdef readonly object upper_bound
+    cpdef bool adjacent(ObjectInterval self, object lower, object upper)
+    cpdef int containment_cmp(ObjectInterval self, object item)
+    cpdef bool contains(ObjectInterval self, object item)
+    cpdef bool subset(ObjectInterval self, ObjectInterval other)
+    cpdef int overlap_cmp(ObjectInterval self, ObjectInterval other)
+    cpdef tuple init_args(ObjectInterval self)
+    cpdef ObjectInterval intersection(ObjectInterval self, ObjectInterval other)
+    cpdef ObjectInterval fusion(ObjectInterval self, ObjectInterval other)
+    cpdef bool empty(ObjectInterval self)  
+    cpdef bool richcmp(ObjectInterval self, ObjectInterval other, int op)
+    cpdef int lower_cmp(ObjectInterval self, ObjectInterval other)
+    cpdef int upper_cmp(ObjectInterval self, ObjectInterval other)
+
+cpdef ObjectIntervalSet ObjectIntervalSet_from_intervals(tuple intervals)
+cpdef tuple ObjectInterval_preprocess_intervals(tuple intervals)
+
+cdef class ObjectIntervalSetBuilder:
+    cdef Py_ssize_t size
+    cdef Py_ssize_t capacity
+    cdef array flags_array
+    cdef unsigned char *flags
+    cdef list lower_bounds
+    cdef list upper_bounds
+    cdef int grow(ObjectIntervalSetBuilder self) except -1
+    cdef int append(ObjectIntervalSetBuilder self, object lower, object upper, 
+                    unsigned char flags) except -1
+    cdef int merge(ObjectIntervalSetBuilder self, object lower, object upper, 
+                   unsigned char flags) except -1
+    cdef int remove(ObjectIntervalSetBuilder self, Py_ssize_t start, Py_ssize_t stop) except -1
+    cdef int insert(ObjectIntervalSetBuilder self, Py_ssize_t position, object lower, object upper, 
+                    unsigned char flags) except -1
+    cdef ObjectIntervalSet build(ObjectIntervalSetBuilder self)
+
+cdef class ObjectIntervalSetCoalescer:
+    cdef object source
+    cdef bint pending
+    cdef bint started
+    cdef object lower
+    cdef object upper
+    cdef unsigned char flags
+    cdef object last_lower
+    cdef unsigned char last_flags
+    cdef object result_lower
+    cdef object result_upper
+    cdef unsigned char result_flags
+    cdef int next_raw(ObjectIntervalSetCoalescer self) except -1
+
+cdef class ObjectIntervalSetIterator(BaseIntervalSetIterator):
+    cdef readonly ObjectIntervalSet interval_set
+
+cdef class ObjectIntervalSet(BaseIntervalSet):
+    cdef list lower_bounds
+    cdef list upper_bounds
+    cpdef bool lower_bounded(ObjectIntervalSet self)
+    cpdef bool upper_bounded(ObjectIntervalSet self)
+    cpdef object lower_bound(ObjectIntervalSet self)
+    cpdef object upper_bound(ObjectIntervalSet self)
+    cpdef tuple init_args(ObjectIntervalSet self)
+    cdef Py_ssize_t locate_item(ObjectIntervalSet self, object item)
+    cpdef bool contains(ObjectIntervalSet self, object item)
+    cdef int locate_many(ObjectIntervalSet self, tuple items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1
+    cpdef array contains_many(ObjectIntervalSet self, points)
+    cpdef array locate(ObjectIntervalSet self, points)
+    cpdef bool empty(ObjectIntervalSet self)
+    cpdef bool subset(ObjectIntervalSet self, ObjectIntervalSet other)
+    cpdef bool equal(ObjectIntervalSet self, ObjectIntervalSet other)
+    cpdef bool richcmp(ObjectIntervalSet self, ObjectIntervalSet other, int op)
+    cpdef ObjectIntervalSet intersection(ObjectIntervalSet self, ObjectIntervalSet other)
+    cdef int intersection_into(ObjectIntervalSet self, ObjectIntervalSet other, 
+                               ObjectIntervalSetBuilder builder) except -1
+    cpdef ObjectIntervalSet union(ObjectIntervalSet self, ObjectIntervalSet other)
+    cdef int union_into(ObjectIntervalSet self, ObjectIntervalSet other, 
+                        ObjectIntervalSetBuilder builder) except -1
+    cpdef ObjectIntervalSet complement(ObjectIntervalSet self)
+    cpdef ObjectIntervalSet symmetric_difference(ObjectIntervalSet self, ObjectIntervalSet other)
+    cdef int symmetric_difference_into(ObjectIntervalSet self, ObjectIntervalSet other, 
+                                       ObjectIntervalSetBuilder builder) except -1
+    cpdef ObjectIntervalSet minus(ObjectIntervalSet self, ObjectIntervalSet other)
+    cdef int minus_into(ObjectIntervalSet self, ObjectIntervalSet other, 
+                        ObjectIntervalSetBuilder builder) except -1
+
+cpdef ObjectIntervalSet ObjectIntervalSet_union_all(list sets)
+cpdef ObjectIntervalSet ObjectIntervalSet_intersection_all(list sets)
+
+cdef class MutableObjectIntervalSet:
+    cdef list blocks
+    cdef readonly Py_ssize_t n_intervals
+    cdef ObjectIntervalSet frozen
+    cdef int reset(MutableObjectIntervalSet self, ObjectIntervalSet interval_set) except -1
+    cpdef ObjectIntervalSet freeze(MutableObjectIntervalSet self)
+    cdef int search(MutableObjectIntervalSet self, object lower, object upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1
+    cdef int replace(MutableObjectIntervalSet self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, ObjectIntervalSetBuilder replacement) except -1
+    cpdef add(MutableObjectIntervalSet self, ObjectInterval interval)
+    cpdef discard(MutableObjectIntervalSet self, ObjectInterval interval)
+    cpdef bool contains(MutableObjectIntervalSet self, object item)
+
+cdef class ObjectIntervalIndex:
+    cdef readonly Py_ssize_t n_intervals
+    cdef ObjectIntervalSet sorted_intervals
+    cdef array order_array
+    cdef Py_ssize_t *order
+    cdef Py_ssize_t leaves
+    cdef array tree_array
+    cdef Py_ssize_t *tree
+    cdef tuple cached_intervals
+    cdef int index(ObjectIntervalIndex self, ObjectIntervalSetBuilder raw) except -1
+    cdef Py_ssize_t end(ObjectIntervalIndex self, object upper, unsigned char flags)
+    cdef int collect(ObjectIntervalIndex self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, object lower, object upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1
+    cdef int query(ObjectIntervalIndex self, object lower, object upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1
+    cpdef array stab(ObjectIntervalIndex self, object point)
+    cpdef array overlap(ObjectIntervalIndex self, ObjectInterval interval)
+
+cpdef tuple ObjectInterval_overlap_join(ObjectIntervalIndex left, ObjectIntervalIndex right)
+
+
+cdef class DateInterval(BaseInterval):
+    # Exposed as properties converting to date
+    cdef int32_t lower_bound
+    cdef int32_t upper_bound
+    cpdef bool adjacent(DateInterval self, object lower, object upper)
+    cpdef int containment_cmp(DateInterval self, object item)
+    cpdef bool contains(DateInterval self, object item)
+    cpdef bool subset(DateInterval self, DateInterval other)
+    cpdef int overlap_cmp(DateInterval self, DateInterval other)
+    cpdef tuple init_args(DateInterval self)
+    cpdef DateInterval intersection(DateInterval self, DateInterval other)
+    cpdef DateInterval fusion(DateInterval self, DateInterval other)
+    cpdef bool empty(DateInterval self)  
+    cpdef bool richcmp(DateInterval self, DateInterval other, int op)
+    cpdef int lower_cmp(DateInterval self, DateInterval other)
+    cpdef int upper_cmp(DateInterval self, DateInterval other)
+
+cpdef DateIntervalSet DateIntervalSet_from_intervals(tuple intervals)
+cpdef tuple DateInterval_preprocess_intervals(tuple intervals)
+
+cdef class DateIntervalSetBuilder:
+    cdef Py_ssize_t size
+    cdef Py_ssize_t capacity
+    cdef array flags_array
+    cdef unsigned char *flags
+    cdef array lower_array
+    cdef array upper_array
+    cdef int32_t *lower_bounds
+    cdef int32_t *upper_bounds
+    cdef int grow(DateIntervalSetBuilder self) except -1
+    cdef int append(DateIntervalSetBuilder self, int32_t lower, int32_t upper, 
+                    unsigned char flags) except -1 nogil
+    cdef int merge(DateIntervalSetBuilder self, int32_t lower, int32_t upper, 
+                   unsigned char flags) except -1 nogil
+    cdef int remove(DateIntervalSetBuilder self, Py_ssize_t start, Py_ssize_t stop) except -1
+    cdef int insert(DateIntervalSetBuilder self, Py_ssize_t position, int32_t lower, int32_t upper, 
+                    unsigned char flags) except -1
+    cdef DateIntervalSet build(DateIntervalSetBuilder self)
+
+cdef class DateIntervalSetCoalescer:
+    cdef object source
+    cdef bint pending
+    cdef bint started
+    cdef int32_t lower
+    cdef int32_t upper
+    cdef unsigned char flags
+    cdef int32_t last_lower
+    cdef unsigned char last_flags
+    cdef int32_t result_lower
+    cdef int32_t result_upper
+    cdef unsigned char result_flags
+    cdef int next_raw(DateIntervalSetCoalescer self) except -1
+
+cdef class DateIntervalSetIterator(BaseIntervalSetIterator):
+    cdef readonly DateIntervalSet interval_set
+
+cdef class DateIntervalSet(BaseIntervalSet):
+    cdef int32_t *lower_bounds
+    cdef int32_t *upper_bounds
+    cpdef bool lower_bounded(DateIntervalSet self)
+    cpdef bool upper_bounded(DateIntervalSet self)
+    cpdef object lower_bound(DateIntervalSet self)
+    cpdef object upper_bound(DateIntervalSet self)
+    cpdef tuple init_args(DateIntervalSet self)
+    cdef Py_ssize_t locate_item(DateIntervalSet self, int32_t item) nogil
+    cpdef bool contains(DateIntervalSet self, object item)
+    cdef int locate_many(DateIntervalSet self, const int32_t[:] items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1 nogil
+    cpdef array contains_many(DateIntervalSet self, points)
+    cpdef array locate(DateIntervalSet self, points)
+    cpdef bool empty(DateIntervalSet self)
+    cpdef object measure(DateIntervalSet self)
+    cpdef object intersection_measure(DateIntervalSet self, DateIntervalSet other)
+    cpdef bool subset(DateIntervalSet self, DateIntervalSet other)
+    cpdef bool equal(DateIntervalSet self, DateIntervalSet other)
+    cpdef bool richcmp(DateIntervalSet self, DateIntervalSet other, int op)
+    cpdef DateIntervalSet intersection(DateIntervalSet self, DateIntervalSet other)
+    cdef int intersection_into(DateIntervalSet self, DateIntervalSet other, 
+                               DateIntervalSetBuilder builder) except -1 nogil
+    cpdef DateIntervalSet union(DateIntervalSet self, DateIntervalSet other)
+    cdef int union_into(DateIntervalSet self, DateIntervalSet other, 
+                        DateIntervalSetBuilder builder) except -1 nogil
+    cpdef DateIntervalSet complement(DateIntervalSet self)
+    cpdef DateIntervalSet symmetric_difference(DateIntervalSet self, DateIntervalSet other)
+    cdef int symmetric_difference_into(DateIntervalSet self, DateIntervalSet other, 
+                                       DateIntervalSetBuilder builder) except -1 nogil
+    cpdef DateIntervalSet minus(DateIntervalSet self, DateIntervalSet other)
+    cdef int minus_into(DateIntervalSet self, DateIntervalSet other, 
+                        DateIntervalSetBuilder builder) except -1 nogil
+
+cpdef DateIntervalSet DateIntervalSet_union_all(list sets)
+cpdef DateIntervalSet DateIntervalSet_intersection_all(list sets)
+
+cdef class MutableDateIntervalSet:
+    cdef list blocks
+    cdef readonly Py_ssize_t n_intervals
+    cdef DateIntervalSet frozen
+    cdef int reset(MutableDateIntervalSet self, DateIntervalSet interval_set) except -1
+    cpdef DateIntervalSet freeze(MutableDateIntervalSet self)
+    cdef int search(MutableDateIntervalSet self, int32_t lower, int32_t upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1
+    cdef int replace(MutableDateIntervalSet self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, DateIntervalSetBuilder replacement) except -1
+    cpdef add(MutableDateIntervalSet self, DateInterval interval)
+    cpdef discard(MutableDateIntervalSet self, DateInterval interval)
+    cpdef bool contains(MutableDateIntervalSet self, object item)
+
+cdef class DateIntervalIndex:
+    cdef readonly Py_ssize_t n_intervals
+    cdef DateIntervalSet sorted_intervals
+    cdef array order_array
+    cdef Py_ssize_t *order
+    cdef Py_ssize_t leaves
+    cdef array tree_array
+    cdef Py_ssize_t *tree
+    cdef tuple cached_intervals
+    cdef int index(DateIntervalIndex self, DateIntervalSetBuilder raw) except -1
+    cdef Py_ssize_t end(DateIntervalIndex self, int32_t upper, unsigned char flags)
+    cdef int collect(DateIntervalIndex self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, int32_t lower, int32_t upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1
+    cdef int query(DateIntervalIndex self, int32_t lower, int32_t upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1
+    cpdef array stab(DateIntervalIndex self, object point)
+    cpdef array overlap(DateIntervalIndex self, DateInterval interval)
+
+cpdef tuple DateInterval_overlap_join(DateIntervalIndex left, DateIntervalIndex right)
+
+
+cdef class IntInterval(BaseInterval):
+    cdef readonly int lower_bound
+    cdef readonly int upper_bound
+    cpdef bool adjacent(IntInterval self, int lower, int upper)
+    cpdef int containment_cmp(IntInterval self, int item)
+    cpdef bool contains(IntInterval self, int item)
+    cpdef bool subset(IntInterval self, IntInterval other)
+    cpdef int overlap_cmp(IntInterval self, IntInterval other)
+    cpdef tuple init_args(IntInterval self)
+    cpdef IntInterval intersection(IntInterval self, IntInterval other)
+    cpdef IntInterval fusion(IntInterval self, IntInterval other)
+    cpdef bool empty(IntInterval self)  
+    cpdef bool richcmp(IntInterval self, IntInterval other, int op)
+    cpdef int lower_cmp(IntInterval self, IntInterval other)
+    cpdef int upper_cmp(IntInterval self, IntInterval other)
+
+cpdef IntIntervalSet IntIntervalSet_from_intervals(tuple intervals)
+cpdef tuple IntInterval_preprocess_intervals(tuple intervals)
+
+cdef class IntIntervalSetBuilder:
+    cdef Py_ssize_t size
+    cdef Py_ssize_t capacity
+    cdef array flags_array
+    cdef unsigned char *flags
+    cdef array lower_array
+    cdef array upper_array
+    cdef int *lower_bounds
+    cdef int *upper_bounds
+    cdef int grow(IntIntervalSetBuilder self) except -1
+    cdef int append(IntIntervalSetBuilder self, int lower, int upper, 
+                    unsigned char flags) except -1 nogil
+    cdef int merge(IntIntervalSetBuilder self, int lower, int upper, 
+                   unsigned char flags) except -1 nogil
+    cdef int remove(IntIntervalSetBuilder self, Py_ssize_t start, Py_ssize_t stop) except -1
+    cdef int insert(IntIntervalSetBuilder self, Py_ssize_t position, int lower, int upper, 
+                    unsigned char flags) except -1
+    cdef IntIntervalSet build(IntIntervalSetBuilder self)
+
+cdef class IntIntervalSetCoalescer:
+    cdef object source
+    cdef bint pending
+    cdef bint started
+    cdef int lower
+    cdef int upper
+    cdef unsigned char flags
+    cdef int last_lower
+    cdef unsigned char last_flags
+    cdef int result_lower
+    cdef int result_upper
+    cdef unsigned char result_flags
+    cdef int next_raw(IntIntervalSetCoalescer self) except -1
+
+cdef class IntIntervalSetIterator(BaseIntervalSetIterator):
+    cdef readonly IntIntervalSet interval_set
+
+cdef class IntIntervalSet(BaseIntervalSet):
+    cdef int *lower_bounds
+    cdef int *upper_bounds
+    cpdef bool lower_bounded(IntIntervalSet self)
+    cpdef bool upper_bounded(IntIntervalSet self)
+    cpdef int lower_bound(IntIntervalSet self)
+    cpdef int upper_bound(IntIntervalSet self)
+    cpdef tuple init_args(IntIntervalSet self)
+    cdef Py_ssize_t locate_item(IntIntervalSet self, int item) nogil
+    cpdef bool contains(IntIntervalSet self, int item)
+    cdef int locate_many(IntIntervalSet self, const int[:] items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1 nogil
+    cpdef array contains_many(IntIntervalSet self, points)
+    cpdef array locate(IntIntervalSet self, points)
+    cpdef bool empty(IntIntervalSet self)
+    cpdef object measure(IntIntervalSet self)
+    cpdef object intersection_measure(IntIntervalSet self, IntIntervalSet other)
+    cpdef bool subset(IntIntervalSet self, IntIntervalSet other)
+    cpdef bool equal(IntIntervalSet self, IntIntervalSet other)
+    cpdef bool richcmp(IntIntervalSet self, IntIntervalSet other, int op)
+    cpdef IntIntervalSet intersection(IntIntervalSet self, IntIntervalSet other)
+    cdef int intersection_into(IntIntervalSet self, IntIntervalSet other, 
+                               IntIntervalSetBuilder builder) except -1 nogil
+    cpdef IntIntervalSet union(IntIntervalSet self, IntIntervalSet other)
+    cdef int union_into(IntIntervalSet self, IntIntervalSet other, 
+                        IntIntervalSetBuilder builder) except -1 nogil
+    cpdef IntIntervalSet complement(IntIntervalSet self)
+    cpdef IntIntervalSet symmetric_difference(IntIntervalSet self, IntIntervalSet other)
+    cdef int symmetric_difference_into(IntIntervalSet self, IntIntervalSet other, 
+                                       IntIntervalSetBuilder builder) except -1 nogil
+    cpdef IntIntervalSet minus(IntIntervalSet self, IntIntervalSet other)
+    cdef int minus_into(IntIntervalSet self, IntIntervalSet other, 
+                        IntIntervalSetBuilder builder) except -1 nogil
+
+cpdef IntIntervalSet IntIntervalSet_union_all(list sets)
+cpdef IntIntervalSet IntIntervalSet_intersection_all(list sets)
+
+cdef class MutableIntIntervalSet:
+    cdef list blocks
+    cdef readonly Py_ssize_t n_intervals
+    cdef IntIntervalSet frozen
+    cdef int reset(MutableIntIntervalSet self, IntIntervalSet interval_set) except -1
+    cpdef IntIntervalSet freeze(MutableIntIntervalSet self)
+    cdef int search(MutableIntIntervalSet self, int lower, int upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1
+    cdef int replace(MutableIntIntervalSet self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, IntIntervalSetBuilder replacement) except -1
+    cpdef add(MutableIntIntervalSet self, IntInterval interval)
+    cpdef discard(MutableIntIntervalSet self, IntInterval interval)
+    cpdef bool contains(MutableIntIntervalSet self, int item)
+
+cdef class IntIntervalIndex:
+    cdef readonly Py_ssize_t n_intervals
+    cdef IntIntervalSet sorted_intervals
+    cdef array order_array
+    cdef Py_ssize_t *order
+    cdef Py_ssize_t leaves
+    cdef array tree_array
+    cdef Py_ssize_t *tree
+    cdef tuple cached_intervals
+    cdef int index(IntIntervalIndex self, IntIntervalSetBuilder raw) except -1
+    cdef Py_ssize_t end(IntIntervalIndex self, int upper, unsigned char flags)
+    cdef int collect(IntIntervalIndex self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, int lower, int upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1
+    cdef int query(IntIntervalIndex self, int lower, int upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1
+    cpdef array stab(IntIntervalIndex self, int point)
+    cpdef array overlap(IntIntervalIndex self, IntInterval interval)
+
+cpdef tuple IntInterval_overlap_join(IntIntervalIndex left, IntIntervalIndex right)
+
+
+cdef class Int64Interval(BaseInterval):
+    cdef readonly int64_t lower_bound
+    cdef readonly int64_t upper_bound
+    cpdef bool adjacent(Int64Interval self, int64_t lower, int64_t upper)
+    cpdef int containment_cmp(Int64Interval self, int64_t item)
+    cpdef bool contains(Int64Interval self, int64_t item)
+    cpdef bool subset(Int64Interval self, Int64Interval other)
+    cpdef int overlap_cmp(Int64Interval self, Int64Interval other)
+    cpdef tuple init_args(Int64Interval self)
+    cpdef Int64Interval intersection(Int64Interval self, Int64Interval other)
+    cpdef Int64Interval fusion(Int64Interval self, Int64Interval other)
+    cpdef bool empty(Int64Interval self)  
+    cpdef bool richcmp(Int64Interval self, Int64Interval other, int op)
+    cpdef int lower_cmp(Int64Interval self, Int64Interval other)
+    cpdef int upper_cmp(Int64Interval self, Int64Interval other)
+
+cpdef Int64IntervalSet Int64IntervalSet_from_intervals(tuple intervals)
+cpdef tuple Int64Interval_preprocess_intervals(tuple intervals)
+
+cdef class Int64IntervalSetBuilder:
+    cdef Py_ssize_t size
+    cdef Py_ssize_t capacity
+    cdef array flags_array
+    cdef unsigned char *flags
+    cdef array lower_array
+    cdef array upper_array
+    cdef int64_t *lower_bounds
+    cdef int64_t *upper_bounds
+    cdef int grow(Int64IntervalSetBuilder self) except -1
+    cdef int append(Int64IntervalSetBuilder self, int64_t lower, int64_t upper, 
+                    unsigned char flags) except -1 nogil
+    cdef int merge(Int64IntervalSetBuilder self, int64_t lower, int64_t upper, 
+                   unsigned char flags) except -1 nogil
+    cdef int remove(Int64IntervalSetBuilder self, Py_ssize_t start, Py_ssize_t stop) except -1
+    cdef int insert(Int64IntervalSetBuilder self, Py_ssize_t position, int64_t lower, int64_t upper, 
+                    unsigned char flags) except -1
+    cdef Int64IntervalSet build(Int64IntervalSetBuilder self)
+
+cdef class Int64IntervalSetCoalescer:
+    cdef object source
+    cdef bint pending
+    cdef bint started
+    cdef int64_t lower
+    cdef int64_t upper
+    cdef unsigned char flags
+    cdef int64_t last_lower
+    cdef unsigned char last_flags
+    cdef int64_t result_lower
+    cdef int64_t result_upper
+    cdef unsigned char result_flags
+    cdef int next_raw(Int64IntervalSetCoalescer self) except -1
+
+cdef class Int64IntervalSetIterator(BaseIntervalSetIterator):
+    cdef readonly Int64IntervalSet interval_set
+
+cdef class Int64IntervalSet(BaseIntervalSet):
+    cdef int64_t *lower_bounds
+    cdef int64_t *upper_bounds
+    cpdef bool lower_bounded(Int64IntervalSet self)
+    cpdef bool upper_bounded(Int64IntervalSet self)
+    cpdef int64_t lower_bound(Int64IntervalSet self)
+    cpdef int64_t upper_bound(Int64IntervalSet self)
+    cpdef tuple init_args(Int64IntervalSet self)
+    cdef Py_ssize_t locate_item(Int64IntervalSet self, int64_t item) nogil
+    cpdef bool contains(Int64IntervalSet self, int64_t item)
+    cdef int locate_many(Int64IntervalSet self, const int64_t[:] items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1 nogil
+    cpdef array contains_many(Int64IntervalSet self, points)
+    cpdef array locate(Int64IntervalSet self, points)
+    cpdef bool empty(Int64IntervalSet self)
+    cpdef object measure(Int64IntervalSet self)
+    cpdef object intersection_measure(Int64IntervalSet self, Int64IntervalSet other)
+    cpdef bool subset(Int64IntervalSet self, Int64IntervalSet other)
+    cpdef bool equal(Int64IntervalSet self, Int64IntervalSet other)
+    cpdef bool richcmp(Int64IntervalSet self, Int64IntervalSet other, int op)
+    cpdef Int64IntervalSet intersection(Int64IntervalSet self, Int64IntervalSet other)
+    cdef int intersection_into(Int64IntervalSet self, Int64IntervalSet other, 
+                               Int64IntervalSetBuilder builder) except -1 nogil
+    cpdef Int64IntervalSet union(Int64IntervalSet self, Int64IntervalSet other)
+    cdef int union_into(Int64IntervalSet self, Int64IntervalSet other, 
+                        Int64IntervalSetBuilder builder) except -1 nogil
+    cpdef Int64IntervalSet complement(Int64IntervalSet self)
+    cpdef Int64IntervalSet symmetric_difference(Int64IntervalSet self, Int64IntervalSet other)
+    cdef int symmetric_difference_into(Int64IntervalSet self, Int64IntervalSet other, 
+                                       Int64IntervalSetBuilder builder) except -1 nogil
+    cpdef Int64IntervalSet minus(Int64IntervalSet self, Int64IntervalSet other)
+    cdef int minus_into(Int64IntervalSet self, Int64IntervalSet other, 
+                        Int64IntervalSetBuilder builder) except -1 nogil
+
+cpdef Int64IntervalSet Int64IntervalSet_union_all(list sets)
+cpdef Int64IntervalSet Int64IntervalSet_intersection_all(list sets)
+
+cdef class MutableInt64IntervalSet:
+    cdef list blocks
+    cdef readonly Py_ssize_t n_intervals
+    cdef Int64IntervalSet frozen
+    cdef int reset(MutableInt64IntervalSet self, Int64IntervalSet interval_set) except -1
+    cpdef Int64IntervalSet freeze(MutableInt64IntervalSet self)
+    cdef int search(MutableInt64IntervalSet self, int64_t lower, int64_t upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1
+    cdef int replace(MutableInt64IntervalSet self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, Int64IntervalSetBuilder replacement) except -1
+    cpdef add(MutableInt64IntervalSet self, Int64Interval interval)
+    cpdef discard(MutableInt64IntervalSet self, Int64Interval interval)
+    cpdef bool contains(MutableInt64IntervalSet self, int64_t item)
+
+cdef class Int64IntervalIndex:
+    cdef readonly Py_ssize_t n_intervals
+    cdef Int64IntervalSet sorted_intervals
+    cdef array order_array
+    cdef Py_ssize_t *order
+    cdef Py_ssize_t leaves
+    cdef array tree_array
+    cdef Py_ssize_t *tree
+    cdef tuple cached_intervals
+    cdef int index(Int64IntervalIndex self, Int64IntervalSetBuilder raw) except -1
+    cdef Py_ssize_t end(Int64IntervalIndex self, int64_t upper, unsigned char flags)
+    cdef int collect(Int64IntervalIndex self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, int64_t lower, int64_t upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1
+    cdef int query(Int64IntervalIndex self, int64_t lower, int64_t upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1
+    cpdef array stab(Int64IntervalIndex self, int64_t point)
+    cpdef array overlap(Int64IntervalIndex self, Int64Interval interval)
+
+cpdef tuple Int64Interval_overlap_join(Int64IntervalIndex left, Int64IntervalIndex right)
+
+
+cdef class FloatInterval(BaseInterval):
+    cdef readonly double lower_bound
+    cdef readonly double upper_bound
+    cpdef bool adjacent(FloatInterval self, double lower, double upper)
+    cpdef int containment_cmp(FloatInterval self, double item)
+    cpdef bool contains(FloatInterval self, double item)
+    cpdef bool subset(FloatInterval self, FloatInterval other)
+    cpdef int overlap_cmp(FloatInterval self, FloatInterval other)
+    cpdef tuple init_args(FloatInterval self)
+    cpdef FloatInterval intersection(FloatInterval self, FloatInterval other)
+    cpdef FloatInterval fusion(FloatInterval self, FloatInterval other)
+    cpdef bool empty(FloatInterval self)  
+    cpdef bool richcmp(FloatInterval self, FloatInterval other, int op)
+    cpdef int lower_cmp(FloatInterval self, FloatInterval other)
+    cpdef int upper_cmp(FloatInterval self, FloatInterval other)
+
+cpdef FloatIntervalSet FloatIntervalSet_from_intervals(tuple intervals)
+cpdef tuple FloatInterval_preprocess_intervals(tuple intervals)
+
+cdef class FloatIntervalSetBuilder:
+    cdef Py_ssize_t size
+    cdef Py_ssize_t capacity
+    cdef array flags_array
+    cdef unsigned char *flags
+    cdef array lower_array
+    cdef array upper_array
+    cdef double *lower_bounds
+    cdef double *upper_bounds
+    cdef int grow(FloatIntervalSetBuilder self) except -1
+    cdef int append(FloatIntervalSetBuilder self, double lower, double upper, 
+                    unsigned char flags) except -1 nogil
+    cdef int merge(FloatIntervalSetBuilder self, double lower, double upper, 
+                   unsigned char flags) except -1 nogil
+    cdef int remove(FloatIntervalSetBuilder self, Py_ssize_t start, Py_ssize_t stop) except -1
+    cdef int insert(FloatIntervalSetBuilder self, Py_ssize_t position, double lower, double upper, 
+                    unsigned char flags) except -1
+    cdef FloatIntervalSet build(FloatIntervalSetBuilder self)
+
+cdef class FloatIntervalSetCoalescer:
+    cdef object source
+    cdef bint pending
+    cdef bint started
+    cdef double lower
+    cdef double upper
+    cdef unsigned char flags
+    cdef double last_lower
+    cdef unsigned char last_flags
+    cdef double result_lower
+    cdef double result_upper
+    cdef unsigned char result_flags
+    cdef int next_raw(FloatIntervalSetCoalescer self) except -1
+
+cdef class FloatIntervalSetIterator(BaseIntervalSetIterator):
+    cdef readonly FloatIntervalSet interval_set
+
+cdef class FloatIntervalSet(BaseIntervalSet):
+    cdef double *lower_bounds
+    cdef double *upper_bounds
+    cpdef bool lower_bounded(FloatIntervalSet self)
+    cpdef bool upper_bounded(FloatIntervalSet self)
+    cpdef double lower_bound(FloatIntervalSet self)
+    cpdef double upper_bound(FloatIntervalSet self)
+    cpdef tuple init_args(FloatIntervalSet self)
+    cdef Py_ssize_t locate_item(FloatIntervalSet self, double item) nogil
+    cpdef bool contains(FloatIntervalSet self, double item)
+    cdef int locate_many(FloatIntervalSet self, const double[:] items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1 nogil
+    cpdef array contains_many(FloatIntervalSet self, points)
+    cpdef array locate(FloatIntervalSet self, points)
+    cpdef bool empty(FloatIntervalSet self)
+    cpdef object measure(FloatIntervalSet self)
+    cpdef object intersection_measure(FloatIntervalSet self, FloatIntervalSet other)
+    cpdef bool subset(FloatIntervalSet self, FloatIntervalSet other)
+    cpdef bool equal(FloatIntervalSet self, FloatIntervalSet other)
+    cpdef bool richcmp(FloatIntervalSet self, FloatIntervalSet other, int op)
+    cpdef FloatIntervalSet intersection(FloatIntervalSet self, FloatIntervalSet other)
+    cdef int intersection_into(FloatIntervalSet self, FloatIntervalSet other, 
+                               FloatIntervalSetBuilder builder) except -1 nogil
+    cpdef FloatIntervalSet union(FloatIntervalSet self, FloatIntervalSet other)
+    cdef int union_into(FloatIntervalSet self, FloatIntervalSet other, 
+                        FloatIntervalSetBuilder builder) except -1 nogil
+    cpdef FloatIntervalSet complement(FloatIntervalSet self)
+    cpdef FloatIntervalSet symmetric_difference(FloatIntervalSet self, FloatIntervalSet other)
+    cdef int symmetric_difference_into(FloatIntervalSet self, FloatIntervalSet other, 
+                                       FloatIntervalSetBuilder builder) except -1 nogil
+    cpdef FloatIntervalSet minus(FloatIntervalSet self, FloatIntervalSet other)
+    cdef int minus_into(FloatIntervalSet self, FloatIntervalSet other, 
+                        FloatIntervalSetBuilder builder) except -1 nogil
+
+cpdef FloatIntervalSet FloatIntervalSet_union_all(list sets)
+cpdef FloatIntervalSet FloatIntervalSet_intersection_all(list sets)
+
+cdef class MutableFloatIntervalSet:
+    cdef list blocks
+    cdef readonly Py_ssize_t n_intervals
+    cdef FloatIntervalSet frozen
+    cdef int reset(MutableFloatIntervalSet self, FloatIntervalSet interval_set) except -1
+    cpdef FloatIntervalSet freeze(MutableFloatIntervalSet self)
+    cdef int search(MutableFloatIntervalSet self, double lower, double upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1
+    cdef int replace(MutableFloatIntervalSet self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, FloatIntervalSetBuilder replacement) except -1
+    cpdef add(MutableFloatIntervalSet self, FloatInterval interval)
+    cpdef discard(MutableFloatIntervalSet self, FloatInterval interval)
+    cpdef bool contains(MutableFloatIntervalSet self, double item)
+
+cdef class FloatIntervalIndex:
+    cdef readonly Py_ssize_t n_intervals
+    cdef FloatIntervalSet sorted_intervals
+    cdef array order_array
+    cdef Py_ssize_t *order
+    cdef Py_ssize_t leaves
+    cdef array tree_array
+    cdef Py_ssize_t *tree
+    cdef tuple cached_intervals
+    cdef int index(FloatIntervalIndex self, FloatIntervalSetBuilder raw) except -1
+    cdef Py_ssize_t end(FloatIntervalIndex self, double upper, unsigned char flags)
+    cdef int collect(FloatIntervalIndex self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, double lower, double upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1
+    cdef int query(FloatIntervalIndex self, double lower, double upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1
+    cpdef array stab(FloatIntervalIndex self, double point)
+    cpdef array overlap(FloatIntervalIndex self, FloatInterval interval)
+
+cpdef tuple FloatInterval_overlap_join(FloatIntervalIndex left, FloatIntervalIndex right)
+
+
+cdef class DatetimeInterval(BaseInterval):
+    # Exposed as properties converting to datetime
+    cdef int64_t lower_bound
+    cdef int64_t upper_bound
+    cpdef bool adjacent(DatetimeInterval self, object lower, object upper)
+    cpdef int containment_cmp(DatetimeInterval self, object item)
+    cpdef bool contains(DatetimeInterval self, object item)
+    cpdef bool subset(DatetimeInterval self, DatetimeInterval other)
+    cpdef int overlap_cmp(DatetimeInterval self, DatetimeInterval other)
+    cpdef tuple init_args(DatetimeInterval self)
+    cpdef DatetimeInterval intersection(DatetimeInterval self, DatetimeInterval other)
+    cpdef DatetimeInterval fusion(DatetimeInterval self, DatetimeInterval other)
+    cpdef bool empty(DatetimeInterval self)  
+    cpdef bool richcmp(DatetimeInterval self, DatetimeInterval other, int op)
+    cpdef int lower_cmp(DatetimeInterval self, DatetimeInterval other)
+    cpdef int upper_cmp(DatetimeInterval self, DatetimeInterval other)
+
+cpdef DatetimeIntervalSet DatetimeIntervalSet_from_intervals(tuple intervals)
+cpdef tuple DatetimeInterval_preprocess_intervals(tuple intervals)
+
+cdef class DatetimeIntervalSetBuilder:
+    cdef Py_ssize_t size
+    cdef Py_ssize_t capacity
+    cdef array flags_array
+    cdef unsigned char *flags
+    cdef array lower_array
+    cdef array upper_array
+    cdef int64_t *lower_bounds
+    cdef int64_t *upper_bounds
+    cdef int grow(DatetimeIntervalSetBuilder self) except -1
+    cdef int append(DatetimeIntervalSetBuilder self, int64_t lower, int64_t upper, 
+                    unsigned char flags) except -1 nogil
+    cdef int merge(DatetimeIntervalSetBuilder self, int64_t lower, int64_t upper, 
+                   unsigned char flags) except -1 nogil
+    cdef int remove(DatetimeIntervalSetBuilder self, Py_ssize_t start, Py_ssize_t stop) except -1
+    cdef int insert(DatetimeIntervalSetBuilder self, Py_ssize_t position, int64_t lower, int64_t upper, 
+                    unsigned char flags) except -1
+    cdef DatetimeIntervalSet build(DatetimeIntervalSetBuilder self)
+
+cdef class DatetimeIntervalSetCoalescer:
+    cdef object source
+    cdef bint pending
+    cdef bint started
+    cdef int64_t lower
+    cdef int64_t upper
+    cdef unsigned char flags
+    cdef int64_t last_lower
+    cdef unsigned char last_flags
+    cdef int64_t result_lower
+    cdef int64_t result_upper
+    cdef unsigned char result_flags
+    cdef int next_raw(DatetimeIntervalSetCoalescer self) except -1
+
+cdef class DatetimeIntervalSetIterator(BaseIntervalSetIterator):
+    cdef readonly DatetimeIntervalSet interval_set
+
+cdef class DatetimeIntervalSet(BaseIntervalSet):
+    cdef int64_t *lower_bounds
+    cdef int64_t *upper_bounds
+    cpdef bool lower_bounded(DatetimeIntervalSet self)
+    cpdef bool upper_bounded(DatetimeIntervalSet self)
+    cpdef object lower_bound(DatetimeIntervalSet self)
+    cpdef object upper_bound(DatetimeIntervalSet self)
+    cpdef tuple init_args(DatetimeIntervalSet self)
+    cdef Py_ssize_t locate_item(DatetimeIntervalSet self, int64_t item) nogil
+    cpdef bool contains(DatetimeIntervalSet self, object item)
+    cdef int locate_many(DatetimeIntervalSet self, const int64_t[:] items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1 nogil
+    cpdef array contains_many(DatetimeIntervalSet self, points)
+    cpdef array locate(DatetimeIntervalSet self, points)
+    cpdef bool empty(DatetimeIntervalSet self)
+    cpdef object measure(DatetimeIntervalSet self)
+    cpdef object intersection_measure(DatetimeIntervalSet self, DatetimeIntervalSet other)
+    cpdef bool subset(DatetimeIntervalSet self, DatetimeIntervalSet other)
+    cpdef bool equal(DatetimeIntervalSet self, DatetimeIntervalSet other)
+    cpdef bool richcmp(DatetimeIntervalSet self, DatetimeIntervalSet other, int op)
+    cpdef DatetimeIntervalSet intersection(DatetimeIntervalSet self, DatetimeIntervalSet other)
+    cdef int intersection_into(DatetimeIntervalSet self, DatetimeIntervalSet other, 
+                               DatetimeIntervalSetBuilder builder) except -1 nogil
+    cpdef DatetimeIntervalSet union(DatetimeIntervalSet self, DatetimeIntervalSet other)
+    cdef int union_into(DatetimeIntervalSet self, DatetimeIntervalSet other, 
+                        DatetimeIntervalSetBuilder builder) except -1 nogil
+    cpdef DatetimeIntervalSet complement(DatetimeIntervalSet self)
+    cpdef DatetimeIntervalSet symmetric_difference(DatetimeIntervalSet self, DatetimeIntervalSet other)
+    cdef int symmetric_difference_into(DatetimeIntervalSet self, DatetimeIntervalSet other, 
+                                       DatetimeIntervalSetBuilder builder) except -1 nogil
+    cpdef DatetimeIntervalSet minus(DatetimeIntervalSet self, DatetimeIntervalSet other)
+    cdef int minus_into(DatetimeIntervalSet self, DatetimeIntervalSet other, 
+                        DatetimeIntervalSetBuilder builder) except -1 nogil
+
+cpdef DatetimeIntervalSet DatetimeIntervalSet_union_all(list sets)
+cpdef DatetimeIntervalSet DatetimeIntervalSet_intersection_all(list sets)
+
+cdef class MutableDatetimeIntervalSet:
+    cdef list blocks
+    cdef readonly Py_ssize_t n_intervals
+    cdef DatetimeIntervalSet frozen
+    cdef int reset(MutableDatetimeIntervalSet self, DatetimeIntervalSet interval_set) except -1
+    cpdef DatetimeIntervalSet freeze(MutableDatetimeIntervalSet self)
+    cdef int search(MutableDatetimeIntervalSet self, int64_t lower, int64_t upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1
+    cdef int replace(MutableDatetimeIntervalSet self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, DatetimeIntervalSetBuilder replacement) except -1
+    cpdef add(MutableDatetimeIntervalSet self, DatetimeInterval interval)
+    cpdef discard(MutableDatetimeIntervalSet self, DatetimeInterval interval)
+    cpdef bool contains(MutableDatetimeIntervalSet self, object item)
+
+cdef class DatetimeIntervalIndex:
+    cdef readonly Py_ssize_t n_intervals
+    cdef DatetimeIntervalSet sorted_intervals
+    cdef array order_array
+    cdef Py_ssize_t *order
+    cdef Py_ssize_t leaves
+    cdef array tree_array
+    cdef Py_ssize_t *tree
+    cdef tuple cached_intervals
+    cdef int index(DatetimeIntervalIndex self, DatetimeIntervalSetBuilder raw) except -1
+    cdef Py_ssize_t end(DatetimeIntervalIndex self, int64_t upper, unsigned char flags)
+    cdef int collect(DatetimeIntervalIndex self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, int64_t lower, int64_t upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1
+    cdef int query(DatetimeIntervalIndex self, int64_t lower, int64_t upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1
+    cpdef array stab(DatetimeIntervalIndex self, object point)
+    cpdef array overlap(DatetimeIntervalIndex self, DatetimeInterval interval)
+
+cpdef tuple DatetimeInterval_overlap_join(DatetimeIntervalIndex left, DatetimeIntervalIndex right)
+
@@ -0,0 +1,12633 @@
+from datetime import date, datetime, timedelta
+from itertools import chain, repeat
+from mmap import mmap, ACCESS_READ
+from os import cpu_count
+from struct import Struct
+import sys
+from cpython.array cimport array, clone, resize
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+from libc.stdlib cimport qsort, realloc, free
+from libc.string cimport memcpy, memmove
+from libc.math cimport INFINITY
+from cpython.object cimport PyObject_RichCompare
+cimport cython
+try:
+    from pickle import PickleBuffer
+except ImportError:
+    PickleBuffer = None
+from time import perf_counter
+
+cdef array flags_template = array('B')
+# Positions are stored as Py_ssize_t, which is 64 bits on every 64 bit platform including 
+# Windows, where long is only 32 bits
+cdef array index_template = array('q' if sizeof(Py_ssize_t) == sizeof(long long) else 'i')
+
+# Mutable interval sets keep their intervals in blocks of between block_size / 4 and 
+# 2 * block_size intervals, except that a set with few intervals may have one small block.
+cdef Py_ssize_t block_size = 256
+
+cdef int set_flags(unsigned char *flags, Py_ssize_t n, object values, unsigned char flag) except -1:
+    '''
+    Set flag in each of the n entries of flags for which values is true and clear it in the 
+    others.  The values may be a single bool for all entries or a sequence of n bools.
+    '''
+    cdef const unsigned char[:] view
+    cdef Py_ssize_t i
+    try:
+        view = values
+    except (TypeError, ValueError, BufferError):
+        try:
+            view = array('B', [1 if value else 0 for value in values])
+        except TypeError:
+            # A single value for all entries
+            for i in range(n):
+                flags[i] = (flags[i] | flag) if values else (flags[i] & ~flag)
+            return 0
+    if view.shape[0] != n:
+        raise ValueError('Expected %d flag values but got %d' % (n, view.shape[0]))
+    for i in range(n):
+        flags[i] = (flags[i] | flag) if view[i] else (flags[i] & ~flag)
+    return 0
+
+cdef array get_flags(const unsigned char *flags, Py_ssize_t n, unsigned char flag):
+    '''
+    Return an array of n bytes which are 1 where flag is set in flags and 0 elsewhere.
+    '''
+    cdef array result = clone(flags_template, n, False)
+    cdef Py_ssize_t i
+    for i in range(n):
+        result.data.as_uchars[i] = 1 if flags[i] & flag else 0
+    return result
+
+# Interval set files consist of this header, followed by the lower bounds, the upper bounds 
+# and the flags of the intervals in native byte order.  The header holds a magic string, the 
+# name of the interval set type, the byte order, the size of a bound and the number of 
+# intervals.  Its size is a multiple of 8 so the bounds are aligned when the file is mapped.
+cdef bytes file_magic = b'CYINTSET'
+cdef object file_header = Struct('<8s24scBxxxxxxq')
+
+cdef inline Py_ssize_t *index_data(array values):
+    '''
+    The entries of an array made from index_template.
+    '''
+    return <Py_ssize_t *> values.data.as_voidptr
+
+cdef int append_index(array values, Py_ssize_t *size, Py_ssize_t value) except -1:
+    '''
+    Store value after the first size entries of values, growing values if it is full.
+    '''
+    if size[0] == len(values):
+        resize(values, 2 * size[0] + 8)
+    index_data(values)[size[0]] = value
+    size[0] += 1
+    return 0
+
+# Pairs of positions accumulated without the GIL
+ctypedef struct IndexPairs:
+    Py_ssize_t *first
+    Py_ssize_t *second
+    Py_ssize_t size
+    Py_ssize_t capacity
+
+cdef int append_pair(IndexPairs *pairs, Py_ssize_t first, Py_ssize_t second) nogil except -1:
+    cdef Py_ssize_t capacity
+    cdef Py_ssize_t *new_first
+    cdef Py_ssize_t *new_second
+    if pairs.size == pairs.capacity:
+        capacity = 2 * pairs.capacity + 8
+        new_first = <Py_ssize_t *> realloc(pairs.first, capacity * sizeof(Py_ssize_t))
+        if new_first != NULL:
+            pairs.first = new_first
+        new_second = <Py_ssize_t *> realloc(pairs.second, capacity * sizeof(Py_ssize_t))
+        if new_second != NULL:
+            pairs.second = new_second
+        if new_first == NULL or new_second == NULL:
+            with gil:
+                raise MemoryError()
+        pairs.capacity = capacity
+    pairs.first[pairs.size] = first
+    pairs.second[pairs.size] = second
+    pairs.size += 1
+    return 0
+
+cdef tuple index_pairs_to_arrays(IndexPairs *pairs):
+    cdef array first = clone(index_template, pairs.size, False)
+    cdef array second = clone(index_template, pairs.size, False)
+    if pairs.size > 0:
+        memcpy(index_data(first), pairs.first, pairs.size * sizeof(Py_ssize_t))
+        memcpy(index_data(second), pairs.second, pairs.size * sizeof(Py_ssize_t))
+    return first, second
+
+cdef int index_cmp(const void *value1, const void *value2) nogil:
+    cdef Py_ssize_t first = (<Py_ssize_t *> value1)[0]
+    cdef Py_ssize_t second = (<Py_ssize_t *> value2)[0]
+    return (first > second) - (first < second)
+
+cdef inline unsigned char canonical_flags(unsigned char flags):
+    '''
+    Clear the closedness of unbounded sides, which does not affect equality.
+    '''
+    if not (flags & LOWER_BOUNDED):
+        flags &= ~LOWER_CLOSED
+    if not (flags & UPPER_BOUNDED):
+        flags &= ~UPPER_CLOSED
+    return flags
+
+cdef unsigned char pack_flags(bint lower_closed, bint upper_closed, bint lower_bounded, bint upper_bounded):
+    return ((LOWER_CLOSED if lower_closed else 0) | (UPPER_CLOSED if upper_closed else 0) | 
+            (LOWER_BOUNDED if lower_bounded else 0) | (UPPER_BOUNDED if upper_bounded else 0))
+
+# Counters reported by stats.  They are updated without locking, so they may undercount 
+# while the GIL is released in several threads at once.
+cdef dict operation_calls = {}
+cdef dict operation_times = {}
+cdef unsigned long long lower_cmp_count = 0
+cdef unsigned long long upper_cmp_count = 0
+cdef unsigned long long overlap_cmp_count = 0
+cdef unsigned long long containment_cmp_count = 0
+cdef unsigned long long intervals_allocated = 0
+
+cdef class OperationTimer:
+    '''
+    Count a call of the named operation, adding the time since its creation to the total for 
+    the operation when it is released at the end of the call.
+    '''
+    cdef str name
+    cdef double start
+    
+    def __cinit__(OperationTimer self, str name):
+        self.name = name
+        self.start = perf_counter()
+    
+    def __dealloc__(OperationTimer self):
+        operation_calls[self.name] = operation_calls.get(self.name, 0) + 1
+        operation_times[self.name] = operation_times.get(self.name, 0.) + perf_counter() - self.start
+
+cdef class BaseInterval:
+    '''
+    Interpreted as the conjunction of two inequalities.
+    '''
+    def __reduce__(BaseInterval self):
+        return (self.__class__, self.init_args())
+        
+    def __cinit__(BaseInterval self):
+        global intervals_allocated
+        intervals_allocated += 1
+        self.hash_value = -1
+    
+    def __hash__(BaseInterval self):
+        # Intervals are immutable, so the hash is only computed once.  Equal intervals may 
+        # differ in the closedness or stored value of an unbounded side, so those are ignored.
+        if self.hash_value == -1:
+            self.hash_value = hash((self.lower_bound if self.flags & LOWER_BOUNDED else None, 
+                                    self.upper_bound if self.flags & UPPER_BOUNDED else None,
+                                    canonical_flags(self.flags)))
+        return self.hash_value
+    
+    @property
+    def lower_closed(BaseInterval self):
+        return (self.flags & LOWER_CLOSED) != 0
+    
+    @property
+    def upper_closed(BaseInterval self):
+        return (self.flags & UPPER_CLOSED) != 0
+    
+    @property
+    def lower_bounded(BaseInterval self):
+        return (self.flags & LOWER_BOUNDED) != 0
+    
+    @property
+    def upper_bounded(BaseInterval self):
+        return (self.flags & UPPER_BOUNDED) != 0
+    
+    def __nonzero__(BaseInterval self):
+        return not self.empty()
+    
+    def __richcmp__(BaseInterval self, other, int op):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.richcmp(other, op)
+        
+    def __and__(BaseInterval self, other):
+        if other.__class__ is self.__class__:
+            raise NotImplementedError('Only intervals of the same type can be intersected')
+        return self.intersection(other)
+    
+    def __rand__(BaseInterval self, other):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return other.__and__(other)
+    
+    def __contains__(BaseInterval self, item):
+        return self.contains(item)
+    
+    def __str__(BaseInterval self):
+        return (('[' if self.lower_closed else '(') + (str(self.lower_bound) if self.lower_bounded else '-infty') + ',' + 
+                (str(self.upper_bound) if self.upper_bounded else 'infty') + (']' if self.upper_closed else ')'))
+    
+    def __repr__(BaseInterval self):
+        return str(self)
+        
+cdef class BaseIntervalSet:
+    '''
+    The bounds of the intervals are stored contiguously, in one container for lower bounds and 
+    one for upper bounds, with a single byte of packed flags per interval.  Interval objects are 
+    only created when the intervals attribute is accessed.
+    '''
+    def __cinit__(BaseIntervalSet self):
+        self.hash_value = -1
+    
+    @property
+    def intervals(BaseIntervalSet self):
+        if self.cached_intervals is None:
+            self.cached_intervals = self.materialize_intervals()
+        return self.cached_intervals
+    
+    cdef tuple materialize_intervals(BaseIntervalSet self):
+        return tuple()
+    
+    def __str__(BaseIntervalSet self):
+        return 'U'.join(map(str, self.intervals)) if self.intervals else '{}'
+    
+    def __contains__(BaseIntervalSet self, item):
+        return self.contains(item)
+    
+    def __repr__(BaseIntervalSet self):
+        return str(self)
+    
+    def __richcmp__(BaseIntervalSet self, other, int op):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return self.richcmp(other, op)
+    
+    def __and__(BaseIntervalSet self, other):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return self.intersection(other)
+    
+    def __or__(BaseIntervalSet self, other):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return self.union(other)
+    
+    def __ror__(BaseIntervalSet self, other):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return other.__or__(self)
+    
+    def __rand__(BaseIntervalSet self, other):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return other.__and__(other)
+    
+    def __sub__(BaseIntervalSet self, other):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return self.minus(other)
+    
+    def __rsub__(BaseIntervalSet self, other):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return other.__sub__(self)
+    
+    def __xor__(BaseIntervalSet self, other):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return self.symmetric_difference(other)
+    
+    def __rxor__(BaseIntervalSet self, other):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return other.__xor__(self)
+    
+    def __invert__(BaseIntervalSet self):
+        return self.complement()
+    
+    def __nonzero__(BaseIntervalSet self):
+        return not self.empty()
+    
+    def __reduce__(BaseIntervalSet self):
+        return (self.__class__, self.init_args())
+    
+    def __hash__(BaseIntervalSet self):
+        # Interval sets are immutable, so the hash is only computed once
+        if self.hash_value == -1:
+            self.hash_value = self.compute_hash()
+        return self.hash_value
+    
+    cdef Py_hash_t compute_hash(BaseIntervalSet self) except -1:
+        return hash(())
+    
+cdef class BaseIntervalSetIterator:
+    pass
+
+cdef object epoch = datetime(1970, 1, 1)
+cdef int64_t epoch_ordinal = epoch.toordinal()
+
+# numpy is never imported here, since it is slow to import and optional.  A datetime64 value 
+# or array can only exist once something else has imported it, so it is looked up in 
+# sys.modules when one might be converted.
+
+# DateInterval bounds are stored as proleptic Gregorian ordinals, as returned by 
+# date.toordinal.
+cdef int32_t DateInterval_to_c(object value) except? -1:
+    if isinstance(value, date):
+        return value.toordinal()
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(value, numpy.datetime64):
+        if numpy.isnat(value):
+            raise ValueError('NaT is not a valid interval bound')
+        return value.astype('datetime64[D]').astype('int64') + epoch_ordinal
+    raise TypeError('Expected a date or numpy.datetime64 but got %r' % (value,))
+
+cdef object DateInterval_to_py(int32_t value):
+    return date.fromordinal(value)
+
+cdef const int32_t[:] DateIntervalSet_values(object values):
+    '''
+    Convert a numpy datetime64 array to ordinals with vectorized operations.  Any other 
+    sequence is converted one date at a time.
+    '''
+    if getattr(getattr(values, 'dtype', None), 'kind', None) == 'M':
+        if sys.modules['numpy'].isnat(values).any():
+            raise ValueError('NaT is not a valid interval bound')
+        return (values.astype('datetime64[D]').view('int64') + epoch_ordinal).astype('i')
+    return array('i', [DateInterval_to_c(value) for value in values])
+
+# DatetimeInterval bounds are stored as microseconds since the epoch, in UTC.  Aware datetimes 
+# are converted to UTC and naive ones are assumed to already be in UTC.  Bounds are returned as 
+# naive datetimes.
+cdef int64_t DatetimeInterval_to_c(object value) except? -1:
+    if isinstance(value, datetime):
+        offset = value.utcoffset()
+        if offset is not None:
+            value = (value - offset).replace(tzinfo=None)
+        return ((((<int64_t> value.toordinal()) - epoch_ordinal) * 86400 + value.hour * 3600 + 
+                 value.minute * 60 + value.second) * 1000000 + value.microsecond)
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(value, numpy.datetime64):
+        if numpy.isnat(value):
+            raise ValueError('NaT is not a valid interval bound')
+        return value.astype('datetime64[us]').astype('int64')
+    raise TypeError('Expected a datetime or numpy.datetime64 but got %r' % (value,))
+
+cdef object DatetimeInterval_to_py(int64_t value):
+    return epoch + timedelta(microseconds=value)
+
+cdef object DatetimeInterval_length_to_py(int64_t value):
+    return timedelta(microseconds=value)
+
+cdef const int64_t[:] DatetimeIntervalSet_values(object values):
+    '''
+    View a numpy datetime64 array as int64 microseconds, converting its unit only if 
+    necessary.  Any other sequence is converted one datetime at a time.
+    '''
+    if getattr(getattr(values, 'dtype', None), 'kind', None) == 'M':
+        if sys.modules['numpy'].isnat(values).any():
+            raise ValueError('NaT is not a valid interval bound')
+        return values.astype('datetime64[us]', copy=False).view('int64')
+    return array('q', [DatetimeInterval_to_c(value) for value in values])
+
+
+
+
+# These operate on the raw bounds and packed flags of an interval.  The methods of 
+# ObjectInterval and the loops of ObjectIntervalSet are built on them.
+cdef inline bint ObjectInterval_adjacent(object lower, object upper):
+    return False
+
+cdef inline bint ObjectInterval_empty(object lower, object upper, unsigned char flags):
+    return (((flags & LOWER_BOUNDED) and (flags & UPPER_BOUNDED)) and 
+            ((((lower == upper) and 
+            (not ((flags & LOWER_CLOSED) and (flags & UPPER_CLOSED)))) or
+            lower > upper) or 
+             (lower < upper and 
+              (not (flags & (LOWER_CLOSED | UPPER_CLOSED))) and
+              ObjectInterval_adjacent(lower, upper))))
+
+cdef inline int ObjectInterval_containment_cmp(object lower, object upper, unsigned char flags, 
+                                                object item):
+    global containment_cmp_count
+    containment_cmp_count += 1
+    if flags & LOWER_BOUNDED:
+        if item < lower:
+            return -1
+        elif item == lower:
+            if not (flags & LOWER_CLOSED):
+                return -1
+    if flags & UPPER_BOUNDED:
+        if item > upper:
+            return 1
+        elif item == upper:
+            if not (flags & UPPER_CLOSED):
+                return 1
+    return 0
+
+cdef inline int ObjectInterval_lower_cmp(object lower1, unsigned char flags1, 
+                                          object lower2, unsigned char flags2):
+    global lower_cmp_count
+    lower_cmp_count += 1
+    if not (flags1 & LOWER_BOUNDED):
+        if not (flags2 & LOWER_BOUNDED):
+            return 0
+        else:
+            return -1
+    elif not (flags2 & LOWER_BOUNDED):
+        return 1
+    if lower1 < lower2:
+        return -1
+    elif lower1 == lower2:
+        if (flags1 & LOWER_CLOSED) and not (flags2 & LOWER_CLOSED):
+            return -1
+        elif (flags2 & LOWER_CLOSED) and not (flags1 & LOWER_CLOSED):
+            return 1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int ObjectInterval_upper_cmp(object upper1, unsigned char flags1, 
+                                          object upper2, unsigned char flags2):
+    global upper_cmp_count
+    upper_cmp_count += 1
+    if not (flags1 & UPPER_BOUNDED):
+        if not (flags2 & UPPER_BOUNDED):
+            return 0
+        else:
+            return 1
+    elif not (flags2 & UPPER_BOUNDED):
+        return -1
+    if upper1 < upper2:
+        return -1
+    elif upper1 == upper2:
+        if (flags1 & UPPER_CLOSED) and not (flags2 & UPPER_CLOSED):
+            return 1
+        elif (flags2 & UPPER_CLOSED) and not (flags1 & UPPER_CLOSED):
+            return -1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int ObjectInterval_overlap_cmp(object lower1, object upper1, unsigned char flags1, 
+                                            object lower2, object upper2, unsigned char flags2):
+    global overlap_cmp_count
+    overlap_cmp_count += 1
+    if (flags1 & UPPER_BOUNDED) and (flags2 & LOWER_BOUNDED):
+        if upper1 < lower2:
+            return -1
+        elif upper1 == lower2:
+            if (flags1 & UPPER_CLOSED) and (flags2 & LOWER_CLOSED):
+                return 0
+            else:
+                return -1
+    if (flags1 & LOWER_BOUNDED) and (flags2 & UPPER_BOUNDED):
+        if lower1 > upper2:
+            return 1
+        elif lower1 == upper2:
+            if (flags1 & LOWER_CLOSED) and (flags2 & UPPER_CLOSED):
+                return 0
+            else:
+                return 1
+    return 0
+
+cdef inline bint ObjectInterval_fusible(object lower1, object upper1, unsigned char flags1, 
+                                         object lower2, object upper2, unsigned char flags2):
+    '''
+    Return whether the union of two nonempty intervals is an interval, because they overlap 
+    or touch.
+    '''
+    cdef int overlap_cmp = ObjectInterval_overlap_cmp(lower1, upper1, flags1, lower2, upper2, flags2)
+    return ((overlap_cmp == 0) or 
+            (overlap_cmp == -1 and upper1 == lower2 and 
+             ((flags1 & UPPER_CLOSED) or (flags2 & LOWER_CLOSED))) or
+            (overlap_cmp == 1 and upper2 == lower1 and 
+             ((flags2 & UPPER_CLOSED) or (flags1 & LOWER_CLOSED))))
+
+cdef inline bint ObjectInterval_intersection_empty(object lower1, object upper1, unsigned char flags1, 
+                                                    object lower2, object upper2, unsigned char flags2):
+    '''
+    Return whether two nonempty intervals that overlap according to overlap_cmp nonetheless 
+    have no element in common, which can only happen for types with adjacent elements.
+    '''
+    return False
+
+cdef class ObjectIntervalSetBuilder:
+    '''
+    Accumulates the bounds and flags of sorted intervals into the storage of a new 
+    ObjectIntervalSet.  The builder must not be used after build has been called.
+    '''
+    def __cinit__(ObjectIntervalSetBuilder self, Py_ssize_t capacity=0):
+        self.size = 0
+        self.capacity = capacity
+        self.flags_array = clone(flags_template, capacity, False)
+        self.flags = self.flags_array.data.as_uchars
+        self.lower_bounds = []
+        self.upper_bounds = []
+    
+    cdef int grow(ObjectIntervalSetBuilder self) except -1:
+        self.capacity = 2 * self.capacity + 8
+        resize(self.flags_array, self.capacity)
+        self.flags = self.flags_array.data.as_uchars
+        return 0
+    
+    cdef int append(ObjectIntervalSetBuilder self, object lower, object upper, 
+                    unsigned char flags) except -1:
+        '''
+        Add an interval after all intervals added so far, assuming the two neither overlap 
+        nor touch.
+        '''
+        if self.size == self.capacity:
+            self.grow()
+        self.lower_bounds.append(lower)
+        self.upper_bounds.append(upper)
+        self.flags[self.size] = flags
+        self.size += 1
+        return 0
+    
+    cdef int merge(ObjectIntervalSetBuilder self, object lower, object upper, 
+                   unsigned char flags) except -1:
+        '''
+        Add an interval whose lower bound is not less than that of any interval added so far, 
+        fusing it with the last interval if the two overlap or touch.  Empty intervals are 
+        ignored.
+        '''
+        cdef Py_ssize_t last = self.size - 1
+        if ObjectInterval_empty(lower, upper, flags):
+            return 0
+        if last < 0:
+            return self.append(lower, upper, flags)
+        if ObjectInterval_fusible(self.lower_bounds[last], self.upper_bounds[last], self.flags[last], 
+                                   lower, upper, flags):
+            if ObjectInterval_lower_cmp(lower, flags, self.lower_bounds[last], self.flags[last]) < 0:
+                self.lower_bounds[last] = lower
+                self.flags[last] = (self.flags[last] & UPPER_FLAGS) | (flags & LOWER_FLAGS)
+            if ObjectInterval_upper_cmp(upper, flags, self.upper_bounds[last], self.flags[last]) > 0:
+                self.upper_bounds[last] = upper
+                self.flags[last] = (self.flags[last] & LOWER_FLAGS) | (flags & UPPER_FLAGS)
+            return 0
+        return self.append(lower, upper, flags)
+    
+    cdef int remove(ObjectIntervalSetBuilder self, Py_ssize_t start, Py_ssize_t stop) except -1:
+        '''
+        Remove the intervals at positions start up to, but not including, stop.
+        '''
+        cdef Py_ssize_t tail = self.size - stop
+        if stop <= start:
+            return 0
+        del self.lower_bounds[start:stop]
+        del self.upper_bounds[start:stop]
+        memmove(self.flags + start, self.flags + stop, tail)
+        self.size -= stop - start
+        return 0
+    
+    cdef int insert(ObjectIntervalSetBuilder self, Py_ssize_t position, object lower, object upper, 
+                    unsigned char flags) except -1:
+        '''
+        Add an interval at the given position, moving the intervals after it.
+        '''
+        if self.size == self.capacity:
+            self.grow()
+        self.lower_bounds.insert(position, lower)
+        self.upper_bounds.insert(position, upper)
+        memmove(self.flags + position + 1, self.flags + position, self.size - position)
+        self.flags[position] = flags
+        self.size += 1
+        return 0
+    
+    cdef ObjectIntervalSet build(ObjectIntervalSetBuilder self):
+        cdef ObjectIntervalSet result = ObjectIntervalSet.__new__(ObjectIntervalSet)
+        resize(self.flags_array, self.size)
+        result.flags = self.flags_array.data.as_uchars
+        result.lower_bounds = self.lower_bounds
+        result.upper_bounds = self.upper_bounds
+        result.storage = (self.flags_array,)
+        result.n_intervals = self.size
+        return result
+
+cdef ObjectIntervalSet ObjectIntervalSet_normalize(ObjectIntervalSetBuilder raw):
+    '''
+    Build an ObjectIntervalSet from the intervals accumulated in raw, which may be empty, 
+    unsorted and overlapping.  Empty intervals are dropped, the rest are sorted by lower bound 
+    and any that overlap or touch are fused.
+    '''
+    cdef Py_ssize_t i, k, n = raw.size
+    cdef ObjectIntervalSetBuilder builder
+    cdef bint is_sorted = True
+    for i in range(1, n):
+        if ObjectInterval_lower_cmp(raw.lower_bounds[i-1], raw.flags[i-1], 
+                                     raw.lower_bounds[i], raw.flags[i]) > 0:
+            is_sorted = False
+            break
+    if is_sorted:
+        builder = ObjectIntervalSetBuilder(n)
+        for i in range(n):
+            builder.merge(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i])
+        return builder.build()
+    cdef list order = []
+    for i in range(n):
+        if not ObjectInterval_empty(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i]):
+            order.append(i)
+    # Unbounded lower bounds sort first, and closed lower bounds before open ones at the same value
+    order.sort(key=lambda i: (1, raw.lower_bounds[i], not (raw.flags[i] & LOWER_CLOSED)) 
+                             if raw.flags[i] & LOWER_BOUNDED else (0,))
+    builder = ObjectIntervalSetBuilder(len(order))
+    for k in order:
+        builder.merge(raw.lower_bounds[k], raw.upper_bounds[k], raw.flags[k])
+    return builder.build()
+
+cdef class ObjectInterval(BaseInterval):
+    def __init__(BaseInterval self, object lower_bound, object upper_bound, bool lower_closed, 
+                 bool upper_closed, bool lower_bounded, bool upper_bounded):
+        self.flags = pack_flags(lower_closed, upper_closed, lower_bounded, upper_bounded)
+        if lower_bounded:
+            self.lower_bound = lower_bound
+        if upper_bounded:
+            self.upper_bound = upper_bound
+    
+    # For some types, there is a concept of adjacent elements.  For example, 
+    # there are no integers between 1 and 2 (although there are several real numbers).
+    # If there is such a concept, it's possible for an interval to be empty even when 
+    # the lower bound is strictly less than the upper bound, provided the bounds are strict 
+    # (not closed).  The adjacent method is used to help determine such cases.
+    cpdef bool adjacent(ObjectInterval self, object lower, object upper):
+        return ObjectInterval_adjacent(lower, upper)
+    
+    cpdef int containment_cmp(ObjectInterval self, object item):
+        return ObjectInterval_containment_cmp(self.lower_bound, self.upper_bound, self.flags, item)
+    
+    cpdef bool contains(ObjectInterval self, object item):
+        return self.containment_cmp(item) == 0
+    
+    cpdef bool subset(ObjectInterval self, ObjectInterval other):
+        '''
+        Return True if and only if self is a subset of other.
+        '''
+        return (ObjectInterval_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags) >= 0 and 
+                ObjectInterval_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags) <= 0)
+        
+    cpdef int overlap_cmp(ObjectInterval self, ObjectInterval other):
+        '''
+        Assume both are nonempty.  Return -1 if every element of self is less than every 
+        element of other.  Return 0 if self and other intersect.  Return 1 if every element of 
+        self is greater than every element of other.
+        '''
+        return ObjectInterval_overlap_cmp(self.lower_bound, self.upper_bound, self.flags, 
+                                           other.lower_bound, other.upper_bound, other.flags)
+    
+    cpdef tuple init_args(ObjectInterval self):
+        return (self.lower_bound, self.upper_bound, (self.flags & LOWER_CLOSED) != 0, 
+                (self.flags & UPPER_CLOSED) != 0, (self.flags & LOWER_BOUNDED) != 0, 
+                (self.flags & UPPER_BOUNDED) != 0)
+
+    cpdef ObjectInterval intersection(ObjectInterval self, ObjectInterval other):
+        cdef ObjectInterval result = ObjectInterval.__new__(ObjectInterval)
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
+        else:
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
+        else:
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
+        return result
+    
+    cpdef ObjectInterval fusion(ObjectInterval self, ObjectInterval other):
+        '''
+        Assume union of intervals is a single interval.  Return their union.  Results not correct
+        if above assumption is violated.
+        '''
+        cdef ObjectInterval result = ObjectInterval.__new__(ObjectInterval)
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
+        else:
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
+        else:
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
+        return result
+    
+    cpdef bool empty(ObjectInterval self):
+        return ObjectInterval_empty(self.lower_bound, self.upper_bound, self.flags)
+    
+    cpdef bool richcmp(ObjectInterval self, ObjectInterval other, int op):
+        cdef int lower_cmp
+        cdef int upper_cmp
+        if op == 0 or op == 1:
+            lower_cmp = self.lower_cmp(other)
+            if lower_cmp == -1:
+                return True
+            elif lower_cmp == 1:
+                return False
+            else: # lower_cmp == 0
+                upper_cmp = self.upper_cmp(other)
+                if upper_cmp == -1:
+                    return True
+                elif upper_cmp == 1:
+                    return False
+                else: # upper_cmp == 0
+                    return op == 1
+        elif op == 2:
+            return (self.lower_cmp(other) == 0) and (self.upper_cmp(other) == 0)
+        elif op == 3:
+            return (self.lower_cmp(other) != 0) or (self.upper_cmp(other) != 0)
+        elif op == 4 or op == 5:
+            lower_cmp = self.lower_cmp(other)
+            if lower_cmp == -1:
+                return False
+            elif lower_cmp == 1:
+                return True
+            else: # lower_cmp == 0
+                upper_cmp = self.upper_cmp(other)
+                if upper_cmp == -1:
+                    return False
+                elif upper_cmp == 1:
+                    return True
+                else: # upper_cmp == 0
+                    return op == 5
+    
+    cpdef int lower_cmp(ObjectInterval self, ObjectInterval other):
+        return ObjectInterval_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags)
+    
+    cpdef int upper_cmp(ObjectInterval self, ObjectInterval other):
+        return ObjectInterval_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags)
+
+# This is because static cpdef methods are not supported.  Otherwise this
+# would be a static method of ObjectIntervalSet
+cpdef ObjectIntervalSet ObjectIntervalSet_from_intervals(tuple intervals):
+    '''
+    Construct an ObjectIntervalSet from intervals in any order, which may be empty or 
+    overlapping.
+    '''
+    cdef OperationTimer timer = OperationTimer('ObjectIntervalSet_from_intervals')
+    cdef ObjectInterval interval
+    cdef ObjectIntervalSetBuilder raw = ObjectIntervalSetBuilder(len(intervals))
+    for interval in intervals:
+        raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+    return ObjectIntervalSet_normalize(raw)
+
+cdef ObjectIntervalSetBuilder ObjectIntervalSet_raw_from_arrays(object lower, object upper, object lower_closed, 
+                                                                   object upper_closed, object lower_bounded, 
+                                                                   object upper_bounded):
+    '''
+    Accumulate intervals given as arrays of bounds and flags, as described in 
+    ObjectIntervalSet.from_arrays, into a builder in the order given.
+    '''
+    cdef tuple lower_values = tuple(lower)
+    cdef tuple upper_values = tuple(upper)
+    cdef Py_ssize_t i, n = len(lower_values)
+    if len(upper_values) != n:
+        raise ValueError('lower and upper must have the same length')
+    cdef array flags = clone(flags_template, n, True)
+    set_flags(flags.data.as_uchars, n, lower_closed, LOWER_CLOSED)
+    set_flags(flags.data.as_uchars, n, upper_closed, UPPER_CLOSED)
+    set_flags(flags.data.as_uchars, n, lower_bounded, LOWER_BOUNDED)
+    set_flags(flags.data.as_uchars, n, upper_bounded, UPPER_BOUNDED)
+    cdef ObjectIntervalSetBuilder raw = ObjectIntervalSetBuilder(n)
+    for i in range(n):
+        raw.append(lower_values[i] if flags.data.as_uchars[i] & LOWER_BOUNDED else None, 
+                   upper_values[i] if flags.data.as_uchars[i] & UPPER_BOUNDED else None, 
+                   flags.data.as_uchars[i])
+    return raw
+
+cpdef tuple ObjectInterval_preprocess_intervals(tuple intervals):
+    '''
+    Remove empty intervals, sort, and fuse any overlapping intervals.
+    '''
+    cdef OperationTimer timer = OperationTimer('ObjectInterval_preprocess_intervals')
+    return ObjectIntervalSet_from_intervals(intervals).intervals
+
+cdef class ObjectIntervalSetCoalescer:
+    '''
+    Iterate over the coalesced intervals of an iterable of ObjectIntervals or (lower, upper) 
+    pairs, sorted by lower bound.  Pairs describe closed intervals, and either bound may be 
+    unbounded.  Only one pending interval is held at a time, so the input is never 
+    materialized.  A ValueError is raised if the input is found to be out of order.
+    '''
+    def __init__(ObjectIntervalSetCoalescer self, intervals):
+        self.source = iter(intervals)
+        self.pending = False
+        self.started = False
+    
+    def __iter__(ObjectIntervalSetCoalescer self):
+        return self
+    
+    def __next__(ObjectIntervalSetCoalescer self):
+        cdef ObjectInterval result
+        if not self.next_raw():
+            raise StopIteration
+        result = ObjectInterval.__new__(ObjectInterval)
+        result.lower_bound = self.result_lower
+        result.upper_bound = self.result_upper
+        result.flags = self.result_flags
+        return result
+    
+    cdef int next_raw(ObjectIntervalSetCoalescer self) except -1:
+        '''
+        Store the next coalesced interval in the result fields and return 1, or return 0 if 
+        there are no more.
+        '''
+        cdef object item_lower, item_upper
+        cdef unsigned char item_flags
+        cdef ObjectInterval interval
+        for item in self.source:
+            if isinstance(item, ObjectInterval):
+                interval = item
+                item_lower = interval.lower_bound
+                item_upper = interval.upper_bound
+                item_flags = interval.flags
+            else:
+                lower_value, upper_value = item
+                item_flags = LOWER_CLOSED | UPPER_CLOSED
+                if lower_value is unbounded:
+                    item_lower = None
+                else:
+                    item_lower = lower_value
+                    item_flags |= LOWER_BOUNDED
+                if upper_value is unbounded:
+                    item_upper = None
+                else:
+                    item_upper = upper_value
+                    item_flags |= UPPER_BOUNDED
+            if self.started and ObjectInterval_lower_cmp(item_lower, item_flags, 
+                                                          self.last_lower, self.last_flags) < 0:
+                raise ValueError('Intervals must be sorted by lower bound')
+            self.started = True
+            self.last_lower = item_lower
+            self.last_flags = item_flags
+            if ObjectInterval_empty(item_lower, item_upper, item_flags):
+                continue
+            if not self.pending:
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                self.pending = True
+            elif ObjectInterval_fusible(self.lower, self.upper, self.flags, item_lower, item_upper, item_flags):
+                if ObjectInterval_upper_cmp(item_upper, item_flags, self.upper, self.flags) > 0:
+                    self.upper = item_upper
+                    self.flags = (self.flags & LOWER_FLAGS) | (item_flags & UPPER_FLAGS)
+            else:
+                self.result_lower = self.lower
+                self.result_upper = self.upper
+                self.result_flags = self.flags
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                return 1
+        if self.pending:
+            self.result_lower = self.lower
+            self.result_upper = self.upper
+            self.result_flags = self.flags
+            self.pending = False
+            return 1
+        return 0
+
+cdef class ObjectIntervalSetIterator(BaseIntervalSetIterator):
+    def __init__(ObjectIntervalSetIterator self, ObjectIntervalSet interval_set):
+        self.index = 0
+        self.interval_set = interval_set
+    
+    def __iter__(ObjectIntervalSetIterator self):
+        return self
+    
+    def __next__(ObjectIntervalSetIterator self):
+        self.index += 1
+        if self.index <= self.interval_set.n_intervals:
+            return self.interval_set.intervals[self.index-1]
+        raise StopIteration
+
+cdef class ObjectIntervalSet(BaseIntervalSet):
+    def __init__(ObjectIntervalSet self, tuple intervals):
+        '''
+        The intervals must already be sorted and non-overlapping.
+        '''
+        cdef ObjectIntervalSetBuilder builder = ObjectIntervalSetBuilder(len(intervals))
+        cdef ObjectInterval interval
+        cdef ObjectIntervalSet built
+        for interval in intervals:
+            builder.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        built = builder.build()
+        self.lower_bounds = built.lower_bounds
+        self.upper_bounds = built.upper_bounds
+        self.flags = built.flags
+        self.storage = built.storage
+        self.n_intervals = built.n_intervals
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True):
+        '''
+        Construct an ObjectIntervalSet directly from sequences of lower and upper bounds, 
+        given as any sequences of objects.  
+        Each of lower_closed, upper_closed, lower_bounded and upper_bounded is either a single 
+        bool for all intervals or a sequence of bools with one per interval.  The intervals need 
+        not be sorted or disjoint, and no interval objects are created.
+        '''
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalSet.from_arrays')
+        return ObjectIntervalSet_normalize(ObjectIntervalSet_raw_from_arrays(lower, upper, lower_closed, 
+                                                                                upper_closed, lower_bounded, 
+                                                                                upper_bounded))
+    
+    @staticmethod
+    def from_sorted(intervals):
+        '''
+        Construct an ObjectIntervalSet from an iterable of ObjectIntervals or (lower, upper) pairs 
+        sorted by lower bound, as described in ObjectIntervalSetCoalescer, coalescing them as 
+        they are read.
+        '''
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalSet.from_sorted')
+        cdef ObjectIntervalSetCoalescer coalescer = ObjectIntervalSetCoalescer(intervals)
+        cdef ObjectIntervalSetBuilder builder = ObjectIntervalSetBuilder()
+        while coalescer.next_raw():
+            builder.append(coalescer.result_lower, coalescer.result_upper, coalescer.result_flags)
+        return builder.build()
+    
+    def __iter__(ObjectIntervalSet self):
+        return ObjectIntervalSetIterator(self)
+    
+    def __getitem__(ObjectIntervalSet self, index):
+        return self.intervals[index]
+    
+    cdef tuple materialize_intervals(ObjectIntervalSet self):
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalSet.materialize_intervals')
+        cdef Py_ssize_t i
+        cdef unsigned char flags
+        cdef ObjectInterval interval
+        cdef list result = []
+        for i in range(self.n_intervals):
+            interval = ObjectInterval.__new__(ObjectInterval)
+            interval.lower_bound = self.lower_bounds[i]
+            interval.upper_bound = self.upper_bounds[i]
+            interval.flags = self.flags[i]
+            result.append(interval)
+        return tuple(result)
+    
+    cdef Py_hash_t compute_hash(ObjectIntervalSet self) except -1:
+        '''
+        Combine the hashes of the intervals in the same way as the hash of a tuple.
+        '''
+        cdef Py_ssize_t i
+        cdef unsigned char flags
+        cdef size_t result = 0x345678
+        cdef size_t multiplier = 1000003
+        cdef Py_hash_t interval_hash
+        for i in range(self.n_intervals):
+            flags = canonical_flags(self.flags[i])
+            interval_hash = hash((self.lower_bounds[i] if flags & LOWER_BOUNDED else None, 
+                                  self.upper_bounds[i] if flags & UPPER_BOUNDED else None, flags))
+            result = (result ^ <size_t> interval_hash) * multiplier
+            multiplier += 82520 + 2 * (self.n_intervals - i)
+        result += 97531
+        if <Py_hash_t> result == -1:
+            return -2
+        return <Py_hash_t> result
+    
+    cpdef bool lower_bounded(ObjectIntervalSet self):
+        if self.n_intervals > 0:
+            return (self.flags[0] & LOWER_BOUNDED) != 0
+        else:
+            return True
+    
+    cpdef bool upper_bounded(ObjectIntervalSet self):
+        if self.n_intervals > 0:
+            return (self.flags[self.n_intervals - 1] & UPPER_BOUNDED) != 0
+        else:
+            return True
+    
+    cpdef object lower_bound(ObjectIntervalSet self):
+        if self.n_intervals > 0:
+            return self.lower_bounds[0]
+        else:
+            return None
+    
+    cpdef object upper_bound(ObjectIntervalSet self):
+        if self.n_intervals > 0:
+            return self.upper_bounds[self.n_intervals - 1]
+        else:
+            return None
+    
+    cpdef tuple init_args(ObjectIntervalSet self):
+        return (self.intervals,)
+    
+    cdef Py_ssize_t locate_item(ObjectIntervalSet self, object item):
+        '''
+        Use binary search to find the index of the interval containing item, or -1 if there 
+        is none.
+        '''
+        cdef Py_ssize_t i, n
+        cdef Py_ssize_t low, high
+        cdef int cmp
+        n = self.n_intervals
+        low = 0
+        high = n-1
+        while high >= low:
+            i = (high + low) / 2
+            cmp = ObjectInterval_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                  self.flags[i], item)
+            if cmp == -1:
+                high = i - 1
+            elif cmp == 1:
+                low = i + 1
+            else: #if cmp == 0:
+                return i
+        return -1
+    
+    cpdef bool contains(ObjectIntervalSet self, object item):
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalSet.contains')
+        return self.locate_item(item) >= 0
+    
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef int locate_many(ObjectIntervalSet self, tuple items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1:
+        '''
+        For each of items, store the index of the interval containing it (or -1 if there is 
+        none) in indices and whether there is one in mask, skipping either if it is NULL.  
+        Sorted items are merged against the intervals in a single pass, otherwise each is 
+        found by binary search.
+        '''
+        cdef Py_ssize_t n = len(items)
+        cdef Py_ssize_t k
+        cdef Py_ssize_t i, index
+        cdef int cmp
+        cdef bint is_sorted = True
+        cdef object item
+        for k in range(1, n):
+            if items[k] < items[k-1]:
+                is_sorted = False
+                break
+        i = 0
+        for k in range(n):
+            item = items[k]
+            if is_sorted:
+                cmp = 1
+                while i < self.n_intervals:
+                    cmp = ObjectInterval_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                          self.flags[i], item)
+                    if cmp != 1:
+                        break
+                    i += 1
+                index = i if cmp == 0 else -1
+            else:
+                index = self.locate_item(item)
+            if indices != NULL:
+                indices[k] = index
+            if mask != NULL:
+                mask[k] = index >= 0
+        return 0
+    
+    cpdef array contains_many(ObjectIntervalSet self, points):
+        '''
+        Return an array of bytes, with 1 for each of points contained in self and 0 for each 
+        that is not.  The result can be viewed as a boolean numpy array with 
+        numpy.frombuffer(result, dtype=bool).
+        '''
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalSet.contains_many')
+        cdef tuple items = tuple(points)
+        cdef array result = clone(flags_template, len(items), False)
+        self.locate_many(items, NULL, result.data.as_uchars)
+        return result
+    
+    cpdef array locate(ObjectIntervalSet self, points):
+        '''
+        Return an array of positions holding, for each of points, the index in self.intervals of 
+        the interval containing it, or -1 if no interval contains it.
+        '''
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalSet.locate')
+        cdef tuple items = tuple(points)
+        cdef array result = clone(index_template, len(items), False)
+        self.locate_many(items, index_data(result), NULL)
+        return result
+
+    cpdef bool subset(ObjectIntervalSet self, ObjectIntervalSet other):
+        '''
+        Return True if and only if self is a subset of other.
+        '''
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalSet.subset')
+        cdef Py_ssize_t i, j, m, n
+        cdef int overlap_cmp
+        if self.empty():
+            return True
+        elif other.empty():
+            return False
+        m = self.n_intervals
+        n = other.n_intervals
+        i = 0
+        j = 0
+        while i < m:
+            overlap_cmp = ObjectInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+            if overlap_cmp == -1:
+                return False
+            elif overlap_cmp == 0:
+                if (ObjectInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.flags[j]) < 0 or 
+                    ObjectInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                              other.upper_bounds[j], other.flags[j]) > 0):
+                    return False
+                i += 1
+            else:
+                # The current interval of self lies beyond the current interval of other, so 
+                # compare it against the next interval of other.
+                j += 1
+                if j == n:
+                    return False
+        return True
+    
+    cpdef bool equal(ObjectIntervalSet self, ObjectIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalSet.equal')
+        cdef Py_ssize_t i, n
+        n = self.n_intervals
+        if n != other.n_intervals:
+            return False
+        for i in range(n):
+            if (ObjectInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                          other.lower_bounds[i], other.flags[i]) != 0 or 
+                ObjectInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                          other.upper_bounds[i], other.flags[i]) != 0):
+                return False
+        return True
+    
+    cpdef bool richcmp(ObjectIntervalSet self, ObjectIntervalSet other, int op):
+        if op == 0:
+            return self.subset(other) and not self.equal(other)
+        elif op == 1:
+            return self.subset(other)
+        elif op == 2:
+            return self.equal(other)
+        elif op == 3:
+            return not self.equal(other)
+        elif op == 4:
+            return other.subset(self) and not other.equal(self)
+        elif op == 5:
+            return other.subset(self)
+    
+    cpdef bool empty(ObjectIntervalSet self):
+        return self.n_intervals == 0 
+    
+    cpdef ObjectIntervalSet intersection(ObjectIntervalSet self, ObjectIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalSet.intersection')
+        if self.empty():
+            return self
+        if other.empty():
+            return other
+        cdef ObjectIntervalSetBuilder builder = ObjectIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        self.intersection_into(other, builder)
+        return builder.build()
+    
+    cdef int intersection_into(ObjectIntervalSet self, ObjectIntervalSet other, 
+                               ObjectIntervalSetBuilder builder) except -1:
+        '''
+        Append the intersection of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, lower_cmp, upper_cmp
+        cdef object new_lower_bound, new_upper_bound
+        cdef unsigned char new_flags
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        while i < m and j < n:
+            cmp = ObjectInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+            if cmp == -1:
+                i += 1
+            elif cmp == 1:
+                j += 1
+            else:
+                lower_cmp = ObjectInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.flags[j])
+                upper_cmp = ObjectInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                                      other.upper_bounds[j], other.flags[j])
+                if lower_cmp <= 0:
+                    new_lower_bound = other.lower_bounds[j]
+                    new_flags = other.flags[j] & LOWER_FLAGS
+                else:
+                    new_lower_bound = self.lower_bounds[i]
+                    new_flags = self.flags[i] & LOWER_FLAGS
+                if upper_cmp <= 0:
+                    new_upper_bound = self.upper_bounds[i]
+                    new_flags |= self.flags[i] & UPPER_FLAGS
+                else:
+                    new_upper_bound = other.upper_bounds[j]
+                    new_flags |= other.flags[j] & UPPER_FLAGS
+                # For types with adjacent elements the overlap may still be empty
+                if not ObjectInterval_empty(new_lower_bound, new_upper_bound, new_flags):
+                    builder.append(new_lower_bound, new_upper_bound, new_flags)
+                if upper_cmp <= 0:
+                    i += 1
+                if upper_cmp >= 0:
+                    j += 1
+        return 0
+    
+    cpdef ObjectIntervalSet union(ObjectIntervalSet self, ObjectIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalSet.union')
+        if self.empty():
+            return other
+        if other.empty():
+            return self
+        cdef ObjectIntervalSetBuilder builder = ObjectIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        self.union_into(other, builder)
+        return builder.build()
+    
+    cdef int union_into(ObjectIntervalSet self, ObjectIntervalSet other, 
+                        ObjectIntervalSetBuilder builder) except -1:
+        '''
+        Append the union of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        while i < m or j < n:
+            if j == n or (i < m and 
+                          ObjectInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                    other.lower_bounds[j], other.flags[j]) <= 0):
+                builder.merge(self.lower_bounds[i], self.upper_bounds[i], self.flags[i])
+                i += 1
+            else:
+                builder.merge(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                j += 1
+        return 0
+    
+    cpdef ObjectIntervalSet complement(ObjectIntervalSet self):
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalSet.complement')
+        cdef ObjectIntervalSetBuilder builder
+        if self.empty():
+            builder = ObjectIntervalSetBuilder(1)
+            builder.append(None, None, LOWER_CLOSED | UPPER_CLOSED)
+            return builder.build()
+        cdef Py_ssize_t i
+        cdef Py_ssize_t n = self.n_intervals
+        cdef unsigned char flags
+        builder = ObjectIntervalSetBuilder(n + 1)
+        if self.flags[0] & LOWER_BOUNDED:
+            builder.append(None, self.lower_bounds[0], 
+                           LOWER_CLOSED | UPPER_BOUNDED | (0 if self.flags[0] & LOWER_CLOSED else UPPER_CLOSED))
+        for i in range(1, n):
+            # For types with adjacent elements the gap between two intervals may be empty
+            flags = (LOWER_BOUNDED | UPPER_BOUNDED | 
+                     (0 if self.flags[i-1] & UPPER_CLOSED else LOWER_CLOSED) | 
+                     (0 if self.flags[i] & LOWER_CLOSED else UPPER_CLOSED))
+            if not ObjectInterval_empty(self.upper_bounds[i-1], self.lower_bounds[i], flags):
+                builder.append(self.upper_bounds[i-1], self.lower_bounds[i], flags)
+        if self.flags[n-1] & UPPER_BOUNDED:
+            builder.append(self.upper_bounds[n-1], None, 
+                           UPPER_CLOSED | LOWER_BOUNDED | (0 if self.flags[n-1] & UPPER_CLOSED else LOWER_CLOSED))
+        return builder.build()
+            
+    cpdef ObjectIntervalSet symmetric_difference(ObjectIntervalSet self, ObjectIntervalSet other):
+        '''
+        Return the set of elements in exactly one of self and other, computed in a single sweep 
+        over both.  At each step the remaining parts of the current intervals of self and other 
+        are compared, and whatever lies before the start or after the end of their overlap is 
+        kept.
+        '''
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalSet.symmetric_difference')
+        if self.empty():
+            return other
+        if other.empty():
+            return self
+        cdef ObjectIntervalSetBuilder builder = ObjectIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        self.symmetric_difference_into(other, builder)
+        return builder.build()
+    
+    cdef int symmetric_difference_into(ObjectIntervalSet self, ObjectIntervalSet other, 
+                                       ObjectIntervalSetBuilder builder) except -1:
+        '''
+        Append the symmetric difference of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, upper_cmp
+        cdef object lower1, upper1, lower2, upper2
+        cdef unsigned char lower_flags1, upper_flags1, lower_flags2, upper_flags2
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        lower1 = self.lower_bounds[0]
+        lower_flags1 = self.flags[0] & LOWER_FLAGS
+        lower2 = other.lower_bounds[0]
+        lower_flags2 = other.flags[0] & LOWER_FLAGS
+        while i < m and j < n:
+            upper1 = self.upper_bounds[i]
+            upper_flags1 = self.flags[i] & UPPER_FLAGS
+            upper2 = other.upper_bounds[j]
+            upper_flags2 = other.flags[j] & UPPER_FLAGS
+            cmp = ObjectInterval_overlap_cmp(lower1, upper1, lower_flags1 | upper_flags1, 
+                                              lower2, upper2, lower_flags2 | upper_flags2)
+            if cmp == -1:
+                builder.merge(lower1, upper1, lower_flags1 | upper_flags1)
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+                continue
+            elif cmp == 1:
+                builder.merge(lower2, upper2, lower_flags2 | upper_flags2)
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+                continue
+            
+            # Keep whatever precedes the overlap
+            cmp = ObjectInterval_lower_cmp(lower1, lower_flags1, lower2, lower_flags2)
+            if cmp < 0:
+                builder.merge(lower1, lower2, lower_flags1 | UPPER_BOUNDED | 
+                              (0 if lower_flags2 & LOWER_CLOSED else UPPER_CLOSED))
+            elif cmp > 0:
+                builder.merge(lower2, lower1, lower_flags2 | UPPER_BOUNDED | 
+                              (0 if lower_flags1 & LOWER_CLOSED else UPPER_CLOSED))
+            
+            # Whatever follows the overlap remains to be compared with later intervals
+            upper_cmp = ObjectInterval_upper_cmp(upper1, upper_flags1, upper2, upper_flags2)
+            if upper_cmp < 0:
+                lower2 = upper1
+                lower_flags2 = LOWER_BOUNDED | (0 if upper_flags1 & UPPER_CLOSED else LOWER_CLOSED)
+            elif upper_cmp > 0:
+                lower1 = upper2
+                lower_flags1 = LOWER_BOUNDED | (0 if upper_flags2 & UPPER_CLOSED else LOWER_CLOSED)
+            if upper_cmp <= 0:
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+            if upper_cmp >= 0:
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+        while i < m:
+            builder.merge(lower1, self.upper_bounds[i], lower_flags1 | (self.flags[i] & UPPER_FLAGS))
+            i += 1
+            if i < m:
+                lower1 = self.lower_bounds[i]
+                lower_flags1 = self.flags[i] & LOWER_FLAGS
+        while j < n:
+            builder.merge(lower2, other.upper_bounds[j], lower_flags2 | (other.flags[j] & UPPER_FLAGS))
+            j += 1
+            if j < n:
+                lower2 = other.lower_bounds[j]
+                lower_flags2 = other.flags[j] & LOWER_FLAGS
+        return 0
+    
+    cpdef ObjectIntervalSet minus(ObjectIntervalSet self, ObjectIntervalSet other):
+        '''
+        Subtract other from self in a single sweep over both, cutting each interval of self 
+        at the intervals of other that overlap it.
+        '''
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalSet.minus')
+        if self.empty() or other.empty():
+            return self
+        cdef ObjectIntervalSetBuilder builder = ObjectIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        self.minus_into(other, builder)
+        return builder.build()
+    
+    cdef int minus_into(ObjectIntervalSet self, ObjectIntervalSet other, 
+                        ObjectIntervalSetBuilder builder) except -1:
+        '''
+        Append self minus other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp
+        cdef object lower, upper
+        cdef unsigned char lower_flags, upper_flags, piece_flags
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        # The part of the interval i of self that remains to be cut runs from lower to upper
+        lower = self.lower_bounds[0]
+        lower_flags = self.flags[0] & LOWER_FLAGS
+        while i < m:
+            upper = self.upper_bounds[i]
+            upper_flags = self.flags[i] & UPPER_FLAGS
+            cmp = -1
+            while j < n:
+                cmp = ObjectInterval_overlap_cmp(lower, upper, lower_flags | upper_flags, 
+                                                  other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                if cmp != 1:
+                    break
+                j += 1
+            if j == n or cmp == -1:
+                # Nothing left in other overlaps the remaining part
+                if not ObjectInterval_empty(lower, upper, lower_flags | upper_flags):
+                    builder.append(lower, upper, lower_flags | upper_flags)
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+                continue
+            if ObjectInterval_lower_cmp(lower, lower_flags, other.lower_bounds[j], other.flags[j]) < 0:
+                piece_flags = (lower_flags | UPPER_BOUNDED | 
+                               (0 if other.flags[j] & LOWER_CLOSED else UPPER_CLOSED))
+                if not ObjectInterval_empty(lower, other.lower_bounds[j], piece_flags):
+                    builder.append(lower, other.lower_bounds[j], piece_flags)
+            if ObjectInterval_upper_cmp(upper, upper_flags, other.upper_bounds[j], other.flags[j]) > 0:
+                lower = other.upper_bounds[j]
+                lower_flags = LOWER_BOUNDED | (0 if other.flags[j] & UPPER_CLOSED else LOWER_CLOSED)
+                j += 1
+            else:
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+        return 0
+cdef inline int ObjectIntervalSet_cursor_cmp(list sets, Py_ssize_t *positions, Py_ssize_t a, 
+                                              Py_ssize_t b, bint by_upper) except? -2:
+    cdef ObjectIntervalSet first = sets[a]
+    cdef ObjectIntervalSet second = sets[b]
+    if by_upper:
+        return ObjectInterval_upper_cmp(first.upper_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.upper_bounds[positions[b]], second.flags[positions[b]])
+    else:
+        return ObjectInterval_lower_cmp(first.lower_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.lower_bounds[positions[b]], second.flags[positions[b]])
+
+cdef int ObjectIntervalSet_sift_down(list sets, Py_ssize_t *positions, Py_ssize_t *heap, 
+                                     Py_ssize_t size, Py_ssize_t index, bint by_upper) except -1:
+    '''
+    Restore the heap property below index in a min-heap of indices into sets, ordered by the 
+    lower (or upper) bound of the interval at which each set's cursor in positions points.
+    '''
+    cdef Py_ssize_t child, top
+    while True:
+        child = 2 * index + 1
+        if child >= size:
+            return 0
+        if (child + 1 < size and 
+            ObjectIntervalSet_cursor_cmp(sets, positions, heap[child + 1], heap[child], by_upper) < 0):
+            child += 1
+        if ObjectIntervalSet_cursor_cmp(sets, positions, heap[child], heap[index], by_upper) >= 0:
+            return 0
+        top = heap[index]
+        heap[index] = heap[child]
+        heap[child] = top
+        index = child
+
+cpdef ObjectIntervalSet ObjectIntervalSet_union_all(list sets):
+    '''
+    Return the union of all the given sets, merging them all at once with a heap ordered by 
+    the lower bound of each set's next interval.
+    '''
+    cdef OperationTimer timer = OperationTimer('ObjectIntervalSet_union_all')
+    cdef ObjectIntervalSet interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    sets = [interval_set for interval_set in sets if not interval_set.empty()]
+    k = len(sets)
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        total += interval_set.n_intervals
+    cdef ObjectIntervalSetBuilder builder = ObjectIntervalSetBuilder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            ObjectIntervalSet_sift_down(sets, positions, heap, size, i, False)
+        while size > 0:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(interval_set.lower_bounds[positions[i]], interval_set.upper_bounds[positions[i]], 
+                          interval_set.flags[positions[i]])
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                size -= 1
+                heap[0] = heap[size]
+            ObjectIntervalSet_sift_down(sets, positions, heap, size, 0, False)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cpdef ObjectIntervalSet ObjectIntervalSet_intersection_all(list sets):
+    '''
+    Return the intersection of all the given sets in a single sweep over all of them.  The 
+    intersection of the current intervals of the sets runs from the greatest of their lower 
+    bounds to the least of their upper bounds, which is found with a heap.  The set whose 
+    current interval ends first is then advanced.
+    '''
+    cdef OperationTimer timer = OperationTimer('ObjectIntervalSet_intersection_all')
+    cdef ObjectIntervalSet interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    cdef object lower
+    cdef unsigned char lower_flags
+    k = len(sets)
+    if k == 0:
+        return ObjectIntervalSet(()).complement()
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        if interval_set.empty():
+            return interval_set
+        total += interval_set.n_intervals
+    interval_set = sets[0]
+    lower = interval_set.lower_bounds[0]
+    lower_flags = interval_set.flags[0] & LOWER_FLAGS
+    cdef ObjectIntervalSetBuilder builder = ObjectIntervalSetBuilder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+            interval_set = sets[i]
+            if ObjectInterval_lower_cmp(interval_set.lower_bounds[0], interval_set.flags[0], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[0]
+                lower_flags = interval_set.flags[0] & LOWER_FLAGS
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            ObjectIntervalSet_sift_down(sets, positions, heap, size, i, True)
+        while True:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(lower, interval_set.upper_bounds[positions[i]], 
+                          lower_flags | (interval_set.flags[positions[i]] & UPPER_FLAGS))
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                break
+            if ObjectInterval_lower_cmp(interval_set.lower_bounds[positions[i]], interval_set.flags[positions[i]], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[positions[i]]
+                lower_flags = interval_set.flags[positions[i]] & LOWER_FLAGS
+            ObjectIntervalSet_sift_down(sets, positions, heap, size, 0, True)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cdef class MutableObjectIntervalSet:
+    '''
+    A set of disjoint ObjectIntervals that can be changed in place.  The intervals are kept 
+    sorted in a list of blocks of bounded size, so that adding or discarding an interval 
+    takes O(log(n)) comparisons and moves O(block_size) intervals, plus the cost of removing 
+    any intervals it absorbs.  Queries other than contains are answered by an immutable 
+    snapshot, which is cached until the next change.
+    '''
+    def __init__(MutableObjectIntervalSet self, tuple intervals=()):
+        self.reset(ObjectIntervalSet_from_intervals(intervals))
+    
+    cdef int reset(MutableObjectIntervalSet self, ObjectIntervalSet interval_set) except -1:
+        '''
+        Replace the contents of self with those of interval_set.
+        '''
+        cdef Py_ssize_t i, start
+        cdef ObjectIntervalSetBuilder block
+        self.blocks = []
+        for start in range(0, max(interval_set.n_intervals, 1), block_size):
+            block = ObjectIntervalSetBuilder(block_size)
+            for i in range(start, min(start + block_size, interval_set.n_intervals)):
+                block.append(interval_set.lower_bounds[i], interval_set.upper_bounds[i], 
+                             interval_set.flags[i])
+            self.blocks.append(block)
+        self.n_intervals = interval_set.n_intervals
+        self.frozen = interval_set
+        return 0
+    
+    cpdef ObjectIntervalSet freeze(MutableObjectIntervalSet self):
+        '''
+        Return an immutable ObjectIntervalSet with the same intervals as self.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableObjectIntervalSet.freeze')
+        cdef ObjectIntervalSetBuilder block, builder
+        cdef Py_ssize_t i
+        if self.frozen is None:
+            builder = ObjectIntervalSetBuilder(self.n_intervals)
+            for block in self.blocks:
+                for i in range(block.size):
+                    builder.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            self.frozen = builder.build()
+        return self.frozen
+    
+    cdef int search(MutableObjectIntervalSet self, object lower, object upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1:
+        '''
+        Find the first interval that does not lie entirely below the query interval, or, if 
+        after is true, the first that lies entirely above it, counting intervals that only 
+        touch it as overlapping if touching is true.  Store its block and position in the 
+        block, which are the last block and its size if there is no such interval.
+        '''
+        cdef ObjectIntervalSetBuilder block
+        cdef Py_ssize_t low = 0, high = len(self.blocks) - 1, i
+        while low < high:
+            i = (low + high) / 2
+            block = self.blocks[i]
+            if MutableObjectIntervalSet_passed(block, block.size - 1, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        block = self.blocks[low]
+        block_index[0] = low
+        low = 0
+        high = block.size
+        while low < high:
+            i = (low + high) / 2
+            if MutableObjectIntervalSet_passed(block, i, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        position[0] = low
+        return 0
+    
+    cdef int replace(MutableObjectIntervalSet self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, ObjectIntervalSetBuilder replacement) except -1:
+        '''
+        Replace the intervals from position first in block first_block up to, but not including, 
+        position last in block last_block with the intervals in replacement.
+        '''
+        cdef ObjectIntervalSetBuilder block = self.blocks[first_block]
+        cdef ObjectIntervalSetBuilder other
+        cdef Py_ssize_t i, j, removed = 0
+        if first_block == last_block:
+            removed = last - first
+            block.remove(first, last)
+        else:
+            removed = block.size - first
+            block.remove(first, block.size)
+            for i in range(first_block + 1, last_block):
+                removed += (<ObjectIntervalSetBuilder> self.blocks[i]).size
+            other = self.blocks[last_block]
+            removed += last
+            other.remove(0, last)
+            del self.blocks[first_block + 1:last_block]
+        for i in range(replacement.size):
+            block.insert(first + i, replacement.lower_bounds[i], replacement.upper_bounds[i], 
+                         replacement.flags[i])
+        self.n_intervals += replacement.size - removed
+        self.frozen = None
+        # Keep the sizes of the changed blocks within bounds
+        if block.size > 2 * block_size:
+            other = ObjectIntervalSetBuilder(block_size)
+            for i in range(block.size / 2, block.size):
+                other.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            block.remove(block.size / 2, block.size)
+            self.blocks.insert(first_block + 1, other)
+        for i in (first_block + 1, first_block, first_block - 1):
+            if i >= 0 and i + 1 < len(self.blocks):
+                block = self.blocks[i]
+                other = self.blocks[i + 1]
+                if ((block.size < block_size / 4 or other.size < block_size / 4) and 
+                    block.size + other.size <= 2 * block_size):
+                    for j in range(other.size):
+                        block.append(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                    del self.blocks[i + 1]
+        return 0
+    
+    cpdef add(MutableObjectIntervalSet self, ObjectInterval interval):
+        '''
+        Add the elements of interval to self, fusing it with any intervals it overlaps or 
+        touches.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableObjectIntervalSet.add')
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef ObjectIntervalSetBuilder block
+        cdef ObjectIntervalSetBuilder replacement = ObjectIntervalSetBuilder(1)
+        cdef object lower = interval.lower_bound
+        cdef object upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        if ObjectInterval_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, True, &first_block, &first)
+        self.search(lower, upper, flags, True, True, &last_block, &last)
+        replacement.append(lower, upper, flags)
+        if first_block != last_block or first != last:
+            # Fuse with the first and last of the intervals being replaced
+            block = self.blocks[first_block]
+            replacement.merge(block.lower_bounds[first], block.upper_bounds[first], block.flags[first])
+            block = self.blocks[last_block if last > 0 else last_block - 1]
+            i = (last if last > 0 else block.size) - 1
+            replacement.merge(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef discard(MutableObjectIntervalSet self, ObjectInterval interval):
+        '''
+        Remove the elements of interval from self, splitting any interval that extends past it.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableObjectIntervalSet.discard')
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef ObjectIntervalSetBuilder block
+        cdef ObjectIntervalSetBuilder replacement = ObjectIntervalSetBuilder(2)
+        cdef object lower = interval.lower_bound
+        cdef object upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        cdef unsigned char piece_flags
+        if ObjectInterval_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, False, &first_block, &first)
+        self.search(lower, upper, flags, True, False, &last_block, &last)
+        if first_block == last_block and first == last:
+            return
+        block = self.blocks[first_block]
+        if flags & LOWER_BOUNDED:
+            # The part of the first overlapping interval below interval
+            piece_flags = ((block.flags[first] & LOWER_FLAGS) | UPPER_BOUNDED | 
+                           (0 if flags & LOWER_CLOSED else UPPER_CLOSED))
+            if not ObjectInterval_empty(block.lower_bounds[first], lower, piece_flags):
+                replacement.append(block.lower_bounds[first], lower, piece_flags)
+        block = self.blocks[last_block if last > 0 else last_block - 1]
+        i = (last if last > 0 else block.size) - 1
+        if flags & UPPER_BOUNDED:
+            # The part of the last overlapping interval above interval
+            piece_flags = ((block.flags[i] & UPPER_FLAGS) | LOWER_BOUNDED | 
+                           (0 if flags & UPPER_CLOSED else LOWER_CLOSED))
+            if not ObjectInterval_empty(upper, block.upper_bounds[i], piece_flags):
+                replacement.append(upper, block.upper_bounds[i], piece_flags)
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef bool contains(MutableObjectIntervalSet self, object item):
+        cdef OperationTimer timer = OperationTimer('MutableObjectIntervalSet.contains')
+        cdef object value = item
+        cdef Py_ssize_t block_index, position
+        cdef ObjectIntervalSetBuilder block
+        self.search(value, value, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                    False, False, &block_index, &position)
+        block = self.blocks[block_index]
+        return position < block.size and ObjectInterval_containment_cmp(block.lower_bounds[position], 
+                                                                         block.upper_bounds[position], 
+                                                                         block.flags[position], value) == 0
+    
+    def __contains__(MutableObjectIntervalSet self, item):
+        return self.contains(item)
+    
+    def __ior__(MutableObjectIntervalSet self, other):
+        cdef ObjectInterval interval
+        for interval in other:
+            self.add(interval)
+        return self
+    
+    def __isub__(MutableObjectIntervalSet self, other):
+        cdef ObjectInterval interval
+        for interval in other:
+            self.discard(interval)
+        return self
+    
+    def __iand__(MutableObjectIntervalSet self, other):
+        cdef ObjectIntervalSet interval_set
+        if isinstance(other, MutableObjectIntervalSet):
+            interval_set = (<MutableObjectIntervalSet> other).freeze()
+        elif isinstance(other, ObjectIntervalSet):
+            interval_set = other
+        else:
+            # Any other iterable of intervals, as for |= and -=
+            interval_set = ObjectIntervalSet_from_intervals(tuple(other))
+        # Discarding the complement would leave gaps holding no element of a discrete type 
+        # inside the remaining intervals, so the intersection is rebuilt as a whole
+        self.reset(self.freeze().intersection(interval_set))
+        return self
+    
+    def __richcmp__(MutableObjectIntervalSet self, other, int op):
+        if isinstance(other, MutableObjectIntervalSet):
+            other = (<MutableObjectIntervalSet> other).freeze()
+        return PyObject_RichCompare(self.freeze(), other, op)
+    
+    __hash__ = None
+    
+    def __reduce__(MutableObjectIntervalSet self):
+        return (self.__class__, (self.intervals,))
+    
+    def __iter__(MutableObjectIntervalSet self):
+        return iter(self.freeze())
+    
+    def __str__(MutableObjectIntervalSet self):
+        return str(self.freeze())
+    
+    def __repr__(MutableObjectIntervalSet self):
+        return str(self)
+    
+    def __nonzero__(MutableObjectIntervalSet self):
+        return self.n_intervals > 0
+    
+    @property
+    def intervals(MutableObjectIntervalSet self):
+        return self.freeze().intervals
+    
+    def empty(MutableObjectIntervalSet self):
+        return self.n_intervals == 0
+    
+    def lower_bounded(MutableObjectIntervalSet self):
+        return self.freeze().lower_bounded()
+    
+    def upper_bounded(MutableObjectIntervalSet self):
+        return self.freeze().upper_bounded()
+    
+    def lower_bound(MutableObjectIntervalSet self):
+        return self.freeze().lower_bound()
+    
+    def upper_bound(MutableObjectIntervalSet self):
+        return self.freeze().upper_bound()
+    
+    def contains_many(MutableObjectIntervalSet self, points):
+        return self.freeze().contains_many(points)
+    
+    def locate(MutableObjectIntervalSet self, points):
+        return self.freeze().locate(points)
+    
+    def subset(MutableObjectIntervalSet self, other):
+        if isinstance(other, MutableObjectIntervalSet):
+            other = (<MutableObjectIntervalSet> other).freeze()
+        return self.freeze().subset(other)
+
+cdef inline bint MutableObjectIntervalSet_passed(ObjectIntervalSetBuilder block, Py_ssize_t i, 
+                                                  object lower, object upper, unsigned char flags, 
+                                                  bint after, bint touching):
+    '''
+    Return whether interval i of block is not entirely below the query interval or, if after 
+    is true, whether it is entirely above it.  If touching is true, intervals that touch 
+    the query interval without overlapping it count as overlapping it.
+    '''
+    cdef int cmp = ObjectInterval_overlap_cmp(block.lower_bounds[i], block.upper_bounds[i], block.flags[i], 
+                                               lower, upper, flags)
+    if after:
+        return cmp == 1 and not (touching and block.lower_bounds[i] == upper and (flags & UPPER_BOUNDED) and 
+                                 (block.flags[i] & LOWER_BOUNDED) and 
+                                 ((block.flags[i] & LOWER_CLOSED) or (flags & UPPER_CLOSED)))
+    else:
+        return cmp != -1 or (touching and block.upper_bounds[i] == lower and (flags & LOWER_BOUNDED) and 
+                             (block.flags[i] & UPPER_BOUNDED) and 
+                             ((block.flags[i] & UPPER_CLOSED) or (flags & LOWER_CLOSED)))
+
+cdef class ObjectIntervalIndex:
+    '''
+    A static collection of ObjectIntervals, which may overlap and are identified by their 
+    position in the sequence the index was built from.  Queries return arrays of these 
+    positions in increasing order.  Intervals are sorted by lower bound, and an implicit 
+    binary tree over the sorted order records the interval with the greatest upper bound 
+    in each subtree, so the k intervals overlapping a query are found in O((k + 1) log(n)) 
+    time.
+    '''
+    def __init__(ObjectIntervalIndex self, tuple intervals):
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalIndex.__init__')
+        cdef ObjectInterval interval
+        cdef ObjectIntervalSetBuilder raw = ObjectIntervalSetBuilder(len(intervals))
+        for interval in intervals:
+            raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        self.index(raw)
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True):
+        '''
+        Construct an ObjectIntervalIndex from arrays of bounds and flags, which are 
+        interpreted as in ObjectIntervalSet.from_arrays.
+        '''
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalIndex.from_arrays')
+        cdef ObjectIntervalIndex result = ObjectIntervalIndex.__new__(ObjectIntervalIndex)
+        result.index(ObjectIntervalSet_raw_from_arrays(lower, upper, lower_closed, upper_closed, 
+                                                        lower_bounded, upper_bounded))
+        return result
+    
+    cdef int index(ObjectIntervalIndex self, ObjectIntervalSetBuilder raw) except -1:
+        '''
+        Sort the intervals accumulated in raw and build the tree over them.
+        '''
+        cdef Py_ssize_t i, k, n = raw.size
+        cdef Py_ssize_t left, right
+        cdef ObjectIntervalSetBuilder builder = ObjectIntervalSetBuilder(n)
+        self.order_array = clone(index_template, n, False)
+        self.order = index_data(self.order_array)
+        cdef list order = list(range(n))
+        # Unbounded lower bounds sort first, and closed lower bounds before open ones at the same value
+        order.sort(key=lambda i: (1, raw.lower_bounds[i], not (raw.flags[i] & LOWER_CLOSED)) 
+                                 if raw.flags[i] & LOWER_BOUNDED else (0,))
+        for i in range(n):
+            k = order[i]
+            builder.append(raw.lower_bounds[k], raw.upper_bounds[k], raw.flags[k])
+            self.order[i] = k
+        # The sorted intervals are kept in the storage of an ObjectIntervalSet, although unlike 
+        # those of a set they may be empty or overlap
+        self.sorted_intervals = builder.build()
+        self.n_intervals = n
+        self.leaves = 1
+        while self.leaves < n:
+            self.leaves *= 2
+        self.tree_array = clone(index_template, 2 * self.leaves, False)
+        self.tree = index_data(self.tree_array)
+        # Empty intervals are left out of the tree, so they are never found
+        for i in range(self.leaves):
+            if i < n and not ObjectInterval_empty(self.sorted_intervals.lower_bounds[i], 
+                                                   self.sorted_intervals.upper_bounds[i], 
+                                                   self.sorted_intervals.flags[i]):
+                self.tree[self.leaves + i] = i
+            else:
+                self.tree[self.leaves + i] = -1
+        for i in range(self.leaves - 1, 0, -1):
+            left = self.tree[2 * i]
+            right = self.tree[2 * i + 1]
+            if left < 0 or (right >= 0 and 
+                            ObjectInterval_upper_cmp(self.sorted_intervals.upper_bounds[right], 
+                                                      self.sorted_intervals.flags[right], 
+                                                      self.sorted_intervals.upper_bounds[left], 
+                                                      self.sorted_intervals.flags[left]) > 0):
+                self.tree[i] = right
+            else:
+                self.tree[i] = left
+        return 0
+    
+    def __len__(ObjectIntervalIndex self):
+        return self.n_intervals
+    
+    @property
+    def intervals(ObjectIntervalIndex self):
+        '''
+        The indexed intervals, in the order the index was built from.
+        '''
+        cdef Py_ssize_t i
+        cdef list result
+        if self.cached_intervals is None:
+            result = [None] * self.n_intervals
+            for i, interval in enumerate(self.sorted_intervals.intervals):
+                result[self.order[i]] = interval
+            self.cached_intervals = tuple(result)
+        return self.cached_intervals
+    
+    def __reduce__(ObjectIntervalIndex self):
+        return (self.__class__, (self.intervals,))
+    
+    def __str__(ObjectIntervalIndex self):
+        return 'ObjectIntervalIndex(%s)' % ', '.join(map(str, self.intervals))
+    
+    def __repr__(ObjectIntervalIndex self):
+        return str(self)
+    
+    cdef Py_ssize_t end(ObjectIntervalIndex self, object upper, unsigned char flags):
+        '''
+        Use binary search to find the number of intervals, in sorted order, that do not lie 
+        entirely above the upper bound of the query.
+        '''
+        cdef Py_ssize_t i, low = 0, high = self.n_intervals
+        cdef ObjectIntervalSet intervals = self.sorted_intervals
+        while low < high:
+            i = (low + high) / 2
+            # Masking the flags restricts overlap_cmp to the lower bound of the interval 
+            # and the upper bound of the query
+            if ObjectInterval_overlap_cmp(intervals.lower_bounds[i], intervals.upper_bounds[i], 
+                                           intervals.flags[i] & LOWER_FLAGS, upper, upper, 
+                                           flags & UPPER_FLAGS) == 1:
+                high = i
+            else:
+                low = i + 1
+        return low
+    
+    cdef int collect(ObjectIntervalIndex self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, object lower, object upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals under node, among the first end in 
+        sorted order, that do not lie entirely below the lower bound of the query and share 
+        an element with it.  Subtrees whose greatest upper bound lies below the query are 
+        skipped.
+        '''
+        cdef Py_ssize_t k, middle
+        cdef ObjectIntervalSet intervals = self.sorted_intervals
+        if node_start >= end:
+            return 0
+        k = self.tree[node]
+        if k < 0 or ObjectInterval_overlap_cmp(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                intervals.flags[k] & UPPER_FLAGS, lower, lower, 
+                                                flags & LOWER_FLAGS) == -1:
+            return 0
+        if node_stop - node_start == 1:
+            # Bounds that interleave may still leave no element in common
+            if not ObjectInterval_intersection_empty(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                      intervals.flags[k], lower, upper, flags):
+                append_index(result, size, self.order[k])
+            return 0
+        middle = (node_start + node_stop) / 2
+        self.collect(2 * node, node_start, middle, end, lower, upper, flags, result, size)
+        self.collect(2 * node + 1, middle, node_stop, end, lower, upper, flags, result, size)
+        return 0
+    
+    cdef int query(ObjectIntervalIndex self, object lower, object upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals that overlap the query interval, in 
+        increasing order.
+        '''
+        cdef Py_ssize_t start = size[0]
+        if ObjectInterval_empty(lower, upper, flags):
+            return 0
+        self.collect(1, 0, self.leaves, self.end(upper, flags), lower, upper, flags, result, size)
+        qsort(index_data(result) + start, size[0] - start, sizeof(Py_ssize_t), index_cmp)
+        return 0
+    
+    cpdef array stab(ObjectIntervalIndex self, object point):
+        '''
+        Return the positions of the intervals containing point.
+        '''
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalIndex.stab')
+        cdef object item = point
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(item, item, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, result, &size)
+        resize(result, size)
+        return result
+    
+    cpdef array overlap(ObjectIntervalIndex self, ObjectInterval interval):
+        '''
+        Return the positions of the intervals that overlap interval.
+        '''
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalIndex.overlap')
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+        resize(result, size)
+        return result
+    
+    def stab_many(ObjectIntervalIndex self, points):
+        '''
+        Stab the index with each of points.  Return a pair of arrays of equal length, the 
+        first holding positions in points and the second the positions of the intervals 
+        containing them, ordered by position in points and then by interval position.
+        '''
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalIndex.stab_many')
+        cdef tuple items = tuple(points)
+        cdef Py_ssize_t n = len(items)
+        cdef Py_ssize_t i, start, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for i in range(n):
+            start = size
+            self.query(items[i], items[i], LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                       result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+    
+    def overlap_many(ObjectIntervalIndex self, intervals):
+        '''
+        Query the index with each of intervals, which may be any iterable of ObjectIntervals 
+        such as an ObjectIntervalSet.  Return a pair of arrays as in stab_many.
+        '''
+        cdef OperationTimer timer = OperationTimer('ObjectIntervalIndex.overlap_many')
+        cdef ObjectInterval interval
+        cdef Py_ssize_t i = 0, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for interval in intervals:
+            self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+            i += 1
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+
+
+cdef int ObjectInterval_sweep_step(list lower1, list upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                     Py_ssize_t i, list lower2, list upper2, unsigned char *flags2, 
+                                     Py_ssize_t *order2, Py_ssize_t *active2, Py_ssize_t *n_active2, bint swapped, 
+                                     IndexPairs *pairs) except -1:
+    '''
+    Pair interval i of the first side with each active interval of the second side that 
+    does not lie entirely below it, and drop those that do from the active intervals.  The 
+    active intervals all have lower bounds not greater than that of interval i, so they 
+    overlap it unless they lie below it, and then they lie below all later intervals too.
+    '''
+    cdef Py_ssize_t k, j, kept = 0
+    for k in range(n_active2[0]):
+        j = active2[k]
+        # Masking the flags restricts overlap_cmp to the upper bound of the active interval and 
+        # the lower bound of interval i
+        if ObjectInterval_overlap_cmp(lower2[j], upper2[j], flags2[j] & UPPER_FLAGS, 
+                                       lower1[i], upper1[i], flags1[i] & LOWER_FLAGS) != -1:
+            # Bounds that interleave may still leave no element in common
+            if not ObjectInterval_intersection_empty(lower1[i], upper1[i], flags1[i], 
+                                                      lower2[j], upper2[j], flags2[j]):
+                if swapped:
+                    append_pair(pairs, order2[j], order1[i])
+                else:
+                    append_pair(pairs, order1[i], order2[j])
+            active2[kept] = j
+            kept += 1
+    n_active2[0] = kept
+    return 0
+
+cdef int ObjectInterval_sweep(list lower1, list upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                Py_ssize_t n1, list lower2, list upper2, unsigned char *flags2, 
+                                Py_ssize_t *order2, Py_ssize_t n2, Py_ssize_t *active1, Py_ssize_t *active2, 
+                                IndexPairs *pairs) except -1:
+    '''
+    Merge two sequences of intervals sorted by lower bound, keeping for each side the 
+    intervals that may still overlap later intervals of the other side.
+    '''
+    cdef Py_ssize_t i = 0, j = 0, n_active1 = 0, n_active2 = 0
+    while i < n1 or j < n2:
+        if j == n2 or (i < n1 and ObjectInterval_lower_cmp(lower1[i], flags1[i], lower2[j], flags2[j]) <= 0):
+            if not ObjectInterval_empty(lower1[i], upper1[i], flags1[i]):
+                ObjectInterval_sweep_step(lower1, upper1, flags1, order1, i, lower2, upper2, flags2, 
+                                           order2, active2, &n_active2, False, pairs)
+                active1[n_active1] = i
+                n_active1 += 1
+            i += 1
+        else:
+            if not ObjectInterval_empty(lower2[j], upper2[j], flags2[j]):
+                ObjectInterval_sweep_step(lower2, upper2, flags2, order2, j, lower1, upper1, flags1, 
+                                           order1, active1, &n_active1, True, pairs)
+                active2[n_active2] = j
+                n_active2 += 1
+            j += 1
+    return 0
+
+cpdef tuple ObjectInterval_overlap_join(ObjectIntervalIndex left, ObjectIntervalIndex right):
+    '''
+    Return a pair of arrays holding the positions in left and in right of every pair of 
+    overlapping intervals, in no particular order.
+    '''
+    cdef OperationTimer timer = OperationTimer('ObjectInterval_overlap_join')
+    cdef ObjectIntervalSet left_intervals = left.sorted_intervals
+    cdef ObjectIntervalSet right_intervals = right.sorted_intervals
+    cdef IndexPairs pairs
+    pairs.first = NULL
+    pairs.second = NULL
+    pairs.size = 0
+    pairs.capacity = 0
+    cdef Py_ssize_t *active = <Py_ssize_t *> PyMem_Malloc((left.n_intervals + right.n_intervals) * sizeof(Py_ssize_t))
+    if active == NULL and left.n_intervals + right.n_intervals > 0:
+        raise MemoryError()
+    try:
+        ObjectInterval_sweep(left_intervals.lower_bounds, left_intervals.upper_bounds, 
+                              left_intervals.flags, left.order, left.n_intervals, 
+                              right_intervals.lower_bounds, right_intervals.upper_bounds, 
+                              right_intervals.flags, right.order, right.n_intervals, 
+                              active, active + left.n_intervals, &pairs)
+        return index_pairs_to_arrays(&pairs)
+    finally:
+        PyMem_Free(active)
+        free(pairs.first)
+        free(pairs.second)
+
+
+# These operate on the raw bounds and packed flags of an interval.  The methods of 
+# DateInterval and the loops of DateIntervalSet are built on them.
+cdef inline bint DateInterval_adjacent(int32_t lower, int32_t upper) nogil:
+    return lower + 1 == upper
+
+cdef inline bint DateInterval_empty(int32_t lower, int32_t upper, unsigned char flags) nogil:
+    return (((flags & LOWER_BOUNDED) and (flags & UPPER_BOUNDED)) and 
+            ((((lower == upper) and 
+            (not ((flags & LOWER_CLOSED) and (flags & UPPER_CLOSED)))) or
+            lower > upper) or 
+             (lower < upper and 
+              (not (flags & (LOWER_CLOSED | UPPER_CLOSED))) and
+              DateInterval_adjacent(lower, upper))))
+
+cdef inline int DateInterval_containment_cmp(int32_t lower, int32_t upper, unsigned char flags, 
+                                                int32_t item) nogil:
+    global containment_cmp_count
+    containment_cmp_count += 1
+    if flags & LOWER_BOUNDED:
+        if item < lower:
+            return -1
+        elif item == lower:
+            if not (flags & LOWER_CLOSED):
+                return -1
+    if flags & UPPER_BOUNDED:
+        if item > upper:
+            return 1
+        elif item == upper:
+            if not (flags & UPPER_CLOSED):
+                return 1
+    return 0
+
+cdef inline int DateInterval_lower_cmp(int32_t lower1, unsigned char flags1, 
+                                          int32_t lower2, unsigned char flags2) nogil:
+    global lower_cmp_count
+    lower_cmp_count += 1
+    if not (flags1 & LOWER_BOUNDED):
+        if not (flags2 & LOWER_BOUNDED):
+            return 0
+        else:
+            return -1
+    elif not (flags2 & LOWER_BOUNDED):
+        return 1
+    if lower1 < lower2:
+        return -1
+    elif lower1 == lower2:
+        if (flags1 & LOWER_CLOSED) and not (flags2 & LOWER_CLOSED):
+            return -1
+        elif (flags2 & LOWER_CLOSED) and not (flags1 & LOWER_CLOSED):
+            return 1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int DateInterval_upper_cmp(int32_t upper1, unsigned char flags1, 
+                                          int32_t upper2, unsigned char flags2) nogil:
+    global upper_cmp_count
+    upper_cmp_count += 1
+    if not (flags1 & UPPER_BOUNDED):
+        if not (flags2 & UPPER_BOUNDED):
+            return 0
+        else:
+            return 1
+    elif not (flags2 & UPPER_BOUNDED):
+        return -1
+    if upper1 < upper2:
+        return -1
+    elif upper1 == upper2:
+        if (flags1 & UPPER_CLOSED) and not (flags2 & UPPER_CLOSED):
+            return 1
+        elif (flags2 & UPPER_CLOSED) and not (flags1 & UPPER_CLOSED):
+            return -1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int DateInterval_overlap_cmp(int32_t lower1, int32_t upper1, unsigned char flags1, 
+                                            int32_t lower2, int32_t upper2, unsigned char flags2) nogil:
+    global overlap_cmp_count
+    overlap_cmp_count += 1
+    if (flags1 & UPPER_BOUNDED) and (flags2 & LOWER_BOUNDED):
+        if upper1 < lower2:
+            return -1
+        elif upper1 == lower2:
+            if (flags1 & UPPER_CLOSED) and (flags2 & LOWER_CLOSED):
+                return 0
+            else:
+                return -1
+    if (flags1 & LOWER_BOUNDED) and (flags2 & UPPER_BOUNDED):
+        if lower1 > upper2:
+            return 1
+        elif lower1 == upper2:
+            if (flags1 & LOWER_CLOSED) and (flags2 & UPPER_CLOSED):
+                return 0
+            else:
+                return 1
+    return 0
+
+cdef inline bint DateInterval_fusible(int32_t lower1, int32_t upper1, unsigned char flags1, 
+                                         int32_t lower2, int32_t upper2, unsigned char flags2) nogil:
+    '''
+    Return whether the union of two nonempty intervals is an interval, because they overlap 
+    or touch.
+    '''
+    cdef int overlap_cmp = DateInterval_overlap_cmp(lower1, upper1, flags1, lower2, upper2, flags2)
+    return ((overlap_cmp == 0) or 
+            (overlap_cmp == -1 and upper1 == lower2 and 
+             ((flags1 & UPPER_CLOSED) or (flags2 & LOWER_CLOSED))) or
+            (overlap_cmp == 1 and upper2 == lower1 and 
+             ((flags2 & UPPER_CLOSED) or (flags1 & LOWER_CLOSED))))
+
+cdef inline bint DateInterval_intersection_empty(int32_t lower1, int32_t upper1, unsigned char flags1, 
+                                                    int32_t lower2, int32_t upper2, unsigned char flags2) nogil:
+    '''
+    Return whether two nonempty intervals that overlap according to overlap_cmp nonetheless 
+    have no element in common, which can only happen for types with adjacent elements.
+    '''
+    cdef int32_t lower, upper
+    cdef unsigned char flags
+    if DateInterval_lower_cmp(lower1, flags1, lower2, flags2) <= 0:
+        lower = lower2
+        flags = flags2 & LOWER_FLAGS
+    else:
+        lower = lower1
+        flags = flags1 & LOWER_FLAGS
+    if DateInterval_upper_cmp(upper1, flags1, upper2, flags2) <= 0:
+        upper = upper1
+        flags |= flags1 & UPPER_FLAGS
+    else:
+        upper = upper2
+        flags |= flags2 & UPPER_FLAGS
+    return DateInterval_empty(lower, upper, flags)
+
+cdef array DateInterval_bounds_template = array('i')
+
+cdef const int32_t[:] DateIntervalSet_stored_values(object values):
+    '''
+    View values as a buffer of int32_t, copying them only if they do not already 
+    expose one of the right type.
+    '''
+    cdef const int32_t[:] result
+    try:
+        result = values
+    except (TypeError, ValueError, BufferError):
+        result = array('i', values)
+    return result
+
+ctypedef struct DateIntervalRecord:
+    int32_t lower
+    int32_t upper
+    unsigned char flags
+    Py_ssize_t index
+
+cdef int DateInterval_record_cmp(const void *record1, const void *record2) nogil:
+    cdef DateIntervalRecord *first = <DateIntervalRecord *> record1
+    cdef DateIntervalRecord *second = <DateIntervalRecord *> record2
+    return DateInterval_lower_cmp(first.lower, first.flags, second.lower, second.flags)
+
+cdef inline void DateInterval_add_length(uint64_t *total, Py_ssize_t *carries, int32_t lower, 
+                                          int32_t upper, unsigned char flags) nogil:
+    '''
+    Add the number of elements of a bounded, nonempty interval to a count kept modulo 2**64, 
+    counting the times it wraps around in carries.  The number of elements less one always 
+    fits in a uint64_t, so it is added first and the one after.
+    '''
+    cdef uint64_t length = ((<uint64_t> upper) - (<uint64_t> lower) - 
+                            (0 if flags & LOWER_CLOSED else 1) - (0 if flags & UPPER_CLOSED else 1))
+    total[0] += length
+    if total[0] < length:
+        carries[0] += 1
+    total[0] += 1
+    if total[0] == 0:
+        carries[0] += 1
+
+cdef object DateInterval_count_to_py(uint64_t total, Py_ssize_t carries):
+    '''
+    Combine a count accumulated modulo 2**64 with the number of times it wrapped around.
+    '''
+    if carries:
+        return (<object> carries) * 18446744073709551616 + total
+    return total
+
+cdef class DateIntervalSetBuilder:
+    '''
+    Accumulates the bounds and flags of sorted intervals into the storage of a new 
+    DateIntervalSet.  The builder must not be used after build has been called.
+    '''
+    def __cinit__(DateIntervalSetBuilder self, Py_ssize_t capacity=0):
+        self.size = 0
+        self.capacity = capacity
+        self.flags_array = clone(flags_template, capacity, False)
+        self.flags = self.flags_array.data.as_uchars
+        self.lower_array = clone(DateInterval_bounds_template, capacity, False)
+        self.upper_array = clone(DateInterval_bounds_template, capacity, False)
+        self.lower_bounds = <int32_t *> self.lower_array.data.as_voidptr
+        self.upper_bounds = <int32_t *> self.upper_array.data.as_voidptr
+    
+    cdef int grow(DateIntervalSetBuilder self) except -1:
+        self.capacity = 2 * self.capacity + 8
+        resize(self.flags_array, self.capacity)
+        self.flags = self.flags_array.data.as_uchars
+        resize(self.lower_array, self.capacity)
+        resize(self.upper_array, self.capacity)
+        self.lower_bounds = <int32_t *> self.lower_array.data.as_voidptr
+        self.upper_bounds = <int32_t *> self.upper_array.data.as_voidptr
+        return 0
+    
+    cdef int append(DateIntervalSetBuilder self, int32_t lower, int32_t upper, 
+                    unsigned char flags) except -1 nogil:
+        '''
+        Add an interval after all intervals added so far, assuming the two neither overlap 
+        nor touch.
+        '''
+        if self.size == self.capacity:
+            with gil:
+                self.grow()
+        self.lower_bounds[self.size] = lower
+        self.upper_bounds[self.size] = upper
+        self.flags[self.size] = flags
+        self.size += 1
+        return 0
+    
+    cdef int merge(DateIntervalSetBuilder self, int32_t lower, int32_t upper, 
+                   unsigned char flags) except -1 nogil:
+        '''
+        Add an interval whose lower bound is not less than that of any interval added so far, 
+        fusing it with the last interval if the two overlap or touch.  Empty intervals are 
+        ignored.
+        '''
+        cdef Py_ssize_t last = self.size - 1
+        if DateInterval_empty(lower, upper, flags):
+            return 0
+        if last < 0:
+            return self.append(lower, upper, flags)
+        if DateInterval_fusible(self.lower_bounds[last], self.upper_bounds[last], self.flags[last], 
+                                   lower, upper, flags):
+            if DateInterval_lower_cmp(lower, flags, self.lower_bounds[last], self.flags[last]) < 0:
+                self.lower_bounds[last] = lower
+                self.flags[last] = (self.flags[last] & UPPER_FLAGS) | (flags & LOWER_FLAGS)
+            if DateInterval_upper_cmp(upper, flags, self.upper_bounds[last], self.flags[last]) > 0:
+                self.upper_bounds[last] = upper
+                self.flags[last] = (self.flags[last] & LOWER_FLAGS) | (flags & UPPER_FLAGS)
+            return 0
+        return self.append(lower, upper, flags)
+    
+    cdef int remove(DateIntervalSetBuilder self, Py_ssize_t start, Py_ssize_t stop) except -1:
+        '''
+        Remove the intervals at positions start up to, but not including, stop.
+        '''
+        cdef Py_ssize_t tail = self.size - stop
+        if stop <= start:
+            return 0
+        memmove(self.lower_bounds + start, self.lower_bounds + stop, tail * sizeof(int32_t))
+        memmove(self.upper_bounds + start, self.upper_bounds + stop, tail * sizeof(int32_t))
+        memmove(self.flags + start, self.flags + stop, tail)
+        self.size -= stop - start
+        return 0
+    
+    cdef int insert(DateIntervalSetBuilder self, Py_ssize_t position, int32_t lower, int32_t upper, 
+                    unsigned char flags) except -1:
+        '''
+        Add an interval at the given position, moving the intervals after it.
+        '''
+        if self.size == self.capacity:
+            self.grow()
+        memmove(self.lower_bounds + position + 1, self.lower_bounds + position, 
+                (self.size - position) * sizeof(int32_t))
+        memmove(self.upper_bounds + position + 1, self.upper_bounds + position, 
+                (self.size - position) * sizeof(int32_t))
+        self.lower_bounds[position] = lower
+        self.upper_bounds[position] = upper
+        memmove(self.flags + position + 1, self.flags + position, self.size - position)
+        self.flags[position] = flags
+        self.size += 1
+        return 0
+    
+    cdef DateIntervalSet build(DateIntervalSetBuilder self):
+        cdef DateIntervalSet result = DateIntervalSet.__new__(DateIntervalSet)
+        resize(self.flags_array, self.size)
+        result.flags = self.flags_array.data.as_uchars
+        resize(self.lower_array, self.size)
+        resize(self.upper_array, self.size)
+        result.lower_bounds = <int32_t *> self.lower_array.data.as_voidptr
+        result.upper_bounds = <int32_t *> self.upper_array.data.as_voidptr
+        result.storage = (self.lower_array, self.upper_array, self.flags_array)
+        result.n_intervals = self.size
+        return result
+
+cdef DateIntervalSet DateIntervalSet_normalize(DateIntervalSetBuilder raw):
+    '''
+    Build an DateIntervalSet from the intervals accumulated in raw, which may be empty, 
+    unsorted and overlapping.  Empty intervals are dropped, the rest are sorted by lower bound 
+    and any that overlap or touch are fused.
+    '''
+    cdef Py_ssize_t i, k, n = raw.size
+    cdef DateIntervalSetBuilder builder
+    cdef bint is_sorted = True
+    for i in range(1, n):
+        if DateInterval_lower_cmp(raw.lower_bounds[i-1], raw.flags[i-1], 
+                                     raw.lower_bounds[i], raw.flags[i]) > 0:
+            is_sorted = False
+            break
+    if is_sorted:
+        builder = DateIntervalSetBuilder(n)
+        for i in range(n):
+            builder.merge(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i])
+        return builder.build()
+    cdef DateIntervalRecord *records = <DateIntervalRecord *> PyMem_Malloc(n * sizeof(DateIntervalRecord))
+    if records == NULL and n > 0:
+        raise MemoryError()
+    try:
+        k = 0
+        for i in range(n):
+            if not DateInterval_empty(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i]):
+                records[k].lower = raw.lower_bounds[i]
+                records[k].upper = raw.upper_bounds[i]
+                records[k].flags = raw.flags[i]
+                k += 1
+        qsort(records, k, sizeof(DateIntervalRecord), DateInterval_record_cmp)
+        builder = DateIntervalSetBuilder(k)
+        for i in range(k):
+            builder.merge(records[i].lower, records[i].upper, records[i].flags)
+    finally:
+        PyMem_Free(records)
+    return builder.build()
+
+cdef class DateInterval(BaseInterval):
+    def __init__(BaseInterval self, object lower_bound, object upper_bound, bool lower_closed, 
+                 bool upper_closed, bool lower_bounded, bool upper_bounded):
+        self.flags = pack_flags(lower_closed, upper_closed, lower_bounded, upper_bounded)
+        if lower_bounded:
+            self.lower_bound = DateInterval_to_c(lower_bound)
+        if upper_bounded:
+            self.upper_bound = DateInterval_to_c(upper_bound)
+    
+    @property
+    def lower_bound(DateInterval self):
+        return DateInterval_to_py(self.lower_bound) if self.flags & LOWER_BOUNDED else None
+    
+    @property
+    def upper_bound(DateInterval self):
+        return DateInterval_to_py(self.upper_bound) if self.flags & UPPER_BOUNDED else None
+    
+    # For some types, there is a concept of adjacent elements.  For example, 
+    # there are no integers between 1 and 2 (although there are several real numbers).
+    # If there is such a concept, it's possible for an interval to be empty even when 
+    # the lower bound is strictly less than the upper bound, provided the bounds are strict 
+    # (not closed).  The adjacent method is used to help determine such cases.
+    cpdef bool adjacent(DateInterval self, object lower, object upper):
+        return DateInterval_adjacent(DateInterval_to_c(lower), DateInterval_to_c(upper))
+    
+    cpdef int containment_cmp(DateInterval self, object item):
+        return DateInterval_containment_cmp(self.lower_bound, self.upper_bound, self.flags, DateInterval_to_c(item))
+    
+    cpdef bool contains(DateInterval self, object item):
+        return self.containment_cmp(item) == 0
+    
+    cpdef bool subset(DateInterval self, DateInterval other):
+        '''
+        Return True if and only if self is a subset of other.
+        '''
+        return (DateInterval_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags) >= 0 and 
+                DateInterval_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags) <= 0)
+        
+    cpdef int overlap_cmp(DateInterval self, DateInterval other):
+        '''
+        Assume both are nonempty.  Return -1 if every element of self is less than every 
+        element of other.  Return 0 if self and other intersect.  Return 1 if every element of 
+        self is greater than every element of other.
+        '''
+        return DateInterval_overlap_cmp(self.lower_bound, self.upper_bound, self.flags, 
+                                           other.lower_bound, other.upper_bound, other.flags)
+    
+    cpdef tuple init_args(DateInterval self):
+        # Unbounded sides have no date value, so they are None as for the lower_bound and 
+        # upper_bound properties
+        return (DateInterval_to_py(self.lower_bound) if self.flags & LOWER_BOUNDED else None, 
+                DateInterval_to_py(self.upper_bound) if self.flags & UPPER_BOUNDED else None, 
+                (self.flags & LOWER_CLOSED) != 0, 
+                (self.flags & UPPER_CLOSED) != 0, (self.flags & LOWER_BOUNDED) != 0, 
+                (self.flags & UPPER_BOUNDED) != 0)
+
+    cpdef DateInterval intersection(DateInterval self, DateInterval other):
+        cdef DateInterval result = DateInterval.__new__(DateInterval)
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
+        else:
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
+        else:
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
+        return result
+    
+    cpdef DateInterval fusion(DateInterval self, DateInterval other):
+        '''
+        Assume union of intervals is a single interval.  Return their union.  Results not correct
+        if above assumption is violated.
+        '''
+        cdef DateInterval result = DateInterval.__new__(DateInterval)
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
+        else:
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
+        else:
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
+        return result
+    
+    cpdef bool empty(DateInterval self):
+        return DateInterval_empty(self.lower_bound, self.upper_bound, self.flags)
+    
+    cpdef bool richcmp(DateInterval self, DateInterval other, int op):
+        cdef int lower_cmp
+        cdef int upper_cmp
+        if op == 0 or op == 1:
+            lower_cmp = self.lower_cmp(other)
+            if lower_cmp == -1:
+                return True
+            elif lower_cmp == 1:
+                return False
+            else: # lower_cmp == 0
+                upper_cmp = self.upper_cmp(other)
+                if upper_cmp == -1:
+                    return True
+                elif upper_cmp == 1:
+                    return False
+                else: # upper_cmp == 0
+                    return op == 1
+        elif op == 2:
+            return (self.lower_cmp(other) == 0) and (self.upper_cmp(other) == 0)
+        elif op == 3:
+            return (self.lower_cmp(other) != 0) or (self.upper_cmp(other) != 0)
+        elif op == 4 or op == 5:
+            lower_cmp = self.lower_cmp(other)
+            if lower_cmp == -1:
+                return False
+            elif lower_cmp == 1:
+                return True
+            else: # lower_cmp == 0
+                upper_cmp = self.upper_cmp(other)
+                if upper_cmp == -1:
+                    return False
+                elif upper_cmp == 1:
+                    return True
+                else: # upper_cmp == 0
+                    return op == 5
+    
+    cpdef int lower_cmp(DateInterval self, DateInterval other):
+        return DateInterval_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags)
+    
+    cpdef int upper_cmp(DateInterval self, DateInterval other):
+        return DateInterval_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags)
+
+# This is because static cpdef methods are not supported.  Otherwise this
+# would be a static method of DateIntervalSet
+cpdef DateIntervalSet DateIntervalSet_from_intervals(tuple intervals):
+    '''
+    Construct an DateIntervalSet from intervals in any order, which may be empty or 
+    overlapping.
+    '''
+    cdef OperationTimer timer = OperationTimer('DateIntervalSet_from_intervals')
+    cdef DateInterval interval
+    cdef DateIntervalSetBuilder raw = DateIntervalSetBuilder(len(intervals))
+    for interval in intervals:
+        raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+    return DateIntervalSet_normalize(raw)
+
+cdef DateIntervalSetBuilder DateIntervalSet_raw_from_arrays(object lower, object upper, object lower_closed, 
+                                                                   object upper_closed, object lower_bounded, 
+                                                                   object upper_bounded, bint raw_bounds=False):
+    '''
+    Accumulate intervals given as arrays of bounds and flags, as described in 
+    DateIntervalSet.from_arrays, into a builder in the order given.
+    '''
+    cdef const int32_t[:] lower_values, upper_values
+    if raw_bounds:
+        lower_values = DateIntervalSet_stored_values(lower)
+        upper_values = DateIntervalSet_stored_values(upper)
+    else:
+        lower_values = DateIntervalSet_values(lower)
+        upper_values = DateIntervalSet_values(upper)
+    cdef Py_ssize_t i, n = lower_values.shape[0]
+    if upper_values.shape[0] != n:
+        raise ValueError('lower and upper must have the same length')
+    cdef array flags = clone(flags_template, n, True)
+    set_flags(flags.data.as_uchars, n, lower_closed, LOWER_CLOSED)
+    set_flags(flags.data.as_uchars, n, upper_closed, UPPER_CLOSED)
+    set_flags(flags.data.as_uchars, n, lower_bounded, LOWER_BOUNDED)
+    set_flags(flags.data.as_uchars, n, upper_bounded, UPPER_BOUNDED)
+    cdef DateIntervalSetBuilder raw = DateIntervalSetBuilder(n)
+    for i in range(n):
+        raw.append(lower_values[i] if flags.data.as_uchars[i] & LOWER_BOUNDED else 0, 
+                   upper_values[i] if flags.data.as_uchars[i] & UPPER_BOUNDED else 0, 
+                   flags.data.as_uchars[i])
+    return raw
+
+cpdef tuple DateInterval_preprocess_intervals(tuple intervals):
+    '''
+    Remove empty intervals, sort, and fuse any overlapping intervals.
+    '''
+    cdef OperationTimer timer = OperationTimer('DateInterval_preprocess_intervals')
+    return DateIntervalSet_from_intervals(intervals).intervals
+
+cdef class DateIntervalSetCoalescer:
+    '''
+    Iterate over the coalesced intervals of an iterable of DateIntervals or (lower, upper) 
+    pairs, sorted by lower bound.  Pairs describe closed intervals, and either bound may be 
+    unbounded.  Only one pending interval is held at a time, so the input is never 
+    materialized.  A ValueError is raised if the input is found to be out of order.
+    '''
+    def __init__(DateIntervalSetCoalescer self, intervals):
+        self.source = iter(intervals)
+        self.pending = False
+        self.started = False
+    
+    def __iter__(DateIntervalSetCoalescer self):
+        return self
+    
+    def __next__(DateIntervalSetCoalescer self):
+        cdef DateInterval result
+        if not self.next_raw():
+            raise StopIteration
+        result = DateInterval.__new__(DateInterval)
+        result.lower_bound = self.result_lower
+        result.upper_bound = self.result_upper
+        result.flags = self.result_flags
+        return result
+    
+    cdef int next_raw(DateIntervalSetCoalescer self) except -1:
+        '''
+        Store the next coalesced interval in the result fields and return 1, or return 0 if 
+        there are no more.
+        '''
+        cdef int32_t item_lower, item_upper
+        cdef unsigned char item_flags
+        cdef DateInterval interval
+        for item in self.source:
+            if isinstance(item, DateInterval):
+                interval = item
+                item_lower = interval.lower_bound
+                item_upper = interval.upper_bound
+                item_flags = interval.flags
+            else:
+                lower_value, upper_value = item
+                item_flags = LOWER_CLOSED | UPPER_CLOSED
+                if lower_value is unbounded:
+                    item_lower = 0
+                else:
+                    item_lower = DateInterval_to_c(lower_value)
+                    item_flags |= LOWER_BOUNDED
+                if upper_value is unbounded:
+                    item_upper = 0
+                else:
+                    item_upper = DateInterval_to_c(upper_value)
+                    item_flags |= UPPER_BOUNDED
+            if self.started and DateInterval_lower_cmp(item_lower, item_flags, 
+                                                          self.last_lower, self.last_flags) < 0:
+                raise ValueError('Intervals must be sorted by lower bound')
+            self.started = True
+            self.last_lower = item_lower
+            self.last_flags = item_flags
+            if DateInterval_empty(item_lower, item_upper, item_flags):
+                continue
+            if not self.pending:
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                self.pending = True
+            elif DateInterval_fusible(self.lower, self.upper, self.flags, item_lower, item_upper, item_flags):
+                if DateInterval_upper_cmp(item_upper, item_flags, self.upper, self.flags) > 0:
+                    self.upper = item_upper
+                    self.flags = (self.flags & LOWER_FLAGS) | (item_flags & UPPER_FLAGS)
+            else:
+                self.result_lower = self.lower
+                self.result_upper = self.upper
+                self.result_flags = self.flags
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                return 1
+        if self.pending:
+            self.result_lower = self.lower
+            self.result_upper = self.upper
+            self.result_flags = self.flags
+            self.pending = False
+            return 1
+        return 0
+
+cdef class DateIntervalSetIterator(BaseIntervalSetIterator):
+    def __init__(DateIntervalSetIterator self, DateIntervalSet interval_set):
+        self.index = 0
+        self.interval_set = interval_set
+    
+    def __iter__(DateIntervalSetIterator self):
+        return self
+    
+    def __next__(DateIntervalSetIterator self):
+        self.index += 1
+        if self.index <= self.interval_set.n_intervals:
+            return self.interval_set.intervals[self.index-1]
+        raise StopIteration
+
+cdef class DateIntervalSet(BaseIntervalSet):
+    def __init__(DateIntervalSet self, tuple intervals):
+        '''
+        The intervals must already be sorted and non-overlapping.
+        '''
+        cdef DateIntervalSetBuilder builder = DateIntervalSetBuilder(len(intervals))
+        cdef DateInterval interval
+        cdef DateIntervalSet built
+        for interval in intervals:
+            builder.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        built = builder.build()
+        self.lower_bounds = built.lower_bounds
+        self.upper_bounds = built.upper_bounds
+        self.flags = built.flags
+        self.storage = built.storage
+        self.n_intervals = built.n_intervals
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True, raw=False):
+        '''
+        Construct an DateIntervalSet directly from sequences of lower and upper bounds, 
+        given as numpy datetime64 arrays or any other sequences of dates.  If raw is true 
+        they are instead given as int32_t buffers or sequences of the stored ordinals, 
+        as returned by to_arrays.  
+        Each of lower_closed, upper_closed, lower_bounded and upper_bounded is either a single 
+        bool for all intervals or a sequence of bools with one per interval.  The intervals need 
+        not be sorted or disjoint, and no interval objects are created.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.from_arrays')
+        return DateIntervalSet_normalize(DateIntervalSet_raw_from_arrays(lower, upper, lower_closed, 
+                                                                                upper_closed, lower_bounded, 
+                                                                                upper_bounded, raw))
+    
+    @staticmethod
+    def from_sorted(intervals):
+        '''
+        Construct an DateIntervalSet from an iterable of DateIntervals or (lower, upper) pairs 
+        sorted by lower bound, as described in DateIntervalSetCoalescer, coalescing them as 
+        they are read.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.from_sorted')
+        cdef DateIntervalSetCoalescer coalescer = DateIntervalSetCoalescer(intervals)
+        cdef DateIntervalSetBuilder builder = DateIntervalSetBuilder()
+        while coalescer.next_raw():
+            builder.append(coalescer.result_lower, coalescer.result_upper, coalescer.result_flags)
+        return builder.build()
+    
+    def __iter__(DateIntervalSet self):
+        return DateIntervalSetIterator(self)
+    
+    def __getitem__(DateIntervalSet self, index):
+        return self.intervals[index]
+    
+    cdef tuple materialize_intervals(DateIntervalSet self):
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.materialize_intervals')
+        cdef Py_ssize_t i
+        cdef unsigned char flags
+        cdef DateInterval interval
+        cdef list result = []
+        for i in range(self.n_intervals):
+            interval = DateInterval.__new__(DateInterval)
+            interval.lower_bound = self.lower_bounds[i]
+            interval.upper_bound = self.upper_bounds[i]
+            interval.flags = self.flags[i]
+            result.append(interval)
+        return tuple(result)
+    
+    cdef Py_hash_t compute_hash(DateIntervalSet self) except -1:
+        '''
+        Combine the hashes of the intervals in the same way as the hash of a tuple.
+        '''
+        cdef Py_ssize_t i
+        cdef unsigned char flags
+        cdef size_t result = 0x345678
+        cdef size_t multiplier = 1000003
+        cdef Py_hash_t interval_hash
+        for i in range(self.n_intervals):
+            flags = canonical_flags(self.flags[i])
+            interval_hash = hash((self.lower_bounds[i] if flags & LOWER_BOUNDED else None, 
+                                  self.upper_bounds[i] if flags & UPPER_BOUNDED else None, flags))
+            result = (result ^ <size_t> interval_hash) * multiplier
+            multiplier += 82520 + 2 * (self.n_intervals - i)
+        result += 97531
+        if <Py_hash_t> result == -1:
+            return -2
+        return <Py_hash_t> result
+    
+    cpdef bool lower_bounded(DateIntervalSet self):
+        if self.n_intervals > 0:
+            return (self.flags[0] & LOWER_BOUNDED) != 0
+        else:
+            return True
+    
+    cpdef bool upper_bounded(DateIntervalSet self):
+        if self.n_intervals > 0:
+            return (self.flags[self.n_intervals - 1] & UPPER_BOUNDED) != 0
+        else:
+            return True
+    
+    cpdef object lower_bound(DateIntervalSet self):
+        if self.n_intervals > 0 and self.flags[0] & LOWER_BOUNDED:
+            return DateInterval_to_py(self.lower_bounds[0])
+        else:
+            return None
+    
+    cpdef object upper_bound(DateIntervalSet self):
+        if self.n_intervals > 0 and self.flags[self.n_intervals - 1] & UPPER_BOUNDED:
+            return DateInterval_to_py(self.upper_bounds[self.n_intervals - 1])
+        else:
+            return None
+    
+    cpdef tuple init_args(DateIntervalSet self):
+        return (self.intervals,)
+    
+    cdef Py_ssize_t locate_item(DateIntervalSet self, int32_t item) nogil:
+        '''
+        Use binary search to find the index of the interval containing item, or -1 if there 
+        is none.
+        '''
+        cdef Py_ssize_t i, n
+        cdef Py_ssize_t low, high
+        cdef int cmp
+        n = self.n_intervals
+        low = 0
+        high = n-1
+        while high >= low:
+            i = (high + low) / 2
+            cmp = DateInterval_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                  self.flags[i], item)
+            if cmp == -1:
+                high = i - 1
+            elif cmp == 1:
+                low = i + 1
+            else: #if cmp == 0:
+                return i
+        return -1
+    
+    cpdef bool contains(DateIntervalSet self, object item):
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.contains')
+        return self.locate_item(DateInterval_to_c(item)) >= 0
+    
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef int locate_many(DateIntervalSet self, const int32_t[:] items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1 nogil:
+        '''
+        For each of items, store the index of the interval containing it (or -1 if there is 
+        none) in indices and whether there is one in mask, skipping either if it is NULL.  
+        Sorted items are merged against the intervals in a single pass, otherwise each is 
+        found by binary search.
+        '''
+        cdef Py_ssize_t n = items.shape[0]
+        cdef Py_ssize_t k
+        cdef Py_ssize_t i, index
+        cdef int cmp
+        cdef bint is_sorted = True
+        cdef int32_t item
+        for k in range(1, n):
+            if not items[k] >= items[k-1]:
+                is_sorted = False
+                break
+        i = 0
+        for k in range(n):
+            item = items[k]
+            if is_sorted:
+                cmp = 1
+                while i < self.n_intervals:
+                    cmp = DateInterval_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                          self.flags[i], item)
+                    if cmp != 1:
+                        break
+                    i += 1
+                index = i if cmp == 0 else -1
+            else:
+                index = self.locate_item(item)
+            if indices != NULL:
+                indices[k] = index
+            if mask != NULL:
+                mask[k] = index >= 0
+        return 0
+    
+    cpdef array contains_many(DateIntervalSet self, points):
+        '''
+        Return an array of bytes, with 1 for each of points contained in self and 0 for each 
+        that is not.  The result can be viewed as a boolean numpy array with 
+        numpy.frombuffer(result, dtype=bool).
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.contains_many')
+        cdef const int32_t[:] items = DateIntervalSet_values(points)
+        cdef array result = clone(flags_template, items.shape[0], False)
+        with nogil:
+            self.locate_many(items, NULL, result.data.as_uchars)
+        return result
+    
+    cpdef array locate(DateIntervalSet self, points):
+        '''
+        Return an array of positions holding, for each of points, the index in self.intervals of 
+        the interval containing it, or -1 if no interval contains it.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.locate')
+        cdef const int32_t[:] items = DateIntervalSet_values(points)
+        cdef array result = clone(index_template, items.shape[0], False)
+        cdef Py_ssize_t *indices = index_data(result)
+        with nogil:
+            self.locate_many(items, indices, NULL)
+        return result
+
+    cpdef bool subset(DateIntervalSet self, DateIntervalSet other):
+        '''
+        Return True if and only if self is a subset of other.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.subset')
+        cdef Py_ssize_t i, j, m, n
+        cdef int overlap_cmp
+        if self.empty():
+            return True
+        elif other.empty():
+            return False
+        m = self.n_intervals
+        n = other.n_intervals
+        i = 0
+        j = 0
+        while i < m:
+            overlap_cmp = DateInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+            if overlap_cmp == -1:
+                return False
+            elif overlap_cmp == 0:
+                if (DateInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.flags[j]) < 0 or 
+                    DateInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                              other.upper_bounds[j], other.flags[j]) > 0):
+                    return False
+                i += 1
+            else:
+                # The current interval of self lies beyond the current interval of other, so 
+                # compare it against the next interval of other.
+                j += 1
+                if j == n:
+                    return False
+        return True
+    
+    cpdef bool equal(DateIntervalSet self, DateIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.equal')
+        cdef Py_ssize_t i, n
+        n = self.n_intervals
+        if n != other.n_intervals:
+            return False
+        for i in range(n):
+            if (DateInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                          other.lower_bounds[i], other.flags[i]) != 0 or 
+                DateInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                          other.upper_bounds[i], other.flags[i]) != 0):
+                return False
+        return True
+    
+    cpdef bool richcmp(DateIntervalSet self, DateIntervalSet other, int op):
+        if op == 0:
+            return self.subset(other) and not self.equal(other)
+        elif op == 1:
+            return self.subset(other)
+        elif op == 2:
+            return self.equal(other)
+        elif op == 3:
+            return not self.equal(other)
+        elif op == 4:
+            return other.subset(self) and not other.equal(self)
+        elif op == 5:
+            return other.subset(self)
+    
+    cpdef bool empty(DateIntervalSet self):
+        return self.n_intervals == 0 
+    
+    def to_arrays(DateIntervalSet self):
+        '''
+        Return (lower, upper, lower_closed, upper_closed, lower_bounded, upper_bounded), which 
+        are the arguments that from_arrays would take to construct self with raw=True.  The lower 
+        and upper bounds are read-only memoryviews of int32_t sharing the storage of self, so 
+        numpy.asarray wraps them without copying.  
+        The bounds are ordinals as returned by date.toordinal.  
+        The bound of an unbounded side is 0.  The flags are arrays of bytes 
+        which are 1 where true and 0 where false.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.to_arrays')
+        return (memoryview(self.storage[0]).toreadonly(), memoryview(self.storage[1]).toreadonly(), 
+                get_flags(self.flags, self.n_intervals, LOWER_CLOSED), 
+                get_flags(self.flags, self.n_intervals, UPPER_CLOSED), 
+                get_flags(self.flags, self.n_intervals, LOWER_BOUNDED), 
+                get_flags(self.flags, self.n_intervals, UPPER_BOUNDED))
+    
+    def __reduce_ex__(DateIntervalSet self, protocol):
+        # Pickle the storage as three buffers rather than as interval objects.  From protocol 5 
+        # the buffers are passed as PickleBuffers, so they can be sent out of band without 
+        # copying.
+        if protocol >= 5 and PickleBuffer is not None:
+            buffers = tuple(PickleBuffer(buffer) for buffer in self.storage)
+        else:
+            buffers = tuple(memoryview(buffer).tobytes() for buffer in self.storage)
+        return (DateIntervalSet_from_buffers, (self.n_intervals,) + buffers)
+    
+    def save(DateIntervalSet self, path):
+        '''
+        Write self to the file at path in the binary format read by load_interval_set.
+        '''
+        with open(path, 'wb') as outfile:
+            outfile.write(file_header.pack(file_magic, b'DateIntervalSet', sys.byteorder[0].encode(), 
+                                           sizeof(int32_t), self.n_intervals))
+            for buffer in self.storage:
+                outfile.write(buffer)
+    
+    cpdef object measure(DateIntervalSet self):
+        '''
+        Return the total length of the intervals, or infinity if self is unbounded.  
+        For this type the elements are discrete, so this is the number of elements of self.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.measure')
+        cdef Py_ssize_t i, n = self.n_intervals
+        cdef uint64_t total = 0
+        cdef Py_ssize_t carries = 0
+        if n > 0 and not ((self.flags[0] & LOWER_BOUNDED) and (self.flags[n-1] & UPPER_BOUNDED)):
+            return INFINITY
+        with nogil:
+            for i in range(n):
+                DateInterval_add_length(&total, &carries, self.lower_bounds[i], self.upper_bounds[i], 
+                                           self.flags[i])
+        return DateInterval_count_to_py(total, carries)
+    
+    cpdef object intersection_measure(DateIntervalSet self, DateIntervalSet other):
+        '''
+        Return the measure of the intersection of self and other, without constructing it.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.intersection_measure')
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, lower_cmp, upper_cmp
+        cdef int32_t new_lower_bound, new_upper_bound
+        cdef unsigned char new_flags
+        cdef uint64_t total = 0
+        cdef bint infinite = False
+        cdef Py_ssize_t carries = 0
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        with nogil:
+            while i < m and j < n:
+                cmp = DateInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                                  other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                if cmp == -1:
+                    i += 1
+                elif cmp == 1:
+                    j += 1
+                else:
+                    lower_cmp = DateInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                          other.lower_bounds[j], other.flags[j])
+                    upper_cmp = DateInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                                          other.upper_bounds[j], other.flags[j])
+                    if lower_cmp <= 0:
+                        new_lower_bound = other.lower_bounds[j]
+                        new_flags = other.flags[j] & LOWER_FLAGS
+                    else:
+                        new_lower_bound = self.lower_bounds[i]
+                        new_flags = self.flags[i] & LOWER_FLAGS
+                    if upper_cmp <= 0:
+                        new_upper_bound = self.upper_bounds[i]
+                        new_flags |= self.flags[i] & UPPER_FLAGS
+                    else:
+                        new_upper_bound = other.upper_bounds[j]
+                        new_flags |= other.flags[j] & UPPER_FLAGS
+                    if not ((new_flags & LOWER_BOUNDED) and (new_flags & UPPER_BOUNDED)):
+                        infinite = True
+                        break
+                    if not DateInterval_empty(new_lower_bound, new_upper_bound, new_flags):
+                        DateInterval_add_length(&total, &carries, new_lower_bound, new_upper_bound, new_flags)
+                    if upper_cmp <= 0:
+                        i += 1
+                    if upper_cmp >= 0:
+                        j += 1
+        if infinite:
+            return INFINITY
+        return DateInterval_count_to_py(total, carries)
+    
+    cpdef DateIntervalSet intersection(DateIntervalSet self, DateIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.intersection')
+        if self.empty():
+            return self
+        if other.empty():
+            return other
+        cdef DateIntervalSetBuilder builder = DateIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.intersection_into(other, builder)
+        return builder.build()
+    
+    cdef int intersection_into(DateIntervalSet self, DateIntervalSet other, 
+                               DateIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the intersection of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, lower_cmp, upper_cmp
+        cdef int32_t new_lower_bound, new_upper_bound
+        cdef unsigned char new_flags
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        while i < m and j < n:
+            cmp = DateInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+            if cmp == -1:
+                i += 1
+            elif cmp == 1:
+                j += 1
+            else:
+                lower_cmp = DateInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.flags[j])
+                upper_cmp = DateInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                                      other.upper_bounds[j], other.flags[j])
+                if lower_cmp <= 0:
+                    new_lower_bound = other.lower_bounds[j]
+                    new_flags = other.flags[j] & LOWER_FLAGS
+                else:
+                    new_lower_bound = self.lower_bounds[i]
+                    new_flags = self.flags[i] & LOWER_FLAGS
+                if upper_cmp <= 0:
+                    new_upper_bound = self.upper_bounds[i]
+                    new_flags |= self.flags[i] & UPPER_FLAGS
+                else:
+                    new_upper_bound = other.upper_bounds[j]
+                    new_flags |= other.flags[j] & UPPER_FLAGS
+                # For types with adjacent elements the overlap may still be empty
+                if not DateInterval_empty(new_lower_bound, new_upper_bound, new_flags):
+                    builder.append(new_lower_bound, new_upper_bound, new_flags)
+                if upper_cmp <= 0:
+                    i += 1
+                if upper_cmp >= 0:
+                    j += 1
+        return 0
+    
+    cpdef DateIntervalSet union(DateIntervalSet self, DateIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.union')
+        if self.empty():
+            return other
+        if other.empty():
+            return self
+        cdef DateIntervalSetBuilder builder = DateIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.union_into(other, builder)
+        return builder.build()
+    
+    cdef int union_into(DateIntervalSet self, DateIntervalSet other, 
+                        DateIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the union of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        while i < m or j < n:
+            if j == n or (i < m and 
+                          DateInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                    other.lower_bounds[j], other.flags[j]) <= 0):
+                builder.merge(self.lower_bounds[i], self.upper_bounds[i], self.flags[i])
+                i += 1
+            else:
+                builder.merge(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                j += 1
+        return 0
+    
+    cpdef DateIntervalSet complement(DateIntervalSet self):
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.complement')
+        cdef DateIntervalSetBuilder builder
+        if self.empty():
+            builder = DateIntervalSetBuilder(1)
+            builder.append(0, 0, LOWER_CLOSED | UPPER_CLOSED)
+            return builder.build()
+        cdef Py_ssize_t i
+        cdef Py_ssize_t n = self.n_intervals
+        cdef unsigned char flags
+        builder = DateIntervalSetBuilder(n + 1)
+        if self.flags[0] & LOWER_BOUNDED:
+            builder.append(0, self.lower_bounds[0], 
+                           LOWER_CLOSED | UPPER_BOUNDED | (0 if self.flags[0] & LOWER_CLOSED else UPPER_CLOSED))
+        for i in range(1, n):
+            # For types with adjacent elements the gap between two intervals may be empty
+            flags = (LOWER_BOUNDED | UPPER_BOUNDED | 
+                     (0 if self.flags[i-1] & UPPER_CLOSED else LOWER_CLOSED) | 
+                     (0 if self.flags[i] & LOWER_CLOSED else UPPER_CLOSED))
+            if not DateInterval_empty(self.upper_bounds[i-1], self.lower_bounds[i], flags):
+                builder.append(self.upper_bounds[i-1], self.lower_bounds[i], flags)
+        if self.flags[n-1] & UPPER_BOUNDED:
+            builder.append(self.upper_bounds[n-1], 0, 
+                           UPPER_CLOSED | LOWER_BOUNDED | (0 if self.flags[n-1] & UPPER_CLOSED else LOWER_CLOSED))
+        return builder.build()
+            
+    cpdef DateIntervalSet symmetric_difference(DateIntervalSet self, DateIntervalSet other):
+        '''
+        Return the set of elements in exactly one of self and other, computed in a single sweep 
+        over both.  At each step the remaining parts of the current intervals of self and other 
+        are compared, and whatever lies before the start or after the end of their overlap is 
+        kept.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.symmetric_difference')
+        if self.empty():
+            return other
+        if other.empty():
+            return self
+        cdef DateIntervalSetBuilder builder = DateIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.symmetric_difference_into(other, builder)
+        return builder.build()
+    
+    cdef int symmetric_difference_into(DateIntervalSet self, DateIntervalSet other, 
+                                       DateIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the symmetric difference of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, upper_cmp
+        cdef int32_t lower1, upper1, lower2, upper2
+        cdef unsigned char lower_flags1, upper_flags1, lower_flags2, upper_flags2
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        lower1 = self.lower_bounds[0]
+        lower_flags1 = self.flags[0] & LOWER_FLAGS
+        lower2 = other.lower_bounds[0]
+        lower_flags2 = other.flags[0] & LOWER_FLAGS
+        while i < m and j < n:
+            upper1 = self.upper_bounds[i]
+            upper_flags1 = self.flags[i] & UPPER_FLAGS
+            upper2 = other.upper_bounds[j]
+            upper_flags2 = other.flags[j] & UPPER_FLAGS
+            cmp = DateInterval_overlap_cmp(lower1, upper1, lower_flags1 | upper_flags1, 
+                                              lower2, upper2, lower_flags2 | upper_flags2)
+            if cmp == -1:
+                builder.merge(lower1, upper1, lower_flags1 | upper_flags1)
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+                continue
+            elif cmp == 1:
+                builder.merge(lower2, upper2, lower_flags2 | upper_flags2)
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+                continue
+            
+            # Keep whatever precedes the overlap
+            cmp = DateInterval_lower_cmp(lower1, lower_flags1, lower2, lower_flags2)
+            if cmp < 0:
+                builder.merge(lower1, lower2, lower_flags1 | UPPER_BOUNDED | 
+                              (0 if lower_flags2 & LOWER_CLOSED else UPPER_CLOSED))
+            elif cmp > 0:
+                builder.merge(lower2, lower1, lower_flags2 | UPPER_BOUNDED | 
+                              (0 if lower_flags1 & LOWER_CLOSED else UPPER_CLOSED))
+            
+            # Whatever follows the overlap remains to be compared with later intervals
+            upper_cmp = DateInterval_upper_cmp(upper1, upper_flags1, upper2, upper_flags2)
+            if upper_cmp < 0:
+                lower2 = upper1
+                lower_flags2 = LOWER_BOUNDED | (0 if upper_flags1 & UPPER_CLOSED else LOWER_CLOSED)
+            elif upper_cmp > 0:
+                lower1 = upper2
+                lower_flags1 = LOWER_BOUNDED | (0 if upper_flags2 & UPPER_CLOSED else LOWER_CLOSED)
+            if upper_cmp <= 0:
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+            if upper_cmp >= 0:
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+        while i < m:
+            builder.merge(lower1, self.upper_bounds[i], lower_flags1 | (self.flags[i] & UPPER_FLAGS))
+            i += 1
+            if i < m:
+                lower1 = self.lower_bounds[i]
+                lower_flags1 = self.flags[i] & LOWER_FLAGS
+        while j < n:
+            builder.merge(lower2, other.upper_bounds[j], lower_flags2 | (other.flags[j] & UPPER_FLAGS))
+            j += 1
+            if j < n:
+                lower2 = other.lower_bounds[j]
+                lower_flags2 = other.flags[j] & LOWER_FLAGS
+        return 0
+    
+    cpdef DateIntervalSet minus(DateIntervalSet self, DateIntervalSet other):
+        '''
+        Subtract other from self in a single sweep over both, cutting each interval of self 
+        at the intervals of other that overlap it.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalSet.minus')
+        if self.empty() or other.empty():
+            return self
+        cdef DateIntervalSetBuilder builder = DateIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.minus_into(other, builder)
+        return builder.build()
+    
+    cdef int minus_into(DateIntervalSet self, DateIntervalSet other, 
+                        DateIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append self minus other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp
+        cdef int32_t lower, upper
+        cdef unsigned char lower_flags, upper_flags, piece_flags
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        # The part of the interval i of self that remains to be cut runs from lower to upper
+        lower = self.lower_bounds[0]
+        lower_flags = self.flags[0] & LOWER_FLAGS
+        while i < m:
+            upper = self.upper_bounds[i]
+            upper_flags = self.flags[i] & UPPER_FLAGS
+            cmp = -1
+            while j < n:
+                cmp = DateInterval_overlap_cmp(lower, upper, lower_flags | upper_flags, 
+                                                  other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                if cmp != 1:
+                    break
+                j += 1
+            if j == n or cmp == -1:
+                # Nothing left in other overlaps the remaining part
+                if not DateInterval_empty(lower, upper, lower_flags | upper_flags):
+                    builder.append(lower, upper, lower_flags | upper_flags)
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+                continue
+            if DateInterval_lower_cmp(lower, lower_flags, other.lower_bounds[j], other.flags[j]) < 0:
+                piece_flags = (lower_flags | UPPER_BOUNDED | 
+                               (0 if other.flags[j] & LOWER_CLOSED else UPPER_CLOSED))
+                if not DateInterval_empty(lower, other.lower_bounds[j], piece_flags):
+                    builder.append(lower, other.lower_bounds[j], piece_flags)
+            if DateInterval_upper_cmp(upper, upper_flags, other.upper_bounds[j], other.flags[j]) > 0:
+                lower = other.upper_bounds[j]
+                lower_flags = LOWER_BOUNDED | (0 if other.flags[j] & UPPER_CLOSED else LOWER_CLOSED)
+                j += 1
+            else:
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+        return 0
+cdef inline int DateIntervalSet_cursor_cmp(list sets, Py_ssize_t *positions, Py_ssize_t a, 
+                                              Py_ssize_t b, bint by_upper) except? -2:
+    cdef DateIntervalSet first = sets[a]
+    cdef DateIntervalSet second = sets[b]
+    if by_upper:
+        return DateInterval_upper_cmp(first.upper_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.upper_bounds[positions[b]], second.flags[positions[b]])
+    else:
+        return DateInterval_lower_cmp(first.lower_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.lower_bounds[positions[b]], second.flags[positions[b]])
+
+cdef int DateIntervalSet_sift_down(list sets, Py_ssize_t *positions, Py_ssize_t *heap, 
+                                     Py_ssize_t size, Py_ssize_t index, bint by_upper) except -1:
+    '''
+    Restore the heap property below index in a min-heap of indices into sets, ordered by the 
+    lower (or upper) bound of the interval at which each set's cursor in positions points.
+    '''
+    cdef Py_ssize_t child, top
+    while True:
+        child = 2 * index + 1
+        if child >= size:
+            return 0
+        if (child + 1 < size and 
+            DateIntervalSet_cursor_cmp(sets, positions, heap[child + 1], heap[child], by_upper) < 0):
+            child += 1
+        if DateIntervalSet_cursor_cmp(sets, positions, heap[child], heap[index], by_upper) >= 0:
+            return 0
+        top = heap[index]
+        heap[index] = heap[child]
+        heap[child] = top
+        index = child
+
+def DateIntervalSet_from_buffers(Py_ssize_t n, lower, upper, flags):
+    '''
+    Construct an DateIntervalSet of n intervals whose storage is the given buffers of lower 
+    bounds, upper bounds and flags in native byte order, without copying them.  This is used 
+    to load interval set files and to unpickle typed interval sets.
+    '''
+    cdef DateIntervalSet result = DateIntervalSet.__new__(DateIntervalSet)
+    cdef const int32_t[:] lower_view = memoryview(lower).cast('B').cast('i')
+    cdef const int32_t[:] upper_view = memoryview(upper).cast('B').cast('i')
+    cdef const unsigned char[:] flags_view = memoryview(flags).cast('B')
+    if lower_view.shape[0] != n or upper_view.shape[0] != n or flags_view.shape[0] != n:
+        raise ValueError('Expected buffers of %d intervals' % n)
+    result.storage = (lower_view.base, upper_view.base, flags_view.base)
+    result.n_intervals = n
+    if n > 0:
+        result.lower_bounds = <int32_t *> &lower_view[0]
+        result.upper_bounds = <int32_t *> &upper_view[0]
+        result.flags = <unsigned char *> &flags_view[0]
+    return result
+
+cpdef DateIntervalSet DateIntervalSet_union_all(list sets):
+    '''
+    Return the union of all the given sets, merging them all at once with a heap ordered by 
+    the lower bound of each set's next interval.
+    '''
+    cdef OperationTimer timer = OperationTimer('DateIntervalSet_union_all')
+    cdef DateIntervalSet interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    sets = [interval_set for interval_set in sets if not interval_set.empty()]
+    k = len(sets)
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        total += interval_set.n_intervals
+    cdef DateIntervalSetBuilder builder = DateIntervalSetBuilder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            DateIntervalSet_sift_down(sets, positions, heap, size, i, False)
+        while size > 0:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(interval_set.lower_bounds[positions[i]], interval_set.upper_bounds[positions[i]], 
+                          interval_set.flags[positions[i]])
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                size -= 1
+                heap[0] = heap[size]
+            DateIntervalSet_sift_down(sets, positions, heap, size, 0, False)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cpdef DateIntervalSet DateIntervalSet_intersection_all(list sets):
+    '''
+    Return the intersection of all the given sets in a single sweep over all of them.  The 
+    intersection of the current intervals of the sets runs from the greatest of their lower 
+    bounds to the least of their upper bounds, which is found with a heap.  The set whose 
+    current interval ends first is then advanced.
+    '''
+    cdef OperationTimer timer = OperationTimer('DateIntervalSet_intersection_all')
+    cdef DateIntervalSet interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    cdef int32_t lower
+    cdef unsigned char lower_flags
+    k = len(sets)
+    if k == 0:
+        return DateIntervalSet(()).complement()
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        if interval_set.empty():
+            return interval_set
+        total += interval_set.n_intervals
+    interval_set = sets[0]
+    lower = interval_set.lower_bounds[0]
+    lower_flags = interval_set.flags[0] & LOWER_FLAGS
+    cdef DateIntervalSetBuilder builder = DateIntervalSetBuilder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+            interval_set = sets[i]
+            if DateInterval_lower_cmp(interval_set.lower_bounds[0], interval_set.flags[0], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[0]
+                lower_flags = interval_set.flags[0] & LOWER_FLAGS
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            DateIntervalSet_sift_down(sets, positions, heap, size, i, True)
+        while True:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(lower, interval_set.upper_bounds[positions[i]], 
+                          lower_flags | (interval_set.flags[positions[i]] & UPPER_FLAGS))
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                break
+            if DateInterval_lower_cmp(interval_set.lower_bounds[positions[i]], interval_set.flags[positions[i]], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[positions[i]]
+                lower_flags = interval_set.flags[positions[i]] & LOWER_FLAGS
+            DateIntervalSet_sift_down(sets, positions, heap, size, 0, True)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cdef class MutableDateIntervalSet:
+    '''
+    A set of disjoint DateIntervals that can be changed in place.  The intervals are kept 
+    sorted in a list of blocks of bounded size, so that adding or discarding an interval 
+    takes O(log(n)) comparisons and moves O(block_size) intervals, plus the cost of removing 
+    any intervals it absorbs.  Queries other than contains are answered by an immutable 
+    snapshot, which is cached until the next change.
+    '''
+    def __init__(MutableDateIntervalSet self, tuple intervals=()):
+        self.reset(DateIntervalSet_from_intervals(intervals))
+    
+    cdef int reset(MutableDateIntervalSet self, DateIntervalSet interval_set) except -1:
+        '''
+        Replace the contents of self with those of interval_set.
+        '''
+        cdef Py_ssize_t i, start
+        cdef DateIntervalSetBuilder block
+        self.blocks = []
+        for start in range(0, max(interval_set.n_intervals, 1), block_size):
+            block = DateIntervalSetBuilder(block_size)
+            for i in range(start, min(start + block_size, interval_set.n_intervals)):
+                block.append(interval_set.lower_bounds[i], interval_set.upper_bounds[i], 
+                             interval_set.flags[i])
+            self.blocks.append(block)
+        self.n_intervals = interval_set.n_intervals
+        self.frozen = interval_set
+        return 0
+    
+    cpdef DateIntervalSet freeze(MutableDateIntervalSet self):
+        '''
+        Return an immutable DateIntervalSet with the same intervals as self.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableDateIntervalSet.freeze')
+        cdef DateIntervalSetBuilder block, builder
+        cdef Py_ssize_t i
+        if self.frozen is None:
+            builder = DateIntervalSetBuilder(self.n_intervals)
+            for block in self.blocks:
+                for i in range(block.size):
+                    builder.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            self.frozen = builder.build()
+        return self.frozen
+    
+    cdef int search(MutableDateIntervalSet self, int32_t lower, int32_t upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1:
+        '''
+        Find the first interval that does not lie entirely below the query interval, or, if 
+        after is true, the first that lies entirely above it, counting intervals that only 
+        touch it as overlapping if touching is true.  Store its block and position in the 
+        block, which are the last block and its size if there is no such interval.
+        '''
+        cdef DateIntervalSetBuilder block
+        cdef Py_ssize_t low = 0, high = len(self.blocks) - 1, i
+        while low < high:
+            i = (low + high) / 2
+            block = self.blocks[i]
+            if MutableDateIntervalSet_passed(block, block.size - 1, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        block = self.blocks[low]
+        block_index[0] = low
+        low = 0
+        high = block.size
+        while low < high:
+            i = (low + high) / 2
+            if MutableDateIntervalSet_passed(block, i, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        position[0] = low
+        return 0
+    
+    cdef int replace(MutableDateIntervalSet self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, DateIntervalSetBuilder replacement) except -1:
+        '''
+        Replace the intervals from position first in block first_block up to, but not including, 
+        position last in block last_block with the intervals in replacement.
+        '''
+        cdef DateIntervalSetBuilder block = self.blocks[first_block]
+        cdef DateIntervalSetBuilder other
+        cdef Py_ssize_t i, j, removed = 0
+        if first_block == last_block:
+            removed = last - first
+            block.remove(first, last)
+        else:
+            removed = block.size - first
+            block.remove(first, block.size)
+            for i in range(first_block + 1, last_block):
+                removed += (<DateIntervalSetBuilder> self.blocks[i]).size
+            other = self.blocks[last_block]
+            removed += last
+            other.remove(0, last)
+            del self.blocks[first_block + 1:last_block]
+        for i in range(replacement.size):
+            block.insert(first + i, replacement.lower_bounds[i], replacement.upper_bounds[i], 
+                         replacement.flags[i])
+        self.n_intervals += replacement.size - removed
+        self.frozen = None
+        # Keep the sizes of the changed blocks within bounds
+        if block.size > 2 * block_size:
+            other = DateIntervalSetBuilder(block_size)
+            for i in range(block.size / 2, block.size):
+                other.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            block.remove(block.size / 2, block.size)
+            self.blocks.insert(first_block + 1, other)
+        for i in (first_block + 1, first_block, first_block - 1):
+            if i >= 0 and i + 1 < len(self.blocks):
+                block = self.blocks[i]
+                other = self.blocks[i + 1]
+                if ((block.size < block_size / 4 or other.size < block_size / 4) and 
+                    block.size + other.size <= 2 * block_size):
+                    for j in range(other.size):
+                        block.append(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                    del self.blocks[i + 1]
+        return 0
+    
+    cpdef add(MutableDateIntervalSet self, DateInterval interval):
+        '''
+        Add the elements of interval to self, fusing it with any intervals it overlaps or 
+        touches.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableDateIntervalSet.add')
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef DateIntervalSetBuilder block
+        cdef DateIntervalSetBuilder replacement = DateIntervalSetBuilder(1)
+        cdef int32_t lower = interval.lower_bound
+        cdef int32_t upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        if DateInterval_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, True, &first_block, &first)
+        self.search(lower, upper, flags, True, True, &last_block, &last)
+        replacement.append(lower, upper, flags)
+        if first_block != last_block or first != last:
+            # Fuse with the first and last of the intervals being replaced
+            block = self.blocks[first_block]
+            replacement.merge(block.lower_bounds[first], block.upper_bounds[first], block.flags[first])
+            block = self.blocks[last_block if last > 0 else last_block - 1]
+            i = (last if last > 0 else block.size) - 1
+            replacement.merge(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef discard(MutableDateIntervalSet self, DateInterval interval):
+        '''
+        Remove the elements of interval from self, splitting any interval that extends past it.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableDateIntervalSet.discard')
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef DateIntervalSetBuilder block
+        cdef DateIntervalSetBuilder replacement = DateIntervalSetBuilder(2)
+        cdef int32_t lower = interval.lower_bound
+        cdef int32_t upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        cdef unsigned char piece_flags
+        if DateInterval_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, False, &first_block, &first)
+        self.search(lower, upper, flags, True, False, &last_block, &last)
+        if first_block == last_block and first == last:
+            return
+        block = self.blocks[first_block]
+        if flags & LOWER_BOUNDED:
+            # The part of the first overlapping interval below interval
+            piece_flags = ((block.flags[first] & LOWER_FLAGS) | UPPER_BOUNDED | 
+                           (0 if flags & LOWER_CLOSED else UPPER_CLOSED))
+            if not DateInterval_empty(block.lower_bounds[first], lower, piece_flags):
+                replacement.append(block.lower_bounds[first], lower, piece_flags)
+        block = self.blocks[last_block if last > 0 else last_block - 1]
+        i = (last if last > 0 else block.size) - 1
+        if flags & UPPER_BOUNDED:
+            # The part of the last overlapping interval above interval
+            piece_flags = ((block.flags[i] & UPPER_FLAGS) | LOWER_BOUNDED | 
+                           (0 if flags & UPPER_CLOSED else LOWER_CLOSED))
+            if not DateInterval_empty(upper, block.upper_bounds[i], piece_flags):
+                replacement.append(upper, block.upper_bounds[i], piece_flags)
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef bool contains(MutableDateIntervalSet self, object item):
+        cdef OperationTimer timer = OperationTimer('MutableDateIntervalSet.contains')
+        cdef int32_t value = DateInterval_to_c(item)
+        cdef Py_ssize_t block_index, position
+        cdef DateIntervalSetBuilder block
+        self.search(value, value, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                    False, False, &block_index, &position)
+        block = self.blocks[block_index]
+        return position < block.size and DateInterval_containment_cmp(block.lower_bounds[position], 
+                                                                         block.upper_bounds[position], 
+                                                                         block.flags[position], value) == 0
+    
+    def __contains__(MutableDateIntervalSet self, item):
+        return self.contains(item)
+    
+    def __ior__(MutableDateIntervalSet self, other):
+        cdef DateInterval interval
+        for interval in other:
+            self.add(interval)
+        return self
+    
+    def __isub__(MutableDateIntervalSet self, other):
+        cdef DateInterval interval
+        for interval in other:
+            self.discard(interval)
+        return self
+    
+    def __iand__(MutableDateIntervalSet self, other):
+        cdef DateIntervalSet interval_set
+        if isinstance(other, MutableDateIntervalSet):
+            interval_set = (<MutableDateIntervalSet> other).freeze()
+        elif isinstance(other, DateIntervalSet):
+            interval_set = other
+        else:
+            # Any other iterable of intervals, as for |= and -=
+            interval_set = DateIntervalSet_from_intervals(tuple(other))
+        # Discarding the complement would leave gaps holding no element of a discrete type 
+        # inside the remaining intervals, so the intersection is rebuilt as a whole
+        self.reset(self.freeze().intersection(interval_set))
+        return self
+    
+    def __richcmp__(MutableDateIntervalSet self, other, int op):
+        if isinstance(other, MutableDateIntervalSet):
+            other = (<MutableDateIntervalSet> other).freeze()
+        return PyObject_RichCompare(self.freeze(), other, op)
+    
+    __hash__ = None
+    
+    def __reduce__(MutableDateIntervalSet self):
+        return (self.__class__, (self.intervals,))
+    
+    def __iter__(MutableDateIntervalSet self):
+        return iter(self.freeze())
+    
+    def __str__(MutableDateIntervalSet self):
+        return str(self.freeze())
+    
+    def __repr__(MutableDateIntervalSet self):
+        return str(self)
+    
+    def __nonzero__(MutableDateIntervalSet self):
+        return self.n_intervals > 0
+    
+    @property
+    def intervals(MutableDateIntervalSet self):
+        return self.freeze().intervals
+    
+    def empty(MutableDateIntervalSet self):
+        return self.n_intervals == 0
+    
+    def lower_bounded(MutableDateIntervalSet self):
+        return self.freeze().lower_bounded()
+    
+    def upper_bounded(MutableDateIntervalSet self):
+        return self.freeze().upper_bounded()
+    
+    def lower_bound(MutableDateIntervalSet self):
+        return self.freeze().lower_bound()
+    
+    def upper_bound(MutableDateIntervalSet self):
+        return self.freeze().upper_bound()
+    
+    def contains_many(MutableDateIntervalSet self, points):
+        return self.freeze().contains_many(points)
+    
+    def locate(MutableDateIntervalSet self, points):
+        return self.freeze().locate(points)
+    
+    def subset(MutableDateIntervalSet self, other):
+        if isinstance(other, MutableDateIntervalSet):
+            other = (<MutableDateIntervalSet> other).freeze()
+        return self.freeze().subset(other)
+    
+    def measure(MutableDateIntervalSet self):
+        return self.freeze().measure()
+    
+    def intersection_measure(MutableDateIntervalSet self, other):
+        if isinstance(other, MutableDateIntervalSet):
+            other = (<MutableDateIntervalSet> other).freeze()
+        return self.freeze().intersection_measure(other)
+
+cdef inline bint MutableDateIntervalSet_passed(DateIntervalSetBuilder block, Py_ssize_t i, 
+                                                  int32_t lower, int32_t upper, unsigned char flags, 
+                                                  bint after, bint touching):
+    '''
+    Return whether interval i of block is not entirely below the query interval or, if after 
+    is true, whether it is entirely above it.  If touching is true, intervals that touch 
+    the query interval without overlapping it count as overlapping it.
+    '''
+    cdef int cmp = DateInterval_overlap_cmp(block.lower_bounds[i], block.upper_bounds[i], block.flags[i], 
+                                               lower, upper, flags)
+    if after:
+        return cmp == 1 and not (touching and block.lower_bounds[i] == upper and (flags & UPPER_BOUNDED) and 
+                                 (block.flags[i] & LOWER_BOUNDED) and 
+                                 ((block.flags[i] & LOWER_CLOSED) or (flags & UPPER_CLOSED)))
+    else:
+        return cmp != -1 or (touching and block.upper_bounds[i] == lower and (flags & LOWER_BOUNDED) and 
+                             (block.flags[i] & UPPER_BOUNDED) and 
+                             ((block.flags[i] & UPPER_CLOSED) or (flags & LOWER_CLOSED)))
+
+cdef class DateIntervalIndex:
+    '''
+    A static collection of DateIntervals, which may overlap and are identified by their 
+    position in the sequence the index was built from.  Queries return arrays of these 
+    positions in increasing order.  Intervals are sorted by lower bound, and an implicit 
+    binary tree over the sorted order records the interval with the greatest upper bound 
+    in each subtree, so the k intervals overlapping a query are found in O((k + 1) log(n)) 
+    time.
+    '''
+    def __init__(DateIntervalIndex self, tuple intervals):
+        cdef OperationTimer timer = OperationTimer('DateIntervalIndex.__init__')
+        cdef DateInterval interval
+        cdef DateIntervalSetBuilder raw = DateIntervalSetBuilder(len(intervals))
+        for interval in intervals:
+            raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        self.index(raw)
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True):
+        '''
+        Construct an DateIntervalIndex from arrays of bounds and flags, which are 
+        interpreted as in DateIntervalSet.from_arrays.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalIndex.from_arrays')
+        cdef DateIntervalIndex result = DateIntervalIndex.__new__(DateIntervalIndex)
+        result.index(DateIntervalSet_raw_from_arrays(lower, upper, lower_closed, upper_closed, 
+                                                        lower_bounded, upper_bounded))
+        return result
+    
+    cdef int index(DateIntervalIndex self, DateIntervalSetBuilder raw) except -1:
+        '''
+        Sort the intervals accumulated in raw and build the tree over them.
+        '''
+        cdef Py_ssize_t i, k, n = raw.size
+        cdef Py_ssize_t left, right
+        cdef DateIntervalSetBuilder builder = DateIntervalSetBuilder(n)
+        self.order_array = clone(index_template, n, False)
+        self.order = index_data(self.order_array)
+        cdef DateIntervalRecord *records = <DateIntervalRecord *> PyMem_Malloc(n * sizeof(DateIntervalRecord))
+        if records == NULL and n > 0:
+            raise MemoryError()
+        try:
+            for i in range(n):
+                records[i].lower = raw.lower_bounds[i]
+                records[i].upper = raw.upper_bounds[i]
+                records[i].flags = raw.flags[i]
+                records[i].index = i
+            qsort(records, n, sizeof(DateIntervalRecord), DateInterval_record_cmp)
+            for i in range(n):
+                builder.append(records[i].lower, records[i].upper, records[i].flags)
+                self.order[i] = records[i].index
+        finally:
+            PyMem_Free(records)
+        # The sorted intervals are kept in the storage of an DateIntervalSet, although unlike 
+        # those of a set they may be empty or overlap
+        self.sorted_intervals = builder.build()
+        self.n_intervals = n
+        self.leaves = 1
+        while self.leaves < n:
+            self.leaves *= 2
+        self.tree_array = clone(index_template, 2 * self.leaves, False)
+        self.tree = index_data(self.tree_array)
+        # Empty intervals are left out of the tree, so they are never found
+        for i in range(self.leaves):
+            if i < n and not DateInterval_empty(self.sorted_intervals.lower_bounds[i], 
+                                                   self.sorted_intervals.upper_bounds[i], 
+                                                   self.sorted_intervals.flags[i]):
+                self.tree[self.leaves + i] = i
+            else:
+                self.tree[self.leaves + i] = -1
+        for i in range(self.leaves - 1, 0, -1):
+            left = self.tree[2 * i]
+            right = self.tree[2 * i + 1]
+            if left < 0 or (right >= 0 and 
+                            DateInterval_upper_cmp(self.sorted_intervals.upper_bounds[right], 
+                                                      self.sorted_intervals.flags[right], 
+                                                      self.sorted_intervals.upper_bounds[left], 
+                                                      self.sorted_intervals.flags[left]) > 0):
+                self.tree[i] = right
+            else:
+                self.tree[i] = left
+        return 0
+    
+    def __len__(DateIntervalIndex self):
+        return self.n_intervals
+    
+    @property
+    def intervals(DateIntervalIndex self):
+        '''
+        The indexed intervals, in the order the index was built from.
+        '''
+        cdef Py_ssize_t i
+        cdef list result
+        if self.cached_intervals is None:
+            result = [None] * self.n_intervals
+            for i, interval in enumerate(self.sorted_intervals.intervals):
+                result[self.order[i]] = interval
+            self.cached_intervals = tuple(result)
+        return self.cached_intervals
+    
+    def __reduce__(DateIntervalIndex self):
+        return (self.__class__, (self.intervals,))
+    
+    def __str__(DateIntervalIndex self):
+        return 'DateIntervalIndex(%s)' % ', '.join(map(str, self.intervals))
+    
+    def __repr__(DateIntervalIndex self):
+        return str(self)
+    
+    cdef Py_ssize_t end(DateIntervalIndex self, int32_t upper, unsigned char flags):
+        '''
+        Use binary search to find the number of intervals, in sorted order, that do not lie 
+        entirely above the upper bound of the query.
+        '''
+        cdef Py_ssize_t i, low = 0, high = self.n_intervals
+        cdef DateIntervalSet intervals = self.sorted_intervals
+        while low < high:
+            i = (low + high) / 2
+            # Masking the flags restricts overlap_cmp to the lower bound of the interval 
+            # and the upper bound of the query
+            if DateInterval_overlap_cmp(intervals.lower_bounds[i], intervals.upper_bounds[i], 
+                                           intervals.flags[i] & LOWER_FLAGS, upper, upper, 
+                                           flags & UPPER_FLAGS) == 1:
+                high = i
+            else:
+                low = i + 1
+        return low
+    
+    cdef int collect(DateIntervalIndex self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, int32_t lower, int32_t upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals under node, among the first end in 
+        sorted order, that do not lie entirely below the lower bound of the query and share 
+        an element with it.  Subtrees whose greatest upper bound lies below the query are 
+        skipped.
+        '''
+        cdef Py_ssize_t k, middle
+        cdef DateIntervalSet intervals = self.sorted_intervals
+        if node_start >= end:
+            return 0
+        k = self.tree[node]
+        if k < 0 or DateInterval_overlap_cmp(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                intervals.flags[k] & UPPER_FLAGS, lower, lower, 
+                                                flags & LOWER_FLAGS) == -1:
+            return 0
+        if node_stop - node_start == 1:
+            # Bounds that interleave may still leave no element in common
+            if not DateInterval_intersection_empty(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                      intervals.flags[k], lower, upper, flags):
+                append_index(result, size, self.order[k])
+            return 0
+        middle = (node_start + node_stop) / 2
+        self.collect(2 * node, node_start, middle, end, lower, upper, flags, result, size)
+        self.collect(2 * node + 1, middle, node_stop, end, lower, upper, flags, result, size)
+        return 0
+    
+    cdef int query(DateIntervalIndex self, int32_t lower, int32_t upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals that overlap the query interval, in 
+        increasing order.
+        '''
+        cdef Py_ssize_t start = size[0]
+        if DateInterval_empty(lower, upper, flags):
+            return 0
+        self.collect(1, 0, self.leaves, self.end(upper, flags), lower, upper, flags, result, size)
+        qsort(index_data(result) + start, size[0] - start, sizeof(Py_ssize_t), index_cmp)
+        return 0
+    
+    cpdef array stab(DateIntervalIndex self, object point):
+        '''
+        Return the positions of the intervals containing point.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalIndex.stab')
+        cdef int32_t item = DateInterval_to_c(point)
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(item, item, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, result, &size)
+        resize(result, size)
+        return result
+    
+    cpdef array overlap(DateIntervalIndex self, DateInterval interval):
+        '''
+        Return the positions of the intervals that overlap interval.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalIndex.overlap')
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+        resize(result, size)
+        return result
+    
+    def stab_many(DateIntervalIndex self, points):
+        '''
+        Stab the index with each of points.  Return a pair of arrays of equal length, the 
+        first holding positions in points and the second the positions of the intervals 
+        containing them, ordered by position in points and then by interval position.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalIndex.stab_many')
+        cdef const int32_t[:] items = DateIntervalSet_values(points)
+        cdef Py_ssize_t n = items.shape[0]
+        cdef Py_ssize_t i, start, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for i in range(n):
+            start = size
+            self.query(items[i], items[i], LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                       result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+    
+    def overlap_many(DateIntervalIndex self, intervals):
+        '''
+        Query the index with each of intervals, which may be any iterable of DateIntervals 
+        such as an DateIntervalSet.  Return a pair of arrays as in stab_many.
+        '''
+        cdef OperationTimer timer = OperationTimer('DateIntervalIndex.overlap_many')
+        cdef DateInterval interval
+        cdef Py_ssize_t i = 0, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for interval in intervals:
+            self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+            i += 1
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+
+
+cdef int DateInterval_sweep_step(int32_t * lower1, int32_t * upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                     Py_ssize_t i, int32_t * lower2, int32_t * upper2, unsigned char *flags2, 
+                                     Py_ssize_t *order2, Py_ssize_t *active2, Py_ssize_t *n_active2, bint swapped, 
+                                     IndexPairs *pairs) except -1 nogil:
+    '''
+    Pair interval i of the first side with each active interval of the second side that 
+    does not lie entirely below it, and drop those that do from the active intervals.  The 
+    active intervals all have lower bounds not greater than that of interval i, so they 
+    overlap it unless they lie below it, and then they lie below all later intervals too.
+    '''
+    cdef Py_ssize_t k, j, kept = 0
+    for k in range(n_active2[0]):
+        j = active2[k]
+        # Masking the flags restricts overlap_cmp to the upper bound of the active interval and 
+        # the lower bound of interval i
+        if DateInterval_overlap_cmp(lower2[j], upper2[j], flags2[j] & UPPER_FLAGS, 
+                                       lower1[i], upper1[i], flags1[i] & LOWER_FLAGS) != -1:
+            # Bounds that interleave may still leave no element in common
+            if not DateInterval_intersection_empty(lower1[i], upper1[i], flags1[i], 
+                                                      lower2[j], upper2[j], flags2[j]):
+                if swapped:
+                    append_pair(pairs, order2[j], order1[i])
+                else:
+                    append_pair(pairs, order1[i], order2[j])
+            active2[kept] = j
+            kept += 1
+    n_active2[0] = kept
+    return 0
+
+cdef int DateInterval_sweep(int32_t * lower1, int32_t * upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                Py_ssize_t n1, int32_t * lower2, int32_t * upper2, unsigned char *flags2, 
+                                Py_ssize_t *order2, Py_ssize_t n2, Py_ssize_t *active1, Py_ssize_t *active2, 
+                                IndexPairs *pairs) except -1 nogil:
+    '''
+    Merge two sequences of intervals sorted by lower bound, keeping for each side the 
+    intervals that may still overlap later intervals of the other side.
+    '''
+    cdef Py_ssize_t i = 0, j = 0, n_active1 = 0, n_active2 = 0
+    while i < n1 or j < n2:
+        if j == n2 or (i < n1 and DateInterval_lower_cmp(lower1[i], flags1[i], lower2[j], flags2[j]) <= 0):
+            if not DateInterval_empty(lower1[i], upper1[i], flags1[i]):
+                DateInterval_sweep_step(lower1, upper1, flags1, order1, i, lower2, upper2, flags2, 
+                                           order2, active2, &n_active2, False, pairs)
+                active1[n_active1] = i
+                n_active1 += 1
+            i += 1
+        else:
+            if not DateInterval_empty(lower2[j], upper2[j], flags2[j]):
+                DateInterval_sweep_step(lower2, upper2, flags2, order2, j, lower1, upper1, flags1, 
+                                           order1, active1, &n_active1, True, pairs)
+                active2[n_active2] = j
+                n_active2 += 1
+            j += 1
+    return 0
+
+cpdef tuple DateInterval_overlap_join(DateIntervalIndex left, DateIntervalIndex right):
+    '''
+    Return a pair of arrays holding the positions in left and in right of every pair of 
+    overlapping intervals, in no particular order.
+    '''
+    cdef OperationTimer timer = OperationTimer('DateInterval_overlap_join')
+    cdef DateIntervalSet left_intervals = left.sorted_intervals
+    cdef DateIntervalSet right_intervals = right.sorted_intervals
+    cdef IndexPairs pairs
+    pairs.first = NULL
+    pairs.second = NULL
+    pairs.size = 0
+    pairs.capacity = 0
+    cdef Py_ssize_t *active = <Py_ssize_t *> PyMem_Malloc((left.n_intervals + right.n_intervals) * sizeof(Py_ssize_t))
+    if active == NULL and left.n_intervals + right.n_intervals > 0:
+        raise MemoryError()
+    try:
+        with nogil:
+            DateInterval_sweep(left_intervals.lower_bounds, left_intervals.upper_bounds, 
+                                  left_intervals.flags, left.order, left.n_intervals, 
+                                  right_intervals.lower_bounds, right_intervals.upper_bounds, 
+                                  right_intervals.flags, right.order, right.n_intervals, 
+                                  active, active + left.n_intervals, &pairs)
+        return index_pairs_to_arrays(&pairs)
+    finally:
+        PyMem_Free(active)
+        free(pairs.first)
+        free(pairs.second)
+
+
+# These operate on the raw bounds and packed flags of an interval.  The methods of 
+# IntInterval and the loops of IntIntervalSet are built on them.
+cdef inline bint IntInterval_adjacent(int lower, int upper) nogil:
+    return lower + 1 == upper
+
+cdef inline bint IntInterval_empty(int lower, int upper, unsigned char flags) nogil:
+    return (((flags & LOWER_BOUNDED) and (flags & UPPER_BOUNDED)) and 
+            ((((lower == upper) and 
+            (not ((flags & LOWER_CLOSED) and (flags & UPPER_CLOSED)))) or
+            lower > upper) or 
+             (lower < upper and 
+              (not (flags & (LOWER_CLOSED | UPPER_CLOSED))) and
+              IntInterval_adjacent(lower, upper))))
+
+cdef inline int IntInterval_containment_cmp(int lower, int upper, unsigned char flags, 
+                                                int item) nogil:
+    global containment_cmp_count
+    containment_cmp_count += 1
+    if flags & LOWER_BOUNDED:
+        if item < lower:
+            return -1
+        elif item == lower:
+            if not (flags & LOWER_CLOSED):
+                return -1
+    if flags & UPPER_BOUNDED:
+        if item > upper:
+            return 1
+        elif item == upper:
+            if not (flags & UPPER_CLOSED):
+                return 1
+    return 0
+
+cdef inline int IntInterval_lower_cmp(int lower1, unsigned char flags1, 
+                                          int lower2, unsigned char flags2) nogil:
+    global lower_cmp_count
+    lower_cmp_count += 1
+    if not (flags1 & LOWER_BOUNDED):
+        if not (flags2 & LOWER_BOUNDED):
+            return 0
+        else:
+            return -1
+    elif not (flags2 & LOWER_BOUNDED):
+        return 1
+    if lower1 < lower2:
+        return -1
+    elif lower1 == lower2:
+        if (flags1 & LOWER_CLOSED) and not (flags2 & LOWER_CLOSED):
+            return -1
+        elif (flags2 & LOWER_CLOSED) and not (flags1 & LOWER_CLOSED):
+            return 1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int IntInterval_upper_cmp(int upper1, unsigned char flags1, 
+                                          int upper2, unsigned char flags2) nogil:
+    global upper_cmp_count
+    upper_cmp_count += 1
+    if not (flags1 & UPPER_BOUNDED):
+        if not (flags2 & UPPER_BOUNDED):
+            return 0
+        else:
+            return 1
+    elif not (flags2 & UPPER_BOUNDED):
+        return -1
+    if upper1 < upper2:
+        return -1
+    elif upper1 == upper2:
+        if (flags1 & UPPER_CLOSED) and not (flags2 & UPPER_CLOSED):
+            return 1
+        elif (flags2 & UPPER_CLOSED) and not (flags1 & UPPER_CLOSED):
+            return -1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int IntInterval_overlap_cmp(int lower1, int upper1, unsigned char flags1, 
+                                            int lower2, int upper2, unsigned char flags2) nogil:
+    global overlap_cmp_count
+    overlap_cmp_count += 1
+    if (flags1 & UPPER_BOUNDED) and (flags2 & LOWER_BOUNDED):
+        if upper1 < lower2:
+            return -1
+        elif upper1 == lower2:
+            if (flags1 & UPPER_CLOSED) and (flags2 & LOWER_CLOSED):
+                return 0
+            else:
+                return -1
+    if (flags1 & LOWER_BOUNDED) and (flags2 & UPPER_BOUNDED):
+        if lower1 > upper2:
+            return 1
+        elif lower1 == upper2:
+            if (flags1 & LOWER_CLOSED) and (flags2 & UPPER_CLOSED):
+                return 0
+            else:
+                return 1
+    return 0
+
+cdef inline bint IntInterval_fusible(int lower1, int upper1, unsigned char flags1, 
+                                         int lower2, int upper2, unsigned char flags2) nogil:
+    '''
+    Return whether the union of two nonempty intervals is an interval, because they overlap 
+    or touch.
+    '''
+    cdef int overlap_cmp = IntInterval_overlap_cmp(lower1, upper1, flags1, lower2, upper2, flags2)
+    return ((overlap_cmp == 0) or 
+            (overlap_cmp == -1 and upper1 == lower2 and 
+             ((flags1 & UPPER_CLOSED) or (flags2 & LOWER_CLOSED))) or
+            (overlap_cmp == 1 and upper2 == lower1 and 
+             ((flags2 & UPPER_CLOSED) or (flags1 & LOWER_CLOSED))))
+
+cdef inline bint IntInterval_intersection_empty(int lower1, int upper1, unsigned char flags1, 
+                                                    int lower2, int upper2, unsigned char flags2) nogil:
+    '''
+    Return whether two nonempty intervals that overlap according to overlap_cmp nonetheless 
+    have no element in common, which can only happen for types with adjacent elements.
+    '''
+    cdef int lower, upper
+    cdef unsigned char flags
+    if IntInterval_lower_cmp(lower1, flags1, lower2, flags2) <= 0:
+        lower = lower2
+        flags = flags2 & LOWER_FLAGS
+    else:
+        lower = lower1
+        flags = flags1 & LOWER_FLAGS
+    if IntInterval_upper_cmp(upper1, flags1, upper2, flags2) <= 0:
+        upper = upper1
+        flags |= flags1 & UPPER_FLAGS
+    else:
+        upper = upper2
+        flags |= flags2 & UPPER_FLAGS
+    return IntInterval_empty(lower, upper, flags)
+
+cdef array IntInterval_bounds_template = array('i')
+
+cdef const int[:] IntIntervalSet_values(object values):
+    '''
+    View values as a buffer of int, copying them only if they do not already 
+    expose one of the right type.
+    '''
+    cdef const int[:] result
+    try:
+        result = values
+    except (TypeError, ValueError, BufferError):
+        result = array('i', values)
+    return result
+
+ctypedef struct IntIntervalRecord:
+    int lower
+    int upper
+    unsigned char flags
+    Py_ssize_t index
+
+cdef int IntInterval_record_cmp(const void *record1, const void *record2) nogil:
+    cdef IntIntervalRecord *first = <IntIntervalRecord *> record1
+    cdef IntIntervalRecord *second = <IntIntervalRecord *> record2
+    return IntInterval_lower_cmp(first.lower, first.flags, second.lower, second.flags)
+
+cdef inline void IntInterval_add_length(uint64_t *total, Py_ssize_t *carries, int lower, 
+                                          int upper, unsigned char flags) nogil:
+    '''
+    Add the number of elements of a bounded, nonempty interval to a count kept modulo 2**64, 
+    counting the times it wraps around in carries.  The number of elements less one always 
+    fits in a uint64_t, so it is added first and the one after.
+    '''
+    cdef uint64_t length = ((<uint64_t> upper) - (<uint64_t> lower) - 
+                            (0 if flags & LOWER_CLOSED else 1) - (0 if flags & UPPER_CLOSED else 1))
+    total[0] += length
+    if total[0] < length:
+        carries[0] += 1
+    total[0] += 1
+    if total[0] == 0:
+        carries[0] += 1
+
+cdef object IntInterval_count_to_py(uint64_t total, Py_ssize_t carries):
+    '''
+    Combine a count accumulated modulo 2**64 with the number of times it wrapped around.
+    '''
+    if carries:
+        return (<object> carries) * 18446744073709551616 + total
+    return total
+
+cdef class IntIntervalSetBuilder:
+    '''
+    Accumulates the bounds and flags of sorted intervals into the storage of a new 
+    IntIntervalSet.  The builder must not be used after build has been called.
+    '''
+    def __cinit__(IntIntervalSetBuilder self, Py_ssize_t capacity=0):
+        self.size = 0
+        self.capacity = capacity
+        self.flags_array = clone(flags_template, capacity, False)
+        self.flags = self.flags_array.data.as_uchars
+        self.lower_array = clone(IntInterval_bounds_template, capacity, False)
+        self.upper_array = clone(IntInterval_bounds_template, capacity, False)
+        self.lower_bounds = <int *> self.lower_array.data.as_voidptr
+        self.upper_bounds = <int *> self.upper_array.data.as_voidptr
+    
+    cdef int grow(IntIntervalSetBuilder self) except -1:
+        self.capacity = 2 * self.capacity + 8
+        resize(self.flags_array, self.capacity)
+        self.flags = self.flags_array.data.as_uchars
+        resize(self.lower_array, self.capacity)
+        resize(self.upper_array, self.capacity)
+        self.lower_bounds = <int *> self.lower_array.data.as_voidptr
+        self.upper_bounds = <int *> self.upper_array.data.as_voidptr
+        return 0
+    
+    cdef int append(IntIntervalSetBuilder self, int lower, int upper, 
+                    unsigned char flags) except -1 nogil:
+        '''
+        Add an interval after all intervals added so far, assuming the two neither overlap 
+        nor touch.
+        '''
+        if self.size == self.capacity:
+            with gil:
+                self.grow()
+        self.lower_bounds[self.size] = lower
+        self.upper_bounds[self.size] = upper
+        self.flags[self.size] = flags
+        self.size += 1
+        return 0
+    
+    cdef int merge(IntIntervalSetBuilder self, int lower, int upper, 
+                   unsigned char flags) except -1 nogil:
+        '''
+        Add an interval whose lower bound is not less than that of any interval added so far, 
+        fusing it with the last interval if the two overlap or touch.  Empty intervals are 
+        ignored.
+        '''
+        cdef Py_ssize_t last = self.size - 1
+        if IntInterval_empty(lower, upper, flags):
+            return 0
+        if last < 0:
+            return self.append(lower, upper, flags)
+        if IntInterval_fusible(self.lower_bounds[last], self.upper_bounds[last], self.flags[last], 
+                                   lower, upper, flags):
+            if IntInterval_lower_cmp(lower, flags, self.lower_bounds[last], self.flags[last]) < 0:
+                self.lower_bounds[last] = lower
+                self.flags[last] = (self.flags[last] & UPPER_FLAGS) | (flags & LOWER_FLAGS)
+            if IntInterval_upper_cmp(upper, flags, self.upper_bounds[last], self.flags[last]) > 0:
+                self.upper_bounds[last] = upper
+                self.flags[last] = (self.flags[last] & LOWER_FLAGS) | (flags & UPPER_FLAGS)
+            return 0
+        return self.append(lower, upper, flags)
+    
+    cdef int remove(IntIntervalSetBuilder self, Py_ssize_t start, Py_ssize_t stop) except -1:
+        '''
+        Remove the intervals at positions start up to, but not including, stop.
+        '''
+        cdef Py_ssize_t tail = self.size - stop
+        if stop <= start:
+            return 0
+        memmove(self.lower_bounds + start, self.lower_bounds + stop, tail * sizeof(int))
+        memmove(self.upper_bounds + start, self.upper_bounds + stop, tail * sizeof(int))
+        memmove(self.flags + start, self.flags + stop, tail)
+        self.size -= stop - start
+        return 0
+    
+    cdef int insert(IntIntervalSetBuilder self, Py_ssize_t position, int lower, int upper, 
+                    unsigned char flags) except -1:
+        '''
+        Add an interval at the given position, moving the intervals after it.
+        '''
+        if self.size == self.capacity:
+            self.grow()
+        memmove(self.lower_bounds + position + 1, self.lower_bounds + position, 
+                (self.size - position) * sizeof(int))
+        memmove(self.upper_bounds + position + 1, self.upper_bounds + position, 
+                (self.size - position) * sizeof(int))
+        self.lower_bounds[position] = lower
+        self.upper_bounds[position] = upper
+        memmove(self.flags + position + 1, self.flags + position, self.size - position)
+        self.flags[position] = flags
+        self.size += 1
+        return 0
+    
+    cdef IntIntervalSet build(IntIntervalSetBuilder self):
+        cdef IntIntervalSet result = IntIntervalSet.__new__(IntIntervalSet)
+        resize(self.flags_array, self.size)
+        result.flags = self.flags_array.data.as_uchars
+        resize(self.lower_array, self.size)
+        resize(self.upper_array, self.size)
+        result.lower_bounds = <int *> self.lower_array.data.as_voidptr
+        result.upper_bounds = <int *> self.upper_array.data.as_voidptr
+        result.storage = (self.lower_array, self.upper_array, self.flags_array)
+        result.n_intervals = self.size
+        return result
+
+cdef IntIntervalSet IntIntervalSet_normalize(IntIntervalSetBuilder raw):
+    '''
+    Build an IntIntervalSet from the intervals accumulated in raw, which may be empty, 
+    unsorted and overlapping.  Empty intervals are dropped, the rest are sorted by lower bound 
+    and any that overlap or touch are fused.
+    '''
+    cdef Py_ssize_t i, k, n = raw.size
+    cdef IntIntervalSetBuilder builder
+    cdef bint is_sorted = True
+    for i in range(1, n):
+        if IntInterval_lower_cmp(raw.lower_bounds[i-1], raw.flags[i-1], 
+                                     raw.lower_bounds[i], raw.flags[i]) > 0:
+            is_sorted = False
+            break
+    if is_sorted:
+        builder = IntIntervalSetBuilder(n)
+        for i in range(n):
+            builder.merge(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i])
+        return builder.build()
+    cdef IntIntervalRecord *records = <IntIntervalRecord *> PyMem_Malloc(n * sizeof(IntIntervalRecord))
+    if records == NULL and n > 0:
+        raise MemoryError()
+    try:
+        k = 0
+        for i in range(n):
+            if not IntInterval_empty(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i]):
+                records[k].lower = raw.lower_bounds[i]
+                records[k].upper = raw.upper_bounds[i]
+                records[k].flags = raw.flags[i]
+                k += 1
+        qsort(records, k, sizeof(IntIntervalRecord), IntInterval_record_cmp)
+        builder = IntIntervalSetBuilder(k)
+        for i in range(k):
+            builder.merge(records[i].lower, records[i].upper, records[i].flags)
+    finally:
+        PyMem_Free(records)
+    return builder.build()
+
+cdef class IntInterval(BaseInterval):
+    def __init__(BaseInterval self, int lower_bound, int upper_bound, bool lower_closed, 
+                 bool upper_closed, bool lower_bounded, bool upper_bounded):
+        self.flags = pack_flags(lower_closed, upper_closed, lower_bounded, upper_bounded)
+        if lower_bounded:
+            self.lower_bound = lower_bound
+        if upper_bounded:
+            self.upper_bound = upper_bound
+    
+    # For some types, there is a concept of adjacent elements.  For example, 
+    # there are no integers between 1 and 2 (although there are several real numbers).
+    # If there is such a concept, it's possible for an interval to be empty even when 
+    # the lower bound is strictly less than the upper bound, provided the bounds are strict 
+    # (not closed).  The adjacent method is used to help determine such cases.
+    cpdef bool adjacent(IntInterval self, int lower, int upper):
+        return IntInterval_adjacent(lower, upper)
+    
+    cpdef int containment_cmp(IntInterval self, int item):
+        return IntInterval_containment_cmp(self.lower_bound, self.upper_bound, self.flags, item)
+    
+    cpdef bool contains(IntInterval self, int item):
+        return self.containment_cmp(item) == 0
+    
+    cpdef bool subset(IntInterval self, IntInterval other):
+        '''
+        Return True if and only if self is a subset of other.
+        '''
+        return (IntInterval_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags) >= 0 and 
+                IntInterval_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags) <= 0)
+        
+    cpdef int overlap_cmp(IntInterval self, IntInterval other):
+        '''
+        Assume both are nonempty.  Return -1 if every element of self is less than every 
+        element of other.  Return 0 if self and other intersect.  Return 1 if every element of 
+        self is greater than every element of other.
+        '''
+        return IntInterval_overlap_cmp(self.lower_bound, self.upper_bound, self.flags, 
+                                           other.lower_bound, other.upper_bound, other.flags)
+    
+    cpdef tuple init_args(IntInterval self):
+        return (self.lower_bound, self.upper_bound, (self.flags & LOWER_CLOSED) != 0, 
+                (self.flags & UPPER_CLOSED) != 0, (self.flags & LOWER_BOUNDED) != 0, 
+                (self.flags & UPPER_BOUNDED) != 0)
+
+    cpdef IntInterval intersection(IntInterval self, IntInterval other):
+        cdef IntInterval result = IntInterval.__new__(IntInterval)
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
+        else:
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
+        else:
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
+        return result
+    
+    cpdef IntInterval fusion(IntInterval self, IntInterval other):
+        '''
+        Assume union of intervals is a single interval.  Return their union.  Results not correct
+        if above assumption is violated.
+        '''
+        cdef IntInterval result = IntInterval.__new__(IntInterval)
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
+        else:
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
+        else:
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
+        return result
+    
+    cpdef bool empty(IntInterval self):
+        return IntInterval_empty(self.lower_bound, self.upper_bound, self.flags)
+    
+    cpdef bool richcmp(IntInterval self, IntInterval other, int op):
+        cdef int lower_cmp
+        cdef int upper_cmp
+        if op == 0 or op == 1:
+            lower_cmp = self.lower_cmp(other)
+            if lower_cmp == -1:
+                return True
+            elif lower_cmp == 1:
+                return False
+            else: # lower_cmp == 0
+                upper_cmp = self.upper_cmp(other)
+                if upper_cmp == -1:
+                    return True
+                elif upper_cmp == 1:
+                    return False
+                else: # upper_cmp == 0
+                    return op == 1
+        elif op == 2:
+            return (self.lower_cmp(other) == 0) and (self.upper_cmp(other) == 0)
+        elif op == 3:
+            return (self.lower_cmp(other) != 0) or (self.upper_cmp(other) != 0)
+        elif op == 4 or op == 5:
+            lower_cmp = self.lower_cmp(other)
+            if lower_cmp == -1:
+                return False
+            elif lower_cmp == 1:
+                return True
+            else: # lower_cmp == 0
+                upper_cmp = self.upper_cmp(other)
+                if upper_cmp == -1:
+                    return False
+                elif upper_cmp == 1:
+                    return True
+                else: # upper_cmp == 0
+                    return op == 5
+    
+    cpdef int lower_cmp(IntInterval self, IntInterval other):
+        return IntInterval_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags)
+    
+    cpdef int upper_cmp(IntInterval self, IntInterval other):
+        return IntInterval_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags)
+
+# This is because static cpdef methods are not supported.  Otherwise this
+# would be a static method of IntIntervalSet
+cpdef IntIntervalSet IntIntervalSet_from_intervals(tuple intervals):
+    '''
+    Construct an IntIntervalSet from intervals in any order, which may be empty or 
+    overlapping.
+    '''
+    cdef OperationTimer timer = OperationTimer('IntIntervalSet_from_intervals')
+    cdef IntInterval interval
+    cdef IntIntervalSetBuilder raw = IntIntervalSetBuilder(len(intervals))
+    for interval in intervals:
+        raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+    return IntIntervalSet_normalize(raw)
+
+cdef IntIntervalSetBuilder IntIntervalSet_raw_from_arrays(object lower, object upper, object lower_closed, 
+                                                                   object upper_closed, object lower_bounded, 
+                                                                   object upper_bounded):
+    '''
+    Accumulate intervals given as arrays of bounds and flags, as described in 
+    IntIntervalSet.from_arrays, into a builder in the order given.
+    '''
+    cdef const int[:] lower_values = IntIntervalSet_values(lower)
+    cdef const int[:] upper_values = IntIntervalSet_values(upper)
+    cdef Py_ssize_t i, n = lower_values.shape[0]
+    if upper_values.shape[0] != n:
+        raise ValueError('lower and upper must have the same length')
+    cdef array flags = clone(flags_template, n, True)
+    set_flags(flags.data.as_uchars, n, lower_closed, LOWER_CLOSED)
+    set_flags(flags.data.as_uchars, n, upper_closed, UPPER_CLOSED)
+    set_flags(flags.data.as_uchars, n, lower_bounded, LOWER_BOUNDED)
+    set_flags(flags.data.as_uchars, n, upper_bounded, UPPER_BOUNDED)
+    cdef IntIntervalSetBuilder raw = IntIntervalSetBuilder(n)
+    for i in range(n):
+        raw.append(lower_values[i] if flags.data.as_uchars[i] & LOWER_BOUNDED else 0, 
+                   upper_values[i] if flags.data.as_uchars[i] & UPPER_BOUNDED else 0, 
+                   flags.data.as_uchars[i])
+    return raw
+
+cpdef tuple IntInterval_preprocess_intervals(tuple intervals):
+    '''
+    Remove empty intervals, sort, and fuse any overlapping intervals.
+    '''
+    cdef OperationTimer timer = OperationTimer('IntInterval_preprocess_intervals')
+    return IntIntervalSet_from_intervals(intervals).intervals
+
+cdef class IntIntervalSetCoalescer:
+    '''
+    Iterate over the coalesced intervals of an iterable of IntIntervals or (lower, upper) 
+    pairs, sorted by lower bound.  Pairs describe closed intervals, and either bound may be 
+    unbounded.  Only one pending interval is held at a time, so the input is never 
+    materialized.  A ValueError is raised if the input is found to be out of order.
+    '''
+    def __init__(IntIntervalSetCoalescer self, intervals):
+        self.source = iter(intervals)
+        self.pending = False
+        self.started = False
+    
+    def __iter__(IntIntervalSetCoalescer self):
+        return self
+    
+    def __next__(IntIntervalSetCoalescer self):
+        cdef IntInterval result
+        if not self.next_raw():
+            raise StopIteration
+        result = IntInterval.__new__(IntInterval)
+        result.lower_bound = self.result_lower
+        result.upper_bound = self.result_upper
+        result.flags = self.result_flags
+        return result
+    
+    cdef int next_raw(IntIntervalSetCoalescer self) except -1:
+        '''
+        Store the next coalesced interval in the result fields and return 1, or return 0 if 
+        there are no more.
+        '''
+        cdef int item_lower, item_upper
+        cdef unsigned char item_flags
+        cdef IntInterval interval
+        for item in self.source:
+            if isinstance(item, IntInterval):
+                interval = item
+                item_lower = interval.lower_bound
+                item_upper = interval.upper_bound
+                item_flags = interval.flags
+            else:
+                lower_value, upper_value = item
+                item_flags = LOWER_CLOSED | UPPER_CLOSED
+                if lower_value is unbounded:
+                    item_lower = 0
+                else:
+                    item_lower = lower_value
+                    item_flags |= LOWER_BOUNDED
+                if upper_value is unbounded:
+                    item_upper = 0
+                else:
+                    item_upper = upper_value
+                    item_flags |= UPPER_BOUNDED
+            if self.started and IntInterval_lower_cmp(item_lower, item_flags, 
+                                                          self.last_lower, self.last_flags) < 0:
+                raise ValueError('Intervals must be sorted by lower bound')
+            self.started = True
+            self.last_lower = item_lower
+            self.last_flags = item_flags
+            if IntInterval_empty(item_lower, item_upper, item_flags):
+                continue
+            if not self.pending:
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                self.pending = True
+            elif IntInterval_fusible(self.lower, self.upper, self.flags, item_lower, item_upper, item_flags):
+                if IntInterval_upper_cmp(item_upper, item_flags, self.upper, self.flags) > 0:
+                    self.upper = item_upper
+                    self.flags = (self.flags & LOWER_FLAGS) | (item_flags & UPPER_FLAGS)
+            else:
+                self.result_lower = self.lower
+                self.result_upper = self.upper
+                self.result_flags = self.flags
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                return 1
+        if self.pending:
+            self.result_lower = self.lower
+            self.result_upper = self.upper
+            self.result_flags = self.flags
+            self.pending = False
+            return 1
+        return 0
+
+cdef class IntIntervalSetIterator(BaseIntervalSetIterator):
+    def __init__(IntIntervalSetIterator self, IntIntervalSet interval_set):
+        self.index = 0
+        self.interval_set = interval_set
+    
+    def __iter__(IntIntervalSetIterator self):
+        return self
+    
+    def __next__(IntIntervalSetIterator self):
+        self.index += 1
+        if self.index <= self.interval_set.n_intervals:
+            return self.interval_set.intervals[self.index-1]
+        raise StopIteration
+
+cdef class IntIntervalSet(BaseIntervalSet):
+    def __init__(IntIntervalSet self, tuple intervals):
+        '''
+        The intervals must already be sorted and non-overlapping.
+        '''
+        cdef IntIntervalSetBuilder builder = IntIntervalSetBuilder(len(intervals))
+        cdef IntInterval interval
+        cdef IntIntervalSet built
+        for interval in intervals:
+            builder.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        built = builder.build()
+        self.lower_bounds = built.lower_bounds
+        self.upper_bounds = built.upper_bounds
+        self.flags = built.flags
+        self.storage = built.storage
+        self.n_intervals = built.n_intervals
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True):
+        '''
+        Construct an IntIntervalSet directly from sequences of lower and upper bounds, 
+        given as buffers of int (such as numpy arrays) or any other sequences of numbers.  
+        Each of lower_closed, upper_closed, lower_bounded and upper_bounded is either a single 
+        bool for all intervals or a sequence of bools with one per interval.  The intervals need 
+        not be sorted or disjoint, and no interval objects are created.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.from_arrays')
+        return IntIntervalSet_normalize(IntIntervalSet_raw_from_arrays(lower, upper, lower_closed, 
+                                                                                upper_closed, lower_bounded, 
+                                                                                upper_bounded))
+    
+    @staticmethod
+    def from_sorted(intervals):
+        '''
+        Construct an IntIntervalSet from an iterable of IntIntervals or (lower, upper) pairs 
+        sorted by lower bound, as described in IntIntervalSetCoalescer, coalescing them as 
+        they are read.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.from_sorted')
+        cdef IntIntervalSetCoalescer coalescer = IntIntervalSetCoalescer(intervals)
+        cdef IntIntervalSetBuilder builder = IntIntervalSetBuilder()
+        while coalescer.next_raw():
+            builder.append(coalescer.result_lower, coalescer.result_upper, coalescer.result_flags)
+        return builder.build()
+    
+    def __iter__(IntIntervalSet self):
+        return IntIntervalSetIterator(self)
+    
+    def __getitem__(IntIntervalSet self, index):
+        return self.intervals[index]
+    
+    cdef tuple materialize_intervals(IntIntervalSet self):
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.materialize_intervals')
+        cdef Py_ssize_t i
+        cdef unsigned char flags
+        cdef IntInterval interval
+        cdef list result = []
+        for i in range(self.n_intervals):
+            interval = IntInterval.__new__(IntInterval)
+            interval.lower_bound = self.lower_bounds[i]
+            interval.upper_bound = self.upper_bounds[i]
+            interval.flags = self.flags[i]
+            result.append(interval)
+        return tuple(result)
+    
+    cdef Py_hash_t compute_hash(IntIntervalSet self) except -1:
+        '''
+        Combine the hashes of the intervals in the same way as the hash of a tuple.
+        '''
+        cdef Py_ssize_t i
+        cdef unsigned char flags
+        cdef size_t result = 0x345678
+        cdef size_t multiplier = 1000003
+        cdef Py_hash_t interval_hash
+        for i in range(self.n_intervals):
+            flags = canonical_flags(self.flags[i])
+            interval_hash = hash((self.lower_bounds[i] if flags & LOWER_BOUNDED else None, 
+                                  self.upper_bounds[i] if flags & UPPER_BOUNDED else None, flags))
+            result = (result ^ <size_t> interval_hash) * multiplier
+            multiplier += 82520 + 2 * (self.n_intervals - i)
+        result += 97531
+        if <Py_hash_t> result == -1:
+            return -2
+        return <Py_hash_t> result
+    
+    cpdef bool lower_bounded(IntIntervalSet self):
+        if self.n_intervals > 0:
+            return (self.flags[0] & LOWER_BOUNDED) != 0
+        else:
+            return True
+    
+    cpdef bool upper_bounded(IntIntervalSet self):
+        if self.n_intervals > 0:
+            return (self.flags[self.n_intervals - 1] & UPPER_BOUNDED) != 0
+        else:
+            return True
+    
+    cpdef int lower_bound(IntIntervalSet self):
+        if self.n_intervals > 0:
+            return self.lower_bounds[0]
+        else:
+            return 0
+    
+    cpdef int upper_bound(IntIntervalSet self):
+        if self.n_intervals > 0:
+            return self.upper_bounds[self.n_intervals - 1]
+        else:
+            return 0
+    
+    cpdef tuple init_args(IntIntervalSet self):
+        return (self.intervals,)
+    
+    cdef Py_ssize_t locate_item(IntIntervalSet self, int item) nogil:
+        '''
+        Use binary search to find the index of the interval containing item, or -1 if there 
+        is none.
+        '''
+        cdef Py_ssize_t i, n
+        cdef Py_ssize_t low, high
+        cdef int cmp
+        n = self.n_intervals
+        low = 0
+        high = n-1
+        while high >= low:
+            i = (high + low) / 2
+            cmp = IntInterval_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                  self.flags[i], item)
+            if cmp == -1:
+                high = i - 1
+            elif cmp == 1:
+                low = i + 1
+            else: #if cmp == 0:
+                return i
+        return -1
+    
+    cpdef bool contains(IntIntervalSet self, int item):
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.contains')
+        return self.locate_item(item) >= 0
+    
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef int locate_many(IntIntervalSet self, const int[:] items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1 nogil:
+        '''
+        For each of items, store the index of the interval containing it (or -1 if there is 
+        none) in indices and whether there is one in mask, skipping either if it is NULL.  
+        Sorted items are merged against the intervals in a single pass, otherwise each is 
+        found by binary search.
+        '''
+        cdef Py_ssize_t n = items.shape[0]
+        cdef Py_ssize_t k
+        cdef Py_ssize_t i, index
+        cdef int cmp
+        cdef bint is_sorted = True
+        cdef int item
+        for k in range(1, n):
+            if not items[k] >= items[k-1]:
+                is_sorted = False
+                break
+        i = 0
+        for k in range(n):
+            item = items[k]
+            if is_sorted:
+                cmp = 1
+                while i < self.n_intervals:
+                    cmp = IntInterval_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                          self.flags[i], item)
+                    if cmp != 1:
+                        break
+                    i += 1
+                index = i if cmp == 0 else -1
+            else:
+                index = self.locate_item(item)
+            if indices != NULL:
+                indices[k] = index
+            if mask != NULL:
+                mask[k] = index >= 0
+        return 0
+    
+    cpdef array contains_many(IntIntervalSet self, points):
+        '''
+        Return an array of bytes, with 1 for each of points contained in self and 0 for each 
+        that is not.  The result can be viewed as a boolean numpy array with 
+        numpy.frombuffer(result, dtype=bool).
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.contains_many')
+        cdef const int[:] items = IntIntervalSet_values(points)
+        cdef array result = clone(flags_template, items.shape[0], False)
+        with nogil:
+            self.locate_many(items, NULL, result.data.as_uchars)
+        return result
+    
+    cpdef array locate(IntIntervalSet self, points):
+        '''
+        Return an array of positions holding, for each of points, the index in self.intervals of 
+        the interval containing it, or -1 if no interval contains it.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.locate')
+        cdef const int[:] items = IntIntervalSet_values(points)
+        cdef array result = clone(index_template, items.shape[0], False)
+        cdef Py_ssize_t *indices = index_data(result)
+        with nogil:
+            self.locate_many(items, indices, NULL)
+        return result
+
+    cpdef bool subset(IntIntervalSet self, IntIntervalSet other):
+        '''
+        Return True if and only if self is a subset of other.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.subset')
+        cdef Py_ssize_t i, j, m, n
+        cdef int overlap_cmp
+        if self.empty():
+            return True
+        elif other.empty():
+            return False
+        m = self.n_intervals
+        n = other.n_intervals
+        i = 0
+        j = 0
+        while i < m:
+            overlap_cmp = IntInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+            if overlap_cmp == -1:
+                return False
+            elif overlap_cmp == 0:
+                if (IntInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.flags[j]) < 0 or 
+                    IntInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                              other.upper_bounds[j], other.flags[j]) > 0):
+                    return False
+                i += 1
+            else:
+                # The current interval of self lies beyond the current interval of other, so 
+                # compare it against the next interval of other.
+                j += 1
+                if j == n:
+                    return False
+        return True
+    
+    cpdef bool equal(IntIntervalSet self, IntIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.equal')
+        cdef Py_ssize_t i, n
+        n = self.n_intervals
+        if n != other.n_intervals:
+            return False
+        for i in range(n):
+            if (IntInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                          other.lower_bounds[i], other.flags[i]) != 0 or 
+                IntInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                          other.upper_bounds[i], other.flags[i]) != 0):
+                return False
+        return True
+    
+    cpdef bool richcmp(IntIntervalSet self, IntIntervalSet other, int op):
+        if op == 0:
+            return self.subset(other) and not self.equal(other)
+        elif op == 1:
+            return self.subset(other)
+        elif op == 2:
+            return self.equal(other)
+        elif op == 3:
+            return not self.equal(other)
+        elif op == 4:
+            return other.subset(self) and not other.equal(self)
+        elif op == 5:
+            return other.subset(self)
+    
+    cpdef bool empty(IntIntervalSet self):
+        return self.n_intervals == 0 
+    
+    def to_arrays(IntIntervalSet self):
+        '''
+        Return (lower, upper, lower_closed, upper_closed, lower_bounded, upper_bounded), which 
+        are the arguments that from_arrays would take to construct self.  The lower and upper 
+        bounds are read-only memoryviews of int sharing the storage of self, so 
+        numpy.asarray wraps them without copying.  
+        The bound of an unbounded side is 0.  The flags are arrays of bytes 
+        which are 1 where true and 0 where false.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.to_arrays')
+        return (memoryview(self.storage[0]).toreadonly(), memoryview(self.storage[1]).toreadonly(), 
+                get_flags(self.flags, self.n_intervals, LOWER_CLOSED), 
+                get_flags(self.flags, self.n_intervals, UPPER_CLOSED), 
+                get_flags(self.flags, self.n_intervals, LOWER_BOUNDED), 
+                get_flags(self.flags, self.n_intervals, UPPER_BOUNDED))
+    
+    def __reduce_ex__(IntIntervalSet self, protocol):
+        # Pickle the storage as three buffers rather than as interval objects.  From protocol 5 
+        # the buffers are passed as PickleBuffers, so they can be sent out of band without 
+        # copying.
+        if protocol >= 5 and PickleBuffer is not None:
+            buffers = tuple(PickleBuffer(buffer) for buffer in self.storage)
+        else:
+            buffers = tuple(memoryview(buffer).tobytes() for buffer in self.storage)
+        return (IntIntervalSet_from_buffers, (self.n_intervals,) + buffers)
+    
+    def save(IntIntervalSet self, path):
+        '''
+        Write self to the file at path in the binary format read by load_interval_set.
+        '''
+        with open(path, 'wb') as outfile:
+            outfile.write(file_header.pack(file_magic, b'IntIntervalSet', sys.byteorder[0].encode(), 
+                                           sizeof(int), self.n_intervals))
+            for buffer in self.storage:
+                outfile.write(buffer)
+    
+    cpdef object measure(IntIntervalSet self):
+        '''
+        Return the total length of the intervals, or infinity if self is unbounded.  
+        For this type the elements are discrete, so this is the number of elements of self.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.measure')
+        cdef Py_ssize_t i, n = self.n_intervals
+        cdef uint64_t total = 0
+        cdef Py_ssize_t carries = 0
+        if n > 0 and not ((self.flags[0] & LOWER_BOUNDED) and (self.flags[n-1] & UPPER_BOUNDED)):
+            return INFINITY
+        with nogil:
+            for i in range(n):
+                IntInterval_add_length(&total, &carries, self.lower_bounds[i], self.upper_bounds[i], 
+                                           self.flags[i])
+        return IntInterval_count_to_py(total, carries)
+    
+    cpdef object intersection_measure(IntIntervalSet self, IntIntervalSet other):
+        '''
+        Return the measure of the intersection of self and other, without constructing it.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.intersection_measure')
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, lower_cmp, upper_cmp
+        cdef int new_lower_bound, new_upper_bound
+        cdef unsigned char new_flags
+        cdef uint64_t total = 0
+        cdef bint infinite = False
+        cdef Py_ssize_t carries = 0
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        with nogil:
+            while i < m and j < n:
+                cmp = IntInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                                  other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                if cmp == -1:
+                    i += 1
+                elif cmp == 1:
+                    j += 1
+                else:
+                    lower_cmp = IntInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                          other.lower_bounds[j], other.flags[j])
+                    upper_cmp = IntInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                                          other.upper_bounds[j], other.flags[j])
+                    if lower_cmp <= 0:
+                        new_lower_bound = other.lower_bounds[j]
+                        new_flags = other.flags[j] & LOWER_FLAGS
+                    else:
+                        new_lower_bound = self.lower_bounds[i]
+                        new_flags = self.flags[i] & LOWER_FLAGS
+                    if upper_cmp <= 0:
+                        new_upper_bound = self.upper_bounds[i]
+                        new_flags |= self.flags[i] & UPPER_FLAGS
+                    else:
+                        new_upper_bound = other.upper_bounds[j]
+                        new_flags |= other.flags[j] & UPPER_FLAGS
+                    if not ((new_flags & LOWER_BOUNDED) and (new_flags & UPPER_BOUNDED)):
+                        infinite = True
+                        break
+                    if not IntInterval_empty(new_lower_bound, new_upper_bound, new_flags):
+                        IntInterval_add_length(&total, &carries, new_lower_bound, new_upper_bound, new_flags)
+                    if upper_cmp <= 0:
+                        i += 1
+                    if upper_cmp >= 0:
+                        j += 1
+        if infinite:
+            return INFINITY
+        return IntInterval_count_to_py(total, carries)
+    
+    cpdef IntIntervalSet intersection(IntIntervalSet self, IntIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.intersection')
+        if self.empty():
+            return self
+        if other.empty():
+            return other
+        cdef IntIntervalSetBuilder builder = IntIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.intersection_into(other, builder)
+        return builder.build()
+    
+    cdef int intersection_into(IntIntervalSet self, IntIntervalSet other, 
+                               IntIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the intersection of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, lower_cmp, upper_cmp
+        cdef int new_lower_bound, new_upper_bound
+        cdef unsigned char new_flags
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        while i < m and j < n:
+            cmp = IntInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+            if cmp == -1:
+                i += 1
+            elif cmp == 1:
+                j += 1
+            else:
+                lower_cmp = IntInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.flags[j])
+                upper_cmp = IntInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                                      other.upper_bounds[j], other.flags[j])
+                if lower_cmp <= 0:
+                    new_lower_bound = other.lower_bounds[j]
+                    new_flags = other.flags[j] & LOWER_FLAGS
+                else:
+                    new_lower_bound = self.lower_bounds[i]
+                    new_flags = self.flags[i] & LOWER_FLAGS
+                if upper_cmp <= 0:
+                    new_upper_bound = self.upper_bounds[i]
+                    new_flags |= self.flags[i] & UPPER_FLAGS
+                else:
+                    new_upper_bound = other.upper_bounds[j]
+                    new_flags |= other.flags[j] & UPPER_FLAGS
+                # For types with adjacent elements the overlap may still be empty
+                if not IntInterval_empty(new_lower_bound, new_upper_bound, new_flags):
+                    builder.append(new_lower_bound, new_upper_bound, new_flags)
+                if upper_cmp <= 0:
+                    i += 1
+                if upper_cmp >= 0:
+                    j += 1
+        return 0
+    
+    cpdef IntIntervalSet union(IntIntervalSet self, IntIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.union')
+        if self.empty():
+            return other
+        if other.empty():
+            return self
+        cdef IntIntervalSetBuilder builder = IntIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.union_into(other, builder)
+        return builder.build()
+    
+    cdef int union_into(IntIntervalSet self, IntIntervalSet other, 
+                        IntIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the union of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        while i < m or j < n:
+            if j == n or (i < m and 
+                          IntInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                    other.lower_bounds[j], other.flags[j]) <= 0):
+                builder.merge(self.lower_bounds[i], self.upper_bounds[i], self.flags[i])
+                i += 1
+            else:
+                builder.merge(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                j += 1
+        return 0
+    
+    cpdef IntIntervalSet complement(IntIntervalSet self):
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.complement')
+        cdef IntIntervalSetBuilder builder
+        if self.empty():
+            builder = IntIntervalSetBuilder(1)
+            builder.append(0, 0, LOWER_CLOSED | UPPER_CLOSED)
+            return builder.build()
+        cdef Py_ssize_t i
+        cdef Py_ssize_t n = self.n_intervals
+        cdef unsigned char flags
+        builder = IntIntervalSetBuilder(n + 1)
+        if self.flags[0] & LOWER_BOUNDED:
+            builder.append(0, self.lower_bounds[0], 
+                           LOWER_CLOSED | UPPER_BOUNDED | (0 if self.flags[0] & LOWER_CLOSED else UPPER_CLOSED))
+        for i in range(1, n):
+            # For types with adjacent elements the gap between two intervals may be empty
+            flags = (LOWER_BOUNDED | UPPER_BOUNDED | 
+                     (0 if self.flags[i-1] & UPPER_CLOSED else LOWER_CLOSED) | 
+                     (0 if self.flags[i] & LOWER_CLOSED else UPPER_CLOSED))
+            if not IntInterval_empty(self.upper_bounds[i-1], self.lower_bounds[i], flags):
+                builder.append(self.upper_bounds[i-1], self.lower_bounds[i], flags)
+        if self.flags[n-1] & UPPER_BOUNDED:
+            builder.append(self.upper_bounds[n-1], 0, 
+                           UPPER_CLOSED | LOWER_BOUNDED | (0 if self.flags[n-1] & UPPER_CLOSED else LOWER_CLOSED))
+        return builder.build()
+            
+    cpdef IntIntervalSet symmetric_difference(IntIntervalSet self, IntIntervalSet other):
+        '''
+        Return the set of elements in exactly one of self and other, computed in a single sweep 
+        over both.  At each step the remaining parts of the current intervals of self and other 
+        are compared, and whatever lies before the start or after the end of their overlap is 
+        kept.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.symmetric_difference')
+        if self.empty():
+            return other
+        if other.empty():
+            return self
+        cdef IntIntervalSetBuilder builder = IntIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.symmetric_difference_into(other, builder)
+        return builder.build()
+    
+    cdef int symmetric_difference_into(IntIntervalSet self, IntIntervalSet other, 
+                                       IntIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the symmetric difference of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, upper_cmp
+        cdef int lower1, upper1, lower2, upper2
+        cdef unsigned char lower_flags1, upper_flags1, lower_flags2, upper_flags2
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        lower1 = self.lower_bounds[0]
+        lower_flags1 = self.flags[0] & LOWER_FLAGS
+        lower2 = other.lower_bounds[0]
+        lower_flags2 = other.flags[0] & LOWER_FLAGS
+        while i < m and j < n:
+            upper1 = self.upper_bounds[i]
+            upper_flags1 = self.flags[i] & UPPER_FLAGS
+            upper2 = other.upper_bounds[j]
+            upper_flags2 = other.flags[j] & UPPER_FLAGS
+            cmp = IntInterval_overlap_cmp(lower1, upper1, lower_flags1 | upper_flags1, 
+                                              lower2, upper2, lower_flags2 | upper_flags2)
+            if cmp == -1:
+                builder.merge(lower1, upper1, lower_flags1 | upper_flags1)
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+                continue
+            elif cmp == 1:
+                builder.merge(lower2, upper2, lower_flags2 | upper_flags2)
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+                continue
+            
+            # Keep whatever precedes the overlap
+            cmp = IntInterval_lower_cmp(lower1, lower_flags1, lower2, lower_flags2)
+            if cmp < 0:
+                builder.merge(lower1, lower2, lower_flags1 | UPPER_BOUNDED | 
+                              (0 if lower_flags2 & LOWER_CLOSED else UPPER_CLOSED))
+            elif cmp > 0:
+                builder.merge(lower2, lower1, lower_flags2 | UPPER_BOUNDED | 
+                              (0 if lower_flags1 & LOWER_CLOSED else UPPER_CLOSED))
+            
+            # Whatever follows the overlap remains to be compared with later intervals
+            upper_cmp = IntInterval_upper_cmp(upper1, upper_flags1, upper2, upper_flags2)
+            if upper_cmp < 0:
+                lower2 = upper1
+                lower_flags2 = LOWER_BOUNDED | (0 if upper_flags1 & UPPER_CLOSED else LOWER_CLOSED)
+            elif upper_cmp > 0:
+                lower1 = upper2
+                lower_flags1 = LOWER_BOUNDED | (0 if upper_flags2 & UPPER_CLOSED else LOWER_CLOSED)
+            if upper_cmp <= 0:
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+            if upper_cmp >= 0:
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+        while i < m:
+            builder.merge(lower1, self.upper_bounds[i], lower_flags1 | (self.flags[i] & UPPER_FLAGS))
+            i += 1
+            if i < m:
+                lower1 = self.lower_bounds[i]
+                lower_flags1 = self.flags[i] & LOWER_FLAGS
+        while j < n:
+            builder.merge(lower2, other.upper_bounds[j], lower_flags2 | (other.flags[j] & UPPER_FLAGS))
+            j += 1
+            if j < n:
+                lower2 = other.lower_bounds[j]
+                lower_flags2 = other.flags[j] & LOWER_FLAGS
+        return 0
+    
+    cpdef IntIntervalSet minus(IntIntervalSet self, IntIntervalSet other):
+        '''
+        Subtract other from self in a single sweep over both, cutting each interval of self 
+        at the intervals of other that overlap it.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalSet.minus')
+        if self.empty() or other.empty():
+            return self
+        cdef IntIntervalSetBuilder builder = IntIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.minus_into(other, builder)
+        return builder.build()
+    
+    cdef int minus_into(IntIntervalSet self, IntIntervalSet other, 
+                        IntIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append self minus other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp
+        cdef int lower, upper
+        cdef unsigned char lower_flags, upper_flags, piece_flags
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        # The part of the interval i of self that remains to be cut runs from lower to upper
+        lower = self.lower_bounds[0]
+        lower_flags = self.flags[0] & LOWER_FLAGS
+        while i < m:
+            upper = self.upper_bounds[i]
+            upper_flags = self.flags[i] & UPPER_FLAGS
+            cmp = -1
+            while j < n:
+                cmp = IntInterval_overlap_cmp(lower, upper, lower_flags | upper_flags, 
+                                                  other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                if cmp != 1:
+                    break
+                j += 1
+            if j == n or cmp == -1:
+                # Nothing left in other overlaps the remaining part
+                if not IntInterval_empty(lower, upper, lower_flags | upper_flags):
+                    builder.append(lower, upper, lower_flags | upper_flags)
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+                continue
+            if IntInterval_lower_cmp(lower, lower_flags, other.lower_bounds[j], other.flags[j]) < 0:
+                piece_flags = (lower_flags | UPPER_BOUNDED | 
+                               (0 if other.flags[j] & LOWER_CLOSED else UPPER_CLOSED))
+                if not IntInterval_empty(lower, other.lower_bounds[j], piece_flags):
+                    builder.append(lower, other.lower_bounds[j], piece_flags)
+            if IntInterval_upper_cmp(upper, upper_flags, other.upper_bounds[j], other.flags[j]) > 0:
+                lower = other.upper_bounds[j]
+                lower_flags = LOWER_BOUNDED | (0 if other.flags[j] & UPPER_CLOSED else LOWER_CLOSED)
+                j += 1
+            else:
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+        return 0
+cdef inline int IntIntervalSet_cursor_cmp(list sets, Py_ssize_t *positions, Py_ssize_t a, 
+                                              Py_ssize_t b, bint by_upper) except? -2:
+    cdef IntIntervalSet first = sets[a]
+    cdef IntIntervalSet second = sets[b]
+    if by_upper:
+        return IntInterval_upper_cmp(first.upper_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.upper_bounds[positions[b]], second.flags[positions[b]])
+    else:
+        return IntInterval_lower_cmp(first.lower_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.lower_bounds[positions[b]], second.flags[positions[b]])
+
+cdef int IntIntervalSet_sift_down(list sets, Py_ssize_t *positions, Py_ssize_t *heap, 
+                                     Py_ssize_t size, Py_ssize_t index, bint by_upper) except -1:
+    '''
+    Restore the heap property below index in a min-heap of indices into sets, ordered by the 
+    lower (or upper) bound of the interval at which each set's cursor in positions points.
+    '''
+    cdef Py_ssize_t child, top
+    while True:
+        child = 2 * index + 1
+        if child >= size:
+            return 0
+        if (child + 1 < size and 
+            IntIntervalSet_cursor_cmp(sets, positions, heap[child + 1], heap[child], by_upper) < 0):
+            child += 1
+        if IntIntervalSet_cursor_cmp(sets, positions, heap[child], heap[index], by_upper) >= 0:
+            return 0
+        top = heap[index]
+        heap[index] = heap[child]
+        heap[child] = top
+        index = child
+
+def IntIntervalSet_from_buffers(Py_ssize_t n, lower, upper, flags):
+    '''
+    Construct an IntIntervalSet of n intervals whose storage is the given buffers of lower 
+    bounds, upper bounds and flags in native byte order, without copying them.  This is used 
+    to load interval set files and to unpickle typed interval sets.
+    '''
+    cdef IntIntervalSet result = IntIntervalSet.__new__(IntIntervalSet)
+    cdef const int[:] lower_view = memoryview(lower).cast('B').cast('i')
+    cdef const int[:] upper_view = memoryview(upper).cast('B').cast('i')
+    cdef const unsigned char[:] flags_view = memoryview(flags).cast('B')
+    if lower_view.shape[0] != n or upper_view.shape[0] != n or flags_view.shape[0] != n:
+        raise ValueError('Expected buffers of %d intervals' % n)
+    result.storage = (lower_view.base, upper_view.base, flags_view.base)
+    result.n_intervals = n
+    if n > 0:
+        result.lower_bounds = <int *> &lower_view[0]
+        result.upper_bounds = <int *> &upper_view[0]
+        result.flags = <unsigned char *> &flags_view[0]
+    return result
+
+cpdef IntIntervalSet IntIntervalSet_union_all(list sets):
+    '''
+    Return the union of all the given sets, merging them all at once with a heap ordered by 
+    the lower bound of each set's next interval.
+    '''
+    cdef OperationTimer timer = OperationTimer('IntIntervalSet_union_all')
+    cdef IntIntervalSet interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    sets = [interval_set for interval_set in sets if not interval_set.empty()]
+    k = len(sets)
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        total += interval_set.n_intervals
+    cdef IntIntervalSetBuilder builder = IntIntervalSetBuilder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            IntIntervalSet_sift_down(sets, positions, heap, size, i, False)
+        while size > 0:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(interval_set.lower_bounds[positions[i]], interval_set.upper_bounds[positions[i]], 
+                          interval_set.flags[positions[i]])
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                size -= 1
+                heap[0] = heap[size]
+            IntIntervalSet_sift_down(sets, positions, heap, size, 0, False)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cpdef IntIntervalSet IntIntervalSet_intersection_all(list sets):
+    '''
+    Return the intersection of all the given sets in a single sweep over all of them.  The 
+    intersection of the current intervals of the sets runs from the greatest of their lower 
+    bounds to the least of their upper bounds, which is found with a heap.  The set whose 
+    current interval ends first is then advanced.
+    '''
+    cdef OperationTimer timer = OperationTimer('IntIntervalSet_intersection_all')
+    cdef IntIntervalSet interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    cdef int lower
+    cdef unsigned char lower_flags
+    k = len(sets)
+    if k == 0:
+        return IntIntervalSet(()).complement()
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        if interval_set.empty():
+            return interval_set
+        total += interval_set.n_intervals
+    interval_set = sets[0]
+    lower = interval_set.lower_bounds[0]
+    lower_flags = interval_set.flags[0] & LOWER_FLAGS
+    cdef IntIntervalSetBuilder builder = IntIntervalSetBuilder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+            interval_set = sets[i]
+            if IntInterval_lower_cmp(interval_set.lower_bounds[0], interval_set.flags[0], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[0]
+                lower_flags = interval_set.flags[0] & LOWER_FLAGS
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            IntIntervalSet_sift_down(sets, positions, heap, size, i, True)
+        while True:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(lower, interval_set.upper_bounds[positions[i]], 
+                          lower_flags | (interval_set.flags[positions[i]] & UPPER_FLAGS))
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                break
+            if IntInterval_lower_cmp(interval_set.lower_bounds[positions[i]], interval_set.flags[positions[i]], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[positions[i]]
+                lower_flags = interval_set.flags[positions[i]] & LOWER_FLAGS
+            IntIntervalSet_sift_down(sets, positions, heap, size, 0, True)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cdef class MutableIntIntervalSet:
+    '''
+    A set of disjoint IntIntervals that can be changed in place.  The intervals are kept 
+    sorted in a list of blocks of bounded size, so that adding or discarding an interval 
+    takes O(log(n)) comparisons and moves O(block_size) intervals, plus the cost of removing 
+    any intervals it absorbs.  Queries other than contains are answered by an immutable 
+    snapshot, which is cached until the next change.
+    '''
+    def __init__(MutableIntIntervalSet self, tuple intervals=()):
+        self.reset(IntIntervalSet_from_intervals(intervals))
+    
+    cdef int reset(MutableIntIntervalSet self, IntIntervalSet interval_set) except -1:
+        '''
+        Replace the contents of self with those of interval_set.
+        '''
+        cdef Py_ssize_t i, start
+        cdef IntIntervalSetBuilder block
+        self.blocks = []
+        for start in range(0, max(interval_set.n_intervals, 1), block_size):
+            block = IntIntervalSetBuilder(block_size)
+            for i in range(start, min(start + block_size, interval_set.n_intervals)):
+                block.append(interval_set.lower_bounds[i], interval_set.upper_bounds[i], 
+                             interval_set.flags[i])
+            self.blocks.append(block)
+        self.n_intervals = interval_set.n_intervals
+        self.frozen = interval_set
+        return 0
+    
+    cpdef IntIntervalSet freeze(MutableIntIntervalSet self):
+        '''
+        Return an immutable IntIntervalSet with the same intervals as self.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableIntIntervalSet.freeze')
+        cdef IntIntervalSetBuilder block, builder
+        cdef Py_ssize_t i
+        if self.frozen is None:
+            builder = IntIntervalSetBuilder(self.n_intervals)
+            for block in self.blocks:
+                for i in range(block.size):
+                    builder.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            self.frozen = builder.build()
+        return self.frozen
+    
+    cdef int search(MutableIntIntervalSet self, int lower, int upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1:
+        '''
+        Find the first interval that does not lie entirely below the query interval, or, if 
+        after is true, the first that lies entirely above it, counting intervals that only 
+        touch it as overlapping if touching is true.  Store its block and position in the 
+        block, which are the last block and its size if there is no such interval.
+        '''
+        cdef IntIntervalSetBuilder block
+        cdef Py_ssize_t low = 0, high = len(self.blocks) - 1, i
+        while low < high:
+            i = (low + high) / 2
+            block = self.blocks[i]
+            if MutableIntIntervalSet_passed(block, block.size - 1, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        block = self.blocks[low]
+        block_index[0] = low
+        low = 0
+        high = block.size
+        while low < high:
+            i = (low + high) / 2
+            if MutableIntIntervalSet_passed(block, i, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        position[0] = low
+        return 0
+    
+    cdef int replace(MutableIntIntervalSet self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, IntIntervalSetBuilder replacement) except -1:
+        '''
+        Replace the intervals from position first in block first_block up to, but not including, 
+        position last in block last_block with the intervals in replacement.
+        '''
+        cdef IntIntervalSetBuilder block = self.blocks[first_block]
+        cdef IntIntervalSetBuilder other
+        cdef Py_ssize_t i, j, removed = 0
+        if first_block == last_block:
+            removed = last - first
+            block.remove(first, last)
+        else:
+            removed = block.size - first
+            block.remove(first, block.size)
+            for i in range(first_block + 1, last_block):
+                removed += (<IntIntervalSetBuilder> self.blocks[i]).size
+            other = self.blocks[last_block]
+            removed += last
+            other.remove(0, last)
+            del self.blocks[first_block + 1:last_block]
+        for i in range(replacement.size):
+            block.insert(first + i, replacement.lower_bounds[i], replacement.upper_bounds[i], 
+                         replacement.flags[i])
+        self.n_intervals += replacement.size - removed
+        self.frozen = None
+        # Keep the sizes of the changed blocks within bounds
+        if block.size > 2 * block_size:
+            other = IntIntervalSetBuilder(block_size)
+            for i in range(block.size / 2, block.size):
+                other.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            block.remove(block.size / 2, block.size)
+            self.blocks.insert(first_block + 1, other)
+        for i in (first_block + 1, first_block, first_block - 1):
+            if i >= 0 and i + 1 < len(self.blocks):
+                block = self.blocks[i]
+                other = self.blocks[i + 1]
+                if ((block.size < block_size / 4 or other.size < block_size / 4) and 
+                    block.size + other.size <= 2 * block_size):
+                    for j in range(other.size):
+                        block.append(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                    del self.blocks[i + 1]
+        return 0
+    
+    cpdef add(MutableIntIntervalSet self, IntInterval interval):
+        '''
+        Add the elements of interval to self, fusing it with any intervals it overlaps or 
+        touches.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableIntIntervalSet.add')
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef IntIntervalSetBuilder block
+        cdef IntIntervalSetBuilder replacement = IntIntervalSetBuilder(1)
+        cdef int lower = interval.lower_bound
+        cdef int upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        if IntInterval_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, True, &first_block, &first)
+        self.search(lower, upper, flags, True, True, &last_block, &last)
+        replacement.append(lower, upper, flags)
+        if first_block != last_block or first != last:
+            # Fuse with the first and last of the intervals being replaced
+            block = self.blocks[first_block]
+            replacement.merge(block.lower_bounds[first], block.upper_bounds[first], block.flags[first])
+            block = self.blocks[last_block if last > 0 else last_block - 1]
+            i = (last if last > 0 else block.size) - 1
+            replacement.merge(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef discard(MutableIntIntervalSet self, IntInterval interval):
+        '''
+        Remove the elements of interval from self, splitting any interval that extends past it.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableIntIntervalSet.discard')
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef IntIntervalSetBuilder block
+        cdef IntIntervalSetBuilder replacement = IntIntervalSetBuilder(2)
+        cdef int lower = interval.lower_bound
+        cdef int upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        cdef unsigned char piece_flags
+        if IntInterval_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, False, &first_block, &first)
+        self.search(lower, upper, flags, True, False, &last_block, &last)
+        if first_block == last_block and first == last:
+            return
+        block = self.blocks[first_block]
+        if flags & LOWER_BOUNDED:
+            # The part of the first overlapping interval below interval
+            piece_flags = ((block.flags[first] & LOWER_FLAGS) | UPPER_BOUNDED | 
+                           (0 if flags & LOWER_CLOSED else UPPER_CLOSED))
+            if not IntInterval_empty(block.lower_bounds[first], lower, piece_flags):
+                replacement.append(block.lower_bounds[first], lower, piece_flags)
+        block = self.blocks[last_block if last > 0 else last_block - 1]
+        i = (last if last > 0 else block.size) - 1
+        if flags & UPPER_BOUNDED:
+            # The part of the last overlapping interval above interval
+            piece_flags = ((block.flags[i] & UPPER_FLAGS) | LOWER_BOUNDED | 
+                           (0 if flags & UPPER_CLOSED else LOWER_CLOSED))
+            if not IntInterval_empty(upper, block.upper_bounds[i], piece_flags):
+                replacement.append(upper, block.upper_bounds[i], piece_flags)
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef bool contains(MutableIntIntervalSet self, int item):
+        cdef OperationTimer timer = OperationTimer('MutableIntIntervalSet.contains')
+        cdef int value = item
+        cdef Py_ssize_t block_index, position
+        cdef IntIntervalSetBuilder block
+        self.search(value, value, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                    False, False, &block_index, &position)
+        block = self.blocks[block_index]
+        return position < block.size and IntInterval_containment_cmp(block.lower_bounds[position], 
+                                                                         block.upper_bounds[position], 
+                                                                         block.flags[position], value) == 0
+    
+    def __contains__(MutableIntIntervalSet self, item):
+        return self.contains(item)
+    
+    def __ior__(MutableIntIntervalSet self, other):
+        cdef IntInterval interval
+        for interval in other:
+            self.add(interval)
+        return self
+    
+    def __isub__(MutableIntIntervalSet self, other):
+        cdef IntInterval interval
+        for interval in other:
+            self.discard(interval)
+        return self
+    
+    def __iand__(MutableIntIntervalSet self, other):
+        cdef IntIntervalSet interval_set
+        if isinstance(other, MutableIntIntervalSet):
+            interval_set = (<MutableIntIntervalSet> other).freeze()
+        elif isinstance(other, IntIntervalSet):
+            interval_set = other
+        else:
+            # Any other iterable of intervals, as for |= and -=
+            interval_set = IntIntervalSet_from_intervals(tuple(other))
+        # Discarding the complement would leave gaps holding no element of a discrete type 
+        # inside the remaining intervals, so the intersection is rebuilt as a whole
+        self.reset(self.freeze().intersection(interval_set))
+        return self
+    
+    def __richcmp__(MutableIntIntervalSet self, other, int op):
+        if isinstance(other, MutableIntIntervalSet):
+            other = (<MutableIntIntervalSet> other).freeze()
+        return PyObject_RichCompare(self.freeze(), other, op)
+    
+    __hash__ = None
+    
+    def __reduce__(MutableIntIntervalSet self):
+        return (self.__class__, (self.intervals,))
+    
+    def __iter__(MutableIntIntervalSet self):
+        return iter(self.freeze())
+    
+    def __str__(MutableIntIntervalSet self):
+        return str(self.freeze())
+    
+    def __repr__(MutableIntIntervalSet self):
+        return str(self)
+    
+    def __nonzero__(MutableIntIntervalSet self):
+        return self.n_intervals > 0
+    
+    @property
+    def intervals(MutableIntIntervalSet self):
+        return self.freeze().intervals
+    
+    def empty(MutableIntIntervalSet self):
+        return self.n_intervals == 0
+    
+    def lower_bounded(MutableIntIntervalSet self):
+        return self.freeze().lower_bounded()
+    
+    def upper_bounded(MutableIntIntervalSet self):
+        return self.freeze().upper_bounded()
+    
+    def lower_bound(MutableIntIntervalSet self):
+        return self.freeze().lower_bound()
+    
+    def upper_bound(MutableIntIntervalSet self):
+        return self.freeze().upper_bound()
+    
+    def contains_many(MutableIntIntervalSet self, points):
+        return self.freeze().contains_many(points)
+    
+    def locate(MutableIntIntervalSet self, points):
+        return self.freeze().locate(points)
+    
+    def subset(MutableIntIntervalSet self, other):
+        if isinstance(other, MutableIntIntervalSet):
+            other = (<MutableIntIntervalSet> other).freeze()
+        return self.freeze().subset(other)
+    
+    def measure(MutableIntIntervalSet self):
+        return self.freeze().measure()
+    
+    def intersection_measure(MutableIntIntervalSet self, other):
+        if isinstance(other, MutableIntIntervalSet):
+            other = (<MutableIntIntervalSet> other).freeze()
+        return self.freeze().intersection_measure(other)
+
+cdef inline bint MutableIntIntervalSet_passed(IntIntervalSetBuilder block, Py_ssize_t i, 
+                                                  int lower, int upper, unsigned char flags, 
+                                                  bint after, bint touching):
+    '''
+    Return whether interval i of block is not entirely below the query interval or, if after 
+    is true, whether it is entirely above it.  If touching is true, intervals that touch 
+    the query interval without overlapping it count as overlapping it.
+    '''
+    cdef int cmp = IntInterval_overlap_cmp(block.lower_bounds[i], block.upper_bounds[i], block.flags[i], 
+                                               lower, upper, flags)
+    if after:
+        return cmp == 1 and not (touching and block.lower_bounds[i] == upper and (flags & UPPER_BOUNDED) and 
+                                 (block.flags[i] & LOWER_BOUNDED) and 
+                                 ((block.flags[i] & LOWER_CLOSED) or (flags & UPPER_CLOSED)))
+    else:
+        return cmp != -1 or (touching and block.upper_bounds[i] == lower and (flags & LOWER_BOUNDED) and 
+                             (block.flags[i] & UPPER_BOUNDED) and 
+                             ((block.flags[i] & UPPER_CLOSED) or (flags & LOWER_CLOSED)))
+
+cdef class IntIntervalIndex:
+    '''
+    A static collection of IntIntervals, which may overlap and are identified by their 
+    position in the sequence the index was built from.  Queries return arrays of these 
+    positions in increasing order.  Intervals are sorted by lower bound, and an implicit 
+    binary tree over the sorted order records the interval with the greatest upper bound 
+    in each subtree, so the k intervals overlapping a query are found in O((k + 1) log(n)) 
+    time.
+    '''
+    def __init__(IntIntervalIndex self, tuple intervals):
+        cdef OperationTimer timer = OperationTimer('IntIntervalIndex.__init__')
+        cdef IntInterval interval
+        cdef IntIntervalSetBuilder raw = IntIntervalSetBuilder(len(intervals))
+        for interval in intervals:
+            raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        self.index(raw)
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True):
+        '''
+        Construct an IntIntervalIndex from arrays of bounds and flags, which are 
+        interpreted as in IntIntervalSet.from_arrays.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalIndex.from_arrays')
+        cdef IntIntervalIndex result = IntIntervalIndex.__new__(IntIntervalIndex)
+        result.index(IntIntervalSet_raw_from_arrays(lower, upper, lower_closed, upper_closed, 
+                                                        lower_bounded, upper_bounded))
+        return result
+    
+    cdef int index(IntIntervalIndex self, IntIntervalSetBuilder raw) except -1:
+        '''
+        Sort the intervals accumulated in raw and build the tree over them.
+        '''
+        cdef Py_ssize_t i, k, n = raw.size
+        cdef Py_ssize_t left, right
+        cdef IntIntervalSetBuilder builder = IntIntervalSetBuilder(n)
+        self.order_array = clone(index_template, n, False)
+        self.order = index_data(self.order_array)
+        cdef IntIntervalRecord *records = <IntIntervalRecord *> PyMem_Malloc(n * sizeof(IntIntervalRecord))
+        if records == NULL and n > 0:
+            raise MemoryError()
+        try:
+            for i in range(n):
+                records[i].lower = raw.lower_bounds[i]
+                records[i].upper = raw.upper_bounds[i]
+                records[i].flags = raw.flags[i]
+                records[i].index = i
+            qsort(records, n, sizeof(IntIntervalRecord), IntInterval_record_cmp)
+            for i in range(n):
+                builder.append(records[i].lower, records[i].upper, records[i].flags)
+                self.order[i] = records[i].index
+        finally:
+            PyMem_Free(records)
+        # The sorted intervals are kept in the storage of an IntIntervalSet, although unlike 
+        # those of a set they may be empty or overlap
+        self.sorted_intervals = builder.build()
+        self.n_intervals = n
+        self.leaves = 1
+        while self.leaves < n:
+            self.leaves *= 2
+        self.tree_array = clone(index_template, 2 * self.leaves, False)
+        self.tree = index_data(self.tree_array)
+        # Empty intervals are left out of the tree, so they are never found
+        for i in range(self.leaves):
+            if i < n and not IntInterval_empty(self.sorted_intervals.lower_bounds[i], 
+                                                   self.sorted_intervals.upper_bounds[i], 
+                                                   self.sorted_intervals.flags[i]):
+                self.tree[self.leaves + i] = i
+            else:
+                self.tree[self.leaves + i] = -1
+        for i in range(self.leaves - 1, 0, -1):
+            left = self.tree[2 * i]
+            right = self.tree[2 * i + 1]
+            if left < 0 or (right >= 0 and 
+                            IntInterval_upper_cmp(self.sorted_intervals.upper_bounds[right], 
+                                                      self.sorted_intervals.flags[right], 
+                                                      self.sorted_intervals.upper_bounds[left], 
+                                                      self.sorted_intervals.flags[left]) > 0):
+                self.tree[i] = right
+            else:
+                self.tree[i] = left
+        return 0
+    
+    def __len__(IntIntervalIndex self):
+        return self.n_intervals
+    
+    @property
+    def intervals(IntIntervalIndex self):
+        '''
+        The indexed intervals, in the order the index was built from.
+        '''
+        cdef Py_ssize_t i
+        cdef list result
+        if self.cached_intervals is None:
+            result = [None] * self.n_intervals
+            for i, interval in enumerate(self.sorted_intervals.intervals):
+                result[self.order[i]] = interval
+            self.cached_intervals = tuple(result)
+        return self.cached_intervals
+    
+    def __reduce__(IntIntervalIndex self):
+        return (self.__class__, (self.intervals,))
+    
+    def __str__(IntIntervalIndex self):
+        return 'IntIntervalIndex(%s)' % ', '.join(map(str, self.intervals))
+    
+    def __repr__(IntIntervalIndex self):
+        return str(self)
+    
+    cdef Py_ssize_t end(IntIntervalIndex self, int upper, unsigned char flags):
+        '''
+        Use binary search to find the number of intervals, in sorted order, that do not lie 
+        entirely above the upper bound of the query.
+        '''
+        cdef Py_ssize_t i, low = 0, high = self.n_intervals
+        cdef IntIntervalSet intervals = self.sorted_intervals
+        while low < high:
+            i = (low + high) / 2
+            # Masking the flags restricts overlap_cmp to the lower bound of the interval 
+            # and the upper bound of the query
+            if IntInterval_overlap_cmp(intervals.lower_bounds[i], intervals.upper_bounds[i], 
+                                           intervals.flags[i] & LOWER_FLAGS, upper, upper, 
+                                           flags & UPPER_FLAGS) == 1:
+                high = i
+            else:
+                low = i + 1
+        return low
+    
+    cdef int collect(IntIntervalIndex self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, int lower, int upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals under node, among the first end in 
+        sorted order, that do not lie entirely below the lower bound of the query and share 
+        an element with it.  Subtrees whose greatest upper bound lies below the query are 
+        skipped.
+        '''
+        cdef Py_ssize_t k, middle
+        cdef IntIntervalSet intervals = self.sorted_intervals
+        if node_start >= end:
+            return 0
+        k = self.tree[node]
+        if k < 0 or IntInterval_overlap_cmp(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                intervals.flags[k] & UPPER_FLAGS, lower, lower, 
+                                                flags & LOWER_FLAGS) == -1:
+            return 0
+        if node_stop - node_start == 1:
+            # Bounds that interleave may still leave no element in common
+            if not IntInterval_intersection_empty(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                      intervals.flags[k], lower, upper, flags):
+                append_index(result, size, self.order[k])
+            return 0
+        middle = (node_start + node_stop) / 2
+        self.collect(2 * node, node_start, middle, end, lower, upper, flags, result, size)
+        self.collect(2 * node + 1, middle, node_stop, end, lower, upper, flags, result, size)
+        return 0
+    
+    cdef int query(IntIntervalIndex self, int lower, int upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals that overlap the query interval, in 
+        increasing order.
+        '''
+        cdef Py_ssize_t start = size[0]
+        if IntInterval_empty(lower, upper, flags):
+            return 0
+        self.collect(1, 0, self.leaves, self.end(upper, flags), lower, upper, flags, result, size)
+        qsort(index_data(result) + start, size[0] - start, sizeof(Py_ssize_t), index_cmp)
+        return 0
+    
+    cpdef array stab(IntIntervalIndex self, int point):
+        '''
+        Return the positions of the intervals containing point.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalIndex.stab')
+        cdef int item = point
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(item, item, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, result, &size)
+        resize(result, size)
+        return result
+    
+    cpdef array overlap(IntIntervalIndex self, IntInterval interval):
+        '''
+        Return the positions of the intervals that overlap interval.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalIndex.overlap')
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+        resize(result, size)
+        return result
+    
+    def stab_many(IntIntervalIndex self, points):
+        '''
+        Stab the index with each of points.  Return a pair of arrays of equal length, the 
+        first holding positions in points and the second the positions of the intervals 
+        containing them, ordered by position in points and then by interval position.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalIndex.stab_many')
+        cdef const int[:] items = IntIntervalSet_values(points)
+        cdef Py_ssize_t n = items.shape[0]
+        cdef Py_ssize_t i, start, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for i in range(n):
+            start = size
+            self.query(items[i], items[i], LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                       result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+    
+    def overlap_many(IntIntervalIndex self, intervals):
+        '''
+        Query the index with each of intervals, which may be any iterable of IntIntervals 
+        such as an IntIntervalSet.  Return a pair of arrays as in stab_many.
+        '''
+        cdef OperationTimer timer = OperationTimer('IntIntervalIndex.overlap_many')
+        cdef IntInterval interval
+        cdef Py_ssize_t i = 0, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for interval in intervals:
+            self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+            i += 1
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+
+
+cdef int IntInterval_sweep_step(int * lower1, int * upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                     Py_ssize_t i, int * lower2, int * upper2, unsigned char *flags2, 
+                                     Py_ssize_t *order2, Py_ssize_t *active2, Py_ssize_t *n_active2, bint swapped, 
+                                     IndexPairs *pairs) except -1 nogil:
+    '''
+    Pair interval i of the first side with each active interval of the second side that 
+    does not lie entirely below it, and drop those that do from the active intervals.  The 
+    active intervals all have lower bounds not greater than that of interval i, so they 
+    overlap it unless they lie below it, and then they lie below all later intervals too.
+    '''
+    cdef Py_ssize_t k, j, kept = 0
+    for k in range(n_active2[0]):
+        j = active2[k]
+        # Masking the flags restricts overlap_cmp to the upper bound of the active interval and 
+        # the lower bound of interval i
+        if IntInterval_overlap_cmp(lower2[j], upper2[j], flags2[j] & UPPER_FLAGS, 
+                                       lower1[i], upper1[i], flags1[i] & LOWER_FLAGS) != -1:
+            # Bounds that interleave may still leave no element in common
+            if not IntInterval_intersection_empty(lower1[i], upper1[i], flags1[i], 
+                                                      lower2[j], upper2[j], flags2[j]):
+                if swapped:
+                    append_pair(pairs, order2[j], order1[i])
+                else:
+                    append_pair(pairs, order1[i], order2[j])
+            active2[kept] = j
+            kept += 1
+    n_active2[0] = kept
+    return 0
+
+cdef int IntInterval_sweep(int * lower1, int * upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                Py_ssize_t n1, int * lower2, int * upper2, unsigned char *flags2, 
+                                Py_ssize_t *order2, Py_ssize_t n2, Py_ssize_t *active1, Py_ssize_t *active2, 
+                                IndexPairs *pairs) except -1 nogil:
+    '''
+    Merge two sequences of intervals sorted by lower bound, keeping for each side the 
+    intervals that may still overlap later intervals of the other side.
+    '''
+    cdef Py_ssize_t i = 0, j = 0, n_active1 = 0, n_active2 = 0
+    while i < n1 or j < n2:
+        if j == n2 or (i < n1 and IntInterval_lower_cmp(lower1[i], flags1[i], lower2[j], flags2[j]) <= 0):
+            if not IntInterval_empty(lower1[i], upper1[i], flags1[i]):
+                IntInterval_sweep_step(lower1, upper1, flags1, order1, i, lower2, upper2, flags2, 
+                                           order2, active2, &n_active2, False, pairs)
+                active1[n_active1] = i
+                n_active1 += 1
+            i += 1
+        else:
+            if not IntInterval_empty(lower2[j], upper2[j], flags2[j]):
+                IntInterval_sweep_step(lower2, upper2, flags2, order2, j, lower1, upper1, flags1, 
+                                           order1, active1, &n_active1, True, pairs)
+                active2[n_active2] = j
+                n_active2 += 1
+            j += 1
+    return 0
+
+cpdef tuple IntInterval_overlap_join(IntIntervalIndex left, IntIntervalIndex right):
+    '''
+    Return a pair of arrays holding the positions in left and in right of every pair of 
+    overlapping intervals, in no particular order.
+    '''
+    cdef OperationTimer timer = OperationTimer('IntInterval_overlap_join')
+    cdef IntIntervalSet left_intervals = left.sorted_intervals
+    cdef IntIntervalSet right_intervals = right.sorted_intervals
+    cdef IndexPairs pairs
+    pairs.first = NULL
+    pairs.second = NULL
+    pairs.size = 0
+    pairs.capacity = 0
+    cdef Py_ssize_t *active = <Py_ssize_t *> PyMem_Malloc((left.n_intervals + right.n_intervals) * sizeof(Py_ssize_t))
+    if active == NULL and left.n_intervals + right.n_intervals > 0:
+        raise MemoryError()
+    try:
+        with nogil:
+            IntInterval_sweep(left_intervals.lower_bounds, left_intervals.upper_bounds, 
+                                  left_intervals.flags, left.order, left.n_intervals, 
+                                  right_intervals.lower_bounds, right_intervals.upper_bounds, 
+                                  right_intervals.flags, right.order, right.n_intervals, 
+                                  active, active + left.n_intervals, &pairs)
+        return index_pairs_to_arrays(&pairs)
+    finally:
+        PyMem_Free(active)
+        free(pairs.first)
+        free(pairs.second)
+
+
+# These operate on the raw bounds and packed flags of an interval.  The methods of 
+# Int64Interval and the loops of Int64IntervalSet are built on them.
+cdef inline bint Int64Interval_adjacent(int64_t lower, int64_t upper) nogil:
+    return lower + 1 == upper
+
+cdef inline bint Int64Interval_empty(int64_t lower, int64_t upper, unsigned char flags) nogil:
+    return (((flags & LOWER_BOUNDED) and (flags & UPPER_BOUNDED)) and 
+            ((((lower == upper) and 
+            (not ((flags & LOWER_CLOSED) and (flags & UPPER_CLOSED)))) or
+            lower > upper) or 
+             (lower < upper and 
+              (not (flags & (LOWER_CLOSED | UPPER_CLOSED))) and
+              Int64Interval_adjacent(lower, upper))))
+
+cdef inline int Int64Interval_containment_cmp(int64_t lower, int64_t upper, unsigned char flags, 
+                                                int64_t item) nogil:
+    global containment_cmp_count
+    containment_cmp_count += 1
+    if flags & LOWER_BOUNDED:
+        if item < lower:
+            return -1
+        elif item == lower:
+            if not (flags & LOWER_CLOSED):
+                return -1
+    if flags & UPPER_BOUNDED:
+        if item > upper:
+            return 1
+        elif item == upper:
+            if not (flags & UPPER_CLOSED):
+                return 1
+    return 0
+
+cdef inline int Int64Interval_lower_cmp(int64_t lower1, unsigned char flags1, 
+                                          int64_t lower2, unsigned char flags2) nogil:
+    global lower_cmp_count
+    lower_cmp_count += 1
+    if not (flags1 & LOWER_BOUNDED):
+        if not (flags2 & LOWER_BOUNDED):
+            return 0
+        else:
+            return -1
+    elif not (flags2 & LOWER_BOUNDED):
+        return 1
+    if lower1 < lower2:
+        return -1
+    elif lower1 == lower2:
+        if (flags1 & LOWER_CLOSED) and not (flags2 & LOWER_CLOSED):
+            return -1
+        elif (flags2 & LOWER_CLOSED) and not (flags1 & LOWER_CLOSED):
+            return 1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int Int64Interval_upper_cmp(int64_t upper1, unsigned char flags1, 
+                                          int64_t upper2, unsigned char flags2) nogil:
+    global upper_cmp_count
+    upper_cmp_count += 1
+    if not (flags1 & UPPER_BOUNDED):
+        if not (flags2 & UPPER_BOUNDED):
+            return 0
+        else:
+            return 1
+    elif not (flags2 & UPPER_BOUNDED):
+        return -1
+    if upper1 < upper2:
+        return -1
+    elif upper1 == upper2:
+        if (flags1 & UPPER_CLOSED) and not (flags2 & UPPER_CLOSED):
+            return 1
+        elif (flags2 & UPPER_CLOSED) and not (flags1 & UPPER_CLOSED):
+            return -1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int Int64Interval_overlap_cmp(int64_t lower1, int64_t upper1, unsigned char flags1, 
+                                            int64_t lower2, int64_t upper2, unsigned char flags2) nogil:
+    global overlap_cmp_count
+    overlap_cmp_count += 1
+    if (flags1 & UPPER_BOUNDED) and (flags2 & LOWER_BOUNDED):
+        if upper1 < lower2:
+            return -1
+        elif upper1 == lower2:
+            if (flags1 & UPPER_CLOSED) and (flags2 & LOWER_CLOSED):
+                return 0
+            else:
+                return -1
+    if (flags1 & LOWER_BOUNDED) and (flags2 & UPPER_BOUNDED):
+        if lower1 > upper2:
+            return 1
+        elif lower1 == upper2:
+            if (flags1 & LOWER_CLOSED) and (flags2 & UPPER_CLOSED):
+                return 0
+            else:
+                return 1
+    return 0
+
+cdef inline bint Int64Interval_fusible(int64_t lower1, int64_t upper1, unsigned char flags1, 
+                                         int64_t lower2, int64_t upper2, unsigned char flags2) nogil:
+    '''
+    Return whether the union of two nonempty intervals is an interval, because they overlap 
+    or touch.
+    '''
+    cdef int overlap_cmp = Int64Interval_overlap_cmp(lower1, upper1, flags1, lower2, upper2, flags2)
+    return ((overlap_cmp == 0) or 
+            (overlap_cmp == -1 and upper1 == lower2 and 
+             ((flags1 & UPPER_CLOSED) or (flags2 & LOWER_CLOSED))) or
+            (overlap_cmp == 1 and upper2 == lower1 and 
+             ((flags2 & UPPER_CLOSED) or (flags1 & LOWER_CLOSED))))
+
+cdef inline bint Int64Interval_intersection_empty(int64_t lower1, int64_t upper1, unsigned char flags1, 
+                                                    int64_t lower2, int64_t upper2, unsigned char flags2) nogil:
+    '''
+    Return whether two nonempty intervals that overlap according to overlap_cmp nonetheless 
+    have no element in common, which can only happen for types with adjacent elements.
+    '''
+    cdef int64_t lower, upper
+    cdef unsigned char flags
+    if Int64Interval_lower_cmp(lower1, flags1, lower2, flags2) <= 0:
+        lower = lower2
+        flags = flags2 & LOWER_FLAGS
+    else:
+        lower = lower1
+        flags = flags1 & LOWER_FLAGS
+    if Int64Interval_upper_cmp(upper1, flags1, upper2, flags2) <= 0:
+        upper = upper1
+        flags |= flags1 & UPPER_FLAGS
+    else:
+        upper = upper2
+        flags |= flags2 & UPPER_FLAGS
+    return Int64Interval_empty(lower, upper, flags)
+
+cdef array Int64Interval_bounds_template = array('q')
+
+cdef const int64_t[:] Int64IntervalSet_values(object values):
+    '''
+    View values as a buffer of int64_t, copying them only if they do not already 
+    expose one of the right type.
+    '''
+    cdef const int64_t[:] result
+    try:
+        result = values
+    except (TypeError, ValueError, BufferError):
+        result = array('q', values)
+    return result
+
+ctypedef struct Int64IntervalRecord:
+    int64_t lower
+    int64_t upper
+    unsigned char flags
+    Py_ssize_t index
+
+cdef int Int64Interval_record_cmp(const void *record1, const void *record2) nogil:
+    cdef Int64IntervalRecord *first = <Int64IntervalRecord *> record1
+    cdef Int64IntervalRecord *second = <Int64IntervalRecord *> record2
+    return Int64Interval_lower_cmp(first.lower, first.flags, second.lower, second.flags)
+
+cdef inline void Int64Interval_add_length(uint64_t *total, Py_ssize_t *carries, int64_t lower, 
+                                          int64_t upper, unsigned char flags) nogil:
+    '''
+    Add the number of elements of a bounded, nonempty interval to a count kept modulo 2**64, 
+    counting the times it wraps around in carries.  The number of elements less one always 
+    fits in a uint64_t, so it is added first and the one after.
+    '''
+    cdef uint64_t length = ((<uint64_t> upper) - (<uint64_t> lower) - 
+                            (0 if flags & LOWER_CLOSED else 1) - (0 if flags & UPPER_CLOSED else 1))
+    total[0] += length
+    if total[0] < length:
+        carries[0] += 1
+    total[0] += 1
+    if total[0] == 0:
+        carries[0] += 1
+
+cdef object Int64Interval_count_to_py(uint64_t total, Py_ssize_t carries):
+    '''
+    Combine a count accumulated modulo 2**64 with the number of times it wrapped around.
+    '''
+    if carries:
+        return (<object> carries) * 18446744073709551616 + total
+    return total
+
+cdef class Int64IntervalSetBuilder:
+    '''
+    Accumulates the bounds and flags of sorted intervals into the storage of a new 
+    Int64IntervalSet.  The builder must not be used after build has been called.
+    '''
+    def __cinit__(Int64IntervalSetBuilder self, Py_ssize_t capacity=0):
+        self.size = 0
+        self.capacity = capacity
+        self.flags_array = clone(flags_template, capacity, False)
+        self.flags = self.flags_array.data.as_uchars
+        self.lower_array = clone(Int64Interval_bounds_template, capacity, False)
+        self.upper_array = clone(Int64Interval_bounds_template, capacity, False)
+        self.lower_bounds = <int64_t *> self.lower_array.data.as_voidptr
+        self.upper_bounds = <int64_t *> self.upper_array.data.as_voidptr
+    
+    cdef int grow(Int64IntervalSetBuilder self) except -1:
+        self.capacity = 2 * self.capacity + 8
+        resize(self.flags_array, self.capacity)
+        self.flags = self.flags_array.data.as_uchars
+        resize(self.lower_array, self.capacity)
+        resize(self.upper_array, self.capacity)
+        self.lower_bounds = <int64_t *> self.lower_array.data.as_voidptr
+        self.upper_bounds = <int64_t *> self.upper_array.data.as_voidptr
+        return 0
+    
+    cdef int append(Int64IntervalSetBuilder self, int64_t lower, int64_t upper, 
+                    unsigned char flags) except -1 nogil:
+        '''
+        Add an interval after all intervals added so far, assuming the two neither overlap 
+        nor touch.
+        '''
+        if self.size == self.capacity:
+            with gil:
+                self.grow()
+        self.lower_bounds[self.size] = lower
+        self.upper_bounds[self.size] = upper
+        self.flags[self.size] = flags
+        self.size += 1
+        return 0
+    
+    cdef int merge(Int64IntervalSetBuilder self, int64_t lower, int64_t upper, 
+                   unsigned char flags) except -1 nogil:
+        '''
+        Add an interval whose lower bound is not less than that of any interval added so far, 
+        fusing it with the last interval if the two overlap or touch.  Empty intervals are 
+        ignored.
+        '''
+        cdef Py_ssize_t last = self.size - 1
+        if Int64Interval_empty(lower, upper, flags):
+            return 0
+        if last < 0:
+            return self.append(lower, upper, flags)
+        if Int64Interval_fusible(self.lower_bounds[last], self.upper_bounds[last], self.flags[last], 
+                                   lower, upper, flags):
+            if Int64Interval_lower_cmp(lower, flags, self.lower_bounds[last], self.flags[last]) < 0:
+                self.lower_bounds[last] = lower
+                self.flags[last] = (self.flags[last] & UPPER_FLAGS) | (flags & LOWER_FLAGS)
+            if Int64Interval_upper_cmp(upper, flags, self.upper_bounds[last], self.flags[last]) > 0:
+                self.upper_bounds[last] = upper
+                self.flags[last] = (self.flags[last] & LOWER_FLAGS) | (flags & UPPER_FLAGS)
+            return 0
+        return self.append(lower, upper, flags)
+    
+    cdef int remove(Int64IntervalSetBuilder self, Py_ssize_t start, Py_ssize_t stop) except -1:
+        '''
+        Remove the intervals at positions start up to, but not including, stop.
+        '''
+        cdef Py_ssize_t tail = self.size - stop
+        if stop <= start:
+            return 0
+        memmove(self.lower_bounds + start, self.lower_bounds + stop, tail * sizeof(int64_t))
+        memmove(self.upper_bounds + start, self.upper_bounds + stop, tail * sizeof(int64_t))
+        memmove(self.flags + start, self.flags + stop, tail)
+        self.size -= stop - start
+        return 0
+    
+    cdef int insert(Int64IntervalSetBuilder self, Py_ssize_t position, int64_t lower, int64_t upper, 
+                    unsigned char flags) except -1:
+        '''
+        Add an interval at the given position, moving the intervals after it.
+        '''
+        if self.size == self.capacity:
+            self.grow()
+        memmove(self.lower_bounds + position + 1, self.lower_bounds + position, 
+                (self.size - position) * sizeof(int64_t))
+        memmove(self.upper_bounds + position + 1, self.upper_bounds + position, 
+                (self.size - position) * sizeof(int64_t))
+        self.lower_bounds[position] = lower
+        self.upper_bounds[position] = upper
+        memmove(self.flags + position + 1, self.flags + position, self.size - position)
+        self.flags[position] = flags
+        self.size += 1
+        return 0
+    
+    cdef Int64IntervalSet build(Int64IntervalSetBuilder self):
+        cdef Int64IntervalSet result = Int64IntervalSet.__new__(Int64IntervalSet)
+        resize(self.flags_array, self.size)
+        result.flags = self.flags_array.data.as_uchars
+        resize(self.lower_array, self.size)
+        resize(self.upper_array, self.size)
+        result.lower_bounds = <int64_t *> self.lower_array.data.as_voidptr
+        result.upper_bounds = <int64_t *> self.upper_array.data.as_voidptr
+        result.storage = (self.lower_array, self.upper_array, self.flags_array)
+        result.n_intervals = self.size
+        return result
+
+cdef Int64IntervalSet Int64IntervalSet_normalize(Int64IntervalSetBuilder raw):
+    '''
+    Build an Int64IntervalSet from the intervals accumulated in raw, which may be empty, 
+    unsorted and overlapping.  Empty intervals are dropped, the rest are sorted by lower bound 
+    and any that overlap or touch are fused.
+    '''
+    cdef Py_ssize_t i, k, n = raw.size
+    cdef Int64IntervalSetBuilder builder
+    cdef bint is_sorted = True
+    for i in range(1, n):
+        if Int64Interval_lower_cmp(raw.lower_bounds[i-1], raw.flags[i-1], 
+                                     raw.lower_bounds[i], raw.flags[i]) > 0:
+            is_sorted = False
+            break
+    if is_sorted:
+        builder = Int64IntervalSetBuilder(n)
+        for i in range(n):
+            builder.merge(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i])
+        return builder.build()
+    cdef Int64IntervalRecord *records = <Int64IntervalRecord *> PyMem_Malloc(n * sizeof(Int64IntervalRecord))
+    if records == NULL and n > 0:
+        raise MemoryError()
+    try:
+        k = 0
+        for i in range(n):
+            if not Int64Interval_empty(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i]):
+                records[k].lower = raw.lower_bounds[i]
+                records[k].upper = raw.upper_bounds[i]
+                records[k].flags = raw.flags[i]
+                k += 1
+        qsort(records, k, sizeof(Int64IntervalRecord), Int64Interval_record_cmp)
+        builder = Int64IntervalSetBuilder(k)
+        for i in range(k):
+            builder.merge(records[i].lower, records[i].upper, records[i].flags)
+    finally:
+        PyMem_Free(records)
+    return builder.build()
+
+cdef class Int64Interval(BaseInterval):
+    def __init__(BaseInterval self, int64_t lower_bound, int64_t upper_bound, bool lower_closed, 
+                 bool upper_closed, bool lower_bounded, bool upper_bounded):
+        self.flags = pack_flags(lower_closed, upper_closed, lower_bounded, upper_bounded)
+        if lower_bounded:
+            self.lower_bound = lower_bound
+        if upper_bounded:
+            self.upper_bound = upper_bound
+    
+    # For some types, there is a concept of adjacent elements.  For example, 
+    # there are no integers between 1 and 2 (although there are several real numbers).
+    # If there is such a concept, it's possible for an interval to be empty even when 
+    # the lower bound is strictly less than the upper bound, provided the bounds are strict 
+    # (not closed).  The adjacent method is used to help determine such cases.
+    cpdef bool adjacent(Int64Interval self, int64_t lower, int64_t upper):
+        return Int64Interval_adjacent(lower, upper)
+    
+    cpdef int containment_cmp(Int64Interval self, int64_t item):
+        return Int64Interval_containment_cmp(self.lower_bound, self.upper_bound, self.flags, item)
+    
+    cpdef bool contains(Int64Interval self, int64_t item):
+        return self.containment_cmp(item) == 0
+    
+    cpdef bool subset(Int64Interval self, Int64Interval other):
+        '''
+        Return True if and only if self is a subset of other.
+        '''
+        return (Int64Interval_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags) >= 0 and 
+                Int64Interval_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags) <= 0)
+        
+    cpdef int overlap_cmp(Int64Interval self, Int64Interval other):
+        '''
+        Assume both are nonempty.  Return -1 if every element of self is less than every 
+        element of other.  Return 0 if self and other intersect.  Return 1 if every element of 
+        self is greater than every element of other.
+        '''
+        return Int64Interval_overlap_cmp(self.lower_bound, self.upper_bound, self.flags, 
+                                           other.lower_bound, other.upper_bound, other.flags)
+    
+    cpdef tuple init_args(Int64Interval self):
+        return (self.lower_bound, self.upper_bound, (self.flags & LOWER_CLOSED) != 0, 
+                (self.flags & UPPER_CLOSED) != 0, (self.flags & LOWER_BOUNDED) != 0, 
+                (self.flags & UPPER_BOUNDED) != 0)
+
+    cpdef Int64Interval intersection(Int64Interval self, Int64Interval other):
+        cdef Int64Interval result = Int64Interval.__new__(Int64Interval)
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
+        else:
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
+        else:
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
+        return result
+    
+    cpdef Int64Interval fusion(Int64Interval self, Int64Interval other):
+        '''
+        Assume union of intervals is a single interval.  Return their union.  Results not correct
+        if above assumption is violated.
+        '''
+        cdef Int64Interval result = Int64Interval.__new__(Int64Interval)
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
+        else:
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
+        else:
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
+        return result
+    
+    cpdef bool empty(Int64Interval self):
+        return Int64Interval_empty(self.lower_bound, self.upper_bound, self.flags)
+    
+    cpdef bool richcmp(Int64Interval self, Int64Interval other, int op):
+        cdef int lower_cmp
+        cdef int upper_cmp
+        if op == 0 or op == 1:
+            lower_cmp = self.lower_cmp(other)
+            if lower_cmp == -1:
+                return True
+            elif lower_cmp == 1:
+                return False
+            else: # lower_cmp == 0
+                upper_cmp = self.upper_cmp(other)
+                if upper_cmp == -1:
+                    return True
+                elif upper_cmp == 1:
+                    return False
+                else: # upper_cmp == 0
+                    return op == 1
+        elif op == 2:
+            return (self.lower_cmp(other) == 0) and (self.upper_cmp(other) == 0)
+        elif op == 3:
+            return (self.lower_cmp(other) != 0) or (self.upper_cmp(other) != 0)
+        elif op == 4 or op == 5:
+            lower_cmp = self.lower_cmp(other)
+            if lower_cmp == -1:
+                return False
+            elif lower_cmp == 1:
+                return True
+            else: # lower_cmp == 0
+                upper_cmp = self.upper_cmp(other)
+                if upper_cmp == -1:
+                    return False
+                elif upper_cmp == 1:
+                    return True
+                else: # upper_cmp == 0
+                    return op == 5
+    
+    cpdef int lower_cmp(Int64Interval self, Int64Interval other):
+        return Int64Interval_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags)
+    
+    cpdef int upper_cmp(Int64Interval self, Int64Interval other):
+        return Int64Interval_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags)
+
+# This is because static cpdef methods are not supported.  Otherwise this
+# would be a static method of Int64IntervalSet
+cpdef Int64IntervalSet Int64IntervalSet_from_intervals(tuple intervals):
+    '''
+    Construct an Int64IntervalSet from intervals in any order, which may be empty or 
+    overlapping.
+    '''
+    cdef OperationTimer timer = OperationTimer('Int64IntervalSet_from_intervals')
+    cdef Int64Interval interval
+    cdef Int64IntervalSetBuilder raw = Int64IntervalSetBuilder(len(intervals))
+    for interval in intervals:
+        raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+    return Int64IntervalSet_normalize(raw)
+
+cdef Int64IntervalSetBuilder Int64IntervalSet_raw_from_arrays(object lower, object upper, object lower_closed, 
+                                                                   object upper_closed, object lower_bounded, 
+                                                                   object upper_bounded):
+    '''
+    Accumulate intervals given as arrays of bounds and flags, as described in 
+    Int64IntervalSet.from_arrays, into a builder in the order given.
+    '''
+    cdef const int64_t[:] lower_values = Int64IntervalSet_values(lower)
+    cdef const int64_t[:] upper_values = Int64IntervalSet_values(upper)
+    cdef Py_ssize_t i, n = lower_values.shape[0]
+    if upper_values.shape[0] != n:
+        raise ValueError('lower and upper must have the same length')
+    cdef array flags = clone(flags_template, n, True)
+    set_flags(flags.data.as_uchars, n, lower_closed, LOWER_CLOSED)
+    set_flags(flags.data.as_uchars, n, upper_closed, UPPER_CLOSED)
+    set_flags(flags.data.as_uchars, n, lower_bounded, LOWER_BOUNDED)
+    set_flags(flags.data.as_uchars, n, upper_bounded, UPPER_BOUNDED)
+    cdef Int64IntervalSetBuilder raw = Int64IntervalSetBuilder(n)
+    for i in range(n):
+        raw.append(lower_values[i] if flags.data.as_uchars[i] & LOWER_BOUNDED else 0, 
+                   upper_values[i] if flags.data.as_uchars[i] & UPPER_BOUNDED else 0, 
+                   flags.data.as_uchars[i])
+    return raw
+
+cpdef tuple Int64Interval_preprocess_intervals(tuple intervals):
+    '''
+    Remove empty intervals, sort, and fuse any overlapping intervals.
+    '''
+    cdef OperationTimer timer = OperationTimer('Int64Interval_preprocess_intervals')
+    return Int64IntervalSet_from_intervals(intervals).intervals
+
+cdef class Int64IntervalSetCoalescer:
+    '''
+    Iterate over the coalesced intervals of an iterable of Int64Intervals or (lower, upper) 
+    pairs, sorted by lower bound.  Pairs describe closed intervals, and either bound may be 
+    unbounded.  Only one pending interval is held at a time, so the input is never 
+    materialized.  A ValueError is raised if the input is found to be out of order.
+    '''
+    def __init__(Int64IntervalSetCoalescer self, intervals):
+        self.source = iter(intervals)
+        self.pending = False
+        self.started = False
+    
+    def __iter__(Int64IntervalSetCoalescer self):
+        return self
+    
+    def __next__(Int64IntervalSetCoalescer self):
+        cdef Int64Interval result
+        if not self.next_raw():
+            raise StopIteration
+        result = Int64Interval.__new__(Int64Interval)
+        result.lower_bound = self.result_lower
+        result.upper_bound = self.result_upper
+        result.flags = self.result_flags
+        return result
+    
+    cdef int next_raw(Int64IntervalSetCoalescer self) except -1:
+        '''
+        Store the next coalesced interval in the result fields and return 1, or return 0 if 
+        there are no more.
+        '''
+        cdef int64_t item_lower, item_upper
+        cdef unsigned char item_flags
+        cdef Int64Interval interval
+        for item in self.source:
+            if isinstance(item, Int64Interval):
+                interval = item
+                item_lower = interval.lower_bound
+                item_upper = interval.upper_bound
+                item_flags = interval.flags
+            else:
+                lower_value, upper_value = item
+                item_flags = LOWER_CLOSED | UPPER_CLOSED
+                if lower_value is unbounded:
+                    item_lower = 0
+                else:
+                    item_lower = lower_value
+                    item_flags |= LOWER_BOUNDED
+                if upper_value is unbounded:
+                    item_upper = 0
+                else:
+                    item_upper = upper_value
+                    item_flags |= UPPER_BOUNDED
+            if self.started and Int64Interval_lower_cmp(item_lower, item_flags, 
+                                                          self.last_lower, self.last_flags) < 0:
+                raise ValueError('Intervals must be sorted by lower bound')
+            self.started = True
+            self.last_lower = item_lower
+            self.last_flags = item_flags
+            if Int64Interval_empty(item_lower, item_upper, item_flags):
+                continue
+            if not self.pending:
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                self.pending = True
+            elif Int64Interval_fusible(self.lower, self.upper, self.flags, item_lower, item_upper, item_flags):
+                if Int64Interval_upper_cmp(item_upper, item_flags, self.upper, self.flags) > 0:
+                    self.upper = item_upper
+                    self.flags = (self.flags & LOWER_FLAGS) | (item_flags & UPPER_FLAGS)
+            else:
+                self.result_lower = self.lower
+                self.result_upper = self.upper
+                self.result_flags = self.flags
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                return 1
+        if self.pending:
+            self.result_lower = self.lower
+            self.result_upper = self.upper
+            self.result_flags = self.flags
+            self.pending = False
+            return 1
+        return 0
+
+cdef class Int64IntervalSetIterator(BaseIntervalSetIterator):
+    def __init__(Int64IntervalSetIterator self, Int64IntervalSet interval_set):
+        self.index = 0
+        self.interval_set = interval_set
+    
+    def __iter__(Int64IntervalSetIterator self):
+        return self
+    
+    def __next__(Int64IntervalSetIterator self):
+        self.index += 1
+        if self.index <= self.interval_set.n_intervals:
+            return self.interval_set.intervals[self.index-1]
+        raise StopIteration
+
+cdef class Int64IntervalSet(BaseIntervalSet):
+    def __init__(Int64IntervalSet self, tuple intervals):
+        '''
+        The intervals must already be sorted and non-overlapping.
+        '''
+        cdef Int64IntervalSetBuilder builder = Int64IntervalSetBuilder(len(intervals))
+        cdef Int64Interval interval
+        cdef Int64IntervalSet built
+        for interval in intervals:
+            builder.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        built = builder.build()
+        self.lower_bounds = built.lower_bounds
+        self.upper_bounds = built.upper_bounds
+        self.flags = built.flags
+        self.storage = built.storage
+        self.n_intervals = built.n_intervals
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True):
+        '''
+        Construct an Int64IntervalSet directly from sequences of lower and upper bounds, 
+        given as buffers of int64_t (such as numpy arrays) or any other sequences of numbers.  
+        Each of lower_closed, upper_closed, lower_bounded and upper_bounded is either a single 
+        bool for all intervals or a sequence of bools with one per interval.  The intervals need 
+        not be sorted or disjoint, and no interval objects are created.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.from_arrays')
+        return Int64IntervalSet_normalize(Int64IntervalSet_raw_from_arrays(lower, upper, lower_closed, 
+                                                                                upper_closed, lower_bounded, 
+                                                                                upper_bounded))
+    
+    @staticmethod
+    def from_sorted(intervals):
+        '''
+        Construct an Int64IntervalSet from an iterable of Int64Intervals or (lower, upper) pairs 
+        sorted by lower bound, as described in Int64IntervalSetCoalescer, coalescing them as 
+        they are read.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.from_sorted')
+        cdef Int64IntervalSetCoalescer coalescer = Int64IntervalSetCoalescer(intervals)
+        cdef Int64IntervalSetBuilder builder = Int64IntervalSetBuilder()
+        while coalescer.next_raw():
+            builder.append(coalescer.result_lower, coalescer.result_upper, coalescer.result_flags)
+        return builder.build()
+    
+    def __iter__(Int64IntervalSet self):
+        return Int64IntervalSetIterator(self)
+    
+    def __getitem__(Int64IntervalSet self, index):
+        return self.intervals[index]
+    
+    cdef tuple materialize_intervals(Int64IntervalSet self):
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.materialize_intervals')
+        cdef Py_ssize_t i
+        cdef unsigned char flags
+        cdef Int64Interval interval
+        cdef list result = []
+        for i in range(self.n_intervals):
+            interval = Int64Interval.__new__(Int64Interval)
+            interval.lower_bound = self.lower_bounds[i]
+            interval.upper_bound = self.upper_bounds[i]
+            interval.flags = self.flags[i]
+            result.append(interval)
+        return tuple(result)
+    
+    cdef Py_hash_t compute_hash(Int64IntervalSet self) except -1:
+        '''
+        Combine the hashes of the intervals in the same way as the hash of a tuple.
+        '''
+        cdef Py_ssize_t i
+        cdef unsigned char flags
+        cdef size_t result = 0x345678
+        cdef size_t multiplier = 1000003
+        cdef Py_hash_t interval_hash
+        for i in range(self.n_intervals):
+            flags = canonical_flags(self.flags[i])
+            interval_hash = hash((self.lower_bounds[i] if flags & LOWER_BOUNDED else None, 
+                                  self.upper_bounds[i] if flags & UPPER_BOUNDED else None, flags))
+            result = (result ^ <size_t> interval_hash) * multiplier
+            multiplier += 82520 + 2 * (self.n_intervals - i)
+        result += 97531
+        if <Py_hash_t> result == -1:
+            return -2
+        return <Py_hash_t> result
+    
+    cpdef bool lower_bounded(Int64IntervalSet self):
+        if self.n_intervals > 0:
+            return (self.flags[0] & LOWER_BOUNDED) != 0
+        else:
+            return True
+    
+    cpdef bool upper_bounded(Int64IntervalSet self):
+        if self.n_intervals > 0:
+            return (self.flags[self.n_intervals - 1] & UPPER_BOUNDED) != 0
+        else:
+            return True
+    
+    cpdef int64_t lower_bound(Int64IntervalSet self):
+        if self.n_intervals > 0:
+            return self.lower_bounds[0]
+        else:
+            return 0
+    
+    cpdef int64_t upper_bound(Int64IntervalSet self):
+        if self.n_intervals > 0:
+            return self.upper_bounds[self.n_intervals - 1]
+        else:
+            return 0
+    
+    cpdef tuple init_args(Int64IntervalSet self):
+        return (self.intervals,)
+    
+    cdef Py_ssize_t locate_item(Int64IntervalSet self, int64_t item) nogil:
+        '''
+        Use binary search to find the index of the interval containing item, or -1 if there 
+        is none.
+        '''
+        cdef Py_ssize_t i, n
+        cdef Py_ssize_t low, high
+        cdef int cmp
+        n = self.n_intervals
+        low = 0
+        high = n-1
+        while high >= low:
+            i = (high + low) / 2
+            cmp = Int64Interval_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                  self.flags[i], item)
+            if cmp == -1:
+                high = i - 1
+            elif cmp == 1:
+                low = i + 1
+            else: #if cmp == 0:
+                return i
+        return -1
+    
+    cpdef bool contains(Int64IntervalSet self, int64_t item):
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.contains')
+        return self.locate_item(item) >= 0
+    
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef int locate_many(Int64IntervalSet self, const int64_t[:] items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1 nogil:
+        '''
+        For each of items, store the index of the interval containing it (or -1 if there is 
+        none) in indices and whether there is one in mask, skipping either if it is NULL.  
+        Sorted items are merged against the intervals in a single pass, otherwise each is 
+        found by binary search.
+        '''
+        cdef Py_ssize_t n = items.shape[0]
+        cdef Py_ssize_t k
+        cdef Py_ssize_t i, index
+        cdef int cmp
+        cdef bint is_sorted = True
+        cdef int64_t item
+        for k in range(1, n):
+            if not items[k] >= items[k-1]:
+                is_sorted = False
+                break
+        i = 0
+        for k in range(n):
+            item = items[k]
+            if is_sorted:
+                cmp = 1
+                while i < self.n_intervals:
+                    cmp = Int64Interval_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                          self.flags[i], item)
+                    if cmp != 1:
+                        break
+                    i += 1
+                index = i if cmp == 0 else -1
+            else:
+                index = self.locate_item(item)
+            if indices != NULL:
+                indices[k] = index
+            if mask != NULL:
+                mask[k] = index >= 0
+        return 0
+    
+    cpdef array contains_many(Int64IntervalSet self, points):
+        '''
+        Return an array of bytes, with 1 for each of points contained in self and 0 for each 
+        that is not.  The result can be viewed as a boolean numpy array with 
+        numpy.frombuffer(result, dtype=bool).
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.contains_many')
+        cdef const int64_t[:] items = Int64IntervalSet_values(points)
+        cdef array result = clone(flags_template, items.shape[0], False)
+        with nogil:
+            self.locate_many(items, NULL, result.data.as_uchars)
+        return result
+    
+    cpdef array locate(Int64IntervalSet self, points):
+        '''
+        Return an array of positions holding, for each of points, the index in self.intervals of 
+        the interval containing it, or -1 if no interval contains it.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.locate')
+        cdef const int64_t[:] items = Int64IntervalSet_values(points)
+        cdef array result = clone(index_template, items.shape[0], False)
+        cdef Py_ssize_t *indices = index_data(result)
+        with nogil:
+            self.locate_many(items, indices, NULL)
+        return result
+
+    cpdef bool subset(Int64IntervalSet self, Int64IntervalSet other):
+        '''
+        Return True if and only if self is a subset of other.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.subset')
+        cdef Py_ssize_t i, j, m, n
+        cdef int overlap_cmp
+        if self.empty():
+            return True
+        elif other.empty():
+            return False
+        m = self.n_intervals
+        n = other.n_intervals
+        i = 0
+        j = 0
+        while i < m:
+            overlap_cmp = Int64Interval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+            if overlap_cmp == -1:
+                return False
+            elif overlap_cmp == 0:
+                if (Int64Interval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.flags[j]) < 0 or 
+                    Int64Interval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                              other.upper_bounds[j], other.flags[j]) > 0):
+                    return False
+                i += 1
+            else:
+                # The current interval of self lies beyond the current interval of other, so 
+                # compare it against the next interval of other.
+                j += 1
+                if j == n:
+                    return False
+        return True
+    
+    cpdef bool equal(Int64IntervalSet self, Int64IntervalSet other):
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.equal')
+        cdef Py_ssize_t i, n
+        n = self.n_intervals
+        if n != other.n_intervals:
+            return False
+        for i in range(n):
+            if (Int64Interval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                          other.lower_bounds[i], other.flags[i]) != 0 or 
+                Int64Interval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                          other.upper_bounds[i], other.flags[i]) != 0):
+                return False
+        return True
+    
+    cpdef bool richcmp(Int64IntervalSet self, Int64IntervalSet other, int op):
+        if op == 0:
+            return self.subset(other) and not self.equal(other)
+        elif op == 1:
+            return self.subset(other)
+        elif op == 2:
+            return self.equal(other)
+        elif op == 3:
+            return not self.equal(other)
+        elif op == 4:
+            return other.subset(self) and not other.equal(self)
+        elif op == 5:
+            return other.subset(self)
+    
+    cpdef bool empty(Int64IntervalSet self):
+        return self.n_intervals == 0 
+    
+    def to_arrays(Int64IntervalSet self):
+        '''
+        Return (lower, upper, lower_closed, upper_closed, lower_bounded, upper_bounded), which 
+        are the arguments that from_arrays would take to construct self.  The lower and upper 
+        bounds are read-only memoryviews of int64_t sharing the storage of self, so 
+        numpy.asarray wraps them without copying.  
+        The bound of an unbounded side is 0.  The flags are arrays of bytes 
+        which are 1 where true and 0 where false.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.to_arrays')
+        return (memoryview(self.storage[0]).toreadonly(), memoryview(self.storage[1]).toreadonly(), 
+                get_flags(self.flags, self.n_intervals, LOWER_CLOSED), 
+                get_flags(self.flags, self.n_intervals, UPPER_CLOSED), 
+                get_flags(self.flags, self.n_intervals, LOWER_BOUNDED), 
+                get_flags(self.flags, self.n_intervals, UPPER_BOUNDED))
+    
+    def __reduce_ex__(Int64IntervalSet self, protocol):
+        # Pickle the storage as three buffers rather than as interval objects.  From protocol 5 
+        # the buffers are passed as PickleBuffers, so they can be sent out of band without 
+        # copying.
+        if protocol >= 5 and PickleBuffer is not None:
+            buffers = tuple(PickleBuffer(buffer) for buffer in self.storage)
+        else:
+            buffers = tuple(memoryview(buffer).tobytes() for buffer in self.storage)
+        return (Int64IntervalSet_from_buffers, (self.n_intervals,) + buffers)
+    
+    def save(Int64IntervalSet self, path):
+        '''
+        Write self to the file at path in the binary format read by load_interval_set.
+        '''
+        with open(path, 'wb') as outfile:
+            outfile.write(file_header.pack(file_magic, b'Int64IntervalSet', sys.byteorder[0].encode(), 
+                                           sizeof(int64_t), self.n_intervals))
+            for buffer in self.storage:
+                outfile.write(buffer)
+    
+    cpdef object measure(Int64IntervalSet self):
+        '''
+        Return the total length of the intervals, or infinity if self is unbounded.  
+        For this type the elements are discrete, so this is the number of elements of self.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.measure')
+        cdef Py_ssize_t i, n = self.n_intervals
+        cdef uint64_t total = 0
+        cdef Py_ssize_t carries = 0
+        if n > 0 and not ((self.flags[0] & LOWER_BOUNDED) and (self.flags[n-1] & UPPER_BOUNDED)):
+            return INFINITY
+        with nogil:
+            for i in range(n):
+                Int64Interval_add_length(&total, &carries, self.lower_bounds[i], self.upper_bounds[i], 
+                                           self.flags[i])
+        return Int64Interval_count_to_py(total, carries)
+    
+    cpdef object intersection_measure(Int64IntervalSet self, Int64IntervalSet other):
+        '''
+        Return the measure of the intersection of self and other, without constructing it.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.intersection_measure')
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, lower_cmp, upper_cmp
+        cdef int64_t new_lower_bound, new_upper_bound
+        cdef unsigned char new_flags
+        cdef uint64_t total = 0
+        cdef bint infinite = False
+        cdef Py_ssize_t carries = 0
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        with nogil:
+            while i < m and j < n:
+                cmp = Int64Interval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                                  other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                if cmp == -1:
+                    i += 1
+                elif cmp == 1:
+                    j += 1
+                else:
+                    lower_cmp = Int64Interval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                          other.lower_bounds[j], other.flags[j])
+                    upper_cmp = Int64Interval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                                          other.upper_bounds[j], other.flags[j])
+                    if lower_cmp <= 0:
+                        new_lower_bound = other.lower_bounds[j]
+                        new_flags = other.flags[j] & LOWER_FLAGS
+                    else:
+                        new_lower_bound = self.lower_bounds[i]
+                        new_flags = self.flags[i] & LOWER_FLAGS
+                    if upper_cmp <= 0:
+                        new_upper_bound = self.upper_bounds[i]
+                        new_flags |= self.flags[i] & UPPER_FLAGS
+                    else:
+                        new_upper_bound = other.upper_bounds[j]
+                        new_flags |= other.flags[j] & UPPER_FLAGS
+                    if not ((new_flags & LOWER_BOUNDED) and (new_flags & UPPER_BOUNDED)):
+                        infinite = True
+                        break
+                    if not Int64Interval_empty(new_lower_bound, new_upper_bound, new_flags):
+                        Int64Interval_add_length(&total, &carries, new_lower_bound, new_upper_bound, new_flags)
+                    if upper_cmp <= 0:
+                        i += 1
+                    if upper_cmp >= 0:
+                        j += 1
+        if infinite:
+            return INFINITY
+        return Int64Interval_count_to_py(total, carries)
+    
+    cpdef Int64IntervalSet intersection(Int64IntervalSet self, Int64IntervalSet other):
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.intersection')
+        if self.empty():
+            return self
+        if other.empty():
+            return other
+        cdef Int64IntervalSetBuilder builder = Int64IntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.intersection_into(other, builder)
+        return builder.build()
+    
+    cdef int intersection_into(Int64IntervalSet self, Int64IntervalSet other, 
+                               Int64IntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the intersection of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, lower_cmp, upper_cmp
+        cdef int64_t new_lower_bound, new_upper_bound
+        cdef unsigned char new_flags
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        while i < m and j < n:
+            cmp = Int64Interval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+            if cmp == -1:
+                i += 1
+            elif cmp == 1:
+                j += 1
+            else:
+                lower_cmp = Int64Interval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.flags[j])
+                upper_cmp = Int64Interval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                                      other.upper_bounds[j], other.flags[j])
+                if lower_cmp <= 0:
+                    new_lower_bound = other.lower_bounds[j]
+                    new_flags = other.flags[j] & LOWER_FLAGS
+                else:
+                    new_lower_bound = self.lower_bounds[i]
+                    new_flags = self.flags[i] & LOWER_FLAGS
+                if upper_cmp <= 0:
+                    new_upper_bound = self.upper_bounds[i]
+                    new_flags |= self.flags[i] & UPPER_FLAGS
+                else:
+                    new_upper_bound = other.upper_bounds[j]
+                    new_flags |= other.flags[j] & UPPER_FLAGS
+                # For types with adjacent elements the overlap may still be empty
+                if not Int64Interval_empty(new_lower_bound, new_upper_bound, new_flags):
+                    builder.append(new_lower_bound, new_upper_bound, new_flags)
+                if upper_cmp <= 0:
+                    i += 1
+                if upper_cmp >= 0:
+                    j += 1
+        return 0
+    
+    cpdef Int64IntervalSet union(Int64IntervalSet self, Int64IntervalSet other):
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.union')
+        if self.empty():
+            return other
+        if other.empty():
+            return self
+        cdef Int64IntervalSetBuilder builder = Int64IntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.union_into(other, builder)
+        return builder.build()
+    
+    cdef int union_into(Int64IntervalSet self, Int64IntervalSet other, 
+                        Int64IntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the union of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        while i < m or j < n:
+            if j == n or (i < m and 
+                          Int64Interval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                    other.lower_bounds[j], other.flags[j]) <= 0):
+                builder.merge(self.lower_bounds[i], self.upper_bounds[i], self.flags[i])
+                i += 1
+            else:
+                builder.merge(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                j += 1
+        return 0
+    
+    cpdef Int64IntervalSet complement(Int64IntervalSet self):
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.complement')
+        cdef Int64IntervalSetBuilder builder
+        if self.empty():
+            builder = Int64IntervalSetBuilder(1)
+            builder.append(0, 0, LOWER_CLOSED | UPPER_CLOSED)
+            return builder.build()
+        cdef Py_ssize_t i
+        cdef Py_ssize_t n = self.n_intervals
+        cdef unsigned char flags
+        builder = Int64IntervalSetBuilder(n + 1)
+        if self.flags[0] & LOWER_BOUNDED:
+            builder.append(0, self.lower_bounds[0], 
+                           LOWER_CLOSED | UPPER_BOUNDED | (0 if self.flags[0] & LOWER_CLOSED else UPPER_CLOSED))
+        for i in range(1, n):
+            # For types with adjacent elements the gap between two intervals may be empty
+            flags = (LOWER_BOUNDED | UPPER_BOUNDED | 
+                     (0 if self.flags[i-1] & UPPER_CLOSED else LOWER_CLOSED) | 
+                     (0 if self.flags[i] & LOWER_CLOSED else UPPER_CLOSED))
+            if not Int64Interval_empty(self.upper_bounds[i-1], self.lower_bounds[i], flags):
+                builder.append(self.upper_bounds[i-1], self.lower_bounds[i], flags)
+        if self.flags[n-1] & UPPER_BOUNDED:
+            builder.append(self.upper_bounds[n-1], 0, 
+                           UPPER_CLOSED | LOWER_BOUNDED | (0 if self.flags[n-1] & UPPER_CLOSED else LOWER_CLOSED))
+        return builder.build()
+            
+    cpdef Int64IntervalSet symmetric_difference(Int64IntervalSet self, Int64IntervalSet other):
+        '''
+        Return the set of elements in exactly one of self and other, computed in a single sweep 
+        over both.  At each step the remaining parts of the current intervals of self and other 
+        are compared, and whatever lies before the start or after the end of their overlap is 
+        kept.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.symmetric_difference')
+        if self.empty():
+            return other
+        if other.empty():
+            return self
+        cdef Int64IntervalSetBuilder builder = Int64IntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.symmetric_difference_into(other, builder)
+        return builder.build()
+    
+    cdef int symmetric_difference_into(Int64IntervalSet self, Int64IntervalSet other, 
+                                       Int64IntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the symmetric difference of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, upper_cmp
+        cdef int64_t lower1, upper1, lower2, upper2
+        cdef unsigned char lower_flags1, upper_flags1, lower_flags2, upper_flags2
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        lower1 = self.lower_bounds[0]
+        lower_flags1 = self.flags[0] & LOWER_FLAGS
+        lower2 = other.lower_bounds[0]
+        lower_flags2 = other.flags[0] & LOWER_FLAGS
+        while i < m and j < n:
+            upper1 = self.upper_bounds[i]
+            upper_flags1 = self.flags[i] & UPPER_FLAGS
+            upper2 = other.upper_bounds[j]
+            upper_flags2 = other.flags[j] & UPPER_FLAGS
+            cmp = Int64Interval_overlap_cmp(lower1, upper1, lower_flags1 | upper_flags1, 
+                                              lower2, upper2, lower_flags2 | upper_flags2)
+            if cmp == -1:
+                builder.merge(lower1, upper1, lower_flags1 | upper_flags1)
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+                continue
+            elif cmp == 1:
+                builder.merge(lower2, upper2, lower_flags2 | upper_flags2)
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+                continue
+            
+            # Keep whatever precedes the overlap
+            cmp = Int64Interval_lower_cmp(lower1, lower_flags1, lower2, lower_flags2)
+            if cmp < 0:
+                builder.merge(lower1, lower2, lower_flags1 | UPPER_BOUNDED | 
+                              (0 if lower_flags2 & LOWER_CLOSED else UPPER_CLOSED))
+            elif cmp > 0:
+                builder.merge(lower2, lower1, lower_flags2 | UPPER_BOUNDED | 
+                              (0 if lower_flags1 & LOWER_CLOSED else UPPER_CLOSED))
+            
+            # Whatever follows the overlap remains to be compared with later intervals
+            upper_cmp = Int64Interval_upper_cmp(upper1, upper_flags1, upper2, upper_flags2)
+            if upper_cmp < 0:
+                lower2 = upper1
+                lower_flags2 = LOWER_BOUNDED | (0 if upper_flags1 & UPPER_CLOSED else LOWER_CLOSED)
+            elif upper_cmp > 0:
+                lower1 = upper2
+                lower_flags1 = LOWER_BOUNDED | (0 if upper_flags2 & UPPER_CLOSED else LOWER_CLOSED)
+            if upper_cmp <= 0:
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+            if upper_cmp >= 0:
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+        while i < m:
+            builder.merge(lower1, self.upper_bounds[i], lower_flags1 | (self.flags[i] & UPPER_FLAGS))
+            i += 1
+            if i < m:
+                lower1 = self.lower_bounds[i]
+                lower_flags1 = self.flags[i] & LOWER_FLAGS
+        while j < n:
+            builder.merge(lower2, other.upper_bounds[j], lower_flags2 | (other.flags[j] & UPPER_FLAGS))
+            j += 1
+            if j < n:
+                lower2 = other.lower_bounds[j]
+                lower_flags2 = other.flags[j] & LOWER_FLAGS
+        return 0
+    
+    cpdef Int64IntervalSet minus(Int64IntervalSet self, Int64IntervalSet other):
+        '''
+        Subtract other from self in a single sweep over both, cutting each interval of self 
+        at the intervals of other that overlap it.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalSet.minus')
+        if self.empty() or other.empty():
+            return self
+        cdef Int64IntervalSetBuilder builder = Int64IntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.minus_into(other, builder)
+        return builder.build()
+    
+    cdef int minus_into(Int64IntervalSet self, Int64IntervalSet other, 
+                        Int64IntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append self minus other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp
+        cdef int64_t lower, upper
+        cdef unsigned char lower_flags, upper_flags, piece_flags
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        # The part of the interval i of self that remains to be cut runs from lower to upper
+        lower = self.lower_bounds[0]
+        lower_flags = self.flags[0] & LOWER_FLAGS
+        while i < m:
+            upper = self.upper_bounds[i]
+            upper_flags = self.flags[i] & UPPER_FLAGS
+            cmp = -1
+            while j < n:
+                cmp = Int64Interval_overlap_cmp(lower, upper, lower_flags | upper_flags, 
+                                                  other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                if cmp != 1:
+                    break
+                j += 1
+            if j == n or cmp == -1:
+                # Nothing left in other overlaps the remaining part
+                if not Int64Interval_empty(lower, upper, lower_flags | upper_flags):
+                    builder.append(lower, upper, lower_flags | upper_flags)
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+                continue
+            if Int64Interval_lower_cmp(lower, lower_flags, other.lower_bounds[j], other.flags[j]) < 0:
+                piece_flags = (lower_flags | UPPER_BOUNDED | 
+                               (0 if other.flags[j] & LOWER_CLOSED else UPPER_CLOSED))
+                if not Int64Interval_empty(lower, other.lower_bounds[j], piece_flags):
+                    builder.append(lower, other.lower_bounds[j], piece_flags)
+            if Int64Interval_upper_cmp(upper, upper_flags, other.upper_bounds[j], other.flags[j]) > 0:
+                lower = other.upper_bounds[j]
+                lower_flags = LOWER_BOUNDED | (0 if other.flags[j] & UPPER_CLOSED else LOWER_CLOSED)
+                j += 1
+            else:
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+        return 0
+cdef inline int Int64IntervalSet_cursor_cmp(list sets, Py_ssize_t *positions, Py_ssize_t a, 
+                                              Py_ssize_t b, bint by_upper) except? -2:
+    cdef Int64IntervalSet first = sets[a]
+    cdef Int64IntervalSet second = sets[b]
+    if by_upper:
+        return Int64Interval_upper_cmp(first.upper_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.upper_bounds[positions[b]], second.flags[positions[b]])
+    else:
+        return Int64Interval_lower_cmp(first.lower_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.lower_bounds[positions[b]], second.flags[positions[b]])
+
+cdef int Int64IntervalSet_sift_down(list sets, Py_ssize_t *positions, Py_ssize_t *heap, 
+                                     Py_ssize_t size, Py_ssize_t index, bint by_upper) except -1:
+    '''
+    Restore the heap property below index in a min-heap of indices into sets, ordered by the 
+    lower (or upper) bound of the interval at which each set's cursor in positions points.
+    '''
+    cdef Py_ssize_t child, top
+    while True:
+        child = 2 * index + 1
+        if child >= size:
+            return 0
+        if (child + 1 < size and 
+            Int64IntervalSet_cursor_cmp(sets, positions, heap[child + 1], heap[child], by_upper) < 0):
+            child += 1
+        if Int64IntervalSet_cursor_cmp(sets, positions, heap[child], heap[index], by_upper) >= 0:
+            return 0
+        top = heap[index]
+        heap[index] = heap[child]
+        heap[child] = top
+        index = child
+
+def Int64IntervalSet_from_buffers(Py_ssize_t n, lower, upper, flags):
+    '''
+    Construct an Int64IntervalSet of n intervals whose storage is the given buffers of lower 
+    bounds, upper bounds and flags in native byte order, without copying them.  This is used 
+    to load interval set files and to unpickle typed interval sets.
+    '''
+    cdef Int64IntervalSet result = Int64IntervalSet.__new__(Int64IntervalSet)
+    cdef const int64_t[:] lower_view = memoryview(lower).cast('B').cast('q')
+    cdef const int64_t[:] upper_view = memoryview(upper).cast('B').cast('q')
+    cdef const unsigned char[:] flags_view = memoryview(flags).cast('B')
+    if lower_view.shape[0] != n or upper_view.shape[0] != n or flags_view.shape[0] != n:
+        raise ValueError('Expected buffers of %d intervals' % n)
+    result.storage = (lower_view.base, upper_view.base, flags_view.base)
+    result.n_intervals = n
+    if n > 0:
+        result.lower_bounds = <int64_t *> &lower_view[0]
+        result.upper_bounds = <int64_t *> &upper_view[0]
+        result.flags = <unsigned char *> &flags_view[0]
+    return result
+
+cpdef Int64IntervalSet Int64IntervalSet_union_all(list sets):
+    '''
+    Return the union of all the given sets, merging them all at once with a heap ordered by 
+    the lower bound of each set's next interval.
+    '''
+    cdef OperationTimer timer = OperationTimer('Int64IntervalSet_union_all')
+    cdef Int64IntervalSet interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    sets = [interval_set for interval_set in sets if not interval_set.empty()]
+    k = len(sets)
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        total += interval_set.n_intervals
+    cdef Int64IntervalSetBuilder builder = Int64IntervalSetBuilder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            Int64IntervalSet_sift_down(sets, positions, heap, size, i, False)
+        while size > 0:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(interval_set.lower_bounds[positions[i]], interval_set.upper_bounds[positions[i]], 
+                          interval_set.flags[positions[i]])
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                size -= 1
+                heap[0] = heap[size]
+            Int64IntervalSet_sift_down(sets, positions, heap, size, 0, False)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cpdef Int64IntervalSet Int64IntervalSet_intersection_all(list sets):
+    '''
+    Return the intersection of all the given sets in a single sweep over all of them.  The 
+    intersection of the current intervals of the sets runs from the greatest of their lower 
+    bounds to the least of their upper bounds, which is found with a heap.  The set whose 
+    current interval ends first is then advanced.
+    '''
+    cdef OperationTimer timer = OperationTimer('Int64IntervalSet_intersection_all')
+    cdef Int64IntervalSet interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    cdef int64_t lower
+    cdef unsigned char lower_flags
+    k = len(sets)
+    if k == 0:
+        return Int64IntervalSet(()).complement()
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        if interval_set.empty():
+            return interval_set
+        total += interval_set.n_intervals
+    interval_set = sets[0]
+    lower = interval_set.lower_bounds[0]
+    lower_flags = interval_set.flags[0] & LOWER_FLAGS
+    cdef Int64IntervalSetBuilder builder = Int64IntervalSetBuilder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+            interval_set = sets[i]
+            if Int64Interval_lower_cmp(interval_set.lower_bounds[0], interval_set.flags[0], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[0]
+                lower_flags = interval_set.flags[0] & LOWER_FLAGS
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            Int64IntervalSet_sift_down(sets, positions, heap, size, i, True)
+        while True:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(lower, interval_set.upper_bounds[positions[i]], 
+                          lower_flags | (interval_set.flags[positions[i]] & UPPER_FLAGS))
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                break
+            if Int64Interval_lower_cmp(interval_set.lower_bounds[positions[i]], interval_set.flags[positions[i]], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[positions[i]]
+                lower_flags = interval_set.flags[positions[i]] & LOWER_FLAGS
+            Int64IntervalSet_sift_down(sets, positions, heap, size, 0, True)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cdef class MutableInt64IntervalSet:
+    '''
+    A set of disjoint Int64Intervals that can be changed in place.  The intervals are kept 
+    sorted in a list of blocks of bounded size, so that adding or discarding an interval 
+    takes O(log(n)) comparisons and moves O(block_size) intervals, plus the cost of removing 
+    any intervals it absorbs.  Queries other than contains are answered by an immutable 
+    snapshot, which is cached until the next change.
+    '''
+    def __init__(MutableInt64IntervalSet self, tuple intervals=()):
+        self.reset(Int64IntervalSet_from_intervals(intervals))
+    
+    cdef int reset(MutableInt64IntervalSet self, Int64IntervalSet interval_set) except -1:
+        '''
+        Replace the contents of self with those of interval_set.
+        '''
+        cdef Py_ssize_t i, start
+        cdef Int64IntervalSetBuilder block
+        self.blocks = []
+        for start in range(0, max(interval_set.n_intervals, 1), block_size):
+            block = Int64IntervalSetBuilder(block_size)
+            for i in range(start, min(start + block_size, interval_set.n_intervals)):
+                block.append(interval_set.lower_bounds[i], interval_set.upper_bounds[i], 
+                             interval_set.flags[i])
+            self.blocks.append(block)
+        self.n_intervals = interval_set.n_intervals
+        self.frozen = interval_set
+        return 0
+    
+    cpdef Int64IntervalSet freeze(MutableInt64IntervalSet self):
+        '''
+        Return an immutable Int64IntervalSet with the same intervals as self.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableInt64IntervalSet.freeze')
+        cdef Int64IntervalSetBuilder block, builder
+        cdef Py_ssize_t i
+        if self.frozen is None:
+            builder = Int64IntervalSetBuilder(self.n_intervals)
+            for block in self.blocks:
+                for i in range(block.size):
+                    builder.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            self.frozen = builder.build()
+        return self.frozen
+    
+    cdef int search(MutableInt64IntervalSet self, int64_t lower, int64_t upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1:
+        '''
+        Find the first interval that does not lie entirely below the query interval, or, if 
+        after is true, the first that lies entirely above it, counting intervals that only 
+        touch it as overlapping if touching is true.  Store its block and position in the 
+        block, which are the last block and its size if there is no such interval.
+        '''
+        cdef Int64IntervalSetBuilder block
+        cdef Py_ssize_t low = 0, high = len(self.blocks) - 1, i
+        while low < high:
+            i = (low + high) / 2
+            block = self.blocks[i]
+            if MutableInt64IntervalSet_passed(block, block.size - 1, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        block = self.blocks[low]
+        block_index[0] = low
+        low = 0
+        high = block.size
+        while low < high:
+            i = (low + high) / 2
+            if MutableInt64IntervalSet_passed(block, i, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        position[0] = low
+        return 0
+    
+    cdef int replace(MutableInt64IntervalSet self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, Int64IntervalSetBuilder replacement) except -1:
+        '''
+        Replace the intervals from position first in block first_block up to, but not including, 
+        position last in block last_block with the intervals in replacement.
+        '''
+        cdef Int64IntervalSetBuilder block = self.blocks[first_block]
+        cdef Int64IntervalSetBuilder other
+        cdef Py_ssize_t i, j, removed = 0
+        if first_block == last_block:
+            removed = last - first
+            block.remove(first, last)
+        else:
+            removed = block.size - first
+            block.remove(first, block.size)
+            for i in range(first_block + 1, last_block):
+                removed += (<Int64IntervalSetBuilder> self.blocks[i]).size
+            other = self.blocks[last_block]
+            removed += last
+            other.remove(0, last)
+            del self.blocks[first_block + 1:last_block]
+        for i in range(replacement.size):
+            block.insert(first + i, replacement.lower_bounds[i], replacement.upper_bounds[i], 
+                         replacement.flags[i])
+        self.n_intervals += replacement.size - removed
+        self.frozen = None
+        # Keep the sizes of the changed blocks within bounds
+        if block.size > 2 * block_size:
+            other = Int64IntervalSetBuilder(block_size)
+            for i in range(block.size / 2, block.size):
+                other.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            block.remove(block.size / 2, block.size)
+            self.blocks.insert(first_block + 1, other)
+        for i in (first_block + 1, first_block, first_block - 1):
+            if i >= 0 and i + 1 < len(self.blocks):
+                block = self.blocks[i]
+                other = self.blocks[i + 1]
+                if ((block.size < block_size / 4 or other.size < block_size / 4) and 
+                    block.size + other.size <= 2 * block_size):
+                    for j in range(other.size):
+                        block.append(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                    del self.blocks[i + 1]
+        return 0
+    
+    cpdef add(MutableInt64IntervalSet self, Int64Interval interval):
+        '''
+        Add the elements of interval to self, fusing it with any intervals it overlaps or 
+        touches.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableInt64IntervalSet.add')
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef Int64IntervalSetBuilder block
+        cdef Int64IntervalSetBuilder replacement = Int64IntervalSetBuilder(1)
+        cdef int64_t lower = interval.lower_bound
+        cdef int64_t upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        if Int64Interval_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, True, &first_block, &first)
+        self.search(lower, upper, flags, True, True, &last_block, &last)
+        replacement.append(lower, upper, flags)
+        if first_block != last_block or first != last:
+            # Fuse with the first and last of the intervals being replaced
+            block = self.blocks[first_block]
+            replacement.merge(block.lower_bounds[first], block.upper_bounds[first], block.flags[first])
+            block = self.blocks[last_block if last > 0 else last_block - 1]
+            i = (last if last > 0 else block.size) - 1
+            replacement.merge(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef discard(MutableInt64IntervalSet self, Int64Interval interval):
+        '''
+        Remove the elements of interval from self, splitting any interval that extends past it.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableInt64IntervalSet.discard')
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef Int64IntervalSetBuilder block
+        cdef Int64IntervalSetBuilder replacement = Int64IntervalSetBuilder(2)
+        cdef int64_t lower = interval.lower_bound
+        cdef int64_t upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        cdef unsigned char piece_flags
+        if Int64Interval_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, False, &first_block, &first)
+        self.search(lower, upper, flags, True, False, &last_block, &last)
+        if first_block == last_block and first == last:
+            return
+        block = self.blocks[first_block]
+        if flags & LOWER_BOUNDED:
+            # The part of the first overlapping interval below interval
+            piece_flags = ((block.flags[first] & LOWER_FLAGS) | UPPER_BOUNDED | 
+                           (0 if flags & LOWER_CLOSED else UPPER_CLOSED))
+            if not Int64Interval_empty(block.lower_bounds[first], lower, piece_flags):
+                replacement.append(block.lower_bounds[first], lower, piece_flags)
+        block = self.blocks[last_block if last > 0 else last_block - 1]
+        i = (last if last > 0 else block.size) - 1
+        if flags & UPPER_BOUNDED:
+            # The part of the last overlapping interval above interval
+            piece_flags = ((block.flags[i] & UPPER_FLAGS) | LOWER_BOUNDED | 
+                           (0 if flags & UPPER_CLOSED else LOWER_CLOSED))
+            if not Int64Interval_empty(upper, block.upper_bounds[i], piece_flags):
+                replacement.append(upper, block.upper_bounds[i], piece_flags)
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef bool contains(MutableInt64IntervalSet self, int64_t item):
+        cdef OperationTimer timer = OperationTimer('MutableInt64IntervalSet.contains')
+        cdef int64_t value = item
+        cdef Py_ssize_t block_index, position
+        cdef Int64IntervalSetBuilder block
+        self.search(value, value, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                    False, False, &block_index, &position)
+        block = self.blocks[block_index]
+        return position < block.size and Int64Interval_containment_cmp(block.lower_bounds[position], 
+                                                                         block.upper_bounds[position], 
+                                                                         block.flags[position], value) == 0
+    
+    def __contains__(MutableInt64IntervalSet self, item):
+        return self.contains(item)
+    
+    def __ior__(MutableInt64IntervalSet self, other):
+        cdef Int64Interval interval
+        for interval in other:
+            self.add(interval)
+        return self
+    
+    def __isub__(MutableInt64IntervalSet self, other):
+        cdef Int64Interval interval
+        for interval in other:
+            self.discard(interval)
+        return self
+    
+    def __iand__(MutableInt64IntervalSet self, other):
+        cdef Int64IntervalSet interval_set
+        if isinstance(other, MutableInt64IntervalSet):
+            interval_set = (<MutableInt64IntervalSet> other).freeze()
+        elif isinstance(other, Int64IntervalSet):
+            interval_set = other
+        else:
+            # Any other iterable of intervals, as for |= and -=
+            interval_set = Int64IntervalSet_from_intervals(tuple(other))
+        # Discarding the complement would leave gaps holding no element of a discrete type 
+        # inside the remaining intervals, so the intersection is rebuilt as a whole
+        self.reset(self.freeze().intersection(interval_set))
+        return self
+    
+    def __richcmp__(MutableInt64IntervalSet self, other, int op):
+        if isinstance(other, MutableInt64IntervalSet):
+            other = (<MutableInt64IntervalSet> other).freeze()
+        return PyObject_RichCompare(self.freeze(), other, op)
+    
+    __hash__ = None
+    
+    def __reduce__(MutableInt64IntervalSet self):
+        return (self.__class__, (self.intervals,))
+    
+    def __iter__(MutableInt64IntervalSet self):
+        return iter(self.freeze())
+    
+    def __str__(MutableInt64IntervalSet self):
+        return str(self.freeze())
+    
+    def __repr__(MutableInt64IntervalSet self):
+        return str(self)
+    
+    def __nonzero__(MutableInt64IntervalSet self):
+        return self.n_intervals > 0
+    
+    @property
+    def intervals(MutableInt64IntervalSet self):
+        return self.freeze().intervals
+    
+    def empty(MutableInt64IntervalSet self):
+        return self.n_intervals == 0
+    
+    def lower_bounded(MutableInt64IntervalSet self):
+        return self.freeze().lower_bounded()
+    
+    def upper_bounded(MutableInt64IntervalSet self):
+        return self.freeze().upper_bounded()
+    
+    def lower_bound(MutableInt64IntervalSet self):
+        return self.freeze().lower_bound()
+    
+    def upper_bound(MutableInt64IntervalSet self):
+        return self.freeze().upper_bound()
+    
+    def contains_many(MutableInt64IntervalSet self, points):
+        return self.freeze().contains_many(points)
+    
+    def locate(MutableInt64IntervalSet self, points):
+        return self.freeze().locate(points)
+    
+    def subset(MutableInt64IntervalSet self, other):
+        if isinstance(other, MutableInt64IntervalSet):
+            other = (<MutableInt64IntervalSet> other).freeze()
+        return self.freeze().subset(other)
+    
+    def measure(MutableInt64IntervalSet self):
+        return self.freeze().measure()
+    
+    def intersection_measure(MutableInt64IntervalSet self, other):
+        if isinstance(other, MutableInt64IntervalSet):
+            other = (<MutableInt64IntervalSet> other).freeze()
+        return self.freeze().intersection_measure(other)
+
+cdef inline bint MutableInt64IntervalSet_passed(Int64IntervalSetBuilder block, Py_ssize_t i, 
+                                                  int64_t lower, int64_t upper, unsigned char flags, 
+                                                  bint after, bint touching):
+    '''
+    Return whether interval i of block is not entirely below the query interval or, if after 
+    is true, whether it is entirely above it.  If touching is true, intervals that touch 
+    the query interval without overlapping it count as overlapping it.
+    '''
+    cdef int cmp = Int64Interval_overlap_cmp(block.lower_bounds[i], block.upper_bounds[i], block.flags[i], 
+                                               lower, upper, flags)
+    if after:
+        return cmp == 1 and not (touching and block.lower_bounds[i] == upper and (flags & UPPER_BOUNDED) and 
+                                 (block.flags[i] & LOWER_BOUNDED) and 
+                                 ((block.flags[i] & LOWER_CLOSED) or (flags & UPPER_CLOSED)))
+    else:
+        return cmp != -1 or (touching and block.upper_bounds[i] == lower and (flags & LOWER_BOUNDED) and 
+                             (block.flags[i] & UPPER_BOUNDED) and 
+                             ((block.flags[i] & UPPER_CLOSED) or (flags & LOWER_CLOSED)))
+
+cdef class Int64IntervalIndex:
+    '''
+    A static collection of Int64Intervals, which may overlap and are identified by their 
+    position in the sequence the index was built from.  Queries return arrays of these 
+    positions in increasing order.  Intervals are sorted by lower bound, and an implicit 
+    binary tree over the sorted order records the interval with the greatest upper bound 
+    in each subtree, so the k intervals overlapping a query are found in O((k + 1) log(n)) 
+    time.
+    '''
+    def __init__(Int64IntervalIndex self, tuple intervals):
+        cdef OperationTimer timer = OperationTimer('Int64IntervalIndex.__init__')
+        cdef Int64Interval interval
+        cdef Int64IntervalSetBuilder raw = Int64IntervalSetBuilder(len(intervals))
+        for interval in intervals:
+            raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        self.index(raw)
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True):
+        '''
+        Construct an Int64IntervalIndex from arrays of bounds and flags, which are 
+        interpreted as in Int64IntervalSet.from_arrays.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalIndex.from_arrays')
+        cdef Int64IntervalIndex result = Int64IntervalIndex.__new__(Int64IntervalIndex)
+        result.index(Int64IntervalSet_raw_from_arrays(lower, upper, lower_closed, upper_closed, 
+                                                        lower_bounded, upper_bounded))
+        return result
+    
+    cdef int index(Int64IntervalIndex self, Int64IntervalSetBuilder raw) except -1:
+        '''
+        Sort the intervals accumulated in raw and build the tree over them.
+        '''
+        cdef Py_ssize_t i, k, n = raw.size
+        cdef Py_ssize_t left, right
+        cdef Int64IntervalSetBuilder builder = Int64IntervalSetBuilder(n)
+        self.order_array = clone(index_template, n, False)
+        self.order = index_data(self.order_array)
+        cdef Int64IntervalRecord *records = <Int64IntervalRecord *> PyMem_Malloc(n * sizeof(Int64IntervalRecord))
+        if records == NULL and n > 0:
+            raise MemoryError()
+        try:
+            for i in range(n):
+                records[i].lower = raw.lower_bounds[i]
+                records[i].upper = raw.upper_bounds[i]
+                records[i].flags = raw.flags[i]
+                records[i].index = i
+            qsort(records, n, sizeof(Int64IntervalRecord), Int64Interval_record_cmp)
+            for i in range(n):
+                builder.append(records[i].lower, records[i].upper, records[i].flags)
+                self.order[i] = records[i].index
+        finally:
+            PyMem_Free(records)
+        # The sorted intervals are kept in the storage of an Int64IntervalSet, although unlike 
+        # those of a set they may be empty or overlap
+        self.sorted_intervals = builder.build()
+        self.n_intervals = n
+        self.leaves = 1
+        while self.leaves < n:
+            self.leaves *= 2
+        self.tree_array = clone(index_template, 2 * self.leaves, False)
+        self.tree = index_data(self.tree_array)
+        # Empty intervals are left out of the tree, so they are never found
+        for i in range(self.leaves):
+            if i < n and not Int64Interval_empty(self.sorted_intervals.lower_bounds[i], 
+                                                   self.sorted_intervals.upper_bounds[i], 
+                                                   self.sorted_intervals.flags[i]):
+                self.tree[self.leaves + i] = i
+            else:
+                self.tree[self.leaves + i] = -1
+        for i in range(self.leaves - 1, 0, -1):
+            left = self.tree[2 * i]
+            right = self.tree[2 * i + 1]
+            if left < 0 or (right >= 0 and 
+                            Int64Interval_upper_cmp(self.sorted_intervals.upper_bounds[right], 
+                                                      self.sorted_intervals.flags[right], 
+                                                      self.sorted_intervals.upper_bounds[left], 
+                                                      self.sorted_intervals.flags[left]) > 0):
+                self.tree[i] = right
+            else:
+                self.tree[i] = left
+        return 0
+    
+    def __len__(Int64IntervalIndex self):
+        return self.n_intervals
+    
+    @property
+    def intervals(Int64IntervalIndex self):
+        '''
+        The indexed intervals, in the order the index was built from.
+        '''
+        cdef Py_ssize_t i
+        cdef list result
+        if self.cached_intervals is None:
+            result = [None] * self.n_intervals
+            for i, interval in enumerate(self.sorted_intervals.intervals):
+                result[self.order[i]] = interval
+            self.cached_intervals = tuple(result)
+        return self.cached_intervals
+    
+    def __reduce__(Int64IntervalIndex self):
+        return (self.__class__, (self.intervals,))
+    
+    def __str__(Int64IntervalIndex self):
+        return 'Int64IntervalIndex(%s)' % ', '.join(map(str, self.intervals))
+    
+    def __repr__(Int64IntervalIndex self):
+        return str(self)
+    
+    cdef Py_ssize_t end(Int64IntervalIndex self, int64_t upper, unsigned char flags):
+        '''
+        Use binary search to find the number of intervals, in sorted order, that do not lie 
+        entirely above the upper bound of the query.
+        '''
+        cdef Py_ssize_t i, low = 0, high = self.n_intervals
+        cdef Int64IntervalSet intervals = self.sorted_intervals
+        while low < high:
+            i = (low + high) / 2
+            # Masking the flags restricts overlap_cmp to the lower bound of the interval 
+            # and the upper bound of the query
+            if Int64Interval_overlap_cmp(intervals.lower_bounds[i], intervals.upper_bounds[i], 
+                                           intervals.flags[i] & LOWER_FLAGS, upper, upper, 
+                                           flags & UPPER_FLAGS) == 1:
+                high = i
+            else:
+                low = i + 1
+        return low
+    
+    cdef int collect(Int64IntervalIndex self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, int64_t lower, int64_t upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals under node, among the first end in 
+        sorted order, that do not lie entirely below the lower bound of the query and share 
+        an element with it.  Subtrees whose greatest upper bound lies below the query are 
+        skipped.
+        '''
+        cdef Py_ssize_t k, middle
+        cdef Int64IntervalSet intervals = self.sorted_intervals
+        if node_start >= end:
+            return 0
+        k = self.tree[node]
+        if k < 0 or Int64Interval_overlap_cmp(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                intervals.flags[k] & UPPER_FLAGS, lower, lower, 
+                                                flags & LOWER_FLAGS) == -1:
+            return 0
+        if node_stop - node_start == 1:
+            # Bounds that interleave may still leave no element in common
+            if not Int64Interval_intersection_empty(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                      intervals.flags[k], lower, upper, flags):
+                append_index(result, size, self.order[k])
+            return 0
+        middle = (node_start + node_stop) / 2
+        self.collect(2 * node, node_start, middle, end, lower, upper, flags, result, size)
+        self.collect(2 * node + 1, middle, node_stop, end, lower, upper, flags, result, size)
+        return 0
+    
+    cdef int query(Int64IntervalIndex self, int64_t lower, int64_t upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals that overlap the query interval, in 
+        increasing order.
+        '''
+        cdef Py_ssize_t start = size[0]
+        if Int64Interval_empty(lower, upper, flags):
+            return 0
+        self.collect(1, 0, self.leaves, self.end(upper, flags), lower, upper, flags, result, size)
+        qsort(index_data(result) + start, size[0] - start, sizeof(Py_ssize_t), index_cmp)
+        return 0
+    
+    cpdef array stab(Int64IntervalIndex self, int64_t point):
+        '''
+        Return the positions of the intervals containing point.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalIndex.stab')
+        cdef int64_t item = point
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(item, item, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, result, &size)
+        resize(result, size)
+        return result
+    
+    cpdef array overlap(Int64IntervalIndex self, Int64Interval interval):
+        '''
+        Return the positions of the intervals that overlap interval.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalIndex.overlap')
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+        resize(result, size)
+        return result
+    
+    def stab_many(Int64IntervalIndex self, points):
+        '''
+        Stab the index with each of points.  Return a pair of arrays of equal length, the 
+        first holding positions in points and the second the positions of the intervals 
+        containing them, ordered by position in points and then by interval position.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalIndex.stab_many')
+        cdef const int64_t[:] items = Int64IntervalSet_values(points)
+        cdef Py_ssize_t n = items.shape[0]
+        cdef Py_ssize_t i, start, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for i in range(n):
+            start = size
+            self.query(items[i], items[i], LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                       result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+    
+    def overlap_many(Int64IntervalIndex self, intervals):
+        '''
+        Query the index with each of intervals, which may be any iterable of Int64Intervals 
+        such as an Int64IntervalSet.  Return a pair of arrays as in stab_many.
+        '''
+        cdef OperationTimer timer = OperationTimer('Int64IntervalIndex.overlap_many')
+        cdef Int64Interval interval
+        cdef Py_ssize_t i = 0, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for interval in intervals:
+            self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+            i += 1
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+
+
+cdef int Int64Interval_sweep_step(int64_t * lower1, int64_t * upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                     Py_ssize_t i, int64_t * lower2, int64_t * upper2, unsigned char *flags2, 
+                                     Py_ssize_t *order2, Py_ssize_t *active2, Py_ssize_t *n_active2, bint swapped, 
+                                     IndexPairs *pairs) except -1 nogil:
+    '''
+    Pair interval i of the first side with each active interval of the second side that 
+    does not lie entirely below it, and drop those that do from the active intervals.  The 
+    active intervals all have lower bounds not greater than that of interval i, so they 
+    overlap it unless they lie below it, and then they lie below all later intervals too.
+    '''
+    cdef Py_ssize_t k, j, kept = 0
+    for k in range(n_active2[0]):
+        j = active2[k]
+        # Masking the flags restricts overlap_cmp to the upper bound of the active interval and 
+        # the lower bound of interval i
+        if Int64Interval_overlap_cmp(lower2[j], upper2[j], flags2[j] & UPPER_FLAGS, 
+                                       lower1[i], upper1[i], flags1[i] & LOWER_FLAGS) != -1:
+            # Bounds that interleave may still leave no element in common
+            if not Int64Interval_intersection_empty(lower1[i], upper1[i], flags1[i], 
+                                                      lower2[j], upper2[j], flags2[j]):
+                if swapped:
+                    append_pair(pairs, order2[j], order1[i])
+                else:
+                    append_pair(pairs, order1[i], order2[j])
+            active2[kept] = j
+            kept += 1
+    n_active2[0] = kept
+    return 0
+
+cdef int Int64Interval_sweep(int64_t * lower1, int64_t * upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                Py_ssize_t n1, int64_t * lower2, int64_t * upper2, unsigned char *flags2, 
+                                Py_ssize_t *order2, Py_ssize_t n2, Py_ssize_t *active1, Py_ssize_t *active2, 
+                                IndexPairs *pairs) except -1 nogil:
+    '''
+    Merge two sequences of intervals sorted by lower bound, keeping for each side the 
+    intervals that may still overlap later intervals of the other side.
+    '''
+    cdef Py_ssize_t i = 0, j = 0, n_active1 = 0, n_active2 = 0
+    while i < n1 or j < n2:
+        if j == n2 or (i < n1 and Int64Interval_lower_cmp(lower1[i], flags1[i], lower2[j], flags2[j]) <= 0):
+            if not Int64Interval_empty(lower1[i], upper1[i], flags1[i]):
+                Int64Interval_sweep_step(lower1, upper1, flags1, order1, i, lower2, upper2, flags2, 
+                                           order2, active2, &n_active2, False, pairs)
+                active1[n_active1] = i
+                n_active1 += 1
+            i += 1
+        else:
+            if not Int64Interval_empty(lower2[j], upper2[j], flags2[j]):
+                Int64Interval_sweep_step(lower2, upper2, flags2, order2, j, lower1, upper1, flags1, 
+                                           order1, active1, &n_active1, True, pairs)
+                active2[n_active2] = j
+                n_active2 += 1
+            j += 1
+    return 0
+
+cpdef tuple Int64Interval_overlap_join(Int64IntervalIndex left, Int64IntervalIndex right):
+    '''
+    Return a pair of arrays holding the positions in left and in right of every pair of 
+    overlapping intervals, in no particular order.
+    '''
+    cdef OperationTimer timer = OperationTimer('Int64Interval_overlap_join')
+    cdef Int64IntervalSet left_intervals = left.sorted_intervals
+    cdef Int64IntervalSet right_intervals = right.sorted_intervals
+    cdef IndexPairs pairs
+    pairs.first = NULL
+    pairs.second = NULL
+    pairs.size = 0
+    pairs.capacity = 0
+    cdef Py_ssize_t *active = <Py_ssize_t *> PyMem_Malloc((left.n_intervals + right.n_intervals) * sizeof(Py_ssize_t))
+    if active == NULL and left.n_intervals + right.n_intervals > 0:
+        raise MemoryError()
+    try:
+        with nogil:
+            Int64Interval_sweep(left_intervals.lower_bounds, left_intervals.upper_bounds, 
+                                  left_intervals.flags, left.order, left.n_intervals, 
+                                  right_intervals.lower_bounds, right_intervals.upper_bounds, 
+                                  right_intervals.flags, right.order, right.n_intervals, 
+                                  active, active + left.n_intervals, &pairs)
+        return index_pairs_to_arrays(&pairs)
+    finally:
+        PyMem_Free(active)
+        free(pairs.first)
+        free(pairs.second)
+
+
+# These operate on the raw bounds and packed flags of an interval.  The methods of 
+# FloatInterval and the loops of FloatIntervalSet are built on them.
+cdef inline bint FloatInterval_adjacent(double lower, double upper) nogil:
+    return False
+
+cdef inline bint FloatInterval_empty(double lower, double upper, unsigned char flags) nogil:
+    return (((flags & LOWER_BOUNDED) and (flags & UPPER_BOUNDED)) and 
+            ((((lower == upper) and 
+            (not ((flags & LOWER_CLOSED) and (flags & UPPER_CLOSED)))) or
+            lower > upper) or 
+             (lower < upper and 
+              (not (flags & (LOWER_CLOSED | UPPER_CLOSED))) and
+              FloatInterval_adjacent(lower, upper))))
+
+cdef inline int FloatInterval_containment_cmp(double lower, double upper, unsigned char flags, 
+                                                double item) nogil:
+    global containment_cmp_count
+    containment_cmp_count += 1
+    if flags & LOWER_BOUNDED:
+        if item < lower:
+            return -1
+        elif item == lower:
+            if not (flags & LOWER_CLOSED):
+                return -1
+    if flags & UPPER_BOUNDED:
+        if item > upper:
+            return 1
+        elif item == upper:
+            if not (flags & UPPER_CLOSED):
+                return 1
+    return 0
+
+cdef inline int FloatInterval_lower_cmp(double lower1, unsigned char flags1, 
+                                          double lower2, unsigned char flags2) nogil:
+    global lower_cmp_count
+    lower_cmp_count += 1
+    if not (flags1 & LOWER_BOUNDED):
+        if not (flags2 & LOWER_BOUNDED):
+            return 0
+        else:
+            return -1
+    elif not (flags2 & LOWER_BOUNDED):
+        return 1
+    if lower1 < lower2:
+        return -1
+    elif lower1 == lower2:
+        if (flags1 & LOWER_CLOSED) and not (flags2 & LOWER_CLOSED):
+            return -1
+        elif (flags2 & LOWER_CLOSED) and not (flags1 & LOWER_CLOSED):
+            return 1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int FloatInterval_upper_cmp(double upper1, unsigned char flags1, 
+                                          double upper2, unsigned char flags2) nogil:
+    global upper_cmp_count
+    upper_cmp_count += 1
+    if not (flags1 & UPPER_BOUNDED):
+        if not (flags2 & UPPER_BOUNDED):
+            return 0
+        else:
+            return 1
+    elif not (flags2 & UPPER_BOUNDED):
+        return -1
+    if upper1 < upper2:
+        return -1
+    elif upper1 == upper2:
+        if (flags1 & UPPER_CLOSED) and not (flags2 & UPPER_CLOSED):
+            return 1
+        elif (flags2 & UPPER_CLOSED) and not (flags1 & UPPER_CLOSED):
+            return -1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int FloatInterval_overlap_cmp(double lower1, double upper1, unsigned char flags1, 
+                                            double lower2, double upper2, unsigned char flags2) nogil:
+    global overlap_cmp_count
+    overlap_cmp_count += 1
+    if (flags1 & UPPER_BOUNDED) and (flags2 & LOWER_BOUNDED):
+        if upper1 < lower2:
+            return -1
+        elif upper1 == lower2:
+            if (flags1 & UPPER_CLOSED) and (flags2 & LOWER_CLOSED):
+                return 0
+            else:
+                return -1
+    if (flags1 & LOWER_BOUNDED) and (flags2 & UPPER_BOUNDED):
+        if lower1 > upper2:
+            return 1
+        elif lower1 == upper2:
+            if (flags1 & LOWER_CLOSED) and (flags2 & UPPER_CLOSED):
+                return 0
+            else:
+                return 1
+    return 0
+
+cdef inline bint FloatInterval_fusible(double lower1, double upper1, unsigned char flags1, 
+                                         double lower2, double upper2, unsigned char flags2) nogil:
+    '''
+    Return whether the union of two nonempty intervals is an interval, because they overlap 
+    or touch.
+    '''
+    cdef int overlap_cmp = FloatInterval_overlap_cmp(lower1, upper1, flags1, lower2, upper2, flags2)
+    return ((overlap_cmp == 0) or 
+            (overlap_cmp == -1 and upper1 == lower2 and 
+             ((flags1 & UPPER_CLOSED) or (flags2 & LOWER_CLOSED))) or
+            (overlap_cmp == 1 and upper2 == lower1 and 
+             ((flags2 & UPPER_CLOSED) or (flags1 & LOWER_CLOSED))))
+
+cdef inline bint FloatInterval_intersection_empty(double lower1, double upper1, unsigned char flags1, 
+                                                    double lower2, double upper2, unsigned char flags2) nogil:
+    '''
+    Return whether two nonempty intervals that overlap according to overlap_cmp nonetheless 
+    have no element in common, which can only happen for types with adjacent elements.
+    '''
+    return False
+
+cdef array FloatInterval_bounds_template = array('d')
+
+cdef const double[:] FloatIntervalSet_values(object values):
+    '''
+    View values as a buffer of double, copying them only if they do not already 
+    expose one of the right type.
+    '''
+    cdef const double[:] result
+    try:
+        result = values
+    except (TypeError, ValueError, BufferError):
+        result = array('d', values)
+    return result
+
+ctypedef struct FloatIntervalRecord:
+    double lower
+    double upper
+    unsigned char flags
+    Py_ssize_t index
+
+cdef int FloatInterval_record_cmp(const void *record1, const void *record2) nogil:
+    cdef FloatIntervalRecord *first = <FloatIntervalRecord *> record1
+    cdef FloatIntervalRecord *second = <FloatIntervalRecord *> record2
+    return FloatInterval_lower_cmp(first.lower, first.flags, second.lower, second.flags)
+
+cdef inline double FloatInterval_length(double lower, double upper, unsigned char flags) nogil:
+    '''
+    The length of a bounded interval.
+    '''
+    return upper - lower
+
+cdef class FloatIntervalSetBuilder:
+    '''
+    Accumulates the bounds and flags of sorted intervals into the storage of a new 
+    FloatIntervalSet.  The builder must not be used after build has been called.
+    '''
+    def __cinit__(FloatIntervalSetBuilder self, Py_ssize_t capacity=0):
+        self.size = 0
+        self.capacity = capacity
+        self.flags_array = clone(flags_template, capacity, False)
+        self.flags = self.flags_array.data.as_uchars
+        self.lower_array = clone(FloatInterval_bounds_template, capacity, False)
+        self.upper_array = clone(FloatInterval_bounds_template, capacity, False)
+        self.lower_bounds = <double *> self.lower_array.data.as_voidptr
+        self.upper_bounds = <double *> self.upper_array.data.as_voidptr
+    
+    cdef int grow(FloatIntervalSetBuilder self) except -1:
+        self.capacity = 2 * self.capacity + 8
+        resize(self.flags_array, self.capacity)
+        self.flags = self.flags_array.data.as_uchars
+        resize(self.lower_array, self.capacity)
+        resize(self.upper_array, self.capacity)
+        self.lower_bounds = <double *> self.lower_array.data.as_voidptr
+        self.upper_bounds = <double *> self.upper_array.data.as_voidptr
+        return 0
+    
+    cdef int append(FloatIntervalSetBuilder self, double lower, double upper, 
+                    unsigned char flags) except -1 nogil:
+        '''
+        Add an interval after all intervals added so far, assuming the two neither overlap 
+        nor touch.
+        '''
+        if self.size == self.capacity:
+            with gil:
+                self.grow()
+        self.lower_bounds[self.size] = lower
+        self.upper_bounds[self.size] = upper
+        self.flags[self.size] = flags
+        self.size += 1
+        return 0
+    
+    cdef int merge(FloatIntervalSetBuilder self, double lower, double upper, 
+                   unsigned char flags) except -1 nogil:
+        '''
+        Add an interval whose lower bound is not less than that of any interval added so far, 
+        fusing it with the last interval if the two overlap or touch.  Empty intervals are 
+        ignored.
+        '''
+        cdef Py_ssize_t last = self.size - 1
+        if FloatInterval_empty(lower, upper, flags):
+            return 0
+        if last < 0:
+            return self.append(lower, upper, flags)
+        if FloatInterval_fusible(self.lower_bounds[last], self.upper_bounds[last], self.flags[last], 
+                                   lower, upper, flags):
+            if FloatInterval_lower_cmp(lower, flags, self.lower_bounds[last], self.flags[last]) < 0:
+                self.lower_bounds[last] = lower
+                self.flags[last] = (self.flags[last] & UPPER_FLAGS) | (flags & LOWER_FLAGS)
+            if FloatInterval_upper_cmp(upper, flags, self.upper_bounds[last], self.flags[last]) > 0:
+                self.upper_bounds[last] = upper
+                self.flags[last] = (self.flags[last] & LOWER_FLAGS) | (flags & UPPER_FLAGS)
+            return 0
+        return self.append(lower, upper, flags)
+    
+    cdef int remove(FloatIntervalSetBuilder self, Py_ssize_t start, Py_ssize_t stop) except -1:
+        '''
+        Remove the intervals at positions start up to, but not including, stop.
+        '''
+        cdef Py_ssize_t tail = self.size - stop
+        if stop <= start:
+            return 0
+        memmove(self.lower_bounds + start, self.lower_bounds + stop, tail * sizeof(double))
+        memmove(self.upper_bounds + start, self.upper_bounds + stop, tail * sizeof(double))
+        memmove(self.flags + start, self.flags + stop, tail)
+        self.size -= stop - start
+        return 0
+    
+    cdef int insert(FloatIntervalSetBuilder self, Py_ssize_t position, double lower, double upper, 
+                    unsigned char flags) except -1:
+        '''
+        Add an interval at the given position, moving the intervals after it.
+        '''
+        if self.size == self.capacity:
+            self.grow()
+        memmove(self.lower_bounds + position + 1, self.lower_bounds + position, 
+                (self.size - position) * sizeof(double))
+        memmove(self.upper_bounds + position + 1, self.upper_bounds + position, 
+                (self.size - position) * sizeof(double))
+        self.lower_bounds[position] = lower
+        self.upper_bounds[position] = upper
+        memmove(self.flags + position + 1, self.flags + position, self.size - position)
+        self.flags[position] = flags
+        self.size += 1
+        return 0
+    
+    cdef FloatIntervalSet build(FloatIntervalSetBuilder self):
+        cdef FloatIntervalSet result = FloatIntervalSet.__new__(FloatIntervalSet)
+        resize(self.flags_array, self.size)
+        result.flags = self.flags_array.data.as_uchars
+        resize(self.lower_array, self.size)
+        resize(self.upper_array, self.size)
+        result.lower_bounds = <double *> self.lower_array.data.as_voidptr
+        result.upper_bounds = <double *> self.upper_array.data.as_voidptr
+        result.storage = (self.lower_array, self.upper_array, self.flags_array)
+        result.n_intervals = self.size
+        return result
+
+cdef FloatIntervalSet FloatIntervalSet_normalize(FloatIntervalSetBuilder raw):
+    '''
+    Build an FloatIntervalSet from the intervals accumulated in raw, which may be empty, 
+    unsorted and overlapping.  Empty intervals are dropped, the rest are sorted by lower bound 
+    and any that overlap or touch are fused.
+    '''
+    cdef Py_ssize_t i, k, n = raw.size
+    cdef FloatIntervalSetBuilder builder
+    cdef bint is_sorted = True
+    for i in range(1, n):
+        if FloatInterval_lower_cmp(raw.lower_bounds[i-1], raw.flags[i-1], 
+                                     raw.lower_bounds[i], raw.flags[i]) > 0:
+            is_sorted = False
+            break
+    if is_sorted:
+        builder = FloatIntervalSetBuilder(n)
+        for i in range(n):
+            builder.merge(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i])
+        return builder.build()
+    cdef FloatIntervalRecord *records = <FloatIntervalRecord *> PyMem_Malloc(n * sizeof(FloatIntervalRecord))
+    if records == NULL and n > 0:
+        raise MemoryError()
+    try:
+        k = 0
+        for i in range(n):
+            if not FloatInterval_empty(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i]):
+                records[k].lower = raw.lower_bounds[i]
+                records[k].upper = raw.upper_bounds[i]
+                records[k].flags = raw.flags[i]
+                k += 1
+        qsort(records, k, sizeof(FloatIntervalRecord), FloatInterval_record_cmp)
+        builder = FloatIntervalSetBuilder(k)
+        for i in range(k):
+            builder.merge(records[i].lower, records[i].upper, records[i].flags)
+    finally:
+        PyMem_Free(records)
+    return builder.build()
+
+cdef class FloatInterval(BaseInterval):
+    def __init__(BaseInterval self, double lower_bound, double upper_bound, bool lower_closed, 
+                 bool upper_closed, bool lower_bounded, bool upper_bounded):
+        self.flags = pack_flags(lower_closed, upper_closed, lower_bounded, upper_bounded)
+        if lower_bounded:
+            self.lower_bound = lower_bound
+        if upper_bounded:
+            self.upper_bound = upper_bound
+    
+    # For some types, there is a concept of adjacent elements.  For example, 
+    # there are no integers between 1 and 2 (although there are several real numbers).
+    # If there is such a concept, it's possible for an interval to be empty even when 
+    # the lower bound is strictly less than the upper bound, provided the bounds are strict 
+    # (not closed).  The adjacent method is used to help determine such cases.
+    cpdef bool adjacent(FloatInterval self, double lower, double upper):
+        return FloatInterval_adjacent(lower, upper)
+    
+    cpdef int containment_cmp(FloatInterval self, double item):
+        return FloatInterval_containment_cmp(self.lower_bound, self.upper_bound, self.flags, item)
+    
+    cpdef bool contains(FloatInterval self, double item):
+        return self.containment_cmp(item) == 0
+    
+    cpdef bool subset(FloatInterval self, FloatInterval other):
+        '''
+        Return True if and only if self is a subset of other.
+        '''
+        return (FloatInterval_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags) >= 0 and 
+                FloatInterval_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags) <= 0)
+        
+    cpdef int overlap_cmp(FloatInterval self, FloatInterval other):
+        '''
+        Assume both are nonempty.  Return -1 if every element of self is less than every 
+        element of other.  Return 0 if self and other intersect.  Return 1 if every element of 
+        self is greater than every element of other.
+        '''
+        return FloatInterval_overlap_cmp(self.lower_bound, self.upper_bound, self.flags, 
+                                           other.lower_bound, other.upper_bound, other.flags)
+    
+    cpdef tuple init_args(FloatInterval self):
+        return (self.lower_bound, self.upper_bound, (self.flags & LOWER_CLOSED) != 0, 
+                (self.flags & UPPER_CLOSED) != 0, (self.flags & LOWER_BOUNDED) != 0, 
+                (self.flags & UPPER_BOUNDED) != 0)
+
+    cpdef FloatInterval intersection(FloatInterval self, FloatInterval other):
+        cdef FloatInterval result = FloatInterval.__new__(FloatInterval)
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
+        else:
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
+        else:
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
+        return result
+    
+    cpdef FloatInterval fusion(FloatInterval self, FloatInterval other):
+        '''
+        Assume union of intervals is a single interval.  Return their union.  Results not correct
+        if above assumption is violated.
+        '''
+        cdef FloatInterval result = FloatInterval.__new__(FloatInterval)
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
+        else:
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
+        else:
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
+        return result
+    
+    cpdef bool empty(FloatInterval self):
+        return FloatInterval_empty(self.lower_bound, self.upper_bound, self.flags)
+    
+    cpdef bool richcmp(FloatInterval self, FloatInterval other, int op):
+        cdef int lower_cmp
+        cdef int upper_cmp
+        if op == 0 or op == 1:
+            lower_cmp = self.lower_cmp(other)
+            if lower_cmp == -1:
+                return True
+            elif lower_cmp == 1:
+                return False
+            else: # lower_cmp == 0
+                upper_cmp = self.upper_cmp(other)
+                if upper_cmp == -1:
+                    return True
+                elif upper_cmp == 1:
+                    return False
+                else: # upper_cmp == 0
+                    return op == 1
+        elif op == 2:
+            return (self.lower_cmp(other) == 0) and (self.upper_cmp(other) == 0)
+        elif op == 3:
+            return (self.lower_cmp(other) != 0) or (self.upper_cmp(other) != 0)
+        elif op == 4 or op == 5:
+            lower_cmp = self.lower_cmp(other)
+            if lower_cmp == -1:
+                return False
+            elif lower_cmp == 1:
+                return True
+            else: # lower_cmp == 0
+                upper_cmp = self.upper_cmp(other)
+                if upper_cmp == -1:
+                    return False
+                elif upper_cmp == 1:
+                    return True
+                else: # upper_cmp == 0
+                    return op == 5
+    
+    cpdef int lower_cmp(FloatInterval self, FloatInterval other):
+        return FloatInterval_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags)
+    
+    cpdef int upper_cmp(FloatInterval self, FloatInterval other):
+        return FloatInterval_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags)
+
+# This is because static cpdef methods are not supported.  Otherwise this
+# would be a static method of FloatIntervalSet
+cpdef FloatIntervalSet FloatIntervalSet_from_intervals(tuple intervals):
+    '''
+    Construct an FloatIntervalSet from intervals in any order, which may be empty or 
+    overlapping.
+    '''
+    cdef OperationTimer timer = OperationTimer('FloatIntervalSet_from_intervals')
+    cdef FloatInterval interval
+    cdef FloatIntervalSetBuilder raw = FloatIntervalSetBuilder(len(intervals))
+    for interval in intervals:
+        raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+    return FloatIntervalSet_normalize(raw)
+
+cdef FloatIntervalSetBuilder FloatIntervalSet_raw_from_arrays(object lower, object upper, object lower_closed, 
+                                                                   object upper_closed, object lower_bounded, 
+                                                                   object upper_bounded):
+    '''
+    Accumulate intervals given as arrays of bounds and flags, as described in 
+    FloatIntervalSet.from_arrays, into a builder in the order given.
+    '''
+    cdef const double[:] lower_values = FloatIntervalSet_values(lower)
+    cdef const double[:] upper_values = FloatIntervalSet_values(upper)
+    cdef Py_ssize_t i, n = lower_values.shape[0]
+    if upper_values.shape[0] != n:
+        raise ValueError('lower and upper must have the same length')
+    cdef array flags = clone(flags_template, n, True)
+    set_flags(flags.data.as_uchars, n, lower_closed, LOWER_CLOSED)
+    set_flags(flags.data.as_uchars, n, upper_closed, UPPER_CLOSED)
+    set_flags(flags.data.as_uchars, n, lower_bounded, LOWER_BOUNDED)
+    set_flags(flags.data.as_uchars, n, upper_bounded, UPPER_BOUNDED)
+    cdef FloatIntervalSetBuilder raw = FloatIntervalSetBuilder(n)
+    for i in range(n):
+        raw.append(lower_values[i] if flags.data.as_uchars[i] & LOWER_BOUNDED else 0., 
+                   upper_values[i] if flags.data.as_uchars[i] & UPPER_BOUNDED else 0., 
+                   flags.data.as_uchars[i])
+    return raw
+
+cpdef tuple FloatInterval_preprocess_intervals(tuple intervals):
+    '''
+    Remove empty intervals, sort, and fuse any overlapping intervals.
+    '''
+    cdef OperationTimer timer = OperationTimer('FloatInterval_preprocess_intervals')
+    return FloatIntervalSet_from_intervals(intervals).intervals
+
+cdef class FloatIntervalSetCoalescer:
+    '''
+    Iterate over the coalesced intervals of an iterable of FloatIntervals or (lower, upper) 
+    pairs, sorted by lower bound.  Pairs describe closed intervals, and either bound may be 
+    unbounded.  Only one pending interval is held at a time, so the input is never 
+    materialized.  A ValueError is raised if the input is found to be out of order.
+    '''
+    def __init__(FloatIntervalSetCoalescer self, intervals):
+        self.source = iter(intervals)
+        self.pending = False
+        self.started = False
+    
+    def __iter__(FloatIntervalSetCoalescer self):
+        return self
+    
+    def __next__(FloatIntervalSetCoalescer self):
+        cdef FloatInterval result
+        if not self.next_raw():
+            raise StopIteration
+        result = FloatInterval.__new__(FloatInterval)
+        result.lower_bound = self.result_lower
+        result.upper_bound = self.result_upper
+        result.flags = self.result_flags
+        return result
+    
+    cdef int next_raw(FloatIntervalSetCoalescer self) except -1:
+        '''
+        Store the next coalesced interval in the result fields and return 1, or return 0 if 
+        there are no more.
+        '''
+        cdef double item_lower, item_upper
+        cdef unsigned char item_flags
+        cdef FloatInterval interval
+        for item in self.source:
+            if isinstance(item, FloatInterval):
+                interval = item
+                item_lower = interval.lower_bound
+                item_upper = interval.upper_bound
+                item_flags = interval.flags
+            else:
+                lower_value, upper_value = item
+                item_flags = LOWER_CLOSED | UPPER_CLOSED
+                if lower_value is unbounded:
+                    item_lower = 0.
+                else:
+                    item_lower = lower_value
+                    item_flags |= LOWER_BOUNDED
+                if upper_value is unbounded:
+                    item_upper = 0.
+                else:
+                    item_upper = upper_value
+                    item_flags |= UPPER_BOUNDED
+            if self.started and FloatInterval_lower_cmp(item_lower, item_flags, 
+                                                          self.last_lower, self.last_flags) < 0:
+                raise ValueError('Intervals must be sorted by lower bound')
+            self.started = True
+            self.last_lower = item_lower
+            self.last_flags = item_flags
+            if FloatInterval_empty(item_lower, item_upper, item_flags):
+                continue
+            if not self.pending:
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                self.pending = True
+            elif FloatInterval_fusible(self.lower, self.upper, self.flags, item_lower, item_upper, item_flags):
+                if FloatInterval_upper_cmp(item_upper, item_flags, self.upper, self.flags) > 0:
+                    self.upper = item_upper
+                    self.flags = (self.flags & LOWER_FLAGS) | (item_flags & UPPER_FLAGS)
+            else:
+                self.result_lower = self.lower
+                self.result_upper = self.upper
+                self.result_flags = self.flags
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                return 1
+        if self.pending:
+            self.result_lower = self.lower
+            self.result_upper = self.upper
+            self.result_flags = self.flags
+            self.pending = False
+            return 1
+        return 0
+
+cdef class FloatIntervalSetIterator(BaseIntervalSetIterator):
+    def __init__(FloatIntervalSetIterator self, FloatIntervalSet interval_set):
+        self.index = 0
+        self.interval_set = interval_set
+    
+    def __iter__(FloatIntervalSetIterator self):
+        return self
+    
+    def __next__(FloatIntervalSetIterator self):
+        self.index += 1
+        if self.index <= self.interval_set.n_intervals:
+            return self.interval_set.intervals[self.index-1]
+        raise StopIteration
+
+cdef class FloatIntervalSet(BaseIntervalSet):
+    def __init__(FloatIntervalSet self, tuple intervals):
+        '''
+        The intervals must already be sorted and non-overlapping.
+        '''
+        cdef FloatIntervalSetBuilder builder = FloatIntervalSetBuilder(len(intervals))
+        cdef FloatInterval interval
+        cdef FloatIntervalSet built
+        for interval in intervals:
+            builder.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        built = builder.build()
+        self.lower_bounds = built.lower_bounds
+        self.upper_bounds = built.upper_bounds
+        self.flags = built.flags
+        self.storage = built.storage
+        self.n_intervals = built.n_intervals
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True):
+        '''
+        Construct an FloatIntervalSet directly from sequences of lower and upper bounds, 
+        given as buffers of double (such as numpy arrays) or any other sequences of numbers.  
+        Each of lower_closed, upper_closed, lower_bounded and upper_bounded is either a single 
+        bool for all intervals or a sequence of bools with one per interval.  The intervals need 
+        not be sorted or disjoint, and no interval objects are created.
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.from_arrays')
+        return FloatIntervalSet_normalize(FloatIntervalSet_raw_from_arrays(lower, upper, lower_closed, 
+                                                                                upper_closed, lower_bounded, 
+                                                                                upper_bounded))
+    
+    @staticmethod
+    def from_sorted(intervals):
+        '''
+        Construct an FloatIntervalSet from an iterable of FloatIntervals or (lower, upper) pairs 
+        sorted by lower bound, as described in FloatIntervalSetCoalescer, coalescing them as 
+        they are read.
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.from_sorted')
+        cdef FloatIntervalSetCoalescer coalescer = FloatIntervalSetCoalescer(intervals)
+        cdef FloatIntervalSetBuilder builder = FloatIntervalSetBuilder()
+        while coalescer.next_raw():
+            builder.append(coalescer.result_lower, coalescer.result_upper, coalescer.result_flags)
+        return builder.build()
+    
+    def __iter__(FloatIntervalSet self):
+        return FloatIntervalSetIterator(self)
+    
+    def __getitem__(FloatIntervalSet self, index):
+        return self.intervals[index]
+    
+    cdef tuple materialize_intervals(FloatIntervalSet self):
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.materialize_intervals')
+        cdef Py_ssize_t i
+        cdef unsigned char flags
+        cdef FloatInterval interval
+        cdef list result = []
+        for i in range(self.n_intervals):
+            interval = FloatInterval.__new__(FloatInterval)
+            interval.lower_bound = self.lower_bounds[i]
+            interval.upper_bound = self.upper_bounds[i]
+            interval.flags = self.flags[i]
+            result.append(interval)
+        return tuple(result)
+    
+    cdef Py_hash_t compute_hash(FloatIntervalSet self) except -1:
+        '''
+        Combine the hashes of the intervals in the same way as the hash of a tuple.
+        '''
+        cdef Py_ssize_t i
+        cdef unsigned char flags
+        cdef size_t result = 0x345678
+        cdef size_t multiplier = 1000003
+        cdef Py_hash_t interval_hash
+        for i in range(self.n_intervals):
+            flags = canonical_flags(self.flags[i])
+            interval_hash = hash((self.lower_bounds[i] if flags & LOWER_BOUNDED else None, 
+                                  self.upper_bounds[i] if flags & UPPER_BOUNDED else None, flags))
+            result = (result ^ <size_t> interval_hash) * multiplier
+            multiplier += 82520 + 2 * (self.n_intervals - i)
+        result += 97531
+        if <Py_hash_t> result == -1:
+            return -2
+        return <Py_hash_t> result
+    
+    cpdef bool lower_bounded(FloatIntervalSet self):
+        if self.n_intervals > 0:
+            return (self.flags[0] & LOWER_BOUNDED) != 0
+        else:
+            return True
+    
+    cpdef bool upper_bounded(FloatIntervalSet self):
+        if self.n_intervals > 0:
+            return (self.flags[self.n_intervals - 1] & UPPER_BOUNDED) != 0
+        else:
+            return True
+    
+    cpdef double lower_bound(FloatIntervalSet self):
+        if self.n_intervals > 0:
+            return self.lower_bounds[0]
+        else:
+            return 0.
+    
+    cpdef double upper_bound(FloatIntervalSet self):
+        if self.n_intervals > 0:
+            return self.upper_bounds[self.n_intervals - 1]
+        else:
+            return 0.
+    
+    cpdef tuple init_args(FloatIntervalSet self):
+        return (self.intervals,)
+    
+    cdef Py_ssize_t locate_item(FloatIntervalSet self, double item) nogil:
+        '''
+        Use binary search to find the index of the interval containing item, or -1 if there 
+        is none.
+        '''
+        cdef Py_ssize_t i, n
+        cdef Py_ssize_t low, high
+        cdef int cmp
+        n = self.n_intervals
+        low = 0
+        high = n-1
+        while high >= low:
+            i = (high + low) / 2
+            cmp = FloatInterval_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                  self.flags[i], item)
+            if cmp == -1:
+                high = i - 1
+            elif cmp == 1:
+                low = i + 1
+            else: #if cmp == 0:
+                return i
+        return -1
+    
+    cpdef bool contains(FloatIntervalSet self, double item):
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.contains')
+        return self.locate_item(item) >= 0
+    
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef int locate_many(FloatIntervalSet self, const double[:] items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1 nogil:
+        '''
+        For each of items, store the index of the interval containing it (or -1 if there is 
+        none) in indices and whether there is one in mask, skipping either if it is NULL.  
+        Sorted items are merged against the intervals in a single pass, otherwise each is 
+        found by binary search.
+        '''
+        cdef Py_ssize_t n = items.shape[0]
+        cdef Py_ssize_t k
+        cdef Py_ssize_t i, index
+        cdef int cmp
+        cdef bint is_sorted = True
+        cdef double item
+        for k in range(1, n):
+            if not items[k] >= items[k-1]:
+                is_sorted = False
+                break
+        i = 0
+        for k in range(n):
+            item = items[k]
+            if is_sorted:
+                cmp = 1
+                while i < self.n_intervals:
+                    cmp = FloatInterval_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                          self.flags[i], item)
+                    if cmp != 1:
+                        break
+                    i += 1
+                index = i if cmp == 0 else -1
+            else:
+                index = self.locate_item(item)
+            if indices != NULL:
+                indices[k] = index
+            if mask != NULL:
+                mask[k] = index >= 0
+        return 0
+    
+    cpdef array contains_many(FloatIntervalSet self, points):
+        '''
+        Return an array of bytes, with 1 for each of points contained in self and 0 for each 
+        that is not.  The result can be viewed as a boolean numpy array with 
+        numpy.frombuffer(result, dtype=bool).
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.contains_many')
+        cdef const double[:] items = FloatIntervalSet_values(points)
+        cdef array result = clone(flags_template, items.shape[0], False)
+        with nogil:
+            self.locate_many(items, NULL, result.data.as_uchars)
+        return result
+    
+    cpdef array locate(FloatIntervalSet self, points):
+        '''
+        Return an array of positions holding, for each of points, the index in self.intervals of 
+        the interval containing it, or -1 if no interval contains it.
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.locate')
+        cdef const double[:] items = FloatIntervalSet_values(points)
+        cdef array result = clone(index_template, items.shape[0], False)
+        cdef Py_ssize_t *indices = index_data(result)
+        with nogil:
+            self.locate_many(items, indices, NULL)
+        return result
+
+    cpdef bool subset(FloatIntervalSet self, FloatIntervalSet other):
+        '''
+        Return True if and only if self is a subset of other.
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.subset')
+        cdef Py_ssize_t i, j, m, n
+        cdef int overlap_cmp
+        if self.empty():
+            return True
+        elif other.empty():
+            return False
+        m = self.n_intervals
+        n = other.n_intervals
+        i = 0
+        j = 0
+        while i < m:
+            overlap_cmp = FloatInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+            if overlap_cmp == -1:
+                return False
+            elif overlap_cmp == 0:
+                if (FloatInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.flags[j]) < 0 or 
+                    FloatInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                              other.upper_bounds[j], other.flags[j]) > 0):
+                    return False
+                i += 1
+            else:
+                # The current interval of self lies beyond the current interval of other, so 
+                # compare it against the next interval of other.
+                j += 1
+                if j == n:
+                    return False
+        return True
+    
+    cpdef bool equal(FloatIntervalSet self, FloatIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.equal')
+        cdef Py_ssize_t i, n
+        n = self.n_intervals
+        if n != other.n_intervals:
+            return False
+        for i in range(n):
+            if (FloatInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                          other.lower_bounds[i], other.flags[i]) != 0 or 
+                FloatInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                          other.upper_bounds[i], other.flags[i]) != 0):
+                return False
+        return True
+    
+    cpdef bool richcmp(FloatIntervalSet self, FloatIntervalSet other, int op):
+        if op == 0:
+            return self.subset(other) and not self.equal(other)
+        elif op == 1:
+            return self.subset(other)
+        elif op == 2:
+            return self.equal(other)
+        elif op == 3:
+            return not self.equal(other)
+        elif op == 4:
+            return other.subset(self) and not other.equal(self)
+        elif op == 5:
+            return other.subset(self)
+    
+    cpdef bool empty(FloatIntervalSet self):
+        return self.n_intervals == 0 
+    
+    def to_arrays(FloatIntervalSet self):
+        '''
+        Return (lower, upper, lower_closed, upper_closed, lower_bounded, upper_bounded), which 
+        are the arguments that from_arrays would take to construct self.  The lower and upper 
+        bounds are read-only memoryviews of double sharing the storage of self, so 
+        numpy.asarray wraps them without copying.  
+        The bound of an unbounded side is 0..  The flags are arrays of bytes 
+        which are 1 where true and 0 where false.
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.to_arrays')
+        return (memoryview(self.storage[0]).toreadonly(), memoryview(self.storage[1]).toreadonly(), 
+                get_flags(self.flags, self.n_intervals, LOWER_CLOSED), 
+                get_flags(self.flags, self.n_intervals, UPPER_CLOSED), 
+                get_flags(self.flags, self.n_intervals, LOWER_BOUNDED), 
+                get_flags(self.flags, self.n_intervals, UPPER_BOUNDED))
+    
+    def __reduce_ex__(FloatIntervalSet self, protocol):
+        # Pickle the storage as three buffers rather than as interval objects.  From protocol 5 
+        # the buffers are passed as PickleBuffers, so they can be sent out of band without 
+        # copying.
+        if protocol >= 5 and PickleBuffer is not None:
+            buffers = tuple(PickleBuffer(buffer) for buffer in self.storage)
+        else:
+            buffers = tuple(memoryview(buffer).tobytes() for buffer in self.storage)
+        return (FloatIntervalSet_from_buffers, (self.n_intervals,) + buffers)
+    
+    def save(FloatIntervalSet self, path):
+        '''
+        Write self to the file at path in the binary format read by load_interval_set.
+        '''
+        with open(path, 'wb') as outfile:
+            outfile.write(file_header.pack(file_magic, b'FloatIntervalSet', sys.byteorder[0].encode(), 
+                                           sizeof(double), self.n_intervals))
+            for buffer in self.storage:
+                outfile.write(buffer)
+    
+    cpdef object measure(FloatIntervalSet self):
+        '''
+        Return the total length of the intervals, or infinity if self is unbounded.  
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.measure')
+        cdef Py_ssize_t i, n = self.n_intervals
+        cdef double total = 0
+        if n > 0 and not ((self.flags[0] & LOWER_BOUNDED) and (self.flags[n-1] & UPPER_BOUNDED)):
+            return INFINITY
+        with nogil:
+            for i in range(n):
+                total += FloatInterval_length(self.lower_bounds[i], self.upper_bounds[i], self.flags[i])
+        return total
+    
+    cpdef object intersection_measure(FloatIntervalSet self, FloatIntervalSet other):
+        '''
+        Return the measure of the intersection of self and other, without constructing it.
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.intersection_measure')
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, lower_cmp, upper_cmp
+        cdef double new_lower_bound, new_upper_bound
+        cdef unsigned char new_flags
+        cdef double total = 0
+        cdef bint infinite = False
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        with nogil:
+            while i < m and j < n:
+                cmp = FloatInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                                  other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                if cmp == -1:
+                    i += 1
+                elif cmp == 1:
+                    j += 1
+                else:
+                    lower_cmp = FloatInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                          other.lower_bounds[j], other.flags[j])
+                    upper_cmp = FloatInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                                          other.upper_bounds[j], other.flags[j])
+                    if lower_cmp <= 0:
+                        new_lower_bound = other.lower_bounds[j]
+                        new_flags = other.flags[j] & LOWER_FLAGS
+                    else:
+                        new_lower_bound = self.lower_bounds[i]
+                        new_flags = self.flags[i] & LOWER_FLAGS
+                    if upper_cmp <= 0:
+                        new_upper_bound = self.upper_bounds[i]
+                        new_flags |= self.flags[i] & UPPER_FLAGS
+                    else:
+                        new_upper_bound = other.upper_bounds[j]
+                        new_flags |= other.flags[j] & UPPER_FLAGS
+                    if not ((new_flags & LOWER_BOUNDED) and (new_flags & UPPER_BOUNDED)):
+                        infinite = True
+                        break
+                    if not FloatInterval_empty(new_lower_bound, new_upper_bound, new_flags):
+                        total += FloatInterval_length(new_lower_bound, new_upper_bound, new_flags)
+                    if upper_cmp <= 0:
+                        i += 1
+                    if upper_cmp >= 0:
+                        j += 1
+        if infinite:
+            return INFINITY
+        return total
+    
+    cpdef FloatIntervalSet intersection(FloatIntervalSet self, FloatIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.intersection')
+        if self.empty():
+            return self
+        if other.empty():
+            return other
+        cdef FloatIntervalSetBuilder builder = FloatIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.intersection_into(other, builder)
+        return builder.build()
+    
+    cdef int intersection_into(FloatIntervalSet self, FloatIntervalSet other, 
+                               FloatIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the intersection of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, lower_cmp, upper_cmp
+        cdef double new_lower_bound, new_upper_bound
+        cdef unsigned char new_flags
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        while i < m and j < n:
+            cmp = FloatInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+            if cmp == -1:
+                i += 1
+            elif cmp == 1:
+                j += 1
+            else:
+                lower_cmp = FloatInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.flags[j])
+                upper_cmp = FloatInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                                      other.upper_bounds[j], other.flags[j])
+                if lower_cmp <= 0:
+                    new_lower_bound = other.lower_bounds[j]
+                    new_flags = other.flags[j] & LOWER_FLAGS
+                else:
+                    new_lower_bound = self.lower_bounds[i]
+                    new_flags = self.flags[i] & LOWER_FLAGS
+                if upper_cmp <= 0:
+                    new_upper_bound = self.upper_bounds[i]
+                    new_flags |= self.flags[i] & UPPER_FLAGS
+                else:
+                    new_upper_bound = other.upper_bounds[j]
+                    new_flags |= other.flags[j] & UPPER_FLAGS
+                # For types with adjacent elements the overlap may still be empty
+                if not FloatInterval_empty(new_lower_bound, new_upper_bound, new_flags):
+                    builder.append(new_lower_bound, new_upper_bound, new_flags)
+                if upper_cmp <= 0:
+                    i += 1
+                if upper_cmp >= 0:
+                    j += 1
+        return 0
+    
+    cpdef FloatIntervalSet union(FloatIntervalSet self, FloatIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.union')
+        if self.empty():
+            return other
+        if other.empty():
+            return self
+        cdef FloatIntervalSetBuilder builder = FloatIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.union_into(other, builder)
+        return builder.build()
+    
+    cdef int union_into(FloatIntervalSet self, FloatIntervalSet other, 
+                        FloatIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the union of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        while i < m or j < n:
+            if j == n or (i < m and 
+                          FloatInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                    other.lower_bounds[j], other.flags[j]) <= 0):
+                builder.merge(self.lower_bounds[i], self.upper_bounds[i], self.flags[i])
+                i += 1
+            else:
+                builder.merge(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                j += 1
+        return 0
+    
+    cpdef FloatIntervalSet complement(FloatIntervalSet self):
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.complement')
+        cdef FloatIntervalSetBuilder builder
+        if self.empty():
+            builder = FloatIntervalSetBuilder(1)
+            builder.append(0., 0., LOWER_CLOSED | UPPER_CLOSED)
+            return builder.build()
+        cdef Py_ssize_t i
+        cdef Py_ssize_t n = self.n_intervals
+        cdef unsigned char flags
+        builder = FloatIntervalSetBuilder(n + 1)
+        if self.flags[0] & LOWER_BOUNDED:
+            builder.append(0., self.lower_bounds[0], 
+                           LOWER_CLOSED | UPPER_BOUNDED | (0 if self.flags[0] & LOWER_CLOSED else UPPER_CLOSED))
+        for i in range(1, n):
+            # For types with adjacent elements the gap between two intervals may be empty
+            flags = (LOWER_BOUNDED | UPPER_BOUNDED | 
+                     (0 if self.flags[i-1] & UPPER_CLOSED else LOWER_CLOSED) | 
+                     (0 if self.flags[i] & LOWER_CLOSED else UPPER_CLOSED))
+            if not FloatInterval_empty(self.upper_bounds[i-1], self.lower_bounds[i], flags):
+                builder.append(self.upper_bounds[i-1], self.lower_bounds[i], flags)
+        if self.flags[n-1] & UPPER_BOUNDED:
+            builder.append(self.upper_bounds[n-1], 0., 
+                           UPPER_CLOSED | LOWER_BOUNDED | (0 if self.flags[n-1] & UPPER_CLOSED else LOWER_CLOSED))
+        return builder.build()
+            
+    cpdef FloatIntervalSet symmetric_difference(FloatIntervalSet self, FloatIntervalSet other):
+        '''
+        Return the set of elements in exactly one of self and other, computed in a single sweep 
+        over both.  At each step the remaining parts of the current intervals of self and other 
+        are compared, and whatever lies before the start or after the end of their overlap is 
+        kept.
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.symmetric_difference')
+        if self.empty():
+            return other
+        if other.empty():
+            return self
+        cdef FloatIntervalSetBuilder builder = FloatIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.symmetric_difference_into(other, builder)
+        return builder.build()
+    
+    cdef int symmetric_difference_into(FloatIntervalSet self, FloatIntervalSet other, 
+                                       FloatIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the symmetric difference of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, upper_cmp
+        cdef double lower1, upper1, lower2, upper2
+        cdef unsigned char lower_flags1, upper_flags1, lower_flags2, upper_flags2
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        lower1 = self.lower_bounds[0]
+        lower_flags1 = self.flags[0] & LOWER_FLAGS
+        lower2 = other.lower_bounds[0]
+        lower_flags2 = other.flags[0] & LOWER_FLAGS
+        while i < m and j < n:
+            upper1 = self.upper_bounds[i]
+            upper_flags1 = self.flags[i] & UPPER_FLAGS
+            upper2 = other.upper_bounds[j]
+            upper_flags2 = other.flags[j] & UPPER_FLAGS
+            cmp = FloatInterval_overlap_cmp(lower1, upper1, lower_flags1 | upper_flags1, 
+                                              lower2, upper2, lower_flags2 | upper_flags2)
+            if cmp == -1:
+                builder.merge(lower1, upper1, lower_flags1 | upper_flags1)
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+                continue
+            elif cmp == 1:
+                builder.merge(lower2, upper2, lower_flags2 | upper_flags2)
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+                continue
+            
+            # Keep whatever precedes the overlap
+            cmp = FloatInterval_lower_cmp(lower1, lower_flags1, lower2, lower_flags2)
+            if cmp < 0:
+                builder.merge(lower1, lower2, lower_flags1 | UPPER_BOUNDED | 
+                              (0 if lower_flags2 & LOWER_CLOSED else UPPER_CLOSED))
+            elif cmp > 0:
+                builder.merge(lower2, lower1, lower_flags2 | UPPER_BOUNDED | 
+                              (0 if lower_flags1 & LOWER_CLOSED else UPPER_CLOSED))
+            
+            # Whatever follows the overlap remains to be compared with later intervals
+            upper_cmp = FloatInterval_upper_cmp(upper1, upper_flags1, upper2, upper_flags2)
+            if upper_cmp < 0:
+                lower2 = upper1
+                lower_flags2 = LOWER_BOUNDED | (0 if upper_flags1 & UPPER_CLOSED else LOWER_CLOSED)
+            elif upper_cmp > 0:
+                lower1 = upper2
+                lower_flags1 = LOWER_BOUNDED | (0 if upper_flags2 & UPPER_CLOSED else LOWER_CLOSED)
+            if upper_cmp <= 0:
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+            if upper_cmp >= 0:
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+        while i < m:
+            builder.merge(lower1, self.upper_bounds[i], lower_flags1 | (self.flags[i] & UPPER_FLAGS))
+            i += 1
+            if i < m:
+                lower1 = self.lower_bounds[i]
+                lower_flags1 = self.flags[i] & LOWER_FLAGS
+        while j < n:
+            builder.merge(lower2, other.upper_bounds[j], lower_flags2 | (other.flags[j] & UPPER_FLAGS))
+            j += 1
+            if j < n:
+                lower2 = other.lower_bounds[j]
+                lower_flags2 = other.flags[j] & LOWER_FLAGS
+        return 0
+    
+    cpdef FloatIntervalSet minus(FloatIntervalSet self, FloatIntervalSet other):
+        '''
+        Subtract other from self in a single sweep over both, cutting each interval of self 
+        at the intervals of other that overlap it.
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalSet.minus')
+        if self.empty() or other.empty():
+            return self
+        cdef FloatIntervalSetBuilder builder = FloatIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.minus_into(other, builder)
+        return builder.build()
+    
+    cdef int minus_into(FloatIntervalSet self, FloatIntervalSet other, 
+                        FloatIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append self minus other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp
+        cdef double lower, upper
+        cdef unsigned char lower_flags, upper_flags, piece_flags
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        # The part of the interval i of self that remains to be cut runs from lower to upper
+        lower = self.lower_bounds[0]
+        lower_flags = self.flags[0] & LOWER_FLAGS
+        while i < m:
+            upper = self.upper_bounds[i]
+            upper_flags = self.flags[i] & UPPER_FLAGS
+            cmp = -1
+            while j < n:
+                cmp = FloatInterval_overlap_cmp(lower, upper, lower_flags | upper_flags, 
+                                                  other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                if cmp != 1:
+                    break
+                j += 1
+            if j == n or cmp == -1:
+                # Nothing left in other overlaps the remaining part
+                if not FloatInterval_empty(lower, upper, lower_flags | upper_flags):
+                    builder.append(lower, upper, lower_flags | upper_flags)
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+                continue
+            if FloatInterval_lower_cmp(lower, lower_flags, other.lower_bounds[j], other.flags[j]) < 0:
+                piece_flags = (lower_flags | UPPER_BOUNDED | 
+                               (0 if other.flags[j] & LOWER_CLOSED else UPPER_CLOSED))
+                if not FloatInterval_empty(lower, other.lower_bounds[j], piece_flags):
+                    builder.append(lower, other.lower_bounds[j], piece_flags)
+            if FloatInterval_upper_cmp(upper, upper_flags, other.upper_bounds[j], other.flags[j]) > 0:
+                lower = other.upper_bounds[j]
+                lower_flags = LOWER_BOUNDED | (0 if other.flags[j] & UPPER_CLOSED else LOWER_CLOSED)
+                j += 1
+            else:
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+        return 0
+cdef inline int FloatIntervalSet_cursor_cmp(list sets, Py_ssize_t *positions, Py_ssize_t a, 
+                                              Py_ssize_t b, bint by_upper) except? -2:
+    cdef FloatIntervalSet first = sets[a]
+    cdef FloatIntervalSet second = sets[b]
+    if by_upper:
+        return FloatInterval_upper_cmp(first.upper_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.upper_bounds[positions[b]], second.flags[positions[b]])
+    else:
+        return FloatInterval_lower_cmp(first.lower_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.lower_bounds[positions[b]], second.flags[positions[b]])
+
+cdef int FloatIntervalSet_sift_down(list sets, Py_ssize_t *positions, Py_ssize_t *heap, 
+                                     Py_ssize_t size, Py_ssize_t index, bint by_upper) except -1:
+    '''
+    Restore the heap property below index in a min-heap of indices into sets, ordered by the 
+    lower (or upper) bound of the interval at which each set's cursor in positions points.
+    '''
+    cdef Py_ssize_t child, top
+    while True:
+        child = 2 * index + 1
+        if child >= size:
+            return 0
+        if (child + 1 < size and 
+            FloatIntervalSet_cursor_cmp(sets, positions, heap[child + 1], heap[child], by_upper) < 0):
+            child += 1
+        if FloatIntervalSet_cursor_cmp(sets, positions, heap[child], heap[index], by_upper) >= 0:
+            return 0
+        top = heap[index]
+        heap[index] = heap[child]
+        heap[child] = top
+        index = child
+
+def FloatIntervalSet_from_buffers(Py_ssize_t n, lower, upper, flags):
+    '''
+    Construct an FloatIntervalSet of n intervals whose storage is the given buffers of lower 
+    bounds, upper bounds and flags in native byte order, without copying them.  This is used 
+    to load interval set files and to unpickle typed interval sets.
+    '''
+    cdef FloatIntervalSet result = FloatIntervalSet.__new__(FloatIntervalSet)
+    cdef const double[:] lower_view = memoryview(lower).cast('B').cast('d')
+    cdef const double[:] upper_view = memoryview(upper).cast('B').cast('d')
+    cdef const unsigned char[:] flags_view = memoryview(flags).cast('B')
+    if lower_view.shape[0] != n or upper_view.shape[0] != n or flags_view.shape[0] != n:
+        raise ValueError('Expected buffers of %d intervals' % n)
+    result.storage = (lower_view.base, upper_view.base, flags_view.base)
+    result.n_intervals = n
+    if n > 0:
+        result.lower_bounds = <double *> &lower_view[0]
+        result.upper_bounds = <double *> &upper_view[0]
+        result.flags = <unsigned char *> &flags_view[0]
+    return result
+
+cpdef FloatIntervalSet FloatIntervalSet_union_all(list sets):
+    '''
+    Return the union of all the given sets, merging them all at once with a heap ordered by 
+    the lower bound of each set's next interval.
+    '''
+    cdef OperationTimer timer = OperationTimer('FloatIntervalSet_union_all')
+    cdef FloatIntervalSet interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    sets = [interval_set for interval_set in sets if not interval_set.empty()]
+    k = len(sets)
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        total += interval_set.n_intervals
+    cdef FloatIntervalSetBuilder builder = FloatIntervalSetBuilder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            FloatIntervalSet_sift_down(sets, positions, heap, size, i, False)
+        while size > 0:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(interval_set.lower_bounds[positions[i]], interval_set.upper_bounds[positions[i]], 
+                          interval_set.flags[positions[i]])
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                size -= 1
+                heap[0] = heap[size]
+            FloatIntervalSet_sift_down(sets, positions, heap, size, 0, False)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cpdef FloatIntervalSet FloatIntervalSet_intersection_all(list sets):
+    '''
+    Return the intersection of all the given sets in a single sweep over all of them.  The 
+    intersection of the current intervals of the sets runs from the greatest of their lower 
+    bounds to the least of their upper bounds, which is found with a heap.  The set whose 
+    current interval ends first is then advanced.
+    '''
+    cdef OperationTimer timer = OperationTimer('FloatIntervalSet_intersection_all')
+    cdef FloatIntervalSet interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    cdef double lower
+    cdef unsigned char lower_flags
+    k = len(sets)
+    if k == 0:
+        return FloatIntervalSet(()).complement()
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        if interval_set.empty():
+            return interval_set
+        total += interval_set.n_intervals
+    interval_set = sets[0]
+    lower = interval_set.lower_bounds[0]
+    lower_flags = interval_set.flags[0] & LOWER_FLAGS
+    cdef FloatIntervalSetBuilder builder = FloatIntervalSetBuilder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+            interval_set = sets[i]
+            if FloatInterval_lower_cmp(interval_set.lower_bounds[0], interval_set.flags[0], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[0]
+                lower_flags = interval_set.flags[0] & LOWER_FLAGS
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            FloatIntervalSet_sift_down(sets, positions, heap, size, i, True)
+        while True:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(lower, interval_set.upper_bounds[positions[i]], 
+                          lower_flags | (interval_set.flags[positions[i]] & UPPER_FLAGS))
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                break
+            if FloatInterval_lower_cmp(interval_set.lower_bounds[positions[i]], interval_set.flags[positions[i]], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[positions[i]]
+                lower_flags = interval_set.flags[positions[i]] & LOWER_FLAGS
+            FloatIntervalSet_sift_down(sets, positions, heap, size, 0, True)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cdef class MutableFloatIntervalSet:
+    '''
+    A set of disjoint FloatIntervals that can be changed in place.  The intervals are kept 
+    sorted in a list of blocks of bounded size, so that adding or discarding an interval 
+    takes O(log(n)) comparisons and moves O(block_size) intervals, plus the cost of removing 
+    any intervals it absorbs.  Queries other than contains are answered by an immutable 
+    snapshot, which is cached until the next change.
+    '''
+    def __init__(MutableFloatIntervalSet self, tuple intervals=()):
+        self.reset(FloatIntervalSet_from_intervals(intervals))
+    
+    cdef int reset(MutableFloatIntervalSet self, FloatIntervalSet interval_set) except -1:
+        '''
+        Replace the contents of self with those of interval_set.
+        '''
+        cdef Py_ssize_t i, start
+        cdef FloatIntervalSetBuilder block
+        self.blocks = []
+        for start in range(0, max(interval_set.n_intervals, 1), block_size):
+            block = FloatIntervalSetBuilder(block_size)
+            for i in range(start, min(start + block_size, interval_set.n_intervals)):
+                block.append(interval_set.lower_bounds[i], interval_set.upper_bounds[i], 
+                             interval_set.flags[i])
+            self.blocks.append(block)
+        self.n_intervals = interval_set.n_intervals
+        self.frozen = interval_set
+        return 0
+    
+    cpdef FloatIntervalSet freeze(MutableFloatIntervalSet self):
+        '''
+        Return an immutable FloatIntervalSet with the same intervals as self.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableFloatIntervalSet.freeze')
+        cdef FloatIntervalSetBuilder block, builder
+        cdef Py_ssize_t i
+        if self.frozen is None:
+            builder = FloatIntervalSetBuilder(self.n_intervals)
+            for block in self.blocks:
+                for i in range(block.size):
+                    builder.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            self.frozen = builder.build()
+        return self.frozen
+    
+    cdef int search(MutableFloatIntervalSet self, double lower, double upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1:
+        '''
+        Find the first interval that does not lie entirely below the query interval, or, if 
+        after is true, the first that lies entirely above it, counting intervals that only 
+        touch it as overlapping if touching is true.  Store its block and position in the 
+        block, which are the last block and its size if there is no such interval.
+        '''
+        cdef FloatIntervalSetBuilder block
+        cdef Py_ssize_t low = 0, high = len(self.blocks) - 1, i
+        while low < high:
+            i = (low + high) / 2
+            block = self.blocks[i]
+            if MutableFloatIntervalSet_passed(block, block.size - 1, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        block = self.blocks[low]
+        block_index[0] = low
+        low = 0
+        high = block.size
+        while low < high:
+            i = (low + high) / 2
+            if MutableFloatIntervalSet_passed(block, i, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        position[0] = low
+        return 0
+    
+    cdef int replace(MutableFloatIntervalSet self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, FloatIntervalSetBuilder replacement) except -1:
+        '''
+        Replace the intervals from position first in block first_block up to, but not including, 
+        position last in block last_block with the intervals in replacement.
+        '''
+        cdef FloatIntervalSetBuilder block = self.blocks[first_block]
+        cdef FloatIntervalSetBuilder other
+        cdef Py_ssize_t i, j, removed = 0
+        if first_block == last_block:
+            removed = last - first
+            block.remove(first, last)
+        else:
+            removed = block.size - first
+            block.remove(first, block.size)
+            for i in range(first_block + 1, last_block):
+                removed += (<FloatIntervalSetBuilder> self.blocks[i]).size
+            other = self.blocks[last_block]
+            removed += last
+            other.remove(0, last)
+            del self.blocks[first_block + 1:last_block]
+        for i in range(replacement.size):
+            block.insert(first + i, replacement.lower_bounds[i], replacement.upper_bounds[i], 
+                         replacement.flags[i])
+        self.n_intervals += replacement.size - removed
+        self.frozen = None
+        # Keep the sizes of the changed blocks within bounds
+        if block.size > 2 * block_size:
+            other = FloatIntervalSetBuilder(block_size)
+            for i in range(block.size / 2, block.size):
+                other.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            block.remove(block.size / 2, block.size)
+            self.blocks.insert(first_block + 1, other)
+        for i in (first_block + 1, first_block, first_block - 1):
+            if i >= 0 and i + 1 < len(self.blocks):
+                block = self.blocks[i]
+                other = self.blocks[i + 1]
+                if ((block.size < block_size / 4 or other.size < block_size / 4) and 
+                    block.size + other.size <= 2 * block_size):
+                    for j in range(other.size):
+                        block.append(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                    del self.blocks[i + 1]
+        return 0
+    
+    cpdef add(MutableFloatIntervalSet self, FloatInterval interval):
+        '''
+        Add the elements of interval to self, fusing it with any intervals it overlaps or 
+        touches.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableFloatIntervalSet.add')
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef FloatIntervalSetBuilder block
+        cdef FloatIntervalSetBuilder replacement = FloatIntervalSetBuilder(1)
+        cdef double lower = interval.lower_bound
+        cdef double upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        if FloatInterval_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, True, &first_block, &first)
+        self.search(lower, upper, flags, True, True, &last_block, &last)
+        replacement.append(lower, upper, flags)
+        if first_block != last_block or first != last:
+            # Fuse with the first and last of the intervals being replaced
+            block = self.blocks[first_block]
+            replacement.merge(block.lower_bounds[first], block.upper_bounds[first], block.flags[first])
+            block = self.blocks[last_block if last > 0 else last_block - 1]
+            i = (last if last > 0 else block.size) - 1
+            replacement.merge(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef discard(MutableFloatIntervalSet self, FloatInterval interval):
+        '''
+        Remove the elements of interval from self, splitting any interval that extends past it.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableFloatIntervalSet.discard')
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef FloatIntervalSetBuilder block
+        cdef FloatIntervalSetBuilder replacement = FloatIntervalSetBuilder(2)
+        cdef double lower = interval.lower_bound
+        cdef double upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        cdef unsigned char piece_flags
+        if FloatInterval_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, False, &first_block, &first)
+        self.search(lower, upper, flags, True, False, &last_block, &last)
+        if first_block == last_block and first == last:
+            return
+        block = self.blocks[first_block]
+        if flags & LOWER_BOUNDED:
+            # The part of the first overlapping interval below interval
+            piece_flags = ((block.flags[first] & LOWER_FLAGS) | UPPER_BOUNDED | 
+                           (0 if flags & LOWER_CLOSED else UPPER_CLOSED))
+            if not FloatInterval_empty(block.lower_bounds[first], lower, piece_flags):
+                replacement.append(block.lower_bounds[first], lower, piece_flags)
+        block = self.blocks[last_block if last > 0 else last_block - 1]
+        i = (last if last > 0 else block.size) - 1
+        if flags & UPPER_BOUNDED:
+            # The part of the last overlapping interval above interval
+            piece_flags = ((block.flags[i] & UPPER_FLAGS) | LOWER_BOUNDED | 
+                           (0 if flags & UPPER_CLOSED else LOWER_CLOSED))
+            if not FloatInterval_empty(upper, block.upper_bounds[i], piece_flags):
+                replacement.append(upper, block.upper_bounds[i], piece_flags)
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef bool contains(MutableFloatIntervalSet self, double item):
+        cdef OperationTimer timer = OperationTimer('MutableFloatIntervalSet.contains')
+        cdef double value = item
+        cdef Py_ssize_t block_index, position
+        cdef FloatIntervalSetBuilder block
+        self.search(value, value, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                    False, False, &block_index, &position)
+        block = self.blocks[block_index]
+        return position < block.size and FloatInterval_containment_cmp(block.lower_bounds[position], 
+                                                                         block.upper_bounds[position], 
+                                                                         block.flags[position], value) == 0
+    
+    def __contains__(MutableFloatIntervalSet self, item):
+        return self.contains(item)
+    
+    def __ior__(MutableFloatIntervalSet self, other):
+        cdef FloatInterval interval
+        for interval in other:
+            self.add(interval)
+        return self
+    
+    def __isub__(MutableFloatIntervalSet self, other):
+        cdef FloatInterval interval
+        for interval in other:
+            self.discard(interval)
+        return self
+    
+    def __iand__(MutableFloatIntervalSet self, other):
+        cdef FloatIntervalSet interval_set
+        if isinstance(other, MutableFloatIntervalSet):
+            interval_set = (<MutableFloatIntervalSet> other).freeze()
+        elif isinstance(other, FloatIntervalSet):
+            interval_set = other
+        else:
+            # Any other iterable of intervals, as for |= and -=
+            interval_set = FloatIntervalSet_from_intervals(tuple(other))
+        # Discarding the complement would leave gaps holding no element of a discrete type 
+        # inside the remaining intervals, so the intersection is rebuilt as a whole
+        self.reset(self.freeze().intersection(interval_set))
+        return self
+    
+    def __richcmp__(MutableFloatIntervalSet self, other, int op):
+        if isinstance(other, MutableFloatIntervalSet):
+            other = (<MutableFloatIntervalSet> other).freeze()
+        return PyObject_RichCompare(self.freeze(), other, op)
+    
+    __hash__ = None
+    
+    def __reduce__(MutableFloatIntervalSet self):
+        return (self.__class__, (self.intervals,))
+    
+    def __iter__(MutableFloatIntervalSet self):
+        return iter(self.freeze())
+    
+    def __str__(MutableFloatIntervalSet self):
+        return str(self.freeze())
+    
+    def __repr__(MutableFloatIntervalSet self):
+        return str(self)
+    
+    def __nonzero__(MutableFloatIntervalSet self):
+        return self.n_intervals > 0
+    
+    @property
+    def intervals(MutableFloatIntervalSet self):
+        return self.freeze().intervals
+    
+    def empty(MutableFloatIntervalSet self):
+        return self.n_intervals == 0
+    
+    def lower_bounded(MutableFloatIntervalSet self):
+        return self.freeze().lower_bounded()
+    
+    def upper_bounded(MutableFloatIntervalSet self):
+        return self.freeze().upper_bounded()
+    
+    def lower_bound(MutableFloatIntervalSet self):
+        return self.freeze().lower_bound()
+    
+    def upper_bound(MutableFloatIntervalSet self):
+        return self.freeze().upper_bound()
+    
+    def contains_many(MutableFloatIntervalSet self, points):
+        return self.freeze().contains_many(points)
+    
+    def locate(MutableFloatIntervalSet self, points):
+        return self.freeze().locate(points)
+    
+    def subset(MutableFloatIntervalSet self, other):
+        if isinstance(other, MutableFloatIntervalSet):
+            other = (<MutableFloatIntervalSet> other).freeze()
+        return self.freeze().subset(other)
+    
+    def measure(MutableFloatIntervalSet self):
+        return self.freeze().measure()
+    
+    def intersection_measure(MutableFloatIntervalSet self, other):
+        if isinstance(other, MutableFloatIntervalSet):
+            other = (<MutableFloatIntervalSet> other).freeze()
+        return self.freeze().intersection_measure(other)
+
+cdef inline bint MutableFloatIntervalSet_passed(FloatIntervalSetBuilder block, Py_ssize_t i, 
+                                                  double lower, double upper, unsigned char flags, 
+                                                  bint after, bint touching):
+    '''
+    Return whether interval i of block is not entirely below the query interval or, if after 
+    is true, whether it is entirely above it.  If touching is true, intervals that touch 
+    the query interval without overlapping it count as overlapping it.
+    '''
+    cdef int cmp = FloatInterval_overlap_cmp(block.lower_bounds[i], block.upper_bounds[i], block.flags[i], 
+                                               lower, upper, flags)
+    if after:
+        return cmp == 1 and not (touching and block.lower_bounds[i] == upper and (flags & UPPER_BOUNDED) and 
+                                 (block.flags[i] & LOWER_BOUNDED) and 
+                                 ((block.flags[i] & LOWER_CLOSED) or (flags & UPPER_CLOSED)))
+    else:
+        return cmp != -1 or (touching and block.upper_bounds[i] == lower and (flags & LOWER_BOUNDED) and 
+                             (block.flags[i] & UPPER_BOUNDED) and 
+                             ((block.flags[i] & UPPER_CLOSED) or (flags & LOWER_CLOSED)))
+
+cdef class FloatIntervalIndex:
+    '''
+    A static collection of FloatIntervals, which may overlap and are identified by their 
+    position in the sequence the index was built from.  Queries return arrays of these 
+    positions in increasing order.  Intervals are sorted by lower bound, and an implicit 
+    binary tree over the sorted order records the interval with the greatest upper bound 
+    in each subtree, so the k intervals overlapping a query are found in O((k + 1) log(n)) 
+    time.
+    '''
+    def __init__(FloatIntervalIndex self, tuple intervals):
+        cdef OperationTimer timer = OperationTimer('FloatIntervalIndex.__init__')
+        cdef FloatInterval interval
+        cdef FloatIntervalSetBuilder raw = FloatIntervalSetBuilder(len(intervals))
+        for interval in intervals:
+            raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        self.index(raw)
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True):
+        '''
+        Construct an FloatIntervalIndex from arrays of bounds and flags, which are 
+        interpreted as in FloatIntervalSet.from_arrays.
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalIndex.from_arrays')
+        cdef FloatIntervalIndex result = FloatIntervalIndex.__new__(FloatIntervalIndex)
+        result.index(FloatIntervalSet_raw_from_arrays(lower, upper, lower_closed, upper_closed, 
+                                                        lower_bounded, upper_bounded))
+        return result
+    
+    cdef int index(FloatIntervalIndex self, FloatIntervalSetBuilder raw) except -1:
+        '''
+        Sort the intervals accumulated in raw and build the tree over them.
+        '''
+        cdef Py_ssize_t i, k, n = raw.size
+        cdef Py_ssize_t left, right
+        cdef FloatIntervalSetBuilder builder = FloatIntervalSetBuilder(n)
+        self.order_array = clone(index_template, n, False)
+        self.order = index_data(self.order_array)
+        cdef FloatIntervalRecord *records = <FloatIntervalRecord *> PyMem_Malloc(n * sizeof(FloatIntervalRecord))
+        if records == NULL and n > 0:
+            raise MemoryError()
+        try:
+            for i in range(n):
+                records[i].lower = raw.lower_bounds[i]
+                records[i].upper = raw.upper_bounds[i]
+                records[i].flags = raw.flags[i]
+                records[i].index = i
+            qsort(records, n, sizeof(FloatIntervalRecord), FloatInterval_record_cmp)
+            for i in range(n):
+                builder.append(records[i].lower, records[i].upper, records[i].flags)
+                self.order[i] = records[i].index
+        finally:
+            PyMem_Free(records)
+        # The sorted intervals are kept in the storage of an FloatIntervalSet, although unlike 
+        # those of a set they may be empty or overlap
+        self.sorted_intervals = builder.build()
+        self.n_intervals = n
+        self.leaves = 1
+        while self.leaves < n:
+            self.leaves *= 2
+        self.tree_array = clone(index_template, 2 * self.leaves, False)
+        self.tree = index_data(self.tree_array)
+        # Empty intervals are left out of the tree, so they are never found
+        for i in range(self.leaves):
+            if i < n and not FloatInterval_empty(self.sorted_intervals.lower_bounds[i], 
+                                                   self.sorted_intervals.upper_bounds[i], 
+                                                   self.sorted_intervals.flags[i]):
+                self.tree[self.leaves + i] = i
+            else:
+                self.tree[self.leaves + i] = -1
+        for i in range(self.leaves - 1, 0, -1):
+            left = self.tree[2 * i]
+            right = self.tree[2 * i + 1]
+            if left < 0 or (right >= 0 and 
+                            FloatInterval_upper_cmp(self.sorted_intervals.upper_bounds[right], 
+                                                      self.sorted_intervals.flags[right], 
+                                                      self.sorted_intervals.upper_bounds[left], 
+                                                      self.sorted_intervals.flags[left]) > 0):
+                self.tree[i] = right
+            else:
+                self.tree[i] = left
+        return 0
+    
+    def __len__(FloatIntervalIndex self):
+        return self.n_intervals
+    
+    @property
+    def intervals(FloatIntervalIndex self):
+        '''
+        The indexed intervals, in the order the index was built from.
+        '''
+        cdef Py_ssize_t i
+        cdef list result
+        if self.cached_intervals is None:
+            result = [None] * self.n_intervals
+            for i, interval in enumerate(self.sorted_intervals.intervals):
+                result[self.order[i]] = interval
+            self.cached_intervals = tuple(result)
+        return self.cached_intervals
+    
+    def __reduce__(FloatIntervalIndex self):
+        return (self.__class__, (self.intervals,))
+    
+    def __str__(FloatIntervalIndex self):
+        return 'FloatIntervalIndex(%s)' % ', '.join(map(str, self.intervals))
+    
+    def __repr__(FloatIntervalIndex self):
+        return str(self)
+    
+    cdef Py_ssize_t end(FloatIntervalIndex self, double upper, unsigned char flags):
+        '''
+        Use binary search to find the number of intervals, in sorted order, that do not lie 
+        entirely above the upper bound of the query.
+        '''
+        cdef Py_ssize_t i, low = 0, high = self.n_intervals
+        cdef FloatIntervalSet intervals = self.sorted_intervals
+        while low < high:
+            i = (low + high) / 2
+            # Masking the flags restricts overlap_cmp to the lower bound of the interval 
+            # and the upper bound of the query
+            if FloatInterval_overlap_cmp(intervals.lower_bounds[i], intervals.upper_bounds[i], 
+                                           intervals.flags[i] & LOWER_FLAGS, upper, upper, 
+                                           flags & UPPER_FLAGS) == 1:
+                high = i
+            else:
+                low = i + 1
+        return low
+    
+    cdef int collect(FloatIntervalIndex self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, double lower, double upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals under node, among the first end in 
+        sorted order, that do not lie entirely below the lower bound of the query and share 
+        an element with it.  Subtrees whose greatest upper bound lies below the query are 
+        skipped.
+        '''
+        cdef Py_ssize_t k, middle
+        cdef FloatIntervalSet intervals = self.sorted_intervals
+        if node_start >= end:
+            return 0
+        k = self.tree[node]
+        if k < 0 or FloatInterval_overlap_cmp(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                intervals.flags[k] & UPPER_FLAGS, lower, lower, 
+                                                flags & LOWER_FLAGS) == -1:
+            return 0
+        if node_stop - node_start == 1:
+            # Bounds that interleave may still leave no element in common
+            if not FloatInterval_intersection_empty(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                      intervals.flags[k], lower, upper, flags):
+                append_index(result, size, self.order[k])
+            return 0
+        middle = (node_start + node_stop) / 2
+        self.collect(2 * node, node_start, middle, end, lower, upper, flags, result, size)
+        self.collect(2 * node + 1, middle, node_stop, end, lower, upper, flags, result, size)
+        return 0
+    
+    cdef int query(FloatIntervalIndex self, double lower, double upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals that overlap the query interval, in 
+        increasing order.
+        '''
+        cdef Py_ssize_t start = size[0]
+        if FloatInterval_empty(lower, upper, flags):
+            return 0
+        self.collect(1, 0, self.leaves, self.end(upper, flags), lower, upper, flags, result, size)
+        qsort(index_data(result) + start, size[0] - start, sizeof(Py_ssize_t), index_cmp)
+        return 0
+    
+    cpdef array stab(FloatIntervalIndex self, double point):
+        '''
+        Return the positions of the intervals containing point.
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalIndex.stab')
+        cdef double item = point
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(item, item, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, result, &size)
+        resize(result, size)
+        return result
+    
+    cpdef array overlap(FloatIntervalIndex self, FloatInterval interval):
+        '''
+        Return the positions of the intervals that overlap interval.
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalIndex.overlap')
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+        resize(result, size)
+        return result
+    
+    def stab_many(FloatIntervalIndex self, points):
+        '''
+        Stab the index with each of points.  Return a pair of arrays of equal length, the 
+        first holding positions in points and the second the positions of the intervals 
+        containing them, ordered by position in points and then by interval position.
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalIndex.stab_many')
+        cdef const double[:] items = FloatIntervalSet_values(points)
+        cdef Py_ssize_t n = items.shape[0]
+        cdef Py_ssize_t i, start, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for i in range(n):
+            start = size
+            self.query(items[i], items[i], LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                       result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+    
+    def overlap_many(FloatIntervalIndex self, intervals):
+        '''
+        Query the index with each of intervals, which may be any iterable of FloatIntervals 
+        such as an FloatIntervalSet.  Return a pair of arrays as in stab_many.
+        '''
+        cdef OperationTimer timer = OperationTimer('FloatIntervalIndex.overlap_many')
+        cdef FloatInterval interval
+        cdef Py_ssize_t i = 0, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for interval in intervals:
+            self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+            i += 1
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+
+
+cdef int FloatInterval_sweep_step(double * lower1, double * upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                     Py_ssize_t i, double * lower2, double * upper2, unsigned char *flags2, 
+                                     Py_ssize_t *order2, Py_ssize_t *active2, Py_ssize_t *n_active2, bint swapped, 
+                                     IndexPairs *pairs) except -1 nogil:
+    '''
+    Pair interval i of the first side with each active interval of the second side that 
+    does not lie entirely below it, and drop those that do from the active intervals.  The 
+    active intervals all have lower bounds not greater than that of interval i, so they 
+    overlap it unless they lie below it, and then they lie below all later intervals too.
+    '''
+    cdef Py_ssize_t k, j, kept = 0
+    for k in range(n_active2[0]):
+        j = active2[k]
+        # Masking the flags restricts overlap_cmp to the upper bound of the active interval and 
+        # the lower bound of interval i
+        if FloatInterval_overlap_cmp(lower2[j], upper2[j], flags2[j] & UPPER_FLAGS, 
+                                       lower1[i], upper1[i], flags1[i] & LOWER_FLAGS) != -1:
+            # Bounds that interleave may still leave no element in common
+            if not FloatInterval_intersection_empty(lower1[i], upper1[i], flags1[i], 
+                                                      lower2[j], upper2[j], flags2[j]):
+                if swapped:
+                    append_pair(pairs, order2[j], order1[i])
+                else:
+                    append_pair(pairs, order1[i], order2[j])
+            active2[kept] = j
+            kept += 1
+    n_active2[0] = kept
+    return 0
+
+cdef int FloatInterval_sweep(double * lower1, double * upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                Py_ssize_t n1, double * lower2, double * upper2, unsigned char *flags2, 
+                                Py_ssize_t *order2, Py_ssize_t n2, Py_ssize_t *active1, Py_ssize_t *active2, 
+                                IndexPairs *pairs) except -1 nogil:
+    '''
+    Merge two sequences of intervals sorted by lower bound, keeping for each side the 
+    intervals that may still overlap later intervals of the other side.
+    '''
+    cdef Py_ssize_t i = 0, j = 0, n_active1 = 0, n_active2 = 0
+    while i < n1 or j < n2:
+        if j == n2 or (i < n1 and FloatInterval_lower_cmp(lower1[i], flags1[i], lower2[j], flags2[j]) <= 0):
+            if not FloatInterval_empty(lower1[i], upper1[i], flags1[i]):
+                FloatInterval_sweep_step(lower1, upper1, flags1, order1, i, lower2, upper2, flags2, 
+                                           order2, active2, &n_active2, False, pairs)
+                active1[n_active1] = i
+                n_active1 += 1
+            i += 1
+        else:
+            if not FloatInterval_empty(lower2[j], upper2[j], flags2[j]):
+                FloatInterval_sweep_step(lower2, upper2, flags2, order2, j, lower1, upper1, flags1, 
+                                           order1, active1, &n_active1, True, pairs)
+                active2[n_active2] = j
+                n_active2 += 1
+            j += 1
+    return 0
+
+cpdef tuple FloatInterval_overlap_join(FloatIntervalIndex left, FloatIntervalIndex right):
+    '''
+    Return a pair of arrays holding the positions in left and in right of every pair of 
+    overlapping intervals, in no particular order.
+    '''
+    cdef OperationTimer timer = OperationTimer('FloatInterval_overlap_join')
+    cdef FloatIntervalSet left_intervals = left.sorted_intervals
+    cdef FloatIntervalSet right_intervals = right.sorted_intervals
+    cdef IndexPairs pairs
+    pairs.first = NULL
+    pairs.second = NULL
+    pairs.size = 0
+    pairs.capacity = 0
+    cdef Py_ssize_t *active = <Py_ssize_t *> PyMem_Malloc((left.n_intervals + right.n_intervals) * sizeof(Py_ssize_t))
+    if active == NULL and left.n_intervals + right.n_intervals > 0:
+        raise MemoryError()
+    try:
+        with nogil:
+            FloatInterval_sweep(left_intervals.lower_bounds, left_intervals.upper_bounds, 
+                                  left_intervals.flags, left.order, left.n_intervals, 
+                                  right_intervals.lower_bounds, right_intervals.upper_bounds, 
+                                  right_intervals.flags, right.order, right.n_intervals, 
+                                  active, active + left.n_intervals, &pairs)
+        return index_pairs_to_arrays(&pairs)
+    finally:
+        PyMem_Free(active)
+        free(pairs.first)
+        free(pairs.second)
+
+
+# These operate on the raw bounds and packed flags of an interval.  The methods of 
+# DatetimeInterval and the loops of DatetimeIntervalSet are built on them.
+cdef inline bint DatetimeInterval_adjacent(int64_t lower, int64_t upper) nogil:
+    return False
+
+cdef inline bint DatetimeInterval_empty(int64_t lower, int64_t upper, unsigned char flags) nogil:
+    return (((flags & LOWER_BOUNDED) and (flags & UPPER_BOUNDED)) and 
+            ((((lower == upper) and 
+            (not ((flags & LOWER_CLOSED) and (flags & UPPER_CLOSED)))) or
+            lower > upper) or 
+             (lower < upper and 
+              (not (flags & (LOWER_CLOSED | UPPER_CLOSED))) and
+              DatetimeInterval_adjacent(lower, upper))))
+
+cdef inline int DatetimeInterval_containment_cmp(int64_t lower, int64_t upper, unsigned char flags, 
+                                                int64_t item) nogil:
+    global containment_cmp_count
+    containment_cmp_count += 1
+    if flags & LOWER_BOUNDED:
+        if item < lower:
+            return -1
+        elif item == lower:
+            if not (flags & LOWER_CLOSED):
+                return -1
+    if flags & UPPER_BOUNDED:
+        if item > upper:
+            return 1
+        elif item == upper:
+            if not (flags & UPPER_CLOSED):
+                return 1
+    return 0
+
+cdef inline int DatetimeInterval_lower_cmp(int64_t lower1, unsigned char flags1, 
+                                          int64_t lower2, unsigned char flags2) nogil:
+    global lower_cmp_count
+    lower_cmp_count += 1
+    if not (flags1 & LOWER_BOUNDED):
+        if not (flags2 & LOWER_BOUNDED):
+            return 0
+        else:
+            return -1
+    elif not (flags2 & LOWER_BOUNDED):
+        return 1
+    if lower1 < lower2:
+        return -1
+    elif lower1 == lower2:
+        if (flags1 & LOWER_CLOSED) and not (flags2 & LOWER_CLOSED):
+            return -1
+        elif (flags2 & LOWER_CLOSED) and not (flags1 & LOWER_CLOSED):
+            return 1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int DatetimeInterval_upper_cmp(int64_t upper1, unsigned char flags1, 
+                                          int64_t upper2, unsigned char flags2) nogil:
+    global upper_cmp_count
+    upper_cmp_count += 1
+    if not (flags1 & UPPER_BOUNDED):
+        if not (flags2 & UPPER_BOUNDED):
+            return 0
+        else:
+            return 1
+    elif not (flags2 & UPPER_BOUNDED):
+        return -1
+    if upper1 < upper2:
+        return -1
+    elif upper1 == upper2:
+        if (flags1 & UPPER_CLOSED) and not (flags2 & UPPER_CLOSED):
+            return 1
+        elif (flags2 & UPPER_CLOSED) and not (flags1 & UPPER_CLOSED):
+            return -1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int DatetimeInterval_overlap_cmp(int64_t lower1, int64_t upper1, unsigned char flags1, 
+                                            int64_t lower2, int64_t upper2, unsigned char flags2) nogil:
+    global overlap_cmp_count
+    overlap_cmp_count += 1
+    if (flags1 & UPPER_BOUNDED) and (flags2 & LOWER_BOUNDED):
+        if upper1 < lower2:
+            return -1
+        elif upper1 == lower2:
+            if (flags1 & UPPER_CLOSED) and (flags2 & LOWER_CLOSED):
+                return 0
+            else:
+                return -1
+    if (flags1 & LOWER_BOUNDED) and (flags2 & UPPER_BOUNDED):
+        if lower1 > upper2:
+            return 1
+        elif lower1 == upper2:
+            if (flags1 & LOWER_CLOSED) and (flags2 & UPPER_CLOSED):
+                return 0
+            else:
+                return 1
+    return 0
+
+cdef inline bint DatetimeInterval_fusible(int64_t lower1, int64_t upper1, unsigned char flags1, 
+                                         int64_t lower2, int64_t upper2, unsigned char flags2) nogil:
+    '''
+    Return whether the union of two nonempty intervals is an interval, because they overlap 
+    or touch.
+    '''
+    cdef int overlap_cmp = DatetimeInterval_overlap_cmp(lower1, upper1, flags1, lower2, upper2, flags2)
+    return ((overlap_cmp == 0) or 
+            (overlap_cmp == -1 and upper1 == lower2 and 
+             ((flags1 & UPPER_CLOSED) or (flags2 & LOWER_CLOSED))) or
+            (overlap_cmp == 1 and upper2 == lower1 and 
+             ((flags2 & UPPER_CLOSED) or (flags1 & LOWER_CLOSED))))
+
+cdef inline bint DatetimeInterval_intersection_empty(int64_t lower1, int64_t upper1, unsigned char flags1, 
+                                                    int64_t lower2, int64_t upper2, unsigned char flags2) nogil:
+    '''
+    Return whether two nonempty intervals that overlap according to overlap_cmp nonetheless 
+    have no element in common, which can only happen for types with adjacent elements.
+    '''
+    return False
+
+cdef array DatetimeInterval_bounds_template = array('q')
+
+cdef const int64_t[:] DatetimeIntervalSet_stored_values(object values):
+    '''
+    View values as a buffer of int64_t, copying them only if they do not already 
+    expose one of the right type.
+    '''
+    cdef const int64_t[:] result
+    try:
+        result = values
+    except (TypeError, ValueError, BufferError):
+        result = array('q', values)
+    return result
+
+ctypedef struct DatetimeIntervalRecord:
+    int64_t lower
+    int64_t upper
+    unsigned char flags
+    Py_ssize_t index
+
+cdef int DatetimeInterval_record_cmp(const void *record1, const void *record2) nogil:
+    cdef DatetimeIntervalRecord *first = <DatetimeIntervalRecord *> record1
+    cdef DatetimeIntervalRecord *second = <DatetimeIntervalRecord *> record2
+    return DatetimeInterval_lower_cmp(first.lower, first.flags, second.lower, second.flags)
+
+cdef inline int64_t DatetimeInterval_length(int64_t lower, int64_t upper, unsigned char flags) nogil:
+    '''
+    The length of a bounded interval.
+    '''
+    return upper - lower
+
+cdef class DatetimeIntervalSetBuilder:
+    '''
+    Accumulates the bounds and flags of sorted intervals into the storage of a new 
+    DatetimeIntervalSet.  The builder must not be used after build has been called.
+    '''
+    def __cinit__(DatetimeIntervalSetBuilder self, Py_ssize_t capacity=0):
+        self.size = 0
+        self.capacity = capacity
+        self.flags_array = clone(flags_template, capacity, False)
+        self.flags = self.flags_array.data.as_uchars
+        self.lower_array = clone(DatetimeInterval_bounds_template, capacity, False)
+        self.upper_array = clone(DatetimeInterval_bounds_template, capacity, False)
+        self.lower_bounds = <int64_t *> self.lower_array.data.as_voidptr
+        self.upper_bounds = <int64_t *> self.upper_array.data.as_voidptr
+    
+    cdef int grow(DatetimeIntervalSetBuilder self) except -1:
+        self.capacity = 2 * self.capacity + 8
+        resize(self.flags_array, self.capacity)
+        self.flags = self.flags_array.data.as_uchars
+        resize(self.lower_array, self.capacity)
+        resize(self.upper_array, self.capacity)
+        self.lower_bounds = <int64_t *> self.lower_array.data.as_voidptr
+        self.upper_bounds = <int64_t *> self.upper_array.data.as_voidptr
+        return 0
+    
+    cdef int append(DatetimeIntervalSetBuilder self, int64_t lower, int64_t upper, 
+                    unsigned char flags) except -1 nogil:
+        '''
+        Add an interval after all intervals added so far, assuming the two neither overlap 
+        nor touch.
+        '''
+        if self.size == self.capacity:
+            with gil:
+                self.grow()
+        self.lower_bounds[self.size] = lower
+        self.upper_bounds[self.size] = upper
+        self.flags[self.size] = flags
+        self.size += 1
+        return 0
+    
+    cdef int merge(DatetimeIntervalSetBuilder self, int64_t lower, int64_t upper, 
+                   unsigned char flags) except -1 nogil:
+        '''
+        Add an interval whose lower bound is not less than that of any interval added so far, 
+        fusing it with the last interval if the two overlap or touch.  Empty intervals are 
+        ignored.
+        '''
+        cdef Py_ssize_t last = self.size - 1
+        if DatetimeInterval_empty(lower, upper, flags):
+            return 0
+        if last < 0:
+            return self.append(lower, upper, flags)
+        if DatetimeInterval_fusible(self.lower_bounds[last], self.upper_bounds[last], self.flags[last], 
+                                   lower, upper, flags):
+            if DatetimeInterval_lower_cmp(lower, flags, self.lower_bounds[last], self.flags[last]) < 0:
+                self.lower_bounds[last] = lower
+                self.flags[last] = (self.flags[last] & UPPER_FLAGS) | (flags & LOWER_FLAGS)
+            if DatetimeInterval_upper_cmp(upper, flags, self.upper_bounds[last], self.flags[last]) > 0:
+                self.upper_bounds[last] = upper
+                self.flags[last] = (self.flags[last] & LOWER_FLAGS) | (flags & UPPER_FLAGS)
+            return 0
+        return self.append(lower, upper, flags)
+    
+    cdef int remove(DatetimeIntervalSetBuilder self, Py_ssize_t start, Py_ssize_t stop) except -1:
+        '''
+        Remove the intervals at positions start up to, but not including, stop.
+        '''
+        cdef Py_ssize_t tail = self.size - stop
+        if stop <= start:
+            return 0
+        memmove(self.lower_bounds + start, self.lower_bounds + stop, tail * sizeof(int64_t))
+        memmove(self.upper_bounds + start, self.upper_bounds + stop, tail * sizeof(int64_t))
+        memmove(self.flags + start, self.flags + stop, tail)
+        self.size -= stop - start
+        return 0
+    
+    cdef int insert(DatetimeIntervalSetBuilder self, Py_ssize_t position, int64_t lower, int64_t upper, 
+                    unsigned char flags) except -1:
+        '''
+        Add an interval at the given position, moving the intervals after it.
+        '''
+        if self.size == self.capacity:
+            self.grow()
+        memmove(self.lower_bounds + position + 1, self.lower_bounds + position, 
+                (self.size - position) * sizeof(int64_t))
+        memmove(self.upper_bounds + position + 1, self.upper_bounds + position, 
+                (self.size - position) * sizeof(int64_t))
+        self.lower_bounds[position] = lower
+        self.upper_bounds[position] = upper
+        memmove(self.flags + position + 1, self.flags + position, self.size - position)
+        self.flags[position] = flags
+        self.size += 1
+        return 0
+    
+    cdef DatetimeIntervalSet build(DatetimeIntervalSetBuilder self):
+        cdef DatetimeIntervalSet result = DatetimeIntervalSet.__new__(DatetimeIntervalSet)
+        resize(self.flags_array, self.size)
+        result.flags = self.flags_array.data.as_uchars
+        resize(self.lower_array, self.size)
+        resize(self.upper_array, self.size)
+        result.lower_bounds = <int64_t *> self.lower_array.data.as_voidptr
+        result.upper_bounds = <int64_t *> self.upper_array.data.as_voidptr
+        result.storage = (self.lower_array, self.upper_array, self.flags_array)
+        result.n_intervals = self.size
+        return result
+
+cdef DatetimeIntervalSet DatetimeIntervalSet_normalize(DatetimeIntervalSetBuilder raw):
+    '''
+    Build an DatetimeIntervalSet from the intervals accumulated in raw, which may be empty, 
+    unsorted and overlapping.  Empty intervals are dropped, the rest are sorted by lower bound 
+    and any that overlap or touch are fused.
+    '''
+    cdef Py_ssize_t i, k, n = raw.size
+    cdef DatetimeIntervalSetBuilder builder
+    cdef bint is_sorted = True
+    for i in range(1, n):
+        if DatetimeInterval_lower_cmp(raw.lower_bounds[i-1], raw.flags[i-1], 
+                                     raw.lower_bounds[i], raw.flags[i]) > 0:
+            is_sorted = False
+            break
+    if is_sorted:
+        builder = DatetimeIntervalSetBuilder(n)
+        for i in range(n):
+            builder.merge(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i])
+        return builder.build()
+    cdef DatetimeIntervalRecord *records = <DatetimeIntervalRecord *> PyMem_Malloc(n * sizeof(DatetimeIntervalRecord))
+    if records == NULL and n > 0:
+        raise MemoryError()
+    try:
+        k = 0
+        for i in range(n):
+            if not DatetimeInterval_empty(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i]):
+                records[k].lower = raw.lower_bounds[i]
+                records[k].upper = raw.upper_bounds[i]
+                records[k].flags = raw.flags[i]
+                k += 1
+        qsort(records, k, sizeof(DatetimeIntervalRecord), DatetimeInterval_record_cmp)
+        builder = DatetimeIntervalSetBuilder(k)
+        for i in range(k):
+            builder.merge(records[i].lower, records[i].upper, records[i].flags)
+    finally:
+        PyMem_Free(records)
+    return builder.build()
+
+cdef class DatetimeInterval(BaseInterval):
+    def __init__(BaseInterval self, object lower_bound, object upper_bound, bool lower_closed, 
+                 bool upper_closed, bool lower_bounded, bool upper_bounded):
+        self.flags = pack_flags(lower_closed, upper_closed, lower_bounded, upper_bounded)
+        if lower_bounded:
+            self.lower_bound = DatetimeInterval_to_c(lower_bound)
+        if upper_bounded:
+            self.upper_bound = DatetimeInterval_to_c(upper_bound)
+    
+    @property
+    def lower_bound(DatetimeInterval self):
+        return DatetimeInterval_to_py(self.lower_bound) if self.flags & LOWER_BOUNDED else None
+    
+    @property
+    def upper_bound(DatetimeInterval self):
+        return DatetimeInterval_to_py(self.upper_bound) if self.flags & UPPER_BOUNDED else None
+    
+    # For some types, there is a concept of adjacent elements.  For example, 
+    # there are no integers between 1 and 2 (although there are several real numbers).
+    # If there is such a concept, it's possible for an interval to be empty even when 
+    # the lower bound is strictly less than the upper bound, provided the bounds are strict 
+    # (not closed).  The adjacent method is used to help determine such cases.
+    cpdef bool adjacent(DatetimeInterval self, object lower, object upper):
+        return DatetimeInterval_adjacent(DatetimeInterval_to_c(lower), DatetimeInterval_to_c(upper))
+    
+    cpdef int containment_cmp(DatetimeInterval self, object item):
+        return DatetimeInterval_containment_cmp(self.lower_bound, self.upper_bound, self.flags, DatetimeInterval_to_c(item))
+    
+    cpdef bool contains(DatetimeInterval self, object item):
+        return self.containment_cmp(item) == 0
+    
+    cpdef bool subset(DatetimeInterval self, DatetimeInterval other):
+        '''
+        Return True if and only if self is a subset of other.
+        '''
+        return (DatetimeInterval_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags) >= 0 and 
+                DatetimeInterval_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags) <= 0)
+        
+    cpdef int overlap_cmp(DatetimeInterval self, DatetimeInterval other):
+        '''
+        Assume both are nonempty.  Return -1 if every element of self is less than every 
+        element of other.  Return 0 if self and other intersect.  Return 1 if every element of 
+        self is greater than every element of other.
+        '''
+        return DatetimeInterval_overlap_cmp(self.lower_bound, self.upper_bound, self.flags, 
+                                           other.lower_bound, other.upper_bound, other.flags)
+    
+    cpdef tuple init_args(DatetimeInterval self):
+        # Unbounded sides have no datetime value, so they are None as for the lower_bound and 
+        # upper_bound properties
+        return (DatetimeInterval_to_py(self.lower_bound) if self.flags & LOWER_BOUNDED else None, 
+                DatetimeInterval_to_py(self.upper_bound) if self.flags & UPPER_BOUNDED else None, 
+                (self.flags & LOWER_CLOSED) != 0, 
+                (self.flags & UPPER_CLOSED) != 0, (self.flags & LOWER_BOUNDED) != 0, 
+                (self.flags & UPPER_BOUNDED) != 0)
+
+    cpdef DatetimeInterval intersection(DatetimeInterval self, DatetimeInterval other):
+        cdef DatetimeInterval result = DatetimeInterval.__new__(DatetimeInterval)
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
+        else:
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
+        else:
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
+        return result
+    
+    cpdef DatetimeInterval fusion(DatetimeInterval self, DatetimeInterval other):
+        '''
+        Assume union of intervals is a single interval.  Return their union.  Results not correct
+        if above assumption is violated.
+        '''
+        cdef DatetimeInterval result = DatetimeInterval.__new__(DatetimeInterval)
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
+        else:
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
+        else:
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
+        return result
+    
+    cpdef bool empty(DatetimeInterval self):
+        return DatetimeInterval_empty(self.lower_bound, self.upper_bound, self.flags)
+    
+    cpdef bool richcmp(DatetimeInterval self, DatetimeInterval other, int op):
+        cdef int lower_cmp
+        cdef int upper_cmp
+        if op == 0 or op == 1:
+            lower_cmp = self.lower_cmp(other)
+            if lower_cmp == -1:
+                return True
+            elif lower_cmp == 1:
+                return False
+            else: # lower_cmp == 0
+                upper_cmp = self.upper_cmp(other)
+                if upper_cmp == -1:
+                    return True
+                elif upper_cmp == 1:
+                    return False
+                else: # upper_cmp == 0
+                    return op == 1
+        elif op == 2:
+            return (self.lower_cmp(other) == 0) and (self.upper_cmp(other) == 0)
+        elif op == 3:
+            return (self.lower_cmp(other) != 0) or (self.upper_cmp(other) != 0)
+        elif op == 4 or op == 5:
+            lower_cmp = self.lower_cmp(other)
+            if lower_cmp == -1:
+                return False
+            elif lower_cmp == 1:
+                return True
+            else: # lower_cmp == 0
+                upper_cmp = self.upper_cmp(other)
+                if upper_cmp == -1:
+                    return False
+                elif upper_cmp == 1:
+                    return True
+                else: # upper_cmp == 0
+                    return op == 5
+    
+    cpdef int lower_cmp(DatetimeInterval self, DatetimeInterval other):
+        return DatetimeInterval_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags)
+    
+    cpdef int upper_cmp(DatetimeInterval self, DatetimeInterval other):
+        return DatetimeInterval_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags)
+
+# This is because static cpdef methods are not supported.  Otherwise this
+# would be a static method of DatetimeIntervalSet
+cpdef DatetimeIntervalSet DatetimeIntervalSet_from_intervals(tuple intervals):
+    '''
+    Construct an DatetimeIntervalSet from intervals in any order, which may be empty or 
+    overlapping.
+    '''
+    cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet_from_intervals')
+    cdef DatetimeInterval interval
+    cdef DatetimeIntervalSetBuilder raw = DatetimeIntervalSetBuilder(len(intervals))
+    for interval in intervals:
+        raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+    return DatetimeIntervalSet_normalize(raw)
+
+cdef DatetimeIntervalSetBuilder DatetimeIntervalSet_raw_from_arrays(object lower, object upper, object lower_closed, 
+                                                                   object upper_closed, object lower_bounded, 
+                                                                   object upper_bounded, bint raw_bounds=False):
+    '''
+    Accumulate intervals given as arrays of bounds and flags, as described in 
+    DatetimeIntervalSet.from_arrays, into a builder in the order given.
+    '''
+    cdef const int64_t[:] lower_values, upper_values
+    if raw_bounds:
+        lower_values = DatetimeIntervalSet_stored_values(lower)
+        upper_values = DatetimeIntervalSet_stored_values(upper)
+    else:
+        lower_values = DatetimeIntervalSet_values(lower)
+        upper_values = DatetimeIntervalSet_values(upper)
+    cdef Py_ssize_t i, n = lower_values.shape[0]
+    if upper_values.shape[0] != n:
+        raise ValueError('lower and upper must have the same length')
+    cdef array flags = clone(flags_template, n, True)
+    set_flags(flags.data.as_uchars, n, lower_closed, LOWER_CLOSED)
+    set_flags(flags.data.as_uchars, n, upper_closed, UPPER_CLOSED)
+    set_flags(flags.data.as_uchars, n, lower_bounded, LOWER_BOUNDED)
+    set_flags(flags.data.as_uchars, n, upper_bounded, UPPER_BOUNDED)
+    cdef DatetimeIntervalSetBuilder raw = DatetimeIntervalSetBuilder(n)
+    for i in range(n):
+        raw.append(lower_values[i] if flags.data.as_uchars[i] & LOWER_BOUNDED else 0, 
+                   upper_values[i] if flags.data.as_uchars[i] & UPPER_BOUNDED else 0, 
+                   flags.data.as_uchars[i])
+    return raw
+
+cpdef tuple DatetimeInterval_preprocess_intervals(tuple intervals):
+    '''
+    Remove empty intervals, sort, and fuse any overlapping intervals.
+    '''
+    cdef OperationTimer timer = OperationTimer('DatetimeInterval_preprocess_intervals')
+    return DatetimeIntervalSet_from_intervals(intervals).intervals
+
+cdef class DatetimeIntervalSetCoalescer:
+    '''
+    Iterate over the coalesced intervals of an iterable of DatetimeIntervals or (lower, upper) 
+    pairs, sorted by lower bound.  Pairs describe closed intervals, and either bound may be 
+    unbounded.  Only one pending interval is held at a time, so the input is never 
+    materialized.  A ValueError is raised if the input is found to be out of order.
+    '''
+    def __init__(DatetimeIntervalSetCoalescer self, intervals):
+        self.source = iter(intervals)
+        self.pending = False
+        self.started = False
+    
+    def __iter__(DatetimeIntervalSetCoalescer self):
+        return self
+    
+    def __next__(DatetimeIntervalSetCoalescer self):
+        cdef DatetimeInterval result
+        if not self.next_raw():
+            raise StopIteration
+        result = DatetimeInterval.__new__(DatetimeInterval)
+        result.lower_bound = self.result_lower
+        result.upper_bound = self.result_upper
+        result.flags = self.result_flags
+        return result
+    
+    cdef int next_raw(DatetimeIntervalSetCoalescer self) except -1:
+        '''
+        Store the next coalesced interval in the result fields and return 1, or return 0 if 
+        there are no more.
+        '''
+        cdef int64_t item_lower, item_upper
+        cdef unsigned char item_flags
+        cdef DatetimeInterval interval
+        for item in self.source:
+            if isinstance(item, DatetimeInterval):
+                interval = item
+                item_lower = interval.lower_bound
+                item_upper = interval.upper_bound
+                item_flags = interval.flags
+            else:
+                lower_value, upper_value = item
+                item_flags = LOWER_CLOSED | UPPER_CLOSED
+                if lower_value is unbounded:
+                    item_lower = 0
+                else:
+                    item_lower = DatetimeInterval_to_c(lower_value)
+                    item_flags |= LOWER_BOUNDED
+                if upper_value is unbounded:
+                    item_upper = 0
+                else:
+                    item_upper = DatetimeInterval_to_c(upper_value)
+                    item_flags |= UPPER_BOUNDED
+            if self.started and DatetimeInterval_lower_cmp(item_lower, item_flags, 
+                                                          self.last_lower, self.last_flags) < 0:
+                raise ValueError('Intervals must be sorted by lower bound')
+            self.started = True
+            self.last_lower = item_lower
+            self.last_flags = item_flags
+            if DatetimeInterval_empty(item_lower, item_upper, item_flags):
+                continue
+            if not self.pending:
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                self.pending = True
+            elif DatetimeInterval_fusible(self.lower, self.upper, self.flags, item_lower, item_upper, item_flags):
+                if DatetimeInterval_upper_cmp(item_upper, item_flags, self.upper, self.flags) > 0:
+                    self.upper = item_upper
+                    self.flags = (self.flags & LOWER_FLAGS) | (item_flags & UPPER_FLAGS)
+            else:
+                self.result_lower = self.lower
+                self.result_upper = self.upper
+                self.result_flags = self.flags
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                return 1
+        if self.pending:
+            self.result_lower = self.lower
+            self.result_upper = self.upper
+            self.result_flags = self.flags
+            self.pending = False
+            return 1
+        return 0
+
+cdef class DatetimeIntervalSetIterator(BaseIntervalSetIterator):
+    def __init__(DatetimeIntervalSetIterator self, DatetimeIntervalSet interval_set):
+        self.index = 0
+        self.interval_set = interval_set
+    
+    def __iter__(DatetimeIntervalSetIterator self):
+        return self
+    
+    def __next__(DatetimeIntervalSetIterator self):
+        self.index += 1
+        if self.index <= self.interval_set.n_intervals:
+            return self.interval_set.intervals[self.index-1]
+        raise StopIteration
+
+cdef class DatetimeIntervalSet(BaseIntervalSet):
+    def __init__(DatetimeIntervalSet self, tuple intervals):
+        '''
+        The intervals must already be sorted and non-overlapping.
+        '''
+        cdef DatetimeIntervalSetBuilder builder = DatetimeIntervalSetBuilder(len(intervals))
+        cdef DatetimeInterval interval
+        cdef DatetimeIntervalSet built
+        for interval in intervals:
+            builder.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        built = builder.build()
+        self.lower_bounds = built.lower_bounds
+        self.upper_bounds = built.upper_bounds
+        self.flags = built.flags
+        self.storage = built.storage
+        self.n_intervals = built.n_intervals
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True, raw=False):
+        '''
+        Construct an DatetimeIntervalSet directly from sequences of lower and upper bounds, 
+        given as numpy datetime64 arrays or any other sequences of datetimes.  If raw is true 
+        they are instead given as int64_t buffers or sequences of the stored microseconds since the epoch in UTC, 
+        as returned by to_arrays.  
+        Each of lower_closed, upper_closed, lower_bounded and upper_bounded is either a single 
+        bool for all intervals or a sequence of bools with one per interval.  The intervals need 
+        not be sorted or disjoint, and no interval objects are created.
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.from_arrays')
+        return DatetimeIntervalSet_normalize(DatetimeIntervalSet_raw_from_arrays(lower, upper, lower_closed, 
+                                                                                upper_closed, lower_bounded, 
+                                                                                upper_bounded, raw))
+    
+    @staticmethod
+    def from_sorted(intervals):
+        '''
+        Construct an DatetimeIntervalSet from an iterable of DatetimeIntervals or (lower, upper) pairs 
+        sorted by lower bound, as described in DatetimeIntervalSetCoalescer, coalescing them as 
+        they are read.
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.from_sorted')
+        cdef DatetimeIntervalSetCoalescer coalescer = DatetimeIntervalSetCoalescer(intervals)
+        cdef DatetimeIntervalSetBuilder builder = DatetimeIntervalSetBuilder()
+        while coalescer.next_raw():
+            builder.append(coalescer.result_lower, coalescer.result_upper, coalescer.result_flags)
+        return builder.build()
+    
+    def __iter__(DatetimeIntervalSet self):
+        return DatetimeIntervalSetIterator(self)
+    
+    def __getitem__(DatetimeIntervalSet self, index):
+        return self.intervals[index]
+    
+    cdef tuple materialize_intervals(DatetimeIntervalSet self):
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.materialize_intervals')
+        cdef Py_ssize_t i
+        cdef unsigned char flags
+        cdef DatetimeInterval interval
+        cdef list result = []
+        for i in range(self.n_intervals):
+            interval = DatetimeInterval.__new__(DatetimeInterval)
+            interval.lower_bound = self.lower_bounds[i]
+            interval.upper_bound = self.upper_bounds[i]
+            interval.flags = self.flags[i]
+            result.append(interval)
+        return tuple(result)
+    
+    cdef Py_hash_t compute_hash(DatetimeIntervalSet self) except -1:
+        '''
+        Combine the hashes of the intervals in the same way as the hash of a tuple.
+        '''
+        cdef Py_ssize_t i
+        cdef unsigned char flags
+        cdef size_t result = 0x345678
+        cdef size_t multiplier = 1000003
+        cdef Py_hash_t interval_hash
+        for i in range(self.n_intervals):
+            flags = canonical_flags(self.flags[i])
+            interval_hash = hash((self.lower_bounds[i] if flags & LOWER_BOUNDED else None, 
+                                  self.upper_bounds[i] if flags & UPPER_BOUNDED else None, flags))
+            result = (result ^ <size_t> interval_hash) * multiplier
+            multiplier += 82520 + 2 * (self.n_intervals - i)
+        result += 97531
+        if <Py_hash_t> result == -1:
+            return -2
+        return <Py_hash_t> result
+    
+    cpdef bool lower_bounded(DatetimeIntervalSet self):
+        if self.n_intervals > 0:
+            return (self.flags[0] & LOWER_BOUNDED) != 0
+        else:
+            return True
+    
+    cpdef bool upper_bounded(DatetimeIntervalSet self):
+        if self.n_intervals > 0:
+            return (self.flags[self.n_intervals - 1] & UPPER_BOUNDED) != 0
+        else:
+            return True
+    
+    cpdef object lower_bound(DatetimeIntervalSet self):
+        if self.n_intervals > 0 and self.flags[0] & LOWER_BOUNDED:
+            return DatetimeInterval_to_py(self.lower_bounds[0])
+        else:
+            return None
+    
+    cpdef object upper_bound(DatetimeIntervalSet self):
+        if self.n_intervals > 0 and self.flags[self.n_intervals - 1] & UPPER_BOUNDED:
+            return DatetimeInterval_to_py(self.upper_bounds[self.n_intervals - 1])
+        else:
+            return None
+    
+    cpdef tuple init_args(DatetimeIntervalSet self):
+        return (self.intervals,)
+    
+    cdef Py_ssize_t locate_item(DatetimeIntervalSet self, int64_t item) nogil:
+        '''
+        Use binary search to find the index of the interval containing item, or -1 if there 
+        is none.
+        '''
+        cdef Py_ssize_t i, n
+        cdef Py_ssize_t low, high
+        cdef int cmp
+        n = self.n_intervals
+        low = 0
+        high = n-1
+        while high >= low:
+            i = (high + low) / 2
+            cmp = DatetimeInterval_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                  self.flags[i], item)
+            if cmp == -1:
+                high = i - 1
+            elif cmp == 1:
+                low = i + 1
+            else: #if cmp == 0:
+                return i
+        return -1
+    
+    cpdef bool contains(DatetimeIntervalSet self, object item):
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.contains')
+        return self.locate_item(DatetimeInterval_to_c(item)) >= 0
+    
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef int locate_many(DatetimeIntervalSet self, const int64_t[:] items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1 nogil:
+        '''
+        For each of items, store the index of the interval containing it (or -1 if there is 
+        none) in indices and whether there is one in mask, skipping either if it is NULL.  
+        Sorted items are merged against the intervals in a single pass, otherwise each is 
+        found by binary search.
+        '''
+        cdef Py_ssize_t n = items.shape[0]
+        cdef Py_ssize_t k
+        cdef Py_ssize_t i, index
+        cdef int cmp
+        cdef bint is_sorted = True
+        cdef int64_t item
+        for k in range(1, n):
+            if not items[k] >= items[k-1]:
+                is_sorted = False
+                break
+        i = 0
+        for k in range(n):
+            item = items[k]
+            if is_sorted:
+                cmp = 1
+                while i < self.n_intervals:
+                    cmp = DatetimeInterval_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                          self.flags[i], item)
+                    if cmp != 1:
+                        break
+                    i += 1
+                index = i if cmp == 0 else -1
+            else:
+                index = self.locate_item(item)
+            if indices != NULL:
+                indices[k] = index
+            if mask != NULL:
+                mask[k] = index >= 0
+        return 0
+    
+    cpdef array contains_many(DatetimeIntervalSet self, points):
+        '''
+        Return an array of bytes, with 1 for each of points contained in self and 0 for each 
+        that is not.  The result can be viewed as a boolean numpy array with 
+        numpy.frombuffer(result, dtype=bool).
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.contains_many')
+        cdef const int64_t[:] items = DatetimeIntervalSet_values(points)
+        cdef array result = clone(flags_template, items.shape[0], False)
+        with nogil:
+            self.locate_many(items, NULL, result.data.as_uchars)
+        return result
+    
+    cpdef array locate(DatetimeIntervalSet self, points):
+        '''
+        Return an array of positions holding, for each of points, the index in self.intervals of 
+        the interval containing it, or -1 if no interval contains it.
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.locate')
+        cdef const int64_t[:] items = DatetimeIntervalSet_values(points)
+        cdef array result = clone(index_template, items.shape[0], False)
+        cdef Py_ssize_t *indices = index_data(result)
+        with nogil:
+            self.locate_many(items, indices, NULL)
+        return result
+
+    cpdef bool subset(DatetimeIntervalSet self, DatetimeIntervalSet other):
+        '''
+        Return True if and only if self is a subset of other.
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.subset')
+        cdef Py_ssize_t i, j, m, n
+        cdef int overlap_cmp
+        if self.empty():
+            return True
+        elif other.empty():
+            return False
+        m = self.n_intervals
+        n = other.n_intervals
+        i = 0
+        j = 0
+        while i < m:
+            overlap_cmp = DatetimeInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+            if overlap_cmp == -1:
+                return False
+            elif overlap_cmp == 0:
+                if (DatetimeInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.flags[j]) < 0 or 
+                    DatetimeInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                              other.upper_bounds[j], other.flags[j]) > 0):
+                    return False
+                i += 1
+            else:
+                # The current interval of self lies beyond the current interval of other, so 
+                # compare it against the next interval of other.
+                j += 1
+                if j == n:
+                    return False
+        return True
+    
+    cpdef bool equal(DatetimeIntervalSet self, DatetimeIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.equal')
+        cdef Py_ssize_t i, n
+        n = self.n_intervals
+        if n != other.n_intervals:
+            return False
+        for i in range(n):
+            if (DatetimeInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                          other.lower_bounds[i], other.flags[i]) != 0 or 
+                DatetimeInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                          other.upper_bounds[i], other.flags[i]) != 0):
+                return False
+        return True
+    
+    cpdef bool richcmp(DatetimeIntervalSet self, DatetimeIntervalSet other, int op):
+        if op == 0:
+            return self.subset(other) and not self.equal(other)
+        elif op == 1:
+            return self.subset(other)
+        elif op == 2:
+            return self.equal(other)
+        elif op == 3:
+            return not self.equal(other)
+        elif op == 4:
+            return other.subset(self) and not other.equal(self)
+        elif op == 5:
+            return other.subset(self)
+    
+    cpdef bool empty(DatetimeIntervalSet self):
+        return self.n_intervals == 0 
+    
+    def to_arrays(DatetimeIntervalSet self):
+        '''
+        Return (lower, upper, lower_closed, upper_closed, lower_bounded, upper_bounded), which 
+        are the arguments that from_arrays would take to construct self with raw=True.  The lower 
+        and upper bounds are read-only memoryviews of int64_t sharing the storage of self, so 
+        numpy.asarray wraps them without copying.  
+        The bounds are microseconds since the epoch in UTC, so they can be viewed as 
+        datetime64[us].  
+        The bound of an unbounded side is 0.  The flags are arrays of bytes 
+        which are 1 where true and 0 where false.
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.to_arrays')
+        return (memoryview(self.storage[0]).toreadonly(), memoryview(self.storage[1]).toreadonly(), 
+                get_flags(self.flags, self.n_intervals, LOWER_CLOSED), 
+                get_flags(self.flags, self.n_intervals, UPPER_CLOSED), 
+                get_flags(self.flags, self.n_intervals, LOWER_BOUNDED), 
+                get_flags(self.flags, self.n_intervals, UPPER_BOUNDED))
+    
+    def __reduce_ex__(DatetimeIntervalSet self, protocol):
+        # Pickle the storage as three buffers rather than as interval objects.  From protocol 5 
+        # the buffers are passed as PickleBuffers, so they can be sent out of band without 
+        # copying.
+        if protocol >= 5 and PickleBuffer is not None:
+            buffers = tuple(PickleBuffer(buffer) for buffer in self.storage)
+        else:
+            buffers = tuple(memoryview(buffer).tobytes() for buffer in self.storage)
+        return (DatetimeIntervalSet_from_buffers, (self.n_intervals,) + buffers)
+    
+    def save(DatetimeIntervalSet self, path):
+        '''
+        Write self to the file at path in the binary format read by load_interval_set.
+        '''
+        with open(path, 'wb') as outfile:
+            outfile.write(file_header.pack(file_magic, b'DatetimeIntervalSet', sys.byteorder[0].encode(), 
+                                           sizeof(int64_t), self.n_intervals))
+            for buffer in self.storage:
+                outfile.write(buffer)
+    
+    cpdef object measure(DatetimeIntervalSet self):
+        '''
+        Return the total length of the intervals, or infinity if self is unbounded.  
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.measure')
+        cdef Py_ssize_t i, n = self.n_intervals
+        cdef int64_t total = 0
+        if n > 0 and not ((self.flags[0] & LOWER_BOUNDED) and (self.flags[n-1] & UPPER_BOUNDED)):
+            return INFINITY
+        with nogil:
+            for i in range(n):
+                total += DatetimeInterval_length(self.lower_bounds[i], self.upper_bounds[i], self.flags[i])
+        return DatetimeInterval_length_to_py(total)
+    
+    cpdef object intersection_measure(DatetimeIntervalSet self, DatetimeIntervalSet other):
+        '''
+        Return the measure of the intersection of self and other, without constructing it.
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.intersection_measure')
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, lower_cmp, upper_cmp
+        cdef int64_t new_lower_bound, new_upper_bound
+        cdef unsigned char new_flags
+        cdef int64_t total = 0
+        cdef bint infinite = False
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        with nogil:
+            while i < m and j < n:
+                cmp = DatetimeInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                                  other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                if cmp == -1:
+                    i += 1
+                elif cmp == 1:
+                    j += 1
+                else:
+                    lower_cmp = DatetimeInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                          other.lower_bounds[j], other.flags[j])
+                    upper_cmp = DatetimeInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                                          other.upper_bounds[j], other.flags[j])
+                    if lower_cmp <= 0:
+                        new_lower_bound = other.lower_bounds[j]
+                        new_flags = other.flags[j] & LOWER_FLAGS
+                    else:
+                        new_lower_bound = self.lower_bounds[i]
+                        new_flags = self.flags[i] & LOWER_FLAGS
+                    if upper_cmp <= 0:
+                        new_upper_bound = self.upper_bounds[i]
+                        new_flags |= self.flags[i] & UPPER_FLAGS
+                    else:
+                        new_upper_bound = other.upper_bounds[j]
+                        new_flags |= other.flags[j] & UPPER_FLAGS
+                    if not ((new_flags & LOWER_BOUNDED) and (new_flags & UPPER_BOUNDED)):
+                        infinite = True
+                        break
+                    if not DatetimeInterval_empty(new_lower_bound, new_upper_bound, new_flags):
+                        total += DatetimeInterval_length(new_lower_bound, new_upper_bound, new_flags)
+                    if upper_cmp <= 0:
+                        i += 1
+                    if upper_cmp >= 0:
+                        j += 1
+        if infinite:
+            return INFINITY
+        return DatetimeInterval_length_to_py(total)
+    
+    cpdef DatetimeIntervalSet intersection(DatetimeIntervalSet self, DatetimeIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.intersection')
+        if self.empty():
+            return self
+        if other.empty():
+            return other
+        cdef DatetimeIntervalSetBuilder builder = DatetimeIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.intersection_into(other, builder)
+        return builder.build()
+    
+    cdef int intersection_into(DatetimeIntervalSet self, DatetimeIntervalSet other, 
+                               DatetimeIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the intersection of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, lower_cmp, upper_cmp
+        cdef int64_t new_lower_bound, new_upper_bound
+        cdef unsigned char new_flags
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        while i < m and j < n:
+            cmp = DatetimeInterval_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+            if cmp == -1:
+                i += 1
+            elif cmp == 1:
+                j += 1
+            else:
+                lower_cmp = DatetimeInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.flags[j])
+                upper_cmp = DatetimeInterval_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                                      other.upper_bounds[j], other.flags[j])
+                if lower_cmp <= 0:
+                    new_lower_bound = other.lower_bounds[j]
+                    new_flags = other.flags[j] & LOWER_FLAGS
+                else:
+                    new_lower_bound = self.lower_bounds[i]
+                    new_flags = self.flags[i] & LOWER_FLAGS
+                if upper_cmp <= 0:
+                    new_upper_bound = self.upper_bounds[i]
+                    new_flags |= self.flags[i] & UPPER_FLAGS
+                else:
+                    new_upper_bound = other.upper_bounds[j]
+                    new_flags |= other.flags[j] & UPPER_FLAGS
+                # For types with adjacent elements the overlap may still be empty
+                if not DatetimeInterval_empty(new_lower_bound, new_upper_bound, new_flags):
+                    builder.append(new_lower_bound, new_upper_bound, new_flags)
+                if upper_cmp <= 0:
+                    i += 1
+                if upper_cmp >= 0:
+                    j += 1
+        return 0
+    
+    cpdef DatetimeIntervalSet union(DatetimeIntervalSet self, DatetimeIntervalSet other):
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.union')
+        if self.empty():
+            return other
+        if other.empty():
+            return self
+        cdef DatetimeIntervalSetBuilder builder = DatetimeIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.union_into(other, builder)
+        return builder.build()
+    
+    cdef int union_into(DatetimeIntervalSet self, DatetimeIntervalSet other, 
+                        DatetimeIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the union of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        while i < m or j < n:
+            if j == n or (i < m and 
+                          DatetimeInterval_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                    other.lower_bounds[j], other.flags[j]) <= 0):
+                builder.merge(self.lower_bounds[i], self.upper_bounds[i], self.flags[i])
+                i += 1
+            else:
+                builder.merge(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                j += 1
+        return 0
+    
+    cpdef DatetimeIntervalSet complement(DatetimeIntervalSet self):
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.complement')
+        cdef DatetimeIntervalSetBuilder builder
+        if self.empty():
+            builder = DatetimeIntervalSetBuilder(1)
+            builder.append(0, 0, LOWER_CLOSED | UPPER_CLOSED)
+            return builder.build()
+        cdef Py_ssize_t i
+        cdef Py_ssize_t n = self.n_intervals
+        cdef unsigned char flags
+        builder = DatetimeIntervalSetBuilder(n + 1)
+        if self.flags[0] & LOWER_BOUNDED:
+            builder.append(0, self.lower_bounds[0], 
+                           LOWER_CLOSED | UPPER_BOUNDED | (0 if self.flags[0] & LOWER_CLOSED else UPPER_CLOSED))
+        for i in range(1, n):
+            # For types with adjacent elements the gap between two intervals may be empty
+            flags = (LOWER_BOUNDED | UPPER_BOUNDED | 
+                     (0 if self.flags[i-1] & UPPER_CLOSED else LOWER_CLOSED) | 
+                     (0 if self.flags[i] & LOWER_CLOSED else UPPER_CLOSED))
+            if not DatetimeInterval_empty(self.upper_bounds[i-1], self.lower_bounds[i], flags):
+                builder.append(self.upper_bounds[i-1], self.lower_bounds[i], flags)
+        if self.flags[n-1] & UPPER_BOUNDED:
+            builder.append(self.upper_bounds[n-1], 0, 
+                           UPPER_CLOSED | LOWER_BOUNDED | (0 if self.flags[n-1] & UPPER_CLOSED else LOWER_CLOSED))
+        return builder.build()
+            
+    cpdef DatetimeIntervalSet symmetric_difference(DatetimeIntervalSet self, DatetimeIntervalSet other):
+        '''
+        Return the set of elements in exactly one of self and other, computed in a single sweep 
+        over both.  At each step the remaining parts of the current intervals of self and other 
+        are compared, and whatever lies before the start or after the end of their overlap is 
+        kept.
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.symmetric_difference')
+        if self.empty():
+            return other
+        if other.empty():
+            return self
+        cdef DatetimeIntervalSetBuilder builder = DatetimeIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.symmetric_difference_into(other, builder)
+        return builder.build()
+    
+    cdef int symmetric_difference_into(DatetimeIntervalSet self, DatetimeIntervalSet other, 
+                                       DatetimeIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append the symmetric difference of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, upper_cmp
+        cdef int64_t lower1, upper1, lower2, upper2
+        cdef unsigned char lower_flags1, upper_flags1, lower_flags2, upper_flags2
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        lower1 = self.lower_bounds[0]
+        lower_flags1 = self.flags[0] & LOWER_FLAGS
+        lower2 = other.lower_bounds[0]
+        lower_flags2 = other.flags[0] & LOWER_FLAGS
+        while i < m and j < n:
+            upper1 = self.upper_bounds[i]
+            upper_flags1 = self.flags[i] & UPPER_FLAGS
+            upper2 = other.upper_bounds[j]
+            upper_flags2 = other.flags[j] & UPPER_FLAGS
+            cmp = DatetimeInterval_overlap_cmp(lower1, upper1, lower_flags1 | upper_flags1, 
+                                              lower2, upper2, lower_flags2 | upper_flags2)
+            if cmp == -1:
+                builder.merge(lower1, upper1, lower_flags1 | upper_flags1)
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+                continue
+            elif cmp == 1:
+                builder.merge(lower2, upper2, lower_flags2 | upper_flags2)
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+                continue
+            
+            # Keep whatever precedes the overlap
+            cmp = DatetimeInterval_lower_cmp(lower1, lower_flags1, lower2, lower_flags2)
+            if cmp < 0:
+                builder.merge(lower1, lower2, lower_flags1 | UPPER_BOUNDED | 
+                              (0 if lower_flags2 & LOWER_CLOSED else UPPER_CLOSED))
+            elif cmp > 0:
+                builder.merge(lower2, lower1, lower_flags2 | UPPER_BOUNDED | 
+                              (0 if lower_flags1 & LOWER_CLOSED else UPPER_CLOSED))
+            
+            # Whatever follows the overlap remains to be compared with later intervals
+            upper_cmp = DatetimeInterval_upper_cmp(upper1, upper_flags1, upper2, upper_flags2)
+            if upper_cmp < 0:
+                lower2 = upper1
+                lower_flags2 = LOWER_BOUNDED | (0 if upper_flags1 & UPPER_CLOSED else LOWER_CLOSED)
+            elif upper_cmp > 0:
+                lower1 = upper2
+                lower_flags1 = LOWER_BOUNDED | (0 if upper_flags2 & UPPER_CLOSED else LOWER_CLOSED)
+            if upper_cmp <= 0:
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+            if upper_cmp >= 0:
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+        while i < m:
+            builder.merge(lower1, self.upper_bounds[i], lower_flags1 | (self.flags[i] & UPPER_FLAGS))
+            i += 1
+            if i < m:
+                lower1 = self.lower_bounds[i]
+                lower_flags1 = self.flags[i] & LOWER_FLAGS
+        while j < n:
+            builder.merge(lower2, other.upper_bounds[j], lower_flags2 | (other.flags[j] & UPPER_FLAGS))
+            j += 1
+            if j < n:
+                lower2 = other.lower_bounds[j]
+                lower_flags2 = other.flags[j] & LOWER_FLAGS
+        return 0
+    
+    cpdef DatetimeIntervalSet minus(DatetimeIntervalSet self, DatetimeIntervalSet other):
+        '''
+        Subtract other from self in a single sweep over both, cutting each interval of self 
+        at the intervals of other that overlap it.
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet.minus')
+        if self.empty() or other.empty():
+            return self
+        cdef DatetimeIntervalSetBuilder builder = DatetimeIntervalSetBuilder(self.n_intervals + 
+                                                                            other.n_intervals)
+        with nogil:
+            self.minus_into(other, builder)
+        return builder.build()
+    
+    cdef int minus_into(DatetimeIntervalSet self, DatetimeIntervalSet other, 
+                        DatetimeIntervalSetBuilder builder) except -1 nogil:
+        '''
+        Append self minus other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp
+        cdef int64_t lower, upper
+        cdef unsigned char lower_flags, upper_flags, piece_flags
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        # The part of the interval i of self that remains to be cut runs from lower to upper
+        lower = self.lower_bounds[0]
+        lower_flags = self.flags[0] & LOWER_FLAGS
+        while i < m:
+            upper = self.upper_bounds[i]
+            upper_flags = self.flags[i] & UPPER_FLAGS
+            cmp = -1
+            while j < n:
+                cmp = DatetimeInterval_overlap_cmp(lower, upper, lower_flags | upper_flags, 
+                                                  other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                if cmp != 1:
+                    break
+                j += 1
+            if j == n or cmp == -1:
+                # Nothing left in other overlaps the remaining part
+                if not DatetimeInterval_empty(lower, upper, lower_flags | upper_flags):
+                    builder.append(lower, upper, lower_flags | upper_flags)
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+                continue
+            if DatetimeInterval_lower_cmp(lower, lower_flags, other.lower_bounds[j], other.flags[j]) < 0:
+                piece_flags = (lower_flags | UPPER_BOUNDED | 
+                               (0 if other.flags[j] & LOWER_CLOSED else UPPER_CLOSED))
+                if not DatetimeInterval_empty(lower, other.lower_bounds[j], piece_flags):
+                    builder.append(lower, other.lower_bounds[j], piece_flags)
+            if DatetimeInterval_upper_cmp(upper, upper_flags, other.upper_bounds[j], other.flags[j]) > 0:
+                lower = other.upper_bounds[j]
+                lower_flags = LOWER_BOUNDED | (0 if other.flags[j] & UPPER_CLOSED else LOWER_CLOSED)
+                j += 1
+            else:
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+        return 0
+cdef inline int DatetimeIntervalSet_cursor_cmp(list sets, Py_ssize_t *positions, Py_ssize_t a, 
+                                              Py_ssize_t b, bint by_upper) except? -2:
+    cdef DatetimeIntervalSet first = sets[a]
+    cdef DatetimeIntervalSet second = sets[b]
+    if by_upper:
+        return DatetimeInterval_upper_cmp(first.upper_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.upper_bounds[positions[b]], second.flags[positions[b]])
+    else:
+        return DatetimeInterval_lower_cmp(first.lower_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.lower_bounds[positions[b]], second.flags[positions[b]])
+
+cdef int DatetimeIntervalSet_sift_down(list sets, Py_ssize_t *positions, Py_ssize_t *heap, 
+                                     Py_ssize_t size, Py_ssize_t index, bint by_upper) except -1:
+    '''
+    Restore the heap property below index in a min-heap of indices into sets, ordered by the 
+    lower (or upper) bound of the interval at which each set's cursor in positions points.
+    '''
+    cdef Py_ssize_t child, top
+    while True:
+        child = 2 * index + 1
+        if child >= size:
+            return 0
+        if (child + 1 < size and 
+            DatetimeIntervalSet_cursor_cmp(sets, positions, heap[child + 1], heap[child], by_upper) < 0):
+            child += 1
+        if DatetimeIntervalSet_cursor_cmp(sets, positions, heap[child], heap[index], by_upper) >= 0:
+            return 0
+        top = heap[index]
+        heap[index] = heap[child]
+        heap[child] = top
+        index = child
+
+def DatetimeIntervalSet_from_buffers(Py_ssize_t n, lower, upper, flags):
+    '''
+    Construct an DatetimeIntervalSet of n intervals whose storage is the given buffers of lower 
+    bounds, upper bounds and flags in native byte order, without copying them.  This is used 
+    to load interval set files and to unpickle typed interval sets.
+    '''
+    cdef DatetimeIntervalSet result = DatetimeIntervalSet.__new__(DatetimeIntervalSet)
+    cdef const int64_t[:] lower_view = memoryview(lower).cast('B').cast('q')
+    cdef const int64_t[:] upper_view = memoryview(upper).cast('B').cast('q')
+    cdef const unsigned char[:] flags_view = memoryview(flags).cast('B')
+    if lower_view.shape[0] != n or upper_view.shape[0] != n or flags_view.shape[0] != n:
+        raise ValueError('Expected buffers of %d intervals' % n)
+    result.storage = (lower_view.base, upper_view.base, flags_view.base)
+    result.n_intervals = n
+    if n > 0:
+        result.lower_bounds = <int64_t *> &lower_view[0]
+        result.upper_bounds = <int64_t *> &upper_view[0]
+        result.flags = <unsigned char *> &flags_view[0]
+    return result
+
+cpdef DatetimeIntervalSet DatetimeIntervalSet_union_all(list sets):
+    '''
+    Return the union of all the given sets, merging them all at once with a heap ordered by 
+    the lower bound of each set's next interval.
+    '''
+    cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet_union_all')
+    cdef DatetimeIntervalSet interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    sets = [interval_set for interval_set in sets if not interval_set.empty()]
+    k = len(sets)
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        total += interval_set.n_intervals
+    cdef DatetimeIntervalSetBuilder builder = DatetimeIntervalSetBuilder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            DatetimeIntervalSet_sift_down(sets, positions, heap, size, i, False)
+        while size > 0:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(interval_set.lower_bounds[positions[i]], interval_set.upper_bounds[positions[i]], 
+                          interval_set.flags[positions[i]])
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                size -= 1
+                heap[0] = heap[size]
+            DatetimeIntervalSet_sift_down(sets, positions, heap, size, 0, False)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cpdef DatetimeIntervalSet DatetimeIntervalSet_intersection_all(list sets):
+    '''
+    Return the intersection of all the given sets in a single sweep over all of them.  The 
+    intersection of the current intervals of the sets runs from the greatest of their lower 
+    bounds to the least of their upper bounds, which is found with a heap.  The set whose 
+    current interval ends first is then advanced.
+    '''
+    cdef OperationTimer timer = OperationTimer('DatetimeIntervalSet_intersection_all')
+    cdef DatetimeIntervalSet interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    cdef int64_t lower
+    cdef unsigned char lower_flags
+    k = len(sets)
+    if k == 0:
+        return DatetimeIntervalSet(()).complement()
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        if interval_set.empty():
+            return interval_set
+        total += interval_set.n_intervals
+    interval_set = sets[0]
+    lower = interval_set.lower_bounds[0]
+    lower_flags = interval_set.flags[0] & LOWER_FLAGS
+    cdef DatetimeIntervalSetBuilder builder = DatetimeIntervalSetBuilder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+            interval_set = sets[i]
+            if DatetimeInterval_lower_cmp(interval_set.lower_bounds[0], interval_set.flags[0], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[0]
+                lower_flags = interval_set.flags[0] & LOWER_FLAGS
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            DatetimeIntervalSet_sift_down(sets, positions, heap, size, i, True)
+        while True:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(lower, interval_set.upper_bounds[positions[i]], 
+                          lower_flags | (interval_set.flags[positions[i]] & UPPER_FLAGS))
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                break
+            if DatetimeInterval_lower_cmp(interval_set.lower_bounds[positions[i]], interval_set.flags[positions[i]], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[positions[i]]
+                lower_flags = interval_set.flags[positions[i]] & LOWER_FLAGS
+            DatetimeIntervalSet_sift_down(sets, positions, heap, size, 0, True)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cdef class MutableDatetimeIntervalSet:
+    '''
+    A set of disjoint DatetimeIntervals that can be changed in place.  The intervals are kept 
+    sorted in a list of blocks of bounded size, so that adding or discarding an interval 
+    takes O(log(n)) comparisons and moves O(block_size) intervals, plus the cost of removing 
+    any intervals it absorbs.  Queries other than contains are answered by an immutable 
+    snapshot, which is cached until the next change.
+    '''
+    def __init__(MutableDatetimeIntervalSet self, tuple intervals=()):
+        self.reset(DatetimeIntervalSet_from_intervals(intervals))
+    
+    cdef int reset(MutableDatetimeIntervalSet self, DatetimeIntervalSet interval_set) except -1:
+        '''
+        Replace the contents of self with those of interval_set.
+        '''
+        cdef Py_ssize_t i, start
+        cdef DatetimeIntervalSetBuilder block
+        self.blocks = []
+        for start in range(0, max(interval_set.n_intervals, 1), block_size):
+            block = DatetimeIntervalSetBuilder(block_size)
+            for i in range(start, min(start + block_size, interval_set.n_intervals)):
+                block.append(interval_set.lower_bounds[i], interval_set.upper_bounds[i], 
+                             interval_set.flags[i])
+            self.blocks.append(block)
+        self.n_intervals = interval_set.n_intervals
+        self.frozen = interval_set
+        return 0
+    
+    cpdef DatetimeIntervalSet freeze(MutableDatetimeIntervalSet self):
+        '''
+        Return an immutable DatetimeIntervalSet with the same intervals as self.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableDatetimeIntervalSet.freeze')
+        cdef DatetimeIntervalSetBuilder block, builder
+        cdef Py_ssize_t i
+        if self.frozen is None:
+            builder = DatetimeIntervalSetBuilder(self.n_intervals)
+            for block in self.blocks:
+                for i in range(block.size):
+                    builder.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            self.frozen = builder.build()
+        return self.frozen
+    
+    cdef int search(MutableDatetimeIntervalSet self, int64_t lower, int64_t upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1:
+        '''
+        Find the first interval that does not lie entirely below the query interval, or, if 
+        after is true, the first that lies entirely above it, counting intervals that only 
+        touch it as overlapping if touching is true.  Store its block and position in the 
+        block, which are the last block and its size if there is no such interval.
+        '''
+        cdef DatetimeIntervalSetBuilder block
+        cdef Py_ssize_t low = 0, high = len(self.blocks) - 1, i
+        while low < high:
+            i = (low + high) / 2
+            block = self.blocks[i]
+            if MutableDatetimeIntervalSet_passed(block, block.size - 1, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        block = self.blocks[low]
+        block_index[0] = low
+        low = 0
+        high = block.size
+        while low < high:
+            i = (low + high) / 2
+            if MutableDatetimeIntervalSet_passed(block, i, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        position[0] = low
+        return 0
+    
+    cdef int replace(MutableDatetimeIntervalSet self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, DatetimeIntervalSetBuilder replacement) except -1:
+        '''
+        Replace the intervals from position first in block first_block up to, but not including, 
+        position last in block last_block with the intervals in replacement.
+        '''
+        cdef DatetimeIntervalSetBuilder block = self.blocks[first_block]
+        cdef DatetimeIntervalSetBuilder other
+        cdef Py_ssize_t i, j, removed = 0
+        if first_block == last_block:
+            removed = last - first
+            block.remove(first, last)
+        else:
+            removed = block.size - first
+            block.remove(first, block.size)
+            for i in range(first_block + 1, last_block):
+                removed += (<DatetimeIntervalSetBuilder> self.blocks[i]).size
+            other = self.blocks[last_block]
+            removed += last
+            other.remove(0, last)
+            del self.blocks[first_block + 1:last_block]
+        for i in range(replacement.size):
+            block.insert(first + i, replacement.lower_bounds[i], replacement.upper_bounds[i], 
+                         replacement.flags[i])
+        self.n_intervals += replacement.size - removed
+        self.frozen = None
+        # Keep the sizes of the changed blocks within bounds
+        if block.size > 2 * block_size:
+            other = DatetimeIntervalSetBuilder(block_size)
+            for i in range(block.size / 2, block.size):
+                other.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            block.remove(block.size / 2, block.size)
+            self.blocks.insert(first_block + 1, other)
+        for i in (first_block + 1, first_block, first_block - 1):
+            if i >= 0 and i + 1 < len(self.blocks):
+                block = self.blocks[i]
+                other = self.blocks[i + 1]
+                if ((block.size < block_size / 4 or other.size < block_size / 4) and 
+                    block.size + other.size <= 2 * block_size):
+                    for j in range(other.size):
+                        block.append(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                    del self.blocks[i + 1]
+        return 0
+    
+    cpdef add(MutableDatetimeIntervalSet self, DatetimeInterval interval):
+        '''
+        Add the elements of interval to self, fusing it with any intervals it overlaps or 
+        touches.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableDatetimeIntervalSet.add')
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef DatetimeIntervalSetBuilder block
+        cdef DatetimeIntervalSetBuilder replacement = DatetimeIntervalSetBuilder(1)
+        cdef int64_t lower = interval.lower_bound
+        cdef int64_t upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        if DatetimeInterval_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, True, &first_block, &first)
+        self.search(lower, upper, flags, True, True, &last_block, &last)
+        replacement.append(lower, upper, flags)
+        if first_block != last_block or first != last:
+            # Fuse with the first and last of the intervals being replaced
+            block = self.blocks[first_block]
+            replacement.merge(block.lower_bounds[first], block.upper_bounds[first], block.flags[first])
+            block = self.blocks[last_block if last > 0 else last_block - 1]
+            i = (last if last > 0 else block.size) - 1
+            replacement.merge(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef discard(MutableDatetimeIntervalSet self, DatetimeInterval interval):
+        '''
+        Remove the elements of interval from self, splitting any interval that extends past it.
+        '''
+        cdef OperationTimer timer = OperationTimer('MutableDatetimeIntervalSet.discard')
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef DatetimeIntervalSetBuilder block
+        cdef DatetimeIntervalSetBuilder replacement = DatetimeIntervalSetBuilder(2)
+        cdef int64_t lower = interval.lower_bound
+        cdef int64_t upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        cdef unsigned char piece_flags
+        if DatetimeInterval_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, False, &first_block, &first)
+        self.search(lower, upper, flags, True, False, &last_block, &last)
+        if first_block == last_block and first == last:
+            return
+        block = self.blocks[first_block]
+        if flags & LOWER_BOUNDED:
+            # The part of the first overlapping interval below interval
+            piece_flags = ((block.flags[first] & LOWER_FLAGS) | UPPER_BOUNDED | 
+                           (0 if flags & LOWER_CLOSED else UPPER_CLOSED))
+            if not DatetimeInterval_empty(block.lower_bounds[first], lower, piece_flags):
+                replacement.append(block.lower_bounds[first], lower, piece_flags)
+        block = self.blocks[last_block if last > 0 else last_block - 1]
+        i = (last if last > 0 else block.size) - 1
+        if flags & UPPER_BOUNDED:
+            # The part of the last overlapping interval above interval
+            piece_flags = ((block.flags[i] & UPPER_FLAGS) | LOWER_BOUNDED | 
+                           (0 if flags & UPPER_CLOSED else LOWER_CLOSED))
+            if not DatetimeInterval_empty(upper, block.upper_bounds[i], piece_flags):
+                replacement.append(upper, block.upper_bounds[i], piece_flags)
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef bool contains(MutableDatetimeIntervalSet self, object item):
+        cdef OperationTimer timer = OperationTimer('MutableDatetimeIntervalSet.contains')
+        cdef int64_t value = DatetimeInterval_to_c(item)
+        cdef Py_ssize_t block_index, position
+        cdef DatetimeIntervalSetBuilder block
+        self.search(value, value, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                    False, False, &block_index, &position)
+        block = self.blocks[block_index]
+        return position < block.size and DatetimeInterval_containment_cmp(block.lower_bounds[position], 
+                                                                         block.upper_bounds[position], 
+                                                                         block.flags[position], value) == 0
+    
+    def __contains__(MutableDatetimeIntervalSet self, item):
+        return self.contains(item)
+    
+    def __ior__(MutableDatetimeIntervalSet self, other):
+        cdef DatetimeInterval interval
+        for interval in other:
+            self.add(interval)
+        return self
+    
+    def __isub__(MutableDatetimeIntervalSet self, other):
+        cdef DatetimeInterval interval
+        for interval in other:
+            self.discard(interval)
+        return self
+    
+    def __iand__(MutableDatetimeIntervalSet self, other):
+        cdef DatetimeIntervalSet interval_set
+        if isinstance(other, MutableDatetimeIntervalSet):
+            interval_set = (<MutableDatetimeIntervalSet> other).freeze()
+        elif isinstance(other, DatetimeIntervalSet):
+            interval_set = other
+        else:
+            # Any other iterable of intervals, as for |= and -=
+            interval_set = DatetimeIntervalSet_from_intervals(tuple(other))
+        # Discarding the complement would leave gaps holding no element of a discrete type 
+        # inside the remaining intervals, so the intersection is rebuilt as a whole
+        self.reset(self.freeze().intersection(interval_set))
+        return self
+    
+    def __richcmp__(MutableDatetimeIntervalSet self, other, int op):
+        if isinstance(other, MutableDatetimeIntervalSet):
+            other = (<MutableDatetimeIntervalSet> other).freeze()
+        return PyObject_RichCompare(self.freeze(), other, op)
+    
+    __hash__ = None
+    
+    def __reduce__(MutableDatetimeIntervalSet self):
+        return (self.__class__, (self.intervals,))
+    
+    def __iter__(MutableDatetimeIntervalSet self):
+        return iter(self.freeze())
+    
+    def __str__(MutableDatetimeIntervalSet self):
+        return str(self.freeze())
+    
+    def __repr__(MutableDatetimeIntervalSet self):
+        return str(self)
+    
+    def __nonzero__(MutableDatetimeIntervalSet self):
+        return self.n_intervals > 0
+    
+    @property
+    def intervals(MutableDatetimeIntervalSet self):
+        return self.freeze().intervals
+    
+    def empty(MutableDatetimeIntervalSet self):
+        return self.n_intervals == 0
+    
+    def lower_bounded(MutableDatetimeIntervalSet self):
+        return self.freeze().lower_bounded()
+    
+    def upper_bounded(MutableDatetimeIntervalSet self):
+        return self.freeze().upper_bounded()
+    
+    def lower_bound(MutableDatetimeIntervalSet self):
+        return self.freeze().lower_bound()
+    
+    def upper_bound(MutableDatetimeIntervalSet self):
+        return self.freeze().upper_bound()
+    
+    def contains_many(MutableDatetimeIntervalSet self, points):
+        return self.freeze().contains_many(points)
+    
+    def locate(MutableDatetimeIntervalSet self, points):
+        return self.freeze().locate(points)
+    
+    def subset(MutableDatetimeIntervalSet self, other):
+        if isinstance(other, MutableDatetimeIntervalSet):
+            other = (<MutableDatetimeIntervalSet> other).freeze()
+        return self.freeze().subset(other)
+    
+    def measure(MutableDatetimeIntervalSet self):
+        return self.freeze().measure()
+    
+    def intersection_measure(MutableDatetimeIntervalSet self, other):
+        if isinstance(other, MutableDatetimeIntervalSet):
+            other = (<MutableDatetimeIntervalSet> other).freeze()
+        return self.freeze().intersection_measure(other)
+
+cdef inline bint MutableDatetimeIntervalSet_passed(DatetimeIntervalSetBuilder block, Py_ssize_t i, 
+                                                  int64_t lower, int64_t upper, unsigned char flags, 
+                                                  bint after, bint touching):
+    '''
+    Return whether interval i of block is not entirely below the query interval or, if after 
+    is true, whether it is entirely above it.  If touching is true, intervals that touch 
+    the query interval without overlapping it count as overlapping it.
+    '''
+    cdef int cmp = DatetimeInterval_overlap_cmp(block.lower_bounds[i], block.upper_bounds[i], block.flags[i], 
+                                               lower, upper, flags)
+    if after:
+        return cmp == 1 and not (touching and block.lower_bounds[i] == upper and (flags & UPPER_BOUNDED) and 
+                                 (block.flags[i] & LOWER_BOUNDED) and 
+                                 ((block.flags[i] & LOWER_CLOSED) or (flags & UPPER_CLOSED)))
+    else:
+        return cmp != -1 or (touching and block.upper_bounds[i] == lower and (flags & LOWER_BOUNDED) and 
+                             (block.flags[i] & UPPER_BOUNDED) and 
+                             ((block.flags[i] & UPPER_CLOSED) or (flags & LOWER_CLOSED)))
+
+cdef class DatetimeIntervalIndex:
+    '''
+    A static collection of DatetimeIntervals, which may overlap and are identified by their 
+    position in the sequence the index was built from.  Queries return arrays of these 
+    positions in increasing order.  Intervals are sorted by lower bound, and an implicit 
+    binary tree over the sorted order records the interval with the greatest upper bound 
+    in each subtree, so the k intervals overlapping a query are found in O((k + 1) log(n)) 
+    time.
+    '''
+    def __init__(DatetimeIntervalIndex self, tuple intervals):
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalIndex.__init__')
+        cdef DatetimeInterval interval
+        cdef DatetimeIntervalSetBuilder raw = DatetimeIntervalSetBuilder(len(intervals))
+        for interval in intervals:
+            raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        self.index(raw)
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True):
+        '''
+        Construct an DatetimeIntervalIndex from arrays of bounds and flags, which are 
+        interpreted as in DatetimeIntervalSet.from_arrays.
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalIndex.from_arrays')
+        cdef DatetimeIntervalIndex result = DatetimeIntervalIndex.__new__(DatetimeIntervalIndex)
+        result.index(DatetimeIntervalSet_raw_from_arrays(lower, upper, lower_closed, upper_closed, 
+                                                        lower_bounded, upper_bounded))
+        return result
+    
+    cdef int index(DatetimeIntervalIndex self, DatetimeIntervalSetBuilder raw) except -1:
+        '''
+        Sort the intervals accumulated in raw and build the tree over them.
+        '''
+        cdef Py_ssize_t i, k, n = raw.size
+        cdef Py_ssize_t left, right
+        cdef DatetimeIntervalSetBuilder builder = DatetimeIntervalSetBuilder(n)
+        self.order_array = clone(index_template, n, False)
+        self.order = index_data(self.order_array)
+        cdef DatetimeIntervalRecord *records = <DatetimeIntervalRecord *> PyMem_Malloc(n * sizeof(DatetimeIntervalRecord))
+        if records == NULL and n > 0:
+            raise MemoryError()
+        try:
+            for i in range(n):
+                records[i].lower = raw.lower_bounds[i]
+                records[i].upper = raw.upper_bounds[i]
+                records[i].flags = raw.flags[i]
+                records[i].index = i
+            qsort(records, n, sizeof(DatetimeIntervalRecord), DatetimeInterval_record_cmp)
+            for i in range(n):
+                builder.append(records[i].lower, records[i].upper, records[i].flags)
+                self.order[i] = records[i].index
+        finally:
+            PyMem_Free(records)
+        # The sorted intervals are kept in the storage of an DatetimeIntervalSet, although unlike 
+        # those of a set they may be empty or overlap
+        self.sorted_intervals = builder.build()
+        self.n_intervals = n
+        self.leaves = 1
+        while self.leaves < n:
+            self.leaves *= 2
+        self.tree_array = clone(index_template, 2 * self.leaves, False)
+        self.tree = index_data(self.tree_array)
+        # Empty intervals are left out of the tree, so they are never found
+        for i in range(self.leaves):
+            if i < n and not DatetimeInterval_empty(self.sorted_intervals.lower_bounds[i], 
+                                                   self.sorted_intervals.upper_bounds[i], 
+                                                   self.sorted_intervals.flags[i]):
+                self.tree[self.leaves + i] = i
+            else:
+                self.tree[self.leaves + i] = -1
+        for i in range(self.leaves - 1, 0, -1):
+            left = self.tree[2 * i]
+            right = self.tree[2 * i + 1]
+            if left < 0 or (right >= 0 and 
+                            DatetimeInterval_upper_cmp(self.sorted_intervals.upper_bounds[right], 
+                                                      self.sorted_intervals.flags[right], 
+                                                      self.sorted_intervals.upper_bounds[left], 
+                                                      self.sorted_intervals.flags[left]) > 0):
+                self.tree[i] = right
+            else:
+                self.tree[i] = left
+        return 0
+    
+    def __len__(DatetimeIntervalIndex self):
+        return self.n_intervals
+    
+    @property
+    def intervals(DatetimeIntervalIndex self):
+        '''
+        The indexed intervals, in the order the index was built from.
+        '''
+        cdef Py_ssize_t i
+        cdef list result
+        if self.cached_intervals is None:
+            result = [None] * self.n_intervals
+            for i, interval in enumerate(self.sorted_intervals.intervals):
+                result[self.order[i]] = interval
+            self.cached_intervals = tuple(result)
+        return self.cached_intervals
+    
+    def __reduce__(DatetimeIntervalIndex self):
+        return (self.__class__, (self.intervals,))
+    
+    def __str__(DatetimeIntervalIndex self):
+        return 'DatetimeIntervalIndex(%s)' % ', '.join(map(str, self.intervals))
+    
+    def __repr__(DatetimeIntervalIndex self):
+        return str(self)
+    
+    cdef Py_ssize_t end(DatetimeIntervalIndex self, int64_t upper, unsigned char flags):
+        '''
+        Use binary search to find the number of intervals, in sorted order, that do not lie 
+        entirely above the upper bound of the query.
+        '''
+        cdef Py_ssize_t i, low = 0, high = self.n_intervals
+        cdef DatetimeIntervalSet intervals = self.sorted_intervals
+        while low < high:
+            i = (low + high) / 2
+            # Masking the flags restricts overlap_cmp to the lower bound of the interval 
+            # and the upper bound of the query
+            if DatetimeInterval_overlap_cmp(intervals.lower_bounds[i], intervals.upper_bounds[i], 
+                                           intervals.flags[i] & LOWER_FLAGS, upper, upper, 
+                                           flags & UPPER_FLAGS) == 1:
+                high = i
+            else:
+                low = i + 1
+        return low
+    
+    cdef int collect(DatetimeIntervalIndex self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, int64_t lower, int64_t upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals under node, among the first end in 
+        sorted order, that do not lie entirely below the lower bound of the query and share 
+        an element with it.  Subtrees whose greatest upper bound lies below the query are 
+        skipped.
+        '''
+        cdef Py_ssize_t k, middle
+        cdef DatetimeIntervalSet intervals = self.sorted_intervals
+        if node_start >= end:
+            return 0
+        k = self.tree[node]
+        if k < 0 or DatetimeInterval_overlap_cmp(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                intervals.flags[k] & UPPER_FLAGS, lower, lower, 
+                                                flags & LOWER_FLAGS) == -1:
+            return 0
+        if node_stop - node_start == 1:
+            # Bounds that interleave may still leave no element in common
+            if not DatetimeInterval_intersection_empty(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                      intervals.flags[k], lower, upper, flags):
+                append_index(result, size, self.order[k])
+            return 0
+        middle = (node_start + node_stop) / 2
+        self.collect(2 * node, node_start, middle, end, lower, upper, flags, result, size)
+        self.collect(2 * node + 1, middle, node_stop, end, lower, upper, flags, result, size)
+        return 0
+    
+    cdef int query(DatetimeIntervalIndex self, int64_t lower, int64_t upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals that overlap the query interval, in 
+        increasing order.
+        '''
+        cdef Py_ssize_t start = size[0]
+        if DatetimeInterval_empty(lower, upper, flags):
+            return 0
+        self.collect(1, 0, self.leaves, self.end(upper, flags), lower, upper, flags, result, size)
+        qsort(index_data(result) + start, size[0] - start, sizeof(Py_ssize_t), index_cmp)
+        return 0
+    
+    cpdef array stab(DatetimeIntervalIndex self, object point):
+        '''
+        Return the positions of the intervals containing point.
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalIndex.stab')
+        cdef int64_t item = DatetimeInterval_to_c(point)
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(item, item, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, result, &size)
+        resize(result, size)
+        return result
+    
+    cpdef array overlap(DatetimeIntervalIndex self, DatetimeInterval interval):
+        '''
+        Return the positions of the intervals that overlap interval.
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalIndex.overlap')
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+        resize(result, size)
+        return result
+    
+    def stab_many(DatetimeIntervalIndex self, points):
+        '''
+        Stab the index with each of points.  Return a pair of arrays of equal length, the 
+        first holding positions in points and the second the positions of the intervals 
+        containing them, ordered by position in points and then by interval position.
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalIndex.stab_many')
+        cdef const int64_t[:] items = DatetimeIntervalSet_values(points)
+        cdef Py_ssize_t n = items.shape[0]
+        cdef Py_ssize_t i, start, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for i in range(n):
+            start = size
+            self.query(items[i], items[i], LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                       result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+    
+    def overlap_many(DatetimeIntervalIndex self, intervals):
+        '''
+        Query the index with each of intervals, which may be any iterable of DatetimeIntervals 
+        such as an DatetimeIntervalSet.  Return a pair of arrays as in stab_many.
+        '''
+        cdef OperationTimer timer = OperationTimer('DatetimeIntervalIndex.overlap_many')
+        cdef DatetimeInterval interval
+        cdef Py_ssize_t i = 0, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for interval in intervals:
+            self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+            i += 1
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+
+
+cdef int DatetimeInterval_sweep_step(int64_t * lower1, int64_t * upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                     Py_ssize_t i, int64_t * lower2, int64_t * upper2, unsigned char *flags2, 
+                                     Py_ssize_t *order2, Py_ssize_t *active2, Py_ssize_t *n_active2, bint swapped, 
+                                     IndexPairs *pairs) except -1 nogil:
+    '''
+    Pair interval i of the first side with each active interval of the second side that 
+    does not lie entirely below it, and drop those that do from the active intervals.  The 
+    active intervals all have lower bounds not greater than that of interval i, so they 
+    overlap it unless they lie below it, and then they lie below all later intervals too.
+    '''
+    cdef Py_ssize_t k, j, kept = 0
+    for k in range(n_active2[0]):
+        j = active2[k]
+        # Masking the flags restricts overlap_cmp to the upper bound of the active interval and 
+        # the lower bound of interval i
+        if DatetimeInterval_overlap_cmp(lower2[j], upper2[j], flags2[j] & UPPER_FLAGS, 
+                                       lower1[i], upper1[i], flags1[i] & LOWER_FLAGS) != -1:
+            # Bounds that interleave may still leave no element in common
+            if not DatetimeInterval_intersection_empty(lower1[i], upper1[i], flags1[i], 
+                                                      lower2[j], upper2[j], flags2[j]):
+                if swapped:
+                    append_pair(pairs, order2[j], order1[i])
+                else:
+                    append_pair(pairs, order1[i], order2[j])
+            active2[kept] = j
+            kept += 1
+    n_active2[0] = kept
+    return 0
+
+cdef int DatetimeInterval_sweep(int64_t * lower1, int64_t * upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                Py_ssize_t n1, int64_t * lower2, int64_t * upper2, unsigned char *flags2, 
+                                Py_ssize_t *order2, Py_ssize_t n2, Py_ssize_t *active1, Py_ssize_t *active2, 
+                                IndexPairs *pairs) except -1 nogil:
+    '''
+    Merge two sequences of intervals sorted by lower bound, keeping for each side the 
+    intervals that may still overlap later intervals of the other side.
+    '''
+    cdef Py_ssize_t i = 0, j = 0, n_active1 = 0, n_active2 = 0
+    while i < n1 or j < n2:
+        if j == n2 or (i < n1 and DatetimeInterval_lower_cmp(lower1[i], flags1[i], lower2[j], flags2[j]) <= 0):
+            if not DatetimeInterval_empty(lower1[i], upper1[i], flags1[i]):
+                DatetimeInterval_sweep_step(lower1, upper1, flags1, order1, i, lower2, upper2, flags2, 
+                                           order2, active2, &n_active2, False, pairs)
+                active1[n_active1] = i
+                n_active1 += 1
+            i += 1
+        else:
+            if not DatetimeInterval_empty(lower2[j], upper2[j], flags2[j]):
+                DatetimeInterval_sweep_step(lower2, upper2, flags2, order2, j, lower1, upper1, flags1, 
+                                           order1, active1, &n_active1, True, pairs)
+                active2[n_active2] = j
+                n_active2 += 1
+            j += 1
+    return 0
+
+cpdef tuple DatetimeInterval_overlap_join(DatetimeIntervalIndex left, DatetimeIntervalIndex right):
+    '''
+    Return a pair of arrays holding the positions in left and in right of every pair of 
+    overlapping intervals, in no particular order.
+    '''
+    cdef OperationTimer timer = OperationTimer('DatetimeInterval_overlap_join')
+    cdef DatetimeIntervalSet left_intervals = left.sorted_intervals
+    cdef DatetimeIntervalSet right_intervals = right.sorted_intervals
+    cdef IndexPairs pairs
+    pairs.first = NULL
+    pairs.second = NULL
+    pairs.size = 0
+    pairs.capacity = 0
+    cdef Py_ssize_t *active = <Py_ssize_t *> PyMem_Malloc((left.n_intervals + right.n_intervals) * sizeof(Py_ssize_t))
+    if active == NULL and left.n_intervals + right.n_intervals > 0:
+        raise MemoryError()
+    try:
+        with nogil:
+            DatetimeInterval_sweep(left_intervals.lower_bounds, left_intervals.upper_bounds, 
+                                  left_intervals.flags, left.order, left.n_intervals, 
+                                  right_intervals.lower_bounds, right_intervals.upper_bounds, 
+                                  right_intervals.flags, right.order, right.n_intervals, 
+                                  active, active + left.n_intervals, &pairs)
+        return index_pairs_to_arrays(&pairs)
+    finally:
+        PyMem_Free(active)
+        free(pairs.first)
+        free(pairs.second)
+
+
+# This is just a singleton
+class unbounded:
+    def __init__(self):
+        raise NotImplementedError('unbounded should not be instantiated')
+
+cdef dict interval_type_dispatch = {}
+cdef dict interval_default_value_dispatch = {}
+cdef dict interval_set_type_dispatch = {}
+cdef dict interval_set_factory_dispatch = {}
+cdef dict interval_set_union_all_dispatch = {}
+cdef dict interval_set_intersection_all_dispatch = {}
+cdef dict interval_index_type_dispatch = {}
+cdef dict interval_mutable_set_type_dispatch = {}
+cdef dict interval_coalescer_dispatch = {}
+cdef dict interval_index_join_dispatch = {}
+interval_default_value_dispatch[ObjectInterval] = None
+interval_set_type_dispatch[ObjectInterval] = ObjectIntervalSet
+interval_set_factory_dispatch[ObjectInterval] = ObjectIntervalSet_from_intervals
+interval_set_union_all_dispatch[ObjectIntervalSet] = ObjectIntervalSet_union_all
+interval_set_intersection_all_dispatch[ObjectIntervalSet] = ObjectIntervalSet_intersection_all
+interval_index_type_dispatch[ObjectInterval] = ObjectIntervalIndex
+interval_mutable_set_type_dispatch[ObjectInterval] = MutableObjectIntervalSet
+interval_coalescer_dispatch[ObjectInterval] = ObjectIntervalSetCoalescer
+interval_index_join_dispatch[ObjectIntervalIndex] = ObjectInterval_overlap_join
+interval_type_dispatch[date] = DateInterval
+interval_default_value_dispatch[DateInterval] = None
+interval_set_type_dispatch[DateInterval] = DateIntervalSet
+interval_set_factory_dispatch[DateInterval] = DateIntervalSet_from_intervals
+interval_set_union_all_dispatch[DateIntervalSet] = DateIntervalSet_union_all
+interval_set_intersection_all_dispatch[DateIntervalSet] = DateIntervalSet_intersection_all
+interval_index_type_dispatch[DateInterval] = DateIntervalIndex
+interval_mutable_set_type_dispatch[DateInterval] = MutableDateIntervalSet
+interval_coalescer_dispatch[DateInterval] = DateIntervalSetCoalescer
+interval_index_join_dispatch[DateIntervalIndex] = DateInterval_overlap_join
+interval_type_dispatch[int] = IntInterval
+interval_default_value_dispatch[IntInterval] = 0
+interval_set_type_dispatch[IntInterval] = IntIntervalSet
+interval_set_factory_dispatch[IntInterval] = IntIntervalSet_from_intervals
+interval_set_union_all_dispatch[IntIntervalSet] = IntIntervalSet_union_all
+interval_set_intersection_all_dispatch[IntIntervalSet] = IntIntervalSet_intersection_all
+interval_index_type_dispatch[IntInterval] = IntIntervalIndex
+interval_mutable_set_type_dispatch[IntInterval] = MutableIntIntervalSet
+interval_coalescer_dispatch[IntInterval] = IntIntervalSetCoalescer
+interval_index_join_dispatch[IntIntervalIndex] = IntInterval_overlap_join
+interval_default_value_dispatch[Int64Interval] = 0
+interval_set_type_dispatch[Int64Interval] = Int64IntervalSet
+interval_set_factory_dispatch[Int64Interval] = Int64IntervalSet_from_intervals
+interval_set_union_all_dispatch[Int64IntervalSet] = Int64IntervalSet_union_all
+interval_set_intersection_all_dispatch[Int64IntervalSet] = Int64IntervalSet_intersection_all
+interval_index_type_dispatch[Int64Interval] = Int64IntervalIndex
+interval_mutable_set_type_dispatch[Int64Interval] = MutableInt64IntervalSet
+interval_coalescer_dispatch[Int64Interval] = Int64IntervalSetCoalescer
+interval_index_join_dispatch[Int64IntervalIndex] = Int64Interval_overlap_join
+interval_type_dispatch[float] = FloatInterval
+interval_default_value_dispatch[FloatInterval] = 0.
+interval_set_type_dispatch[FloatInterval] = FloatIntervalSet
+interval_set_factory_dispatch[FloatInterval] = FloatIntervalSet_from_intervals
+interval_set_union_all_dispatch[FloatIntervalSet] = FloatIntervalSet_union_all
+interval_set_intersection_all_dispatch[FloatIntervalSet] = FloatIntervalSet_intersection_all
+interval_index_type_dispatch[FloatInterval] = FloatIntervalIndex
+interval_mutable_set_type_dispatch[FloatInterval] = MutableFloatIntervalSet
+interval_coalescer_dispatch[FloatInterval] = FloatIntervalSetCoalescer
+interval_index_join_dispatch[FloatIntervalIndex] = FloatInterval_overlap_join
+interval_type_dispatch[datetime] = DatetimeInterval
+interval_default_value_dispatch[DatetimeInterval] = None
+interval_set_type_dispatch[DatetimeInterval] = DatetimeIntervalSet
+interval_set_factory_dispatch[DatetimeInterval] = DatetimeIntervalSet_from_intervals
+interval_set_union_all_dispatch[DatetimeIntervalSet] = DatetimeIntervalSet_union_all
+interval_set_intersection_all_dispatch[DatetimeIntervalSet] = DatetimeIntervalSet_intersection_all
+interval_index_type_dispatch[DatetimeInterval] = DatetimeIntervalIndex
+interval_mutable_set_type_dispatch[DatetimeInterval] = MutableDatetimeIntervalSet
+interval_coalescer_dispatch[DatetimeInterval] = DatetimeIntervalSetCoalescer
+interval_index_join_dispatch[DatetimeIntervalIndex] = DatetimeInterval_overlap_join
+inverse_interval_type_dispatch = dict(map(tuple, map(reversed, interval_type_dispatch.items())))
+
+cdef bint datetime64_registered = False
+
+cdef int register_datetime64() except -1:
+    '''
+    Dispatch numpy.datetime64 to DatetimeInterval once numpy has been imported.  It is left 
+    out of inverse_interval_type_dispatch so that DatetimeInterval still maps back to datetime.
+    '''
+    global datetime64_registered
+    if not datetime64_registered:
+        numpy = sys.modules.get('numpy')
+        if numpy is not None:
+            interval_type_dispatch[numpy.datetime64] = DatetimeInterval
+            datetime64_registered = True
+    return 0
+
+inverse_interval_index_type_dispatch = dict(map(tuple, map(reversed, interval_index_type_dispatch.items())))
+def _resolve_interval_type(intervals, interval_type):
+    '''
+    Return the interval class for the factories below.  The interval_type may be an interval 
+    class, a bound type such as float, or a bound of that type.  If it is None the class is 
+    that of intervals, which must all have the same type, or the default if there are none.
+    '''
+    register_datetime64()
+    if interval_type is None:
+        if intervals:
+            interval_cls = type(intervals[0])
+            for interval in intervals[1:]:
+                assert interval_cls is type(interval)
+        else:
+            interval_cls = ObjectInterval
+    elif interval_type in interval_default_value_dispatch:
+        interval_cls = interval_type
+    elif interval_type in interval_type_dispatch:
+        interval_cls = interval_type_dispatch[interval_type]
+    elif type(interval_type) in interval_type_dispatch:
+        interval_cls = interval_type_dispatch[type(interval_type)]
+    else:
+        interval_cls = ObjectInterval
+    return interval_cls
+
+def Interval(lower_bound=unbounded, upper_bound=unbounded, lower_closed=True, 
+             upper_closed=True, interval_type=None):
+    register_datetime64()
+    if interval_type is None:
+        if lower_bound is not unbounded and type(lower_bound) in interval_type_dispatch:
+            cls = interval_type_dispatch[type(lower_bound)]
+        elif upper_bound is not unbounded and type(upper_bound) in interval_type_dispatch:
+            cls = interval_type_dispatch[type(upper_bound)]
+        else:
+            cls = ObjectInterval
+    else:
+        cls = _resolve_interval_type((), interval_type)
+    default_value = interval_default_value_dispatch[cls]
+    return cls(lower_bound if lower_bound is not unbounded else default_value,
+               upper_bound if upper_bound is not unbounded else default_value,
+               lower_closed, upper_closed, lower_bound is not unbounded, 
+               upper_bound is not unbounded)
+
+# Just a factory
+def IntervalSet(*intervals, interval_type=None):
+    interval_cls = _resolve_interval_type(intervals, interval_type)
+    interval_set_factory = interval_set_factory_dispatch[interval_cls]
+    return interval_set_factory(intervals)
+
+def coalesce(intervals, interval_type=None):
+    '''
+    Return an iterator over the coalesced intervals of an iterable of intervals or (lower, upper) 
+    pairs sorted by lower bound, which is consumed lazily.  If interval_type is not given, the 
+    type is chosen from the first item, as in Interval for pairs.
+    '''
+    intervals = iter(intervals)
+    if interval_type is None:
+        for first in intervals:
+            intervals = chain((first,), intervals)
+            if isinstance(first, BaseInterval):
+                interval_type = type(first)
+            elif first[0] is not unbounded:
+                interval_type = type(first[0])
+            else:
+                interval_type = type(first[1])
+            break
+    return interval_coalescer_dispatch[_resolve_interval_type((), interval_type)](intervals)
+
+def load_interval_set(path):
+    '''
+    Load an interval set written by the save method of a typed interval set.  The file is 
+    memory mapped and the set operates directly on the mapped pages, so only the pages that 
+    are used are ever read.
+    '''
+    with open(path, 'rb') as infile:
+        mapping = mmap(infile.fileno(), 0, access=ACCESS_READ)
+    if len(mapping) < file_header.size:
+        raise ValueError('%s is not an interval set file' % (path,))
+    magic, name, byteorder, itemsize, n = file_header.unpack(mapping[:file_header.size])
+    if magic != file_magic:
+        raise ValueError('%s is not an interval set file' % (path,))
+    if byteorder != sys.byteorder[0].encode():
+        raise ValueError('%s was written on a machine with a different byte order' % (path,))
+    name = name.rstrip(b'\0')
+    data = memoryview(mapping)[file_header.size:]
+    if name == b'DateIntervalSet':
+        if itemsize != sizeof(int32_t) or len(data) != n * (2 * sizeof(int32_t) + 1):
+            raise ValueError('%s is truncated or corrupt' % (path,))
+        bounds_size = n * sizeof(int32_t)
+        return DateIntervalSet_from_buffers(n, data[:bounds_size], data[bounds_size:2*bounds_size], 
+                                               data[2*bounds_size:])
+    if name == b'IntIntervalSet':
+        if itemsize != sizeof(int) or len(data) != n * (2 * sizeof(int) + 1):
+            raise ValueError('%s is truncated or corrupt' % (path,))
+        bounds_size = n * sizeof(int)
+        return IntIntervalSet_from_buffers(n, data[:bounds_size], data[bounds_size:2*bounds_size], 
+                                               data[2*bounds_size:])
+    if name == b'Int64IntervalSet':
+        if itemsize != sizeof(int64_t) or len(data) != n * (2 * sizeof(int64_t) + 1):
+            raise ValueError('%s is truncated or corrupt' % (path,))
+        bounds_size = n * sizeof(int64_t)
+        return Int64IntervalSet_from_buffers(n, data[:bounds_size], data[bounds_size:2*bounds_size], 
+                                               data[2*bounds_size:])
+    if name == b'FloatIntervalSet':
+        if itemsize != sizeof(double) or len(data) != n * (2 * sizeof(double) + 1):
+            raise ValueError('%s is truncated or corrupt' % (path,))
+        bounds_size = n * sizeof(double)
+        return FloatIntervalSet_from_buffers(n, data[:bounds_size], data[bounds_size:2*bounds_size], 
+                                               data[2*bounds_size:])
+    if name == b'DatetimeIntervalSet':
+        if itemsize != sizeof(int64_t) or len(data) != n * (2 * sizeof(int64_t) + 1):
+            raise ValueError('%s is truncated or corrupt' % (path,))
+        bounds_size = n * sizeof(int64_t)
+        return DatetimeIntervalSet_from_buffers(n, data[:bounds_size], data[bounds_size:2*bounds_size], 
+                                               data[2*bounds_size:])
+    raise ValueError('%s contains an unknown interval set type %r' % (path, name))
+
+def MutableIntervalSet(*intervals, interval_type=None):
+    '''
+    Construct a mutable interval set, with type chosen as in IntervalSet.
+    '''
+    interval_cls = _resolve_interval_type(intervals, interval_type)
+    return interval_mutable_set_type_dispatch[interval_cls](intervals)
+
+def IntervalIndex(*intervals, interval_type=None):
+    '''
+    Construct an index over intervals, which may overlap.  The type of the index is chosen 
+    from the intervals or interval_type as in IntervalSet.
+    '''
+    interval_cls = _resolve_interval_type(intervals, interval_type)
+    return interval_index_type_dispatch[interval_cls](intervals)
+
+def overlap_join(left, right, interval_type=None):
+    '''
+    Find every pair of overlapping intervals with one from left and one from right.  Each of 
+    left and right is an interval index or an iterable of intervals, which is indexed first.  
+    The interval_type is used as in IntervalSet if neither side determines it.  Return a 
+    pair of arrays of equal length holding the positions in left and in right of each 
+    overlapping pair, in no particular order.
+    '''
+    if type(left) not in interval_index_join_dispatch:
+        left = tuple(left)
+    if type(right) not in interval_index_join_dispatch:
+        right = tuple(right)
+    if interval_type is None:
+        for side in (left, right):
+            if type(side) in interval_index_join_dispatch:
+                interval_type = inverse_interval_index_type_dispatch[type(side)]
+                break
+            elif side:
+                interval_type = type(side[0])
+                break
+    if type(left) not in interval_index_join_dispatch:
+        left = IntervalIndex(*left, interval_type=interval_type)
+    if type(right) not in interval_index_join_dispatch:
+        right = IntervalIndex(*right, interval_type=interval_type)
+    return interval_index_join_dispatch[type(left)](left, right)
+
+def union_all(sets, interval_type=None):
+    '''
+    Return the union of an iterable of interval sets of the same type.  The interval_type is 
+    used as in IntervalSet to choose the type of the result if there are no sets.
+    '''
+    sets = list(sets)
+    if not sets:
+        return IntervalSet(interval_type=interval_type)
+    return interval_set_union_all_dispatch[type(sets[0])](sets)
+
+def intersection_all(sets, interval_type=None):
+    '''
+    Return the intersection of an iterable of interval sets of the same type.  If there are 
+    no sets the result is the whole space, with type chosen from interval_type as in 
+    IntervalSet.
+    '''
+    sets = list(sets)
+    if not sets:
+        return IntervalSet(interval_type=interval_type).complement()
+    return interval_set_intersection_all_dispatch[type(sets[0])](sets)
+
+def evaluate_pairs(str operation, list lefts, list rights):
+    '''
+    Return the list of the results of the named operation applied to each pair of lefts and 
+    rights.  This is the unit of work sent to each worker by the batch functions.
+    '''
+    return [getattr(left, operation)(right) for left, right in zip(lefts, rights)]
+
+cdef list evaluate_batch(str operation, lefts, rights, workers, chunksize):
+    cdef list left_list = list(lefts)
+    cdef list right_list = list(rights)
+    cdef Py_ssize_t n = len(left_list)
+    if len(right_list) != n:
+        raise ValueError('lefts and rights must have the same length')
+    if workers is None:
+        workers = cpu_count() or 1
+    if workers <= 1 or n <= 1:
+        return evaluate_pairs(operation, left_list, right_list)
+    if chunksize is None:
+        chunksize = max(1, -(-n // (4 * workers)))
+    # Imported here as it pulls in multiprocessing, which slows down importing cyinterval
+    from concurrent.futures import ProcessPoolExecutor
+    starts = range(0, n, chunksize)
+    with ProcessPoolExecutor(workers) as executor:
+        results = executor.map(evaluate_pairs, repeat(operation), 
+                               [left_list[start:start + chunksize] for start in starts], 
+                               [right_list[start:start + chunksize] for start in starts])
+        return list(chain.from_iterable(results))
+
+def batch_intersection(lefts, rights, workers=None, chunksize=None):
+    '''
+    Return the list of the intersections of corresponding interval sets in lefts and rights, in 
+    input order.  The pairs are split into chunks of chunksize pairs which are evaluated by a 
+    pool of workers processes, defaulting to one per CPU.  Typed interval sets are sent to and 
+    from the workers as their bound and flag buffers.  With one worker the pairs are evaluated 
+    in this process.
+    '''
+    return evaluate_batch('intersection', lefts, rights, workers, chunksize)
+
+def batch_union(lefts, rights, workers=None, chunksize=None):
+    '''
+    Return the list of the unions of corresponding interval sets in lefts and rights, in input 
+    order.  The work is split across processes as in batch_intersection.
+    '''
+    return evaluate_batch('union', lefts, rights, workers, chunksize)
+
+def batch_minus(lefts, rights, workers=None, chunksize=None):
+    '''
+    Return the list of the differences of corresponding interval sets in lefts and rights, in 
+    input order.  The work is split across processes as in batch_intersection.
+    '''
+    return evaluate_batch('minus', lefts, rights, workers, chunksize)
+
+def stats():
+    '''
+    Return a dict of the counters kept when cyinterval is built with instrumentation (see 
+    setup.py --instrument), with keys:
+    
+    enabled: whether the counters are kept at all.  When it is False the rest are empty.
+    calls: the number of calls of each operation, keyed by class and method name.
+    time: the total time in seconds spent in each operation, including nested operations.
+    comparisons: the number of bound comparisons of each kind.
+    intervals_allocated: the number of interval objects created.
+    '''
+    return {'enabled': True, 
+            'calls': dict(operation_calls), 
+            'time': dict(operation_times), 
+            'comparisons': {'lower_cmp': lower_cmp_count, 'upper_cmp': upper_cmp_count, 
+                            'overlap_cmp': overlap_cmp_count, 'containment_cmp': containment_cmp_count}, 
+            'intervals_allocated': intervals_allocated}
+
+def reset_stats():
+    '''
+    Set all the counters reported by stats to zero.
+    '''
+    global lower_cmp_count, upper_cmp_count, overlap_cmp_count, containment_cmp_count, intervals_allocated
+    operation_calls.clear()
+    operation_times.clear()
+    lower_cmp_count = upper_cmp_count = overlap_cmp_count = containment_cmp_count = 0
+    intervals_allocated = 0
@@ -2,3 +2,5 @@
 from ._version import get_versions
 __version__ = get_versions()['version']
 del get_versions
+
+from .cyinterval import stats, reset_stats
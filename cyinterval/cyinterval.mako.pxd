@@ -1,34 +1,59 @@
-from cpython.datetime cimport date, timedelta
 from cpython cimport bool
+from cpython.array cimport array
+from libc.stdint cimport int32_t, int64_t, uint64_t
+
+# Bit flags describing the bounds of an interval, packed into a single byte per 
+# interval in the storage of an interval set.
+cdef enum:
+    LOWER_CLOSED = 1
+    UPPER_CLOSED = 2
+    LOWER_BOUNDED = 4
+    UPPER_BOUNDED = 8
+    LOWER_FLAGS = 5
+    UPPER_FLAGS = 10
+
+cdef unsigned char pack_flags(bint lower_closed, bint upper_closed, bint lower_bounded, bint upper_bounded)
 
 cdef class BaseInterval:
-    cdef readonly bool lower_closed
-    cdef readonly bool upper_closed
-    cdef readonly bool lower_bounded
-    cdef readonly bool upper_bounded
+    cdef unsigned char flags
+    cdef Py_hash_t hash_value
 
 cdef class BaseIntervalSet:
-    cdef readonly tuple intervals
-    cdef readonly int n_intervals
+    cdef readonly Py_ssize_t n_intervals
+    cdef unsigned char *flags
+    cdef tuple storage
+    cdef tuple cached_intervals
+    cdef Py_hash_t hash_value
+    cdef tuple materialize_intervals(BaseIntervalSet self)
+    cdef Py_hash_t compute_hash(BaseIntervalSet self) except -1
 
 cdef class BaseIntervalSetIterator:
-    cdef unsigned int index
+    cdef Py_ssize_t index
 
 <%!
-type_tups = [('ObjectInterval', 'object', None, 'None', False, 'ObjectIntervalSet'), 
-              ('DateInterval', 'date', 'date', 'None', True, 'DateIntervalSet'),
-              ('IntInterval', 'int', 'int', '0', True, 'IntIntervalSet'),
-              ('FloatInterval', 'double', 'float', '0.', True, 'FloatIntervalSet')]
+type_tups = [('ObjectInterval', 'object', None, 'None', False, 'ObjectIntervalSet', None, False), 
+              ('DateInterval', 'int32_t', 'date', '0', True, 'DateIntervalSet', 'i', True),
+              ('IntInterval', 'int', 'int', '0', True, 'IntIntervalSet', 'i', False),
+              ('Int64Interval', 'int64_t', None, '0', False, 'Int64IntervalSet', 'q', False),
+              ('FloatInterval', 'double', 'float', '0.', True, 'FloatIntervalSet', 'd', False),
+              ('DatetimeInterval', 'int64_t', 'datetime', '0', True, 'DatetimeIntervalSet', 'q', True)]
 default_type_tup_index = 0
 %>
 
-% for IntervalType, c_type, p_type, default_value, dispatchable, IntervalSetType in type_tups:
+% for IntervalType, c_type, p_type, default_value, dispatchable, IntervalSetType, array_code, converted in type_tups:
+<% api_type = 'object' if converted else c_type %>
 cdef class ${IntervalType}(BaseInterval):
+% if converted:
+    # Exposed as properties converting to ${p_type}
+    cdef ${c_type} lower_bound
+    cdef ${c_type} upper_bound
+% else:
     cdef readonly ${c_type} lower_bound
     cdef readonly ${c_type} upper_bound
-    cpdef bool adjacent(${IntervalType} self, ${c_type} lower, ${c_type} upper)
-    cpdef int containment_cmp(${IntervalType} self, ${c_type} item)
-    cpdef bool contains(${IntervalType} self, ${c_type} item)
+% endif
+    cpdef bool adjacent(${IntervalType} self, ${api_type} lower, ${api_type} upper)
+    cpdef int containment_cmp(${IntervalType} self, ${api_type} item)
+    cpdef bool contains(${IntervalType} self, ${api_type} item)
     cpdef bool subset(${IntervalType} self, ${IntervalType} other)
     cpdef int overlap_cmp(${IntervalType} self, ${IntervalType} other)
     cpdef tuple init_args(${IntervalType} self)
@@ -39,25 +64,132 @@ cdef class ${IntervalType}(BaseInterval):
     cpdef int lower_cmp(${IntervalType} self, ${IntervalType} other)
     cpdef int upper_cmp(${IntervalType} self, ${IntervalType} other)
 
+cpdef ${IntervalSetType} ${IntervalSetType}_from_intervals(tuple intervals)
 cpdef tuple ${IntervalType}_preprocess_intervals(tuple intervals)
 
+cdef class ${IntervalSetType}Builder:
+    cdef Py_ssize_t size
+    cdef Py_ssize_t capacity
+    cdef array flags_array
+    cdef unsigned char *flags
+% if array_code:
+    cdef array lower_array
+    cdef array upper_array
+    cdef ${c_type} *lower_bounds
+    cdef ${c_type} *upper_bounds
+% else:
+    cdef list lower_bounds
+    cdef list upper_bounds
+% endif
+    cdef int grow(${IntervalSetType}Builder self) except -1
+    cdef int append(${IntervalSetType}Builder self, ${c_type} lower, ${c_type} upper, 
+                    unsigned char flags) except -1${' nogil' if array_code else ''}
+    cdef int merge(${IntervalSetType}Builder self, ${c_type} lower, ${c_type} upper, 
+                   unsigned char flags) except -1${' nogil' if array_code else ''}
+    cdef int remove(${IntervalSetType}Builder self, Py_ssize_t start, Py_ssize_t stop) except -1
+    cdef int insert(${IntervalSetType}Builder self, Py_ssize_t position, ${c_type} lower, ${c_type} upper, 
+                    unsigned char flags) except -1
+    cdef ${IntervalSetType} build(${IntervalSetType}Builder self)
+
+cdef class ${IntervalSetType}Coalescer:
+    cdef object source
+    cdef bint pending
+    cdef bint started
+    cdef ${c_type} lower
+    cdef ${c_type} upper
+    cdef unsigned char flags
+    cdef ${c_type} last_lower
+    cdef unsigned char last_flags
+    cdef ${c_type} result_lower
+    cdef ${c_type} result_upper
+    cdef unsigned char result_flags
+    cdef int next_raw(${IntervalSetType}Coalescer self) except -1
+
 cdef class ${IntervalSetType}Iterator(BaseIntervalSetIterator):
     cdef readonly ${IntervalSetType} interval_set
 
 cdef class ${IntervalSetType}(BaseIntervalSet):
+% if array_code:
+    cdef ${c_type} *lower_bounds
+    cdef ${c_type} *upper_bounds
+% else:
+    cdef list lower_bounds
+    cdef list upper_bounds
+% endif
     cpdef bool lower_bounded(${IntervalSetType} self)
     cpdef bool upper_bounded(${IntervalSetType} self)
-    cpdef ${c_type} lower_bound(${IntervalSetType} self)
-    cpdef ${c_type} upper_bound(${IntervalSetType} self)
+    cpdef ${api_type} lower_bound(${IntervalSetType} self)
+    cpdef ${api_type} upper_bound(${IntervalSetType} self)
     cpdef tuple init_args(${IntervalSetType} self)
-    cpdef bool contains(${IntervalSetType} self, ${c_type} item)
+    cdef Py_ssize_t locate_item(${IntervalSetType} self, ${c_type} item)${' nogil' if array_code else ''}
+    cpdef bool contains(${IntervalSetType} self, ${api_type} item)
+% if array_code:
+    cdef int locate_many(${IntervalSetType} self, const ${c_type}[:] items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1 nogil
+% else:
+    cdef int locate_many(${IntervalSetType} self, tuple items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1
+% endif
+    cpdef array contains_many(${IntervalSetType} self, points)
+    cpdef array locate(${IntervalSetType} self, points)
     cpdef bool empty(${IntervalSetType} self)
+% if array_code:
+    cpdef object measure(${IntervalSetType} self)
+    cpdef object intersection_measure(${IntervalSetType} self, ${IntervalSetType} other)
+% endif
     cpdef bool subset(${IntervalSetType} self, ${IntervalSetType} other)
     cpdef bool equal(${IntervalSetType} self, ${IntervalSetType} other)
     cpdef bool richcmp(${IntervalSetType} self, ${IntervalSetType} other, int op)
     cpdef ${IntervalSetType} intersection(${IntervalSetType} self, ${IntervalSetType} other)
+    cdef int intersection_into(${IntervalSetType} self, ${IntervalSetType} other, 
+                               ${IntervalSetType}Builder builder) except -1${' nogil' if array_code else ''}
     cpdef ${IntervalSetType} union(${IntervalSetType} self, ${IntervalSetType} other)
+    cdef int union_into(${IntervalSetType} self, ${IntervalSetType} other, 
+                        ${IntervalSetType}Builder builder) except -1${' nogil' if array_code else ''}
     cpdef ${IntervalSetType} complement(${IntervalSetType} self)
+    cpdef ${IntervalSetType} symmetric_difference(${IntervalSetType} self, ${IntervalSetType} other)
+    cdef int symmetric_difference_into(${IntervalSetType} self, ${IntervalSetType} other, 
+                                       ${IntervalSetType}Builder builder) except -1${' nogil' if array_code else ''}
     cpdef ${IntervalSetType} minus(${IntervalSetType} self, ${IntervalSetType} other)
+    cdef int minus_into(${IntervalSetType} self, ${IntervalSetType} other, 
+                        ${IntervalSetType}Builder builder) except -1${' nogil' if array_code else ''}
+
+cpdef ${IntervalSetType} ${IntervalSetType}_union_all(list sets)
+cpdef ${IntervalSetType} ${IntervalSetType}_intersection_all(list sets)
+
+cdef class Mutable${IntervalSetType}:
+    cdef list blocks
+    cdef readonly Py_ssize_t n_intervals
+    cdef ${IntervalSetType} frozen
+    cdef int reset(Mutable${IntervalSetType} self, ${IntervalSetType} interval_set) except -1
+    cpdef ${IntervalSetType} freeze(Mutable${IntervalSetType} self)
+    cdef int search(Mutable${IntervalSetType} self, ${c_type} lower, ${c_type} upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1
+    cdef int replace(Mutable${IntervalSetType} self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, ${IntervalSetType}Builder replacement) except -1
+    cpdef add(Mutable${IntervalSetType} self, ${IntervalType} interval)
+    cpdef discard(Mutable${IntervalSetType} self, ${IntervalType} interval)
+    cpdef bool contains(Mutable${IntervalSetType} self, ${api_type} item)
+
+cdef class ${IntervalType}Index:
+    cdef readonly Py_ssize_t n_intervals
+    cdef ${IntervalSetType} sorted_intervals
+    cdef array order_array
+    cdef Py_ssize_t *order
+    cdef Py_ssize_t leaves
+    cdef array tree_array
+    cdef Py_ssize_t *tree
+    cdef tuple cached_intervals
+    cdef int index(${IntervalType}Index self, ${IntervalSetType}Builder raw) except -1
+    cdef Py_ssize_t end(${IntervalType}Index self, ${c_type} upper, unsigned char flags)
+    cdef int collect(${IntervalType}Index self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, ${c_type} lower, ${c_type} upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1
+    cdef int query(${IntervalType}Index self, ${c_type} lower, ${c_type} upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1
+    cpdef array stab(${IntervalType}Index self, ${api_type} point)
+    cpdef array overlap(${IntervalType}Index self, ${IntervalType} interval)
+
+cpdef tuple ${IntervalType}_overlap_join(${IntervalType}Index left, ${IntervalType}Index right)
 
-% endfor
\ No newline at end of file
+% endfor
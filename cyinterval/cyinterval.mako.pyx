@@ -1,5 +1,177 @@
-from datetime import date
+<%
+# Set by rendering the template with instrument=True, which setup.py does for --instrument.  
+# Otherwise none of the instrumentation is generated.
+instrument = context.get('instrument', False)
+%>\
+from datetime import date, datetime, timedelta
+from itertools import chain, repeat
+from mmap import mmap, ACCESS_READ
+from os import cpu_count
+from struct import Struct
+import sys
+from cpython.array cimport array, clone, resize
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+from libc.stdlib cimport qsort, realloc, free
+from libc.string cimport memcpy, memmove
+from libc.math cimport INFINITY
+from cpython.object cimport PyObject_RichCompare
+cimport cython
+try:
+    from pickle import PickleBuffer
+except ImportError:
+    PickleBuffer = None
+% if instrument:
+from time import perf_counter
+% endif
+
+cdef array flags_template = array('B')
+# Positions are stored as Py_ssize_t, which is 64 bits on every 64 bit platform including 
+# Windows, where long is only 32 bits
+cdef array index_template = array('q' if sizeof(Py_ssize_t) == sizeof(long long) else 'i')
+
+# Mutable interval sets keep their intervals in blocks of between block_size / 4 and 
+# 2 * block_size intervals, except that a set with few intervals may have one small block.
+cdef Py_ssize_t block_size = 256
+
+cdef int set_flags(unsigned char *flags, Py_ssize_t n, object values, unsigned char flag) except -1:
+    '''
+    Set flag in each of the n entries of flags for which values is true and clear it in the 
+    others.  The values may be a single bool for all entries or a sequence of n bools.
+    '''
+    cdef const unsigned char[:] view
+    cdef Py_ssize_t i
+    try:
+        view = values
+    except (TypeError, ValueError, BufferError):
+        try:
+            view = array('B', [1 if value else 0 for value in values])
+        except TypeError:
+            # A single value for all entries
+            for i in range(n):
+                flags[i] = (flags[i] | flag) if values else (flags[i] & ~flag)
+            return 0
+    if view.shape[0] != n:
+        raise ValueError('Expected %d flag values but got %d' % (n, view.shape[0]))
+    for i in range(n):
+        flags[i] = (flags[i] | flag) if view[i] else (flags[i] & ~flag)
+    return 0
+
+cdef array get_flags(const unsigned char *flags, Py_ssize_t n, unsigned char flag):
+    '''
+    Return an array of n bytes which are 1 where flag is set in flags and 0 elsewhere.
+    '''
+    cdef array result = clone(flags_template, n, False)
+    cdef Py_ssize_t i
+    for i in range(n):
+        result.data.as_uchars[i] = 1 if flags[i] & flag else 0
+    return result
+
+# Interval set files consist of this header, followed by the lower bounds, the upper bounds 
+# and the flags of the intervals in native byte order.  The header holds a magic string, the 
+# name of the interval set type, the byte order, the size of a bound and the number of 
+# intervals.  Its size is a multiple of 8 so the bounds are aligned when the file is mapped.
+cdef bytes file_magic = b'CYINTSET'
+cdef object file_header = Struct('<8s24scBxxxxxxq')
+
+cdef inline Py_ssize_t *index_data(array values):
+    '''
+    The entries of an array made from index_template.
+    '''
+    return <Py_ssize_t *> values.data.as_voidptr
+
+cdef int append_index(array values, Py_ssize_t *size, Py_ssize_t value) except -1:
+    '''
+    Store value after the first size entries of values, growing values if it is full.
+    '''
+    if size[0] == len(values):
+        resize(values, 2 * size[0] + 8)
+    index_data(values)[size[0]] = value
+    size[0] += 1
+    return 0
 
+# Pairs of positions accumulated without the GIL
+ctypedef struct IndexPairs:
+    Py_ssize_t *first
+    Py_ssize_t *second
+    Py_ssize_t size
+    Py_ssize_t capacity
+
+cdef int append_pair(IndexPairs *pairs, Py_ssize_t first, Py_ssize_t second) nogil except -1:
+    cdef Py_ssize_t capacity
+    cdef Py_ssize_t *new_first
+    cdef Py_ssize_t *new_second
+    if pairs.size == pairs.capacity:
+        capacity = 2 * pairs.capacity + 8
+        new_first = <Py_ssize_t *> realloc(pairs.first, capacity * sizeof(Py_ssize_t))
+        if new_first != NULL:
+            pairs.first = new_first
+        new_second = <Py_ssize_t *> realloc(pairs.second, capacity * sizeof(Py_ssize_t))
+        if new_second != NULL:
+            pairs.second = new_second
+        if new_first == NULL or new_second == NULL:
+            with gil:
+                raise MemoryError()
+        pairs.capacity = capacity
+    pairs.first[pairs.size] = first
+    pairs.second[pairs.size] = second
+    pairs.size += 1
+    return 0
+
+cdef tuple index_pairs_to_arrays(IndexPairs *pairs):
+    cdef array first = clone(index_template, pairs.size, False)
+    cdef array second = clone(index_template, pairs.size, False)
+    if pairs.size > 0:
+        memcpy(index_data(first), pairs.first, pairs.size * sizeof(Py_ssize_t))
+        memcpy(index_data(second), pairs.second, pairs.size * sizeof(Py_ssize_t))
+    return first, second
+
+cdef int index_cmp(const void *value1, const void *value2) nogil:
+    cdef Py_ssize_t first = (<Py_ssize_t *> value1)[0]
+    cdef Py_ssize_t second = (<Py_ssize_t *> value2)[0]
+    return (first > second) - (first < second)
+
+cdef inline unsigned char canonical_flags(unsigned char flags):
+    '''
+    Clear the closedness of unbounded sides, which does not affect equality.
+    '''
+    if not (flags & LOWER_BOUNDED):
+        flags &= ~LOWER_CLOSED
+    if not (flags & UPPER_BOUNDED):
+        flags &= ~UPPER_CLOSED
+    return flags
+
+cdef unsigned char pack_flags(bint lower_closed, bint upper_closed, bint lower_bounded, bint upper_bounded):
+    return ((LOWER_CLOSED if lower_closed else 0) | (UPPER_CLOSED if upper_closed else 0) | 
+            (LOWER_BOUNDED if lower_bounded else 0) | (UPPER_BOUNDED if upper_bounded else 0))
+
+% if instrument:
+# Counters reported by stats.  They are updated without locking, so they may undercount 
+# while the GIL is released in several threads at once.
+cdef dict operation_calls = {}
+cdef dict operation_times = {}
+cdef unsigned long long lower_cmp_count = 0
+cdef unsigned long long upper_cmp_count = 0
+cdef unsigned long long overlap_cmp_count = 0
+cdef unsigned long long containment_cmp_count = 0
+cdef unsigned long long intervals_allocated = 0
+
+cdef class OperationTimer:
+    '''
+    Count a call of the named operation, adding the time since its creation to the total for 
+    the operation when it is released at the end of the call.
+    '''
+    cdef str name
+    cdef double start
+    
+    def __cinit__(OperationTimer self, str name):
+        self.name = name
+        self.start = perf_counter()
+    
+    def __dealloc__(OperationTimer self):
+        operation_calls[self.name] = operation_calls.get(self.name, 0) + 1
+        operation_times[self.name] = operation_times.get(self.name, 0.) + perf_counter() - self.start
+
+% endif
 cdef class BaseInterval:
     '''
     Interpreted as the conjunction of two inequalities.
@@ -7,8 +179,37 @@ cdef class BaseInterval:
     def __reduce__(BaseInterval self):
         return (self.__class__, self.init_args())
         
+    def __cinit__(BaseInterval self):
+        % if instrument:
+        global intervals_allocated
+        intervals_allocated += 1
+        % endif
+        self.hash_value = -1
+    
     def __hash__(BaseInterval self):
-        return hash(self.__reduce__())
+        # Intervals are immutable, so the hash is only computed once.  Equal intervals may 
+        # differ in the closedness or stored value of an unbounded side, so those are ignored.
+        if self.hash_value == -1:
+            self.hash_value = hash((self.lower_bound if self.flags & LOWER_BOUNDED else None, 
+                                    self.upper_bound if self.flags & UPPER_BOUNDED else None,
+                                    canonical_flags(self.flags)))
+        return self.hash_value
+    
+    @property
+    def lower_closed(BaseInterval self):
+        return (self.flags & LOWER_CLOSED) != 0
+    
+    @property
+    def upper_closed(BaseInterval self):
+        return (self.flags & UPPER_CLOSED) != 0
+    
+    @property
+    def lower_bounded(BaseInterval self):
+        return (self.flags & LOWER_BOUNDED) != 0
+    
+    @property
+    def upper_bounded(BaseInterval self):
+        return (self.flags & UPPER_BOUNDED) != 0
     
     def __nonzero__(BaseInterval self):
         return not self.empty()
@@ -39,6 +240,23 @@ cdef class BaseInterval:
         return str(self)
         
 cdef class BaseIntervalSet:
+    '''
+    The bounds of the intervals are stored contiguously, in one container for lower bounds and 
+    one for upper bounds, with a single byte of packed flags per interval.  Interval objects are 
+    only created when the intervals attribute is accessed.
+    '''
+    def __cinit__(BaseIntervalSet self):
+        self.hash_value = -1
+    
+    @property
+    def intervals(BaseIntervalSet self):
+        if self.cached_intervals is None:
+            self.cached_intervals = self.materialize_intervals()
+        return self.cached_intervals
+    
+    cdef tuple materialize_intervals(BaseIntervalSet self):
+        return tuple()
+    
     def __str__(BaseIntervalSet self):
         return 'U'.join(map(str, self.intervals)) if self.intervals else '{}'
     
@@ -83,6 +301,16 @@ cdef class BaseIntervalSet:
             return NotImplemented
         return other.__sub__(self)
     
+    def __xor__(BaseIntervalSet self, other):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return self.symmetric_difference(other)
+    
+    def __rxor__(BaseIntervalSet self, other):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return other.__xor__(self)
+    
     def __invert__(BaseIntervalSet self):
         return self.complement()
     
@@ -93,74 +321,544 @@ cdef class BaseIntervalSet:
         return (self.__class__, self.init_args())
     
     def __hash__(BaseIntervalSet self):
-        return hash(self.__reduce__())
+        # Interval sets are immutable, so the hash is only computed once
+        if self.hash_value == -1:
+            self.hash_value = self.compute_hash()
+        return self.hash_value
+    
+    cdef Py_hash_t compute_hash(BaseIntervalSet self) except -1:
+        return hash(())
     
 cdef class BaseIntervalSetIterator:
     pass
 
-cdef timedelta day = timedelta(days=1)
+cdef object epoch = datetime(1970, 1, 1)
+cdef int64_t epoch_ordinal = epoch.toordinal()
+
+# numpy is never imported here, since it is slow to import and optional.  A datetime64 value 
+# or array can only exist once something else has imported it, so it is looked up in 
+# sys.modules when one might be converted.
+
+# DateInterval bounds are stored as proleptic Gregorian ordinals, as returned by 
+# date.toordinal.
+cdef int32_t DateInterval_to_c(object value) except? -1:
+    if isinstance(value, date):
+        return value.toordinal()
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(value, numpy.datetime64):
+        if numpy.isnat(value):
+            raise ValueError('NaT is not a valid interval bound')
+        return value.astype('datetime64[D]').astype('int64') + epoch_ordinal
+    raise TypeError('Expected a date or numpy.datetime64 but got %r' % (value,))
+
+cdef object DateInterval_to_py(int32_t value):
+    return date.fromordinal(value)
+
+cdef const int32_t[:] DateIntervalSet_values(object values):
+    '''
+    Convert a numpy datetime64 array to ordinals with vectorized operations.  Any other 
+    sequence is converted one date at a time.
+    '''
+    if getattr(getattr(values, 'dtype', None), 'kind', None) == 'M':
+        if sys.modules['numpy'].isnat(values).any():
+            raise ValueError('NaT is not a valid interval bound')
+        return (values.astype('datetime64[D]').view('int64') + epoch_ordinal).astype('i')
+    return array('i', [DateInterval_to_c(value) for value in values])
+
+# DatetimeInterval bounds are stored as microseconds since the epoch, in UTC.  Aware datetimes 
+# are converted to UTC and naive ones are assumed to already be in UTC.  Bounds are returned as 
+# naive datetimes.
+cdef int64_t DatetimeInterval_to_c(object value) except? -1:
+    if isinstance(value, datetime):
+        offset = value.utcoffset()
+        if offset is not None:
+            value = (value - offset).replace(tzinfo=None)
+        return ((((<int64_t> value.toordinal()) - epoch_ordinal) * 86400 + value.hour * 3600 + 
+                 value.minute * 60 + value.second) * 1000000 + value.microsecond)
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(value, numpy.datetime64):
+        if numpy.isnat(value):
+            raise ValueError('NaT is not a valid interval bound')
+        return value.astype('datetime64[us]').astype('int64')
+    raise TypeError('Expected a datetime or numpy.datetime64 but got %r' % (value,))
+
+cdef object DatetimeInterval_to_py(int64_t value):
+    return epoch + timedelta(microseconds=value)
+
+cdef object DatetimeInterval_length_to_py(int64_t value):
+    return timedelta(microseconds=value)
+
+cdef const int64_t[:] DatetimeIntervalSet_values(object values):
+    '''
+    View a numpy datetime64 array as int64 microseconds, converting its unit only if 
+    necessary.  Any other sequence is converted one datetime at a time.
+    '''
+    if getattr(getattr(values, 'dtype', None), 'kind', None) == 'M':
+        if sys.modules['numpy'].isnat(values).any():
+            raise ValueError('NaT is not a valid interval bound')
+        return values.astype('datetime64[us]', copy=False).view('int64')
+    return array('q', [DatetimeInterval_to_c(value) for value in values])
+
 <%!
-type_tups = [('ObjectInterval', 'object', None, 'None', False, 'ObjectIntervalSet', False, None), 
-              ('DateInterval', 'date', 'date', 'None', True, 'DateIntervalSet', True, 'day'),
-              ('IntInterval', 'int', 'int', '0', True, 'IntIntervalSet', True, '1'),
-              ('FloatInterval', 'double', 'float', '0.', True, 'FloatIntervalSet', False, None)]
+# Types with converted set to True store bounds as c_type but take and return values of 
+# p_type, converting them with the hand written ${IntervalType}_to_c, ${IntervalType}_to_py 
+# and ${IntervalSetType}_values functions.
+type_tups = [('ObjectInterval', 'object', None, 'None', False, 'ObjectIntervalSet', False, None, None, False), 
+              ('DateInterval', 'int32_t', 'date', '0', True, 'DateIntervalSet', True, '1', 'i', True),
+              ('IntInterval', 'int', 'int', '0', True, 'IntIntervalSet', True, '1', 'i', False),
+              ('Int64Interval', 'int64_t', None, '0', False, 'Int64IntervalSet', True, '1', 'q', False),
+              ('FloatInterval', 'double', 'float', '0.', True, 'FloatIntervalSet', False, None, 'd', False),
+              ('DatetimeInterval', 'int64_t', 'datetime', '0', True, 'DatetimeIntervalSet', False, None, 'q', True)]
 default_type_tup_index = 0
 %>
 
-% for IntervalType, c_type, p_type, default_value, dispatchable, IntervalSetType, has_adjacent, unit in type_tups:
+% for IntervalType, c_type, p_type, default_value, dispatchable, IntervalSetType, has_adjacent, unit, array_code, converted in type_tups:
+<%
+api_type = 'object' if converted else c_type
+to_c = (lambda expr: '%s_to_c(%s)' % (IntervalType, expr)) if converted else (lambda expr: expr)
+to_py = (lambda expr: '%s_to_py(%s)' % (IntervalType, expr)) if converted else (lambda expr: expr)
+length_to_py = ((lambda expr: '%s_length_to_py(%s)' % (IntervalType, expr)) if converted and not has_adjacent 
+                else (lambda expr: expr))
+length_type = 'uint64_t' if has_adjacent else c_type
+%>
+# These operate on the raw bounds and packed flags of an interval.  The methods of 
+# ${IntervalType} and the loops of ${IntervalSetType} are built on them.
+cdef inline bint ${IntervalType}_adjacent(${c_type} lower, ${c_type} upper)${' nogil' if array_code else ''}:
+    % if has_adjacent:
+    return lower + ${unit} == upper
+    % else:
+    return False
+    % endif
+
+cdef inline bint ${IntervalType}_empty(${c_type} lower, ${c_type} upper, unsigned char flags)${' nogil' if array_code else ''}:
+    return (((flags & LOWER_BOUNDED) and (flags & UPPER_BOUNDED)) and 
+            ((((lower == upper) and 
+            (not ((flags & LOWER_CLOSED) and (flags & UPPER_CLOSED)))) or
+            lower > upper) or 
+             (lower < upper and 
+              (not (flags & (LOWER_CLOSED | UPPER_CLOSED))) and
+              ${IntervalType}_adjacent(lower, upper))))
+
+cdef inline int ${IntervalType}_containment_cmp(${c_type} lower, ${c_type} upper, unsigned char flags, 
+                                                ${c_type} item)${' nogil' if array_code else ''}:
+    % if instrument:
+    global containment_cmp_count
+    containment_cmp_count += 1
+    % endif
+    if flags & LOWER_BOUNDED:
+        if item < lower:
+            return -1
+        elif item == lower:
+            if not (flags & LOWER_CLOSED):
+                return -1
+    if flags & UPPER_BOUNDED:
+        if item > upper:
+            return 1
+        elif item == upper:
+            if not (flags & UPPER_CLOSED):
+                return 1
+    return 0
+
+cdef inline int ${IntervalType}_lower_cmp(${c_type} lower1, unsigned char flags1, 
+                                          ${c_type} lower2, unsigned char flags2)${' nogil' if array_code else ''}:
+    % if instrument:
+    global lower_cmp_count
+    lower_cmp_count += 1
+    % endif
+    if not (flags1 & LOWER_BOUNDED):
+        if not (flags2 & LOWER_BOUNDED):
+            return 0
+        else:
+            return -1
+    elif not (flags2 & LOWER_BOUNDED):
+        return 1
+    if lower1 < lower2:
+        return -1
+    elif lower1 == lower2:
+        if (flags1 & LOWER_CLOSED) and not (flags2 & LOWER_CLOSED):
+            return -1
+        elif (flags2 & LOWER_CLOSED) and not (flags1 & LOWER_CLOSED):
+            return 1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int ${IntervalType}_upper_cmp(${c_type} upper1, unsigned char flags1, 
+                                          ${c_type} upper2, unsigned char flags2)${' nogil' if array_code else ''}:
+    % if instrument:
+    global upper_cmp_count
+    upper_cmp_count += 1
+    % endif
+    if not (flags1 & UPPER_BOUNDED):
+        if not (flags2 & UPPER_BOUNDED):
+            return 0
+        else:
+            return 1
+    elif not (flags2 & UPPER_BOUNDED):
+        return -1
+    if upper1 < upper2:
+        return -1
+    elif upper1 == upper2:
+        if (flags1 & UPPER_CLOSED) and not (flags2 & UPPER_CLOSED):
+            return 1
+        elif (flags2 & UPPER_CLOSED) and not (flags1 & UPPER_CLOSED):
+            return -1
+        else:
+            return 0
+    else:
+        return 1
+
+cdef inline int ${IntervalType}_overlap_cmp(${c_type} lower1, ${c_type} upper1, unsigned char flags1, 
+                                            ${c_type} lower2, ${c_type} upper2, unsigned char flags2)${' nogil' if array_code else ''}:
+    % if instrument:
+    global overlap_cmp_count
+    overlap_cmp_count += 1
+    % endif
+    if (flags1 & UPPER_BOUNDED) and (flags2 & LOWER_BOUNDED):
+        if upper1 < lower2:
+            return -1
+        elif upper1 == lower2:
+            if (flags1 & UPPER_CLOSED) and (flags2 & LOWER_CLOSED):
+                return 0
+            else:
+                return -1
+    if (flags1 & LOWER_BOUNDED) and (flags2 & UPPER_BOUNDED):
+        if lower1 > upper2:
+            return 1
+        elif lower1 == upper2:
+            if (flags1 & LOWER_CLOSED) and (flags2 & UPPER_CLOSED):
+                return 0
+            else:
+                return 1
+    return 0
+
+cdef inline bint ${IntervalType}_fusible(${c_type} lower1, ${c_type} upper1, unsigned char flags1, 
+                                         ${c_type} lower2, ${c_type} upper2, unsigned char flags2)${' nogil' if array_code else ''}:
+    '''
+    Return whether the union of two nonempty intervals is an interval, because they overlap 
+    or touch.
+    '''
+    cdef int overlap_cmp = ${IntervalType}_overlap_cmp(lower1, upper1, flags1, lower2, upper2, flags2)
+    return ((overlap_cmp == 0) or 
+            (overlap_cmp == -1 and upper1 == lower2 and 
+             ((flags1 & UPPER_CLOSED) or (flags2 & LOWER_CLOSED))) or
+            (overlap_cmp == 1 and upper2 == lower1 and 
+             ((flags2 & UPPER_CLOSED) or (flags1 & LOWER_CLOSED))))
+
+cdef inline bint ${IntervalType}_intersection_empty(${c_type} lower1, ${c_type} upper1, unsigned char flags1, 
+                                                    ${c_type} lower2, ${c_type} upper2, unsigned char flags2)${' nogil' if array_code else ''}:
+    '''
+    Return whether two nonempty intervals that overlap according to overlap_cmp nonetheless 
+    have no element in common, which can only happen for types with adjacent elements.
+    '''
+    % if has_adjacent:
+    cdef ${c_type} lower, upper
+    cdef unsigned char flags
+    if ${IntervalType}_lower_cmp(lower1, flags1, lower2, flags2) <= 0:
+        lower = lower2
+        flags = flags2 & LOWER_FLAGS
+    else:
+        lower = lower1
+        flags = flags1 & LOWER_FLAGS
+    if ${IntervalType}_upper_cmp(upper1, flags1, upper2, flags2) <= 0:
+        upper = upper1
+        flags |= flags1 & UPPER_FLAGS
+    else:
+        upper = upper2
+        flags |= flags2 & UPPER_FLAGS
+    return ${IntervalType}_empty(lower, upper, flags)
+    % else:
+    return False
+    % endif
+
+% if array_code:
+cdef array ${IntervalType}_bounds_template = array('${array_code}')
+
+cdef const ${c_type}[:] ${IntervalSetType}_${'stored_values' if converted else 'values'}(object values):
+    '''
+    View values as a buffer of ${c_type}, copying them only if they do not already 
+    expose one of the right type.
+    '''
+    cdef const ${c_type}[:] result
+    try:
+        result = values
+    except (TypeError, ValueError, BufferError):
+        result = array('${array_code}', values)
+    return result
+
+ctypedef struct ${IntervalType}Record:
+    ${c_type} lower
+    ${c_type} upper
+    unsigned char flags
+    Py_ssize_t index
+
+cdef int ${IntervalType}_record_cmp(const void *record1, const void *record2) nogil:
+    cdef ${IntervalType}Record *first = <${IntervalType}Record *> record1
+    cdef ${IntervalType}Record *second = <${IntervalType}Record *> record2
+    return ${IntervalType}_lower_cmp(first.lower, first.flags, second.lower, second.flags)
+
+% if has_adjacent:
+cdef inline void ${IntervalType}_add_length(uint64_t *total, Py_ssize_t *carries, ${c_type} lower, 
+                                          ${c_type} upper, unsigned char flags) nogil:
+    '''
+    Add the number of elements of a bounded, nonempty interval to a count kept modulo 2**64, 
+    counting the times it wraps around in carries.  The number of elements less one always 
+    fits in a uint64_t, so it is added first and the one after.
+    '''
+    cdef uint64_t length = ((<uint64_t> upper) - (<uint64_t> lower) - 
+                            (0 if flags & LOWER_CLOSED else 1) - (0 if flags & UPPER_CLOSED else 1))
+    total[0] += length
+    if total[0] < length:
+        carries[0] += 1
+    total[0] += 1
+    if total[0] == 0:
+        carries[0] += 1
+
+cdef object ${IntervalType}_count_to_py(uint64_t total, Py_ssize_t carries):
+    '''
+    Combine a count accumulated modulo 2**64 with the number of times it wrapped around.
+    '''
+    if carries:
+        return (<object> carries) * 18446744073709551616 + total
+    return total
+% else:
+cdef inline ${c_type} ${IntervalType}_length(${c_type} lower, ${c_type} upper, unsigned char flags) nogil:
+    '''
+    The length of a bounded interval.
+    '''
+    return upper - lower
+% endif
+
+% endif
+cdef class ${IntervalSetType}Builder:
+    '''
+    Accumulates the bounds and flags of sorted intervals into the storage of a new 
+    ${IntervalSetType}.  The builder must not be used after build has been called.
+    '''
+    def __cinit__(${IntervalSetType}Builder self, Py_ssize_t capacity=0):
+        self.size = 0
+        self.capacity = capacity
+        self.flags_array = clone(flags_template, capacity, False)
+        self.flags = self.flags_array.data.as_uchars
+        % if array_code:
+        self.lower_array = clone(${IntervalType}_bounds_template, capacity, False)
+        self.upper_array = clone(${IntervalType}_bounds_template, capacity, False)
+        self.lower_bounds = <${c_type} *> self.lower_array.data.as_voidptr
+        self.upper_bounds = <${c_type} *> self.upper_array.data.as_voidptr
+        % else:
+        self.lower_bounds = []
+        self.upper_bounds = []
+        % endif
+    
+    cdef int grow(${IntervalSetType}Builder self) except -1:
+        self.capacity = 2 * self.capacity + 8
+        resize(self.flags_array, self.capacity)
+        self.flags = self.flags_array.data.as_uchars
+        % if array_code:
+        resize(self.lower_array, self.capacity)
+        resize(self.upper_array, self.capacity)
+        self.lower_bounds = <${c_type} *> self.lower_array.data.as_voidptr
+        self.upper_bounds = <${c_type} *> self.upper_array.data.as_voidptr
+        % endif
+        return 0
+    
+    cdef int append(${IntervalSetType}Builder self, ${c_type} lower, ${c_type} upper, 
+                    unsigned char flags) except -1${' nogil' if array_code else ''}:
+        '''
+        Add an interval after all intervals added so far, assuming the two neither overlap 
+        nor touch.
+        '''
+        if self.size == self.capacity:
+            % if array_code:
+            with gil:
+                self.grow()
+            % else:
+            self.grow()
+            % endif
+        % if array_code:
+        self.lower_bounds[self.size] = lower
+        self.upper_bounds[self.size] = upper
+        % else:
+        self.lower_bounds.append(lower)
+        self.upper_bounds.append(upper)
+        % endif
+        self.flags[self.size] = flags
+        self.size += 1
+        return 0
+    
+    cdef int merge(${IntervalSetType}Builder self, ${c_type} lower, ${c_type} upper, 
+                   unsigned char flags) except -1${' nogil' if array_code else ''}:
+        '''
+        Add an interval whose lower bound is not less than that of any interval added so far, 
+        fusing it with the last interval if the two overlap or touch.  Empty intervals are 
+        ignored.
+        '''
+        cdef Py_ssize_t last = self.size - 1
+        if ${IntervalType}_empty(lower, upper, flags):
+            return 0
+        if last < 0:
+            return self.append(lower, upper, flags)
+        if ${IntervalType}_fusible(self.lower_bounds[last], self.upper_bounds[last], self.flags[last], 
+                                   lower, upper, flags):
+            if ${IntervalType}_lower_cmp(lower, flags, self.lower_bounds[last], self.flags[last]) < 0:
+                self.lower_bounds[last] = lower
+                self.flags[last] = (self.flags[last] & UPPER_FLAGS) | (flags & LOWER_FLAGS)
+            if ${IntervalType}_upper_cmp(upper, flags, self.upper_bounds[last], self.flags[last]) > 0:
+                self.upper_bounds[last] = upper
+                self.flags[last] = (self.flags[last] & LOWER_FLAGS) | (flags & UPPER_FLAGS)
+            return 0
+        return self.append(lower, upper, flags)
+    
+    cdef int remove(${IntervalSetType}Builder self, Py_ssize_t start, Py_ssize_t stop) except -1:
+        '''
+        Remove the intervals at positions start up to, but not including, stop.
+        '''
+        cdef Py_ssize_t tail = self.size - stop
+        if stop <= start:
+            return 0
+        % if array_code:
+        memmove(self.lower_bounds + start, self.lower_bounds + stop, tail * sizeof(${c_type}))
+        memmove(self.upper_bounds + start, self.upper_bounds + stop, tail * sizeof(${c_type}))
+        % else:
+        del self.lower_bounds[start:stop]
+        del self.upper_bounds[start:stop]
+        % endif
+        memmove(self.flags + start, self.flags + stop, tail)
+        self.size -= stop - start
+        return 0
+    
+    cdef int insert(${IntervalSetType}Builder self, Py_ssize_t position, ${c_type} lower, ${c_type} upper, 
+                    unsigned char flags) except -1:
+        '''
+        Add an interval at the given position, moving the intervals after it.
+        '''
+        if self.size == self.capacity:
+            self.grow()
+        % if array_code:
+        memmove(self.lower_bounds + position + 1, self.lower_bounds + position, 
+                (self.size - position) * sizeof(${c_type}))
+        memmove(self.upper_bounds + position + 1, self.upper_bounds + position, 
+                (self.size - position) * sizeof(${c_type}))
+        self.lower_bounds[position] = lower
+        self.upper_bounds[position] = upper
+        % else:
+        self.lower_bounds.insert(position, lower)
+        self.upper_bounds.insert(position, upper)
+        % endif
+        memmove(self.flags + position + 1, self.flags + position, self.size - position)
+        self.flags[position] = flags
+        self.size += 1
+        return 0
+    
+    cdef ${IntervalSetType} build(${IntervalSetType}Builder self):
+        cdef ${IntervalSetType} result = ${IntervalSetType}.__new__(${IntervalSetType})
+        resize(self.flags_array, self.size)
+        result.flags = self.flags_array.data.as_uchars
+        % if array_code:
+        resize(self.lower_array, self.size)
+        resize(self.upper_array, self.size)
+        result.lower_bounds = <${c_type} *> self.lower_array.data.as_voidptr
+        result.upper_bounds = <${c_type} *> self.upper_array.data.as_voidptr
+        result.storage = (self.lower_array, self.upper_array, self.flags_array)
+        % else:
+        result.lower_bounds = self.lower_bounds
+        result.upper_bounds = self.upper_bounds
+        result.storage = (self.flags_array,)
+        % endif
+        result.n_intervals = self.size
+        return result
+
+cdef ${IntervalSetType} ${IntervalSetType}_normalize(${IntervalSetType}Builder raw):
+    '''
+    Build an ${IntervalSetType} from the intervals accumulated in raw, which may be empty, 
+    unsorted and overlapping.  Empty intervals are dropped, the rest are sorted by lower bound 
+    and any that overlap or touch are fused.
+    '''
+    cdef Py_ssize_t i, k, n = raw.size
+    cdef ${IntervalSetType}Builder builder
+    cdef bint is_sorted = True
+    for i in range(1, n):
+        if ${IntervalType}_lower_cmp(raw.lower_bounds[i-1], raw.flags[i-1], 
+                                     raw.lower_bounds[i], raw.flags[i]) > 0:
+            is_sorted = False
+            break
+    if is_sorted:
+        builder = ${IntervalSetType}Builder(n)
+        for i in range(n):
+            builder.merge(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i])
+        return builder.build()
+    % if array_code:
+    cdef ${IntervalType}Record *records = <${IntervalType}Record *> PyMem_Malloc(n * sizeof(${IntervalType}Record))
+    if records == NULL and n > 0:
+        raise MemoryError()
+    try:
+        k = 0
+        for i in range(n):
+            if not ${IntervalType}_empty(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i]):
+                records[k].lower = raw.lower_bounds[i]
+                records[k].upper = raw.upper_bounds[i]
+                records[k].flags = raw.flags[i]
+                k += 1
+        qsort(records, k, sizeof(${IntervalType}Record), ${IntervalType}_record_cmp)
+        builder = ${IntervalSetType}Builder(k)
+        for i in range(k):
+            builder.merge(records[i].lower, records[i].upper, records[i].flags)
+    finally:
+        PyMem_Free(records)
+    % else:
+    cdef list order = []
+    for i in range(n):
+        if not ${IntervalType}_empty(raw.lower_bounds[i], raw.upper_bounds[i], raw.flags[i]):
+            order.append(i)
+    # Unbounded lower bounds sort first, and closed lower bounds before open ones at the same value
+    order.sort(key=lambda i: (1, raw.lower_bounds[i], not (raw.flags[i] & LOWER_CLOSED)) 
+                             if raw.flags[i] & LOWER_BOUNDED else (0,))
+    builder = ${IntervalSetType}Builder(len(order))
+    for k in order:
+        builder.merge(raw.lower_bounds[k], raw.upper_bounds[k], raw.flags[k])
+    % endif
+    return builder.build()
+
 cdef class ${IntervalType}(BaseInterval):
-    def __init__(BaseInterval self, ${c_type} lower_bound, ${c_type} upper_bound, bool lower_closed, 
+    def __init__(BaseInterval self, ${api_type} lower_bound, ${api_type} upper_bound, bool lower_closed, 
                  bool upper_closed, bool lower_bounded, bool upper_bounded):
-        self.lower_closed = lower_closed
-        self.upper_closed = upper_closed
-        self.lower_bounded = lower_bounded
-        self.upper_bounded = upper_bounded
+        self.flags = pack_flags(lower_closed, upper_closed, lower_bounded, upper_bounded)
         if lower_bounded:
-            self.lower_bound = lower_bound
+            self.lower_bound = ${to_c('lower_bound')}
         if upper_bounded:
-            self.upper_bound = upper_bound
+            self.upper_bound = ${to_c('upper_bound')}
+    % if converted:
+    
+    @property
+    def lower_bound(${IntervalType} self):
+        return ${to_py('self.lower_bound')} if self.flags & LOWER_BOUNDED else None
+    
+    @property
+    def upper_bound(${IntervalType} self):
+        return ${to_py('self.upper_bound')} if self.flags & UPPER_BOUNDED else None
+    % endif
     
     # For some types, there is a concept of adjacent elements.  For example, 
     # there are no integers between 1 and 2 (although there are several real numbers).
     # If there is such a concept, it's possible for an interval to be empty even when 
     # the lower bound is strictly less than the upper bound, provided the bounds are strict 
     # (not closed).  The adjacent method is used to help determine such cases.
-    % if has_adjacent:
-    cpdef bool adjacent(${IntervalType} self, ${c_type} lower, ${c_type} upper):
-        return lower + ${unit} == upper
-    % else:
-    cpdef bool adjacent(${IntervalType} self, ${c_type} lower, ${c_type} upper):
-        return False
-    % endif
+    cpdef bool adjacent(${IntervalType} self, ${api_type} lower, ${api_type} upper):
+        return ${IntervalType}_adjacent(${to_c('lower')}, ${to_c('upper')})
     
-    cpdef int containment_cmp(${IntervalType} self, ${c_type} item):
-        if self.lower_bounded:
-            if item < self.lower_bound:
-                return -1
-            elif item == self.lower_bound:
-                if not self.lower_closed:
-                    return -1
-        # If we get here, the item satisfies the lower bound constraint
-        if self.upper_bounded:
-            if item > self.upper_bound:
-                return 1
-            elif item == self.upper_bound:
-                if not self.upper_closed:
-                    return 1
-        # If we get here, the item also satisfies the upper bound constraint
-        return 0
+    cpdef int containment_cmp(${IntervalType} self, ${api_type} item):
+        return ${IntervalType}_containment_cmp(self.lower_bound, self.upper_bound, self.flags, ${to_c('item')})
     
-    cpdef bool contains(${IntervalType} self, ${c_type} item):
+    cpdef bool contains(${IntervalType} self, ${api_type} item):
         return self.containment_cmp(item) == 0
     
     cpdef bool subset(${IntervalType} self, ${IntervalType} other):
         '''
         Return True if and only if self is a subset of other.
         '''
-        cdef int lower_cmp, upper_cmp
-        lower_cmp = self.lower_cmp(other)
-        upper_cmp = self.upper_cmp(other)
-        return lower_cmp >= 0 and upper_cmp <= 0
+        return (${IntervalType}_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags) >= 0 and 
+                ${IntervalType}_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags) <= 0)
         
     cpdef int overlap_cmp(${IntervalType} self, ${IntervalType} other):
         '''
@@ -168,94 +866,60 @@ cdef class ${IntervalType}(BaseInterval):
         element of other.  Return 0 if self and other intersect.  Return 1 if every element of 
         self is greater than every element of other.
         '''
-        cdef int lower_cmp, upper_cmp
-        lower_cmp = self.lower_cmp(other)
-        upper_cmp = self.upper_cmp(other)
-        
-        if self.upper_bounded and other.lower_bounded:
-            if self.upper_bound < other.lower_bound:
-                return -1
-            elif self.upper_bound == other.lower_bound:
-                if self.upper_closed and other.lower_closed:
-                    return 0
-                else:
-                    return -1
-        if self.lower_bounded and other.upper_bounded:
-            if self.lower_bound > other.upper_bound:
-                return 1
-            elif self.lower_bound == other.upper_bound:
-                if self.lower_closed and other.upper_closed:
-                    return 0
-                else:
-                    return 1
-        return 0
+        return ${IntervalType}_overlap_cmp(self.lower_bound, self.upper_bound, self.flags, 
+                                           other.lower_bound, other.upper_bound, other.flags)
     
     cpdef tuple init_args(${IntervalType} self):
-        return (self.lower_bound, self.upper_bound, self.lower_closed, self.upper_closed, 
-                self.lower_bounded, self.upper_bounded)
+        % if converted:
+        # Unbounded sides have no ${p_type} value, so they are None as for the lower_bound and 
+        # upper_bound properties
+        return (${to_py('self.lower_bound')} if self.flags & LOWER_BOUNDED else None, 
+                ${to_py('self.upper_bound')} if self.flags & UPPER_BOUNDED else None, 
+                (self.flags & LOWER_CLOSED) != 0, 
+        % else:
+        return (self.lower_bound, self.upper_bound, (self.flags & LOWER_CLOSED) != 0, 
+        % endif
+                (self.flags & UPPER_CLOSED) != 0, (self.flags & LOWER_BOUNDED) != 0, 
+                (self.flags & UPPER_BOUNDED) != 0)
 
     cpdef ${IntervalType} intersection(${IntervalType} self, ${IntervalType} other):
-        cdef int lower_cmp = self.lower_cmp(other)
-        cdef int upper_cmp = self.upper_cmp(other)
-        cdef ${c_type} new_lower_bound, new_upper_bound
-        cdef bool new_lower_closed, new_lower_bounded, new_upper_closed, new_upper_bounded
-        if lower_cmp <= 0:
-            new_lower_bound = other.lower_bound
-            new_lower_bounded = other.lower_bounded
-            new_lower_closed = other.lower_closed
+        cdef ${IntervalType} result = ${IntervalType}.__new__(${IntervalType})
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
         else:
-            new_lower_bound = self.lower_bound
-            new_lower_bounded = self.lower_bounded
-            new_lower_closed = self.lower_closed
-        
-        if upper_cmp <= 0:
-            new_upper_bound = self.upper_bound
-            new_upper_bounded = self.upper_bounded
-            new_upper_closed = self.upper_closed
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
         else:
-            new_upper_bound = other.upper_bound
-            new_upper_bounded = other.upper_bounded
-            new_upper_closed = other.upper_closed
-        return ${IntervalType}(new_lower_bound, new_upper_bound, new_lower_closed, 
-                               new_upper_closed, new_lower_bounded, new_upper_bounded)
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
+        return result
     
     cpdef ${IntervalType} fusion(${IntervalType} self, ${IntervalType} other):
         '''
         Assume union of intervals is a single interval.  Return their union.  Results not correct
         if above assumption is violated.
         '''
-        cdef int lower_cmp = self.lower_cmp(other)
-        cdef int upper_cmp = self.upper_cmp(other)
-        cdef ${c_type} new_lower_bound, new_upper_bound
-        cdef bool new_lower_closed, new_lower_bounded, new_upper_closed, new_upper_bounded
-        if lower_cmp <= 0:
-            new_lower_bound = self.lower_bound
-            new_lower_bounded = self.lower_bounded
-            new_lower_closed = self.lower_closed
+        cdef ${IntervalType} result = ${IntervalType}.__new__(${IntervalType})
+        if self.lower_cmp(other) <= 0:
+            result.lower_bound = self.lower_bound
+            result.flags = self.flags & LOWER_FLAGS
         else:
-            new_lower_bound = other.lower_bound
-            new_lower_bounded = other.lower_bounded
-            new_lower_closed = other.lower_closed
-        
-        if upper_cmp <= 0:
-            new_upper_bound = other.upper_bound
-            new_upper_bounded = other.upper_bounded
-            new_upper_closed = other.upper_closed
+            result.lower_bound = other.lower_bound
+            result.flags = other.flags & LOWER_FLAGS
+        if self.upper_cmp(other) <= 0:
+            result.upper_bound = other.upper_bound
+            result.flags |= other.flags & UPPER_FLAGS
         else:
-            new_upper_bound = self.upper_bound
-            new_upper_bounded = self.upper_bounded
-            new_upper_closed = self.upper_closed
-        return ${IntervalType}(new_lower_bound, new_upper_bound, new_lower_closed, 
-                               new_upper_closed, new_lower_bounded, new_upper_bounded)
+            result.upper_bound = self.upper_bound
+            result.flags |= self.flags & UPPER_FLAGS
+        return result
     
     cpdef bool empty(${IntervalType} self):
-        return ((self.lower_bounded and self.upper_bounded) and 
-                ((((self.lower_bound == self.upper_bound) and 
-                (not (self.lower_closed and self.upper_closed))) or
-                self.lower_bound > self.upper_bound) or 
-                 (self.lower_bound < self.upper_bound and 
-                  (not (self.lower_closed or self.upper_closed)) and
-                  self.adjacent(self.lower_bound, self.upper_bound))))
+        return ${IntervalType}_empty(self.lower_bound, self.upper_bound, self.flags)
     
     cpdef bool richcmp(${IntervalType} self, ${IntervalType} other, int op):
         cdef int lower_cmp
@@ -294,81 +958,161 @@ cdef class ${IntervalType}(BaseInterval):
                     return op == 5
     
     cpdef int lower_cmp(${IntervalType} self, ${IntervalType} other):
-        if not self.lower_bounded:
-            if not other.lower_bounded:
-                return 0
-            else:
-                return -1
-        elif not other.lower_bounded:
-            return 1
-        if self.lower_bound < other.lower_bound:
-            return -1
-        elif self.lower_bound == other.lower_bound:
-            if self.lower_closed and not other.lower_closed:
-                return -1
-            elif other.lower_closed and not self.lower_closed:
-                return 1
-            else:
-                return 0
-        else:
-            return 1
+        return ${IntervalType}_lower_cmp(self.lower_bound, self.flags, other.lower_bound, other.flags)
     
     cpdef int upper_cmp(${IntervalType} self, ${IntervalType} other):
-        if not self.upper_bounded:
-            if not other.upper_bounded:
-                return 0
-            else:
-                return 1
-        elif not other.upper_bounded:
-            return -1
-        if self.upper_bound < other.upper_bound:
-            return -1
-        elif self.upper_bound == other.upper_bound:
-            if self.upper_closed and not other.upper_closed:
-                return 1
-            elif other.upper_closed and not self.upper_closed:
-                return -1
-            else:
-                return 0
-        else:
-            return 1
+        return ${IntervalType}_upper_cmp(self.upper_bound, self.flags, other.upper_bound, other.flags)
 
 # This is because static cpdef methods are not supported.  Otherwise this
 # would be a static method of ${IntervalSetType}
-cpdef tuple ${IntervalType}_preprocess_intervals(tuple intervals):
-    # Remove any empty intervals
+cpdef ${IntervalSetType} ${IntervalSetType}_from_intervals(tuple intervals):
+    '''
+    Construct an ${IntervalSetType} from intervals in any order, which may be empty or 
+    overlapping.
+    '''
+    % if instrument:
+    cdef OperationTimer timer = OperationTimer('${IntervalSetType}_from_intervals')
+    % endif
     cdef ${IntervalType} interval
-    
-    cdef list tmp = []
+    cdef ${IntervalSetType}Builder raw = ${IntervalSetType}Builder(len(intervals))
     for interval in intervals:
-        if not interval.empty():
-            tmp.append(interval)
+        raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+    return ${IntervalSetType}_normalize(raw)
+
+cdef ${IntervalSetType}Builder ${IntervalSetType}_raw_from_arrays(object lower, object upper, object lower_closed, 
+                                                                   object upper_closed, object lower_bounded, 
+                                                                   object upper_bounded${', bint raw_bounds=False' if converted else ''}):
+    '''
+    Accumulate intervals given as arrays of bounds and flags, as described in 
+    ${IntervalSetType}.from_arrays, into a builder in the order given.
+    '''
+    % if converted:
+    cdef const ${c_type}[:] lower_values, upper_values
+    if raw_bounds:
+        lower_values = ${IntervalSetType}_stored_values(lower)
+        upper_values = ${IntervalSetType}_stored_values(upper)
+    else:
+        lower_values = ${IntervalSetType}_values(lower)
+        upper_values = ${IntervalSetType}_values(upper)
+    % elif array_code:
+    cdef const ${c_type}[:] lower_values = ${IntervalSetType}_values(lower)
+    cdef const ${c_type}[:] upper_values = ${IntervalSetType}_values(upper)
+    % endif
+    % if array_code:
+    cdef Py_ssize_t i, n = lower_values.shape[0]
+    if upper_values.shape[0] != n:
+    % else:
+    cdef tuple lower_values = tuple(lower)
+    cdef tuple upper_values = tuple(upper)
+    cdef Py_ssize_t i, n = len(lower_values)
+    if len(upper_values) != n:
+    % endif
+        raise ValueError('lower and upper must have the same length')
+    cdef array flags = clone(flags_template, n, True)
+    set_flags(flags.data.as_uchars, n, lower_closed, LOWER_CLOSED)
+    set_flags(flags.data.as_uchars, n, upper_closed, UPPER_CLOSED)
+    set_flags(flags.data.as_uchars, n, lower_bounded, LOWER_BOUNDED)
+    set_flags(flags.data.as_uchars, n, upper_bounded, UPPER_BOUNDED)
+    cdef ${IntervalSetType}Builder raw = ${IntervalSetType}Builder(n)
+    for i in range(n):
+        raw.append(lower_values[i] if flags.data.as_uchars[i] & LOWER_BOUNDED else ${default_value}, 
+                   upper_values[i] if flags.data.as_uchars[i] & UPPER_BOUNDED else ${default_value}, 
+                   flags.data.as_uchars[i])
+    return raw
+
+cpdef tuple ${IntervalType}_preprocess_intervals(tuple intervals):
+    '''
+    Remove empty intervals, sort, and fuse any overlapping intervals.
+    '''
+    % if instrument:
+    cdef OperationTimer timer = OperationTimer('${IntervalType}_preprocess_intervals')
+    % endif
+    return ${IntervalSetType}_from_intervals(intervals).intervals
+
+cdef class ${IntervalSetType}Coalescer:
+    '''
+    Iterate over the coalesced intervals of an iterable of ${IntervalType}s or (lower, upper) 
+    pairs, sorted by lower bound.  Pairs describe closed intervals, and either bound may be 
+    unbounded.  Only one pending interval is held at a time, so the input is never 
+    materialized.  A ValueError is raised if the input is found to be out of order.
+    '''
+    def __init__(${IntervalSetType}Coalescer self, intervals):
+        self.source = iter(intervals)
+        self.pending = False
+        self.started = False
     
-    # If there are no nonempty intervals, return
-    if not tmp:
-        return tuple()
+    def __iter__(${IntervalSetType}Coalescer self):
+        return self
     
-    # Sort
-    tmp.sort()
-    
-    # Fuse any overlapping intervals
-    cdef list tmp2 = []
-    cdef ${IntervalType} interval2
-    cdef int overlap_cmp
-    interval = tmp[0]
-    for interval2 in tmp[1:]:
-        overlap_cmp = interval.overlap_cmp(interval2)
-        if (
-            (overlap_cmp == 0) or 
-            (overlap_cmp == -1 and interval.upper_bound == interval2.lower_bound and (interval.upper_closed or interval2.lower_closed)) or
-            (overlap_cmp == 1 and interval2.upper_bound == interval.lower_bound and (interval2.upper_closed or interval.lower_closed))
-            ):
-            interval = interval.fusion(interval2)
-        else:
-            tmp2.append(interval)
-            interval = interval2
-    tmp2.append(interval)
-    return tuple(tmp2)
+    def __next__(${IntervalSetType}Coalescer self):
+        cdef ${IntervalType} result
+        if not self.next_raw():
+            raise StopIteration
+        result = ${IntervalType}.__new__(${IntervalType})
+        result.lower_bound = self.result_lower
+        result.upper_bound = self.result_upper
+        result.flags = self.result_flags
+        return result
+    
+    cdef int next_raw(${IntervalSetType}Coalescer self) except -1:
+        '''
+        Store the next coalesced interval in the result fields and return 1, or return 0 if 
+        there are no more.
+        '''
+        cdef ${c_type} item_lower, item_upper
+        cdef unsigned char item_flags
+        cdef ${IntervalType} interval
+        for item in self.source:
+            if isinstance(item, ${IntervalType}):
+                interval = item
+                item_lower = interval.lower_bound
+                item_upper = interval.upper_bound
+                item_flags = interval.flags
+            else:
+                lower_value, upper_value = item
+                item_flags = LOWER_CLOSED | UPPER_CLOSED
+                if lower_value is unbounded:
+                    item_lower = ${default_value}
+                else:
+                    item_lower = ${to_c('lower_value')}
+                    item_flags |= LOWER_BOUNDED
+                if upper_value is unbounded:
+                    item_upper = ${default_value}
+                else:
+                    item_upper = ${to_c('upper_value')}
+                    item_flags |= UPPER_BOUNDED
+            if self.started and ${IntervalType}_lower_cmp(item_lower, item_flags, 
+                                                          self.last_lower, self.last_flags) < 0:
+                raise ValueError('Intervals must be sorted by lower bound')
+            self.started = True
+            self.last_lower = item_lower
+            self.last_flags = item_flags
+            if ${IntervalType}_empty(item_lower, item_upper, item_flags):
+                continue
+            if not self.pending:
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                self.pending = True
+            elif ${IntervalType}_fusible(self.lower, self.upper, self.flags, item_lower, item_upper, item_flags):
+                if ${IntervalType}_upper_cmp(item_upper, item_flags, self.upper, self.flags) > 0:
+                    self.upper = item_upper
+                    self.flags = (self.flags & LOWER_FLAGS) | (item_flags & UPPER_FLAGS)
+            else:
+                self.result_lower = self.lower
+                self.result_upper = self.upper
+                self.result_flags = self.flags
+                self.lower = item_lower
+                self.upper = item_upper
+                self.flags = item_flags
+                return 1
+        if self.pending:
+            self.result_lower = self.lower
+            self.result_upper = self.upper
+            self.result_flags = self.flags
+            self.pending = False
+            return 1
+        return 0
 
 cdef class ${IntervalSetType}Iterator(BaseIntervalSetIterator):
     def __init__(${IntervalSetType}Iterator self, ${IntervalSetType} interval_set):
@@ -389,8 +1133,59 @@ cdef class ${IntervalSetType}(BaseIntervalSet):
         '''
         The intervals must already be sorted and non-overlapping.
         '''
-        self.intervals = intervals
-        self.n_intervals = len(intervals)
+        cdef ${IntervalSetType}Builder builder = ${IntervalSetType}Builder(len(intervals))
+        cdef ${IntervalType} interval
+        cdef ${IntervalSetType} built
+        for interval in intervals:
+            builder.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        built = builder.build()
+        self.lower_bounds = built.lower_bounds
+        self.upper_bounds = built.upper_bounds
+        self.flags = built.flags
+        self.storage = built.storage
+        self.n_intervals = built.n_intervals
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True${', raw=False' if converted else ''}):
+        '''
+        Construct an ${IntervalSetType} directly from sequences of lower and upper bounds, 
+        % if converted:
+        given as numpy datetime64 arrays or any other sequences of ${p_type}s.  If raw is true 
+        they are instead given as ${c_type} buffers or sequences of the stored ${'ordinals' if has_adjacent else 'microseconds since the epoch in UTC'}, 
+        as returned by to_arrays.  
+        % elif array_code:
+        given as buffers of ${c_type} (such as numpy arrays) or any other sequences of numbers.  
+        % else:
+        given as any sequences of ${p_type or 'objects'}.  
+        % endif
+        Each of lower_closed, upper_closed, lower_bounded and upper_bounded is either a single 
+        bool for all intervals or a sequence of bools with one per interval.  The intervals need 
+        not be sorted or disjoint, and no interval objects are created.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.from_arrays')
+        % endif
+        return ${IntervalSetType}_normalize(${IntervalSetType}_raw_from_arrays(lower, upper, lower_closed, 
+                                                                                upper_closed, lower_bounded, 
+                                                                                upper_bounded${', raw' if converted else ''}))
+    
+    @staticmethod
+    def from_sorted(intervals):
+        '''
+        Construct an ${IntervalSetType} from an iterable of ${IntervalType}s or (lower, upper) pairs 
+        sorted by lower bound, as described in ${IntervalSetType}Coalescer, coalescing them as 
+        they are read.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.from_sorted')
+        % endif
+        cdef ${IntervalSetType}Coalescer coalescer = ${IntervalSetType}Coalescer(intervals)
+        cdef ${IntervalSetType}Builder builder = ${IntervalSetType}Builder()
+        while coalescer.next_raw():
+            builder.append(coalescer.result_lower, coalescer.result_upper, coalescer.result_flags)
+        return builder.build()
     
     def __iter__(${IntervalSetType} self):
         return ${IntervalSetType}Iterator(self)
@@ -398,105 +1193,257 @@ cdef class ${IntervalSetType}(BaseIntervalSet):
     def __getitem__(${IntervalSetType} self, index):
         return self.intervals[index]
     
-    cpdef bool lower_bounded(${IntervalSetType} self):
+    cdef tuple materialize_intervals(${IntervalSetType} self):
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.materialize_intervals')
+        % endif
+        cdef Py_ssize_t i
+        cdef unsigned char flags
         cdef ${IntervalType} interval
+        cdef list result = []
+        for i in range(self.n_intervals):
+            interval = ${IntervalType}.__new__(${IntervalType})
+            interval.lower_bound = self.lower_bounds[i]
+            interval.upper_bound = self.upper_bounds[i]
+            interval.flags = self.flags[i]
+            result.append(interval)
+        return tuple(result)
+    
+    cdef Py_hash_t compute_hash(${IntervalSetType} self) except -1:
+        '''
+        Combine the hashes of the intervals in the same way as the hash of a tuple.
+        '''
+        cdef Py_ssize_t i
+        cdef unsigned char flags
+        cdef size_t result = 0x345678
+        cdef size_t multiplier = 1000003
+        cdef Py_hash_t interval_hash
+        for i in range(self.n_intervals):
+            flags = canonical_flags(self.flags[i])
+            interval_hash = hash((self.lower_bounds[i] if flags & LOWER_BOUNDED else None, 
+                                  self.upper_bounds[i] if flags & UPPER_BOUNDED else None, flags))
+            result = (result ^ <size_t> interval_hash) * multiplier
+            multiplier += 82520 + 2 * (self.n_intervals - i)
+        result += 97531
+        if <Py_hash_t> result == -1:
+            return -2
+        return <Py_hash_t> result
+    
+    cpdef bool lower_bounded(${IntervalSetType} self):
         if self.n_intervals > 0:
-            interval = self.intervals[0]
-            return interval.lower_bounded
+            return (self.flags[0] & LOWER_BOUNDED) != 0
         else:
             return True
     
     cpdef bool upper_bounded(${IntervalSetType} self):
-        cdef ${IntervalType} interval
         if self.n_intervals > 0:
-            interval = self.intervals[self.n_intervals - 1]
-            return interval.upper_bounded
+            return (self.flags[self.n_intervals - 1] & UPPER_BOUNDED) != 0
         else:
             return True
     
-    cpdef ${c_type} lower_bound(${IntervalSetType} self):
-        cdef ${IntervalType} interval
+    cpdef ${api_type} lower_bound(${IntervalSetType} self):
+        % if converted:
+        if self.n_intervals > 0 and self.flags[0] & LOWER_BOUNDED:
+            return ${to_py('self.lower_bounds[0]')}
+        else:
+            return None
+        % else:
         if self.n_intervals > 0:
-            interval = self.intervals[0]
-            return interval.lower_bound
+            return self.lower_bounds[0]
         else:
             return ${default_value}
+        % endif
     
-    cpdef ${c_type} upper_bound(${IntervalSetType} self):
-        cdef ${IntervalType} interval
+    cpdef ${api_type} upper_bound(${IntervalSetType} self):
+        % if converted:
+        if self.n_intervals > 0 and self.flags[self.n_intervals - 1] & UPPER_BOUNDED:
+            return ${to_py('self.upper_bounds[self.n_intervals - 1]')}
+        else:
+            return None
+        % else:
         if self.n_intervals > 0:
-            interval = self.intervals[self.n_intervals - 1]
-            return interval.upper_bound
+            return self.upper_bounds[self.n_intervals - 1]
         else:
             return ${default_value}
+        % endif
     
     cpdef tuple init_args(${IntervalSetType} self):
         return (self.intervals,)
     
-    cpdef bool contains(${IntervalSetType} self, ${c_type} item):
+    cdef Py_ssize_t locate_item(${IntervalSetType} self, ${c_type} item)${' nogil' if array_code else ''}:
         '''
-        Use binary search to determine whether item is in self.
+        Use binary search to find the index of the interval containing item, or -1 if there 
+        is none.
         '''
-        cdef int i, n
-        cdef int low, high
+        cdef Py_ssize_t i, n
+        cdef Py_ssize_t low, high
         cdef int cmp
-        cdef ${IntervalType} interval 
         n = self.n_intervals
         low = 0
         high = n-1
         while high >= low:
             i = (high + low) / 2
-            interval = self.intervals[i]
-            cmp = interval.containment_cmp(item)
+            cmp = ${IntervalType}_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                  self.flags[i], item)
             if cmp == -1:
                 high = i - 1
             elif cmp == 1:
                 low = i + 1
             else: #if cmp == 0:
-                return True
-        return False
-
-    cpdef bool subset(${IntervalSetType} self, ${IntervalSetType} other):
+                return i
+        return -1
+    
+    cpdef bool contains(${IntervalSetType} self, ${api_type} item):
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.contains')
+        % endif
+        return self.locate_item(${to_c('item')}) >= 0
+    
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    % if array_code:
+    cdef int locate_many(${IntervalSetType} self, const ${c_type}[:] items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1 nogil:
+    % else:
+    cdef int locate_many(${IntervalSetType} self, tuple items, Py_ssize_t *indices, 
+                         unsigned char *mask) except -1:
+    % endif
         '''
-        Return True if and only if self is a subset of other.
+        For each of items, store the index of the interval containing it (or -1 if there is 
+        none) in indices and whether there is one in mask, skipping either if it is NULL.  
+        Sorted items are merged against the intervals in a single pass, otherwise each is 
+        found by binary search.
         '''
-        cdef ${IntervalType} self_interval, other_interval
-        cdef int i, j, m, n
-        cdef int overlap_cmp, cmp
+        % if array_code:
+        cdef Py_ssize_t n = items.shape[0]
+        % else:
+        cdef Py_ssize_t n = len(items)
+        % endif
+        cdef Py_ssize_t k
+        cdef Py_ssize_t i, index
+        cdef int cmp
+        cdef bint is_sorted = True
+        cdef ${c_type} item
+        for k in range(1, n):
+            % if array_code:
+            if not items[k] >= items[k-1]:
+            % else:
+            if items[k] < items[k-1]:
+            % endif
+                is_sorted = False
+                break
+        i = 0
+        for k in range(n):
+            item = items[k]
+            if is_sorted:
+                cmp = 1
+                while i < self.n_intervals:
+                    cmp = ${IntervalType}_containment_cmp(self.lower_bounds[i], self.upper_bounds[i], 
+                                                          self.flags[i], item)
+                    if cmp != 1:
+                        break
+                    i += 1
+                index = i if cmp == 0 else -1
+            else:
+                index = self.locate_item(item)
+            if indices != NULL:
+                indices[k] = index
+            if mask != NULL:
+                mask[k] = index >= 0
+        return 0
+    
+    cpdef array contains_many(${IntervalSetType} self, points):
+        '''
+        Return an array of bytes, with 1 for each of points contained in self and 0 for each 
+        that is not.  The result can be viewed as a boolean numpy array with 
+        numpy.frombuffer(result, dtype=bool).
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.contains_many')
+        % endif
+        % if array_code:
+        cdef const ${c_type}[:] items = ${IntervalSetType}_values(points)
+        cdef array result = clone(flags_template, items.shape[0], False)
+        with nogil:
+            self.locate_many(items, NULL, result.data.as_uchars)
+        % else:
+        cdef tuple items = tuple(points)
+        cdef array result = clone(flags_template, len(items), False)
+        self.locate_many(items, NULL, result.data.as_uchars)
+        % endif
+        return result
+    
+    cpdef array locate(${IntervalSetType} self, points):
+        '''
+        Return an array of positions holding, for each of points, the index in self.intervals of 
+        the interval containing it, or -1 if no interval contains it.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.locate')
+        % endif
+        % if array_code:
+        cdef const ${c_type}[:] items = ${IntervalSetType}_values(points)
+        cdef array result = clone(index_template, items.shape[0], False)
+        cdef Py_ssize_t *indices = index_data(result)
+        with nogil:
+            self.locate_many(items, indices, NULL)
+        % else:
+        cdef tuple items = tuple(points)
+        cdef array result = clone(index_template, len(items), False)
+        self.locate_many(items, index_data(result), NULL)
+        % endif
+        return result
+
+    cpdef bool subset(${IntervalSetType} self, ${IntervalSetType} other):
+        '''
+        Return True if and only if self is a subset of other.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.subset')
+        % endif
+        cdef Py_ssize_t i, j, m, n
+        cdef int overlap_cmp
         if self.empty():
             return True
         elif other.empty():
             return False
         m = self.n_intervals
         n = other.n_intervals
+        i = 0
         j = 0
-        other_interval = other.intervals[j]
-        for i in range(m):
-            self_interval = self.intervals[i]
-            overlap_cmp = self_interval.overlap_cmp(other_interval)
+        while i < m:
+            overlap_cmp = ${IntervalType}_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
             if overlap_cmp == -1:
                 return False
             elif overlap_cmp == 0:
-                if not self_interval.subset(other_interval):
+                if (${IntervalType}_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.flags[j]) < 0 or 
+                    ${IntervalType}_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                              other.upper_bounds[j], other.flags[j]) > 0):
                     return False
-            elif overlap_cmp == 1:
-                if j < n-1:
-                    j += 1
-                    other_interval = other.intervals[j]
-                else:
+                i += 1
+            else:
+                # The current interval of self lies beyond the current interval of other, so 
+                # compare it against the next interval of other.
+                j += 1
+                if j == n:
                     return False
         return True
     
     cpdef bool equal(${IntervalSetType} self, ${IntervalSetType} other):
-        cdef ${IntervalType} self_interval, other_interval
-        cdef int i, n
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.equal')
+        % endif
+        cdef Py_ssize_t i, n
         n = self.n_intervals
         if n != other.n_intervals:
             return False
         for i in range(n):
-            self_interval = self.intervals[i]
-            other_interval = other.intervals[i]
-            if not self_interval.richcmp(other_interval, 2):
+            if (${IntervalType}_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                          other.lower_bounds[i], other.flags[i]) != 0 or 
+                ${IntervalType}_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                          other.upper_bounds[i], other.flags[i]) != 0):
                 return False
         return True
     
@@ -517,124 +1464,1303 @@ cdef class ${IntervalSetType}(BaseIntervalSet):
     cpdef bool empty(${IntervalSetType} self):
         return self.n_intervals == 0 
     
+    % if array_code:
+    def to_arrays(${IntervalSetType} self):
+        '''
+        Return (lower, upper, lower_closed, upper_closed, lower_bounded, upper_bounded), which 
+        % if converted:
+        are the arguments that from_arrays would take to construct self with raw=True.  The lower 
+        and upper bounds are read-only memoryviews of ${c_type} sharing the storage of self, so 
+        numpy.asarray wraps them without copying.  
+        % else:
+        are the arguments that from_arrays would take to construct self.  The lower and upper 
+        bounds are read-only memoryviews of ${c_type} sharing the storage of self, so 
+        numpy.asarray wraps them without copying.  
+        % endif
+        % if converted and has_adjacent:
+        The bounds are ordinals as returned by date.toordinal.  
+        % elif converted:
+        The bounds are microseconds since the epoch in UTC, so they can be viewed as 
+        datetime64[us].  
+        % endif
+        The bound of an unbounded side is ${default_value}.  The flags are arrays of bytes 
+        which are 1 where true and 0 where false.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.to_arrays')
+        % endif
+        return (memoryview(self.storage[0]).toreadonly(), memoryview(self.storage[1]).toreadonly(), 
+                get_flags(self.flags, self.n_intervals, LOWER_CLOSED), 
+                get_flags(self.flags, self.n_intervals, UPPER_CLOSED), 
+                get_flags(self.flags, self.n_intervals, LOWER_BOUNDED), 
+                get_flags(self.flags, self.n_intervals, UPPER_BOUNDED))
+    
+    def __reduce_ex__(${IntervalSetType} self, protocol):
+        # Pickle the storage as three buffers rather than as interval objects.  From protocol 5 
+        # the buffers are passed as PickleBuffers, so they can be sent out of band without 
+        # copying.
+        if protocol >= 5 and PickleBuffer is not None:
+            buffers = tuple(PickleBuffer(buffer) for buffer in self.storage)
+        else:
+            buffers = tuple(memoryview(buffer).tobytes() for buffer in self.storage)
+        # The byte order is recorded so that a pickle loaded on a machine with the other one is 
+        # swapped rather than misread
+        return (${IntervalSetType}_from_buffers, (self.n_intervals,) + buffers + (sys.byteorder,))
+    
+    def save(${IntervalSetType} self, path):
+        '''
+        Write self to the file at path in the binary format read by load_interval_set.
+        '''
+        with open(path, 'wb') as outfile:
+            outfile.write(file_header.pack(file_magic, b'${IntervalSetType}', sys.byteorder[0].encode(), 
+                                           sizeof(${c_type}), self.n_intervals))
+            for buffer in self.storage:
+                outfile.write(buffer)
+    
+    cpdef object measure(${IntervalSetType} self):
+        '''
+        Return the total length of the intervals, or infinity if self is unbounded.  
+        % if has_adjacent:
+        For this type the elements are discrete, so this is the number of elements of self.
+        % elif converted:
+        The length is a timedelta, except that infinity is the float inf because no timedelta 
+        is infinite.
+        % endif
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.measure')
+        % endif
+        cdef Py_ssize_t i, n = self.n_intervals
+        cdef ${length_type} total = 0
+        % if has_adjacent:
+        cdef Py_ssize_t carries = 0
+        % endif
+        if n > 0 and not ((self.flags[0] & LOWER_BOUNDED) and (self.flags[n-1] & UPPER_BOUNDED)):
+            return INFINITY
+        with nogil:
+            for i in range(n):
+                % if has_adjacent:
+                ${IntervalType}_add_length(&total, &carries, self.lower_bounds[i], self.upper_bounds[i], 
+                                           self.flags[i])
+                % else:
+                total += ${IntervalType}_length(self.lower_bounds[i], self.upper_bounds[i], self.flags[i])
+                % endif
+        % if has_adjacent:
+        return ${IntervalType}_count_to_py(total, carries)
+        % else:
+        return ${length_to_py('total')}
+        % endif
+    
+    cpdef object intersection_measure(${IntervalSetType} self, ${IntervalSetType} other):
+        '''
+        Return the measure of the intersection of self and other, without constructing it.  
+        % if converted and not has_adjacent:
+        As for measure, this is a timedelta unless the intersection is unbounded, when it is 
+        the float inf.
+        % endif
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.intersection_measure')
+        % endif
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, lower_cmp, upper_cmp
+        cdef ${c_type} new_lower_bound, new_upper_bound
+        cdef unsigned char new_flags
+        cdef ${length_type} total = 0
+        cdef bint infinite = False
+        % if has_adjacent:
+        cdef Py_ssize_t carries = 0
+        % endif
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        with nogil:
+            while i < m and j < n:
+                cmp = ${IntervalType}_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                                  other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                if cmp == -1:
+                    i += 1
+                elif cmp == 1:
+                    j += 1
+                else:
+                    lower_cmp = ${IntervalType}_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                          other.lower_bounds[j], other.flags[j])
+                    upper_cmp = ${IntervalType}_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                                          other.upper_bounds[j], other.flags[j])
+                    if lower_cmp <= 0:
+                        new_lower_bound = other.lower_bounds[j]
+                        new_flags = other.flags[j] & LOWER_FLAGS
+                    else:
+                        new_lower_bound = self.lower_bounds[i]
+                        new_flags = self.flags[i] & LOWER_FLAGS
+                    if upper_cmp <= 0:
+                        new_upper_bound = self.upper_bounds[i]
+                        new_flags |= self.flags[i] & UPPER_FLAGS
+                    else:
+                        new_upper_bound = other.upper_bounds[j]
+                        new_flags |= other.flags[j] & UPPER_FLAGS
+                    if not ((new_flags & LOWER_BOUNDED) and (new_flags & UPPER_BOUNDED)):
+                        infinite = True
+                        break
+                    if not ${IntervalType}_empty(new_lower_bound, new_upper_bound, new_flags):
+                        % if has_adjacent:
+                        ${IntervalType}_add_length(&total, &carries, new_lower_bound, new_upper_bound, new_flags)
+                        % else:
+                        total += ${IntervalType}_length(new_lower_bound, new_upper_bound, new_flags)
+                        % endif
+                    if upper_cmp <= 0:
+                        i += 1
+                    if upper_cmp >= 0:
+                        j += 1
+        if infinite:
+            return INFINITY
+        % if has_adjacent:
+        return ${IntervalType}_count_to_py(total, carries)
+        % else:
+        return ${length_to_py('total')}
+        % endif
+    
+    % endif
     cpdef ${IntervalSetType} intersection(${IntervalSetType} self, ${IntervalSetType} other):
-        if self.empty() or other.empty():
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.intersection')
+        % endif
+        if self.empty():
             return self
-        cdef int i, j, m, n, cmp, upper_cmp
+        if other.empty():
+            return other
+        cdef ${IntervalSetType}Builder builder = ${IntervalSetType}Builder(self.n_intervals + 
+                                                                            other.n_intervals)
+        % if array_code:
+        with nogil:
+            self.intersection_into(other, builder)
+        % else:
+        self.intersection_into(other, builder)
+        % endif
+        return builder.build()
+    
+    cdef int intersection_into(${IntervalSetType} self, ${IntervalSetType} other, 
+                               ${IntervalSetType}Builder builder) except -1${' nogil' if array_code else ''}:
+        '''
+        Append the intersection of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, lower_cmp, upper_cmp
+        cdef ${c_type} new_lower_bound, new_upper_bound
+        cdef unsigned char new_flags
         i = 0
         j = 0
         m = self.n_intervals
         n = other.n_intervals
-        cdef ${IntervalType} interval1, interval2
-        interval1 = self.intervals[i]
-        interval2 = other.intervals[j]
-        cdef list new_intervals = []
-        while True:
-            cmp = interval1.overlap_cmp(interval2)
+        while i < m and j < n:
+            cmp = ${IntervalType}_overlap_cmp(self.lower_bounds[i], self.upper_bounds[i], self.flags[i], 
+                                              other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
             if cmp == -1:
                 i += 1
-                if i <= m-1:
-                    interval1 = self.intervals[i]
-                else:
-                    break
             elif cmp == 1:
                 j += 1
-                if j <= n-1:
-                    interval2 = other.intervals[j]
-                else:
-                    break
             else:
-                new_intervals.append(interval1.intersection(interval2))
-                upper_cmp = interval1.upper_cmp(interval2)
+                lower_cmp = ${IntervalType}_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                      other.lower_bounds[j], other.flags[j])
+                upper_cmp = ${IntervalType}_upper_cmp(self.upper_bounds[i], self.flags[i], 
+                                                      other.upper_bounds[j], other.flags[j])
+                if lower_cmp <= 0:
+                    new_lower_bound = other.lower_bounds[j]
+                    new_flags = other.flags[j] & LOWER_FLAGS
+                else:
+                    new_lower_bound = self.lower_bounds[i]
+                    new_flags = self.flags[i] & LOWER_FLAGS
+                if upper_cmp <= 0:
+                    new_upper_bound = self.upper_bounds[i]
+                    new_flags |= self.flags[i] & UPPER_FLAGS
+                else:
+                    new_upper_bound = other.upper_bounds[j]
+                    new_flags |= other.flags[j] & UPPER_FLAGS
+                # For types with adjacent elements the overlap may still be empty
+                if not ${IntervalType}_empty(new_lower_bound, new_upper_bound, new_flags):
+                    builder.append(new_lower_bound, new_upper_bound, new_flags)
                 if upper_cmp <= 0:
                     i += 1
-                    if i <= m-1:
-                        interval1 = self.intervals[i]
-                    else:
-                        break
                 if upper_cmp >= 0:
                     j += 1
-                    if j <= n-1:
-                        interval2 = other.intervals[j]
-                    else:
-                        break
-        return ${IntervalSetType}(tuple(new_intervals))
+        return 0
     
     cpdef ${IntervalSetType} union(${IntervalSetType} self, ${IntervalSetType} other):
-        cdef ${IntervalType} new_interval, interval1, interval2, next_interval
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.union')
+        % endif
         if self.empty():
             return other
         if other.empty():
             return self
-        interval1 = self.intervals[0]
-        interval2 = other.intervals[0]
-        
-        cdef int i, j, m, n, cmp
-        cdef bool richcmp, first = True
+        cdef ${IntervalSetType}Builder builder = ${IntervalSetType}Builder(self.n_intervals + 
+                                                                            other.n_intervals)
+        % if array_code:
+        with nogil:
+            self.union_into(other, builder)
+        % else:
+        self.union_into(other, builder)
+        % endif
+        return builder.build()
+    
+    cdef int union_into(${IntervalSetType} self, ${IntervalSetType} other, 
+                        ${IntervalSetType}Builder builder) except -1${' nogil' if array_code else ''}:
+        '''
+        Append the union of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
         i = 0
         j = 0
         m = self.n_intervals
         n = other.n_intervals
-        cdef list new_intervals = []
         while i < m or j < n:
-            if i == m:
-                richcmp = False
-            elif j == n:
-                richcmp = True
-            else:
-                richcmp = interval1.richcmp(interval2, 1)
-            if richcmp:
-                next_interval = interval1 
+            if j == n or (i < m and 
+                          ${IntervalType}_lower_cmp(self.lower_bounds[i], self.flags[i], 
+                                                    other.lower_bounds[j], other.flags[j]) <= 0):
+                builder.merge(self.lower_bounds[i], self.upper_bounds[i], self.flags[i])
                 i += 1
-                if i < m:
-                    interval1 = self.intervals[i]
             else:
-                next_interval = interval2
+                builder.merge(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
                 j += 1
-                if j < n:
-                    interval2 = other.intervals[j]
-            if first:
-                first = False
-                new_interval = next_interval
-            else:
-                cmp = new_interval.overlap_cmp(next_interval)
-                if (cmp == 0 or 
-                (cmp==-1 and new_interval.upper_bound == next_interval.lower_bound and 
-                 (new_interval.upper_closed or next_interval.lower_closed)) or 
-                 (cmp==1 and new_interval.lower_bound == next_interval.upper_bound and 
-                 (new_interval.lower_closed or next_interval.upper_closed))):
-                    new_interval = new_interval.fusion(next_interval)
-                else:
-                    new_intervals.append(new_interval)
-                    new_interval = next_interval
-        new_intervals.append(new_interval)
-        return ${IntervalSetType}(tuple(new_intervals))
+        return 0
     
     cpdef ${IntervalSetType} complement(${IntervalSetType} self):
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.complement')
+        % endif
+        cdef ${IntervalSetType}Builder builder
+        if self.empty():
+            builder = ${IntervalSetType}Builder(1)
+            builder.append(${default_value}, ${default_value}, LOWER_CLOSED | UPPER_CLOSED)
+            return builder.build()
+        cdef Py_ssize_t i
+        cdef Py_ssize_t n = self.n_intervals
+        cdef unsigned char flags
+        builder = ${IntervalSetType}Builder(n + 1)
+        if self.flags[0] & LOWER_BOUNDED:
+            builder.append(${default_value}, self.lower_bounds[0], 
+                           LOWER_CLOSED | UPPER_BOUNDED | (0 if self.flags[0] & LOWER_CLOSED else UPPER_CLOSED))
+        for i in range(1, n):
+            # For types with adjacent elements the gap between two intervals may be empty
+            flags = (LOWER_BOUNDED | UPPER_BOUNDED | 
+                     (0 if self.flags[i-1] & UPPER_CLOSED else LOWER_CLOSED) | 
+                     (0 if self.flags[i] & LOWER_CLOSED else UPPER_CLOSED))
+            if not ${IntervalType}_empty(self.upper_bounds[i-1], self.lower_bounds[i], flags):
+                builder.append(self.upper_bounds[i-1], self.lower_bounds[i], flags)
+        if self.flags[n-1] & UPPER_BOUNDED:
+            builder.append(self.upper_bounds[n-1], ${default_value}, 
+                           UPPER_CLOSED | LOWER_BOUNDED | (0 if self.flags[n-1] & UPPER_CLOSED else LOWER_CLOSED))
+        return builder.build()
+            
+    cpdef ${IntervalSetType} symmetric_difference(${IntervalSetType} self, ${IntervalSetType} other):
+        '''
+        Return the set of elements in exactly one of self and other, computed in a single sweep 
+        over both.  At each step the remaining parts of the current intervals of self and other 
+        are compared, and whatever lies before the start or after the end of their overlap is 
+        kept.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.symmetric_difference')
+        % endif
         if self.empty():
-            return ${IntervalSetType}((${IntervalType}(${default_value}, ${default_value}, True, True, False, False),))
-        cdef ${IntervalType} interval, previous
-        cdef int i
-        cdef n = self.n_intervals
-        interval = self.intervals[0]
-        cdef list new_intervals = []
-        if interval.lower_bounded:
-            new_intervals.append(${IntervalType}(${default_value}, interval.lower_bound, 
-                                                 True, not interval.lower_closed, False, True))
-        previous = interval
-        for i in range(1,n):
-            interval = self.intervals[i]
-            new_intervals.append(${IntervalType}(previous.upper_bound, interval.lower_bound, not previous.upper_closed, 
-                                                 not interval.lower_closed, True, True))
-            previous = interval
-        interval = self.intervals[n-1]
-        if interval.upper_bounded:
-            new_intervals.append(${IntervalType}(interval.upper_bound, ${default_value}, not interval.upper_closed, True, 
-                                                 True, False))
-        return ${IntervalSetType}(tuple(new_intervals))
+            return other
+        if other.empty():
+            return self
+        cdef ${IntervalSetType}Builder builder = ${IntervalSetType}Builder(self.n_intervals + 
+                                                                            other.n_intervals)
+        % if array_code:
+        with nogil:
+            self.symmetric_difference_into(other, builder)
+        % else:
+        self.symmetric_difference_into(other, builder)
+        % endif
+        return builder.build()
+    
+    cdef int symmetric_difference_into(${IntervalSetType} self, ${IntervalSetType} other, 
+                                       ${IntervalSetType}Builder builder) except -1${' nogil' if array_code else ''}:
+        '''
+        Append the symmetric difference of self and other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp, upper_cmp
+        cdef ${c_type} lower1, upper1, lower2, upper2
+        cdef unsigned char lower_flags1, upper_flags1, lower_flags2, upper_flags2
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        lower1 = self.lower_bounds[0]
+        lower_flags1 = self.flags[0] & LOWER_FLAGS
+        lower2 = other.lower_bounds[0]
+        lower_flags2 = other.flags[0] & LOWER_FLAGS
+        while i < m and j < n:
+            upper1 = self.upper_bounds[i]
+            upper_flags1 = self.flags[i] & UPPER_FLAGS
+            upper2 = other.upper_bounds[j]
+            upper_flags2 = other.flags[j] & UPPER_FLAGS
+            cmp = ${IntervalType}_overlap_cmp(lower1, upper1, lower_flags1 | upper_flags1, 
+                                              lower2, upper2, lower_flags2 | upper_flags2)
+            if cmp == -1:
+                builder.merge(lower1, upper1, lower_flags1 | upper_flags1)
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+                continue
+            elif cmp == 1:
+                builder.merge(lower2, upper2, lower_flags2 | upper_flags2)
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+                continue
+            
+            # Keep whatever precedes the overlap
+            cmp = ${IntervalType}_lower_cmp(lower1, lower_flags1, lower2, lower_flags2)
+            if cmp < 0:
+                builder.merge(lower1, lower2, lower_flags1 | UPPER_BOUNDED | 
+                              (0 if lower_flags2 & LOWER_CLOSED else UPPER_CLOSED))
+            elif cmp > 0:
+                builder.merge(lower2, lower1, lower_flags2 | UPPER_BOUNDED | 
+                              (0 if lower_flags1 & LOWER_CLOSED else UPPER_CLOSED))
             
+            # Whatever follows the overlap remains to be compared with later intervals
+            upper_cmp = ${IntervalType}_upper_cmp(upper1, upper_flags1, upper2, upper_flags2)
+            if upper_cmp < 0:
+                lower2 = upper1
+                lower_flags2 = LOWER_BOUNDED | (0 if upper_flags1 & UPPER_CLOSED else LOWER_CLOSED)
+            elif upper_cmp > 0:
+                lower1 = upper2
+                lower_flags1 = LOWER_BOUNDED | (0 if upper_flags2 & UPPER_CLOSED else LOWER_CLOSED)
+            if upper_cmp <= 0:
+                i += 1
+                if i < m:
+                    lower1 = self.lower_bounds[i]
+                    lower_flags1 = self.flags[i] & LOWER_FLAGS
+            if upper_cmp >= 0:
+                j += 1
+                if j < n:
+                    lower2 = other.lower_bounds[j]
+                    lower_flags2 = other.flags[j] & LOWER_FLAGS
+        while i < m:
+            builder.merge(lower1, self.upper_bounds[i], lower_flags1 | (self.flags[i] & UPPER_FLAGS))
+            i += 1
+            if i < m:
+                lower1 = self.lower_bounds[i]
+                lower_flags1 = self.flags[i] & LOWER_FLAGS
+        while j < n:
+            builder.merge(lower2, other.upper_bounds[j], lower_flags2 | (other.flags[j] & UPPER_FLAGS))
+            j += 1
+            if j < n:
+                lower2 = other.lower_bounds[j]
+                lower_flags2 = other.flags[j] & LOWER_FLAGS
+        return 0
+    
     cpdef ${IntervalSetType} minus(${IntervalSetType} self, ${IntervalSetType} other):
-        return self.intersection(other.complement())
+        '''
+        Subtract other from self in a single sweep over both, cutting each interval of self 
+        at the intervals of other that overlap it.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalSetType}.minus')
+        % endif
+        if self.empty() or other.empty():
+            return self
+        cdef ${IntervalSetType}Builder builder = ${IntervalSetType}Builder(self.n_intervals + 
+                                                                            other.n_intervals)
+        % if array_code:
+        with nogil:
+            self.minus_into(other, builder)
+        % else:
+        self.minus_into(other, builder)
+        % endif
+        return builder.build()
+    
+    cdef int minus_into(${IntervalSetType} self, ${IntervalSetType} other, 
+                        ${IntervalSetType}Builder builder) except -1${' nogil' if array_code else ''}:
+        '''
+        Append self minus other to builder, for nonempty self and other.
+        '''
+        cdef Py_ssize_t i, j, m, n
+        cdef int cmp
+        cdef ${c_type} lower, upper
+        cdef unsigned char lower_flags, upper_flags, piece_flags
+        i = 0
+        j = 0
+        m = self.n_intervals
+        n = other.n_intervals
+        # The part of the interval i of self that remains to be cut runs from lower to upper
+        lower = self.lower_bounds[0]
+        lower_flags = self.flags[0] & LOWER_FLAGS
+        while i < m:
+            upper = self.upper_bounds[i]
+            upper_flags = self.flags[i] & UPPER_FLAGS
+            cmp = -1
+            while j < n:
+                cmp = ${IntervalType}_overlap_cmp(lower, upper, lower_flags | upper_flags, 
+                                                  other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                if cmp != 1:
+                    break
+                j += 1
+            if j == n or cmp == -1:
+                # Nothing left in other overlaps the remaining part
+                if not ${IntervalType}_empty(lower, upper, lower_flags | upper_flags):
+                    builder.append(lower, upper, lower_flags | upper_flags)
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+                continue
+            if ${IntervalType}_lower_cmp(lower, lower_flags, other.lower_bounds[j], other.flags[j]) < 0:
+                piece_flags = (lower_flags | UPPER_BOUNDED | 
+                               (0 if other.flags[j] & LOWER_CLOSED else UPPER_CLOSED))
+                if not ${IntervalType}_empty(lower, other.lower_bounds[j], piece_flags):
+                    builder.append(lower, other.lower_bounds[j], piece_flags)
+            if ${IntervalType}_upper_cmp(upper, upper_flags, other.upper_bounds[j], other.flags[j]) > 0:
+                lower = other.upper_bounds[j]
+                lower_flags = LOWER_BOUNDED | (0 if other.flags[j] & UPPER_CLOSED else LOWER_CLOSED)
+                j += 1
+            else:
+                i += 1
+                if i < m:
+                    lower = self.lower_bounds[i]
+                    lower_flags = self.flags[i] & LOWER_FLAGS
+        return 0
+cdef inline int ${IntervalSetType}_cursor_cmp(list sets, Py_ssize_t *positions, Py_ssize_t a, 
+                                              Py_ssize_t b, bint by_upper) except? -2:
+    cdef ${IntervalSetType} first = sets[a]
+    cdef ${IntervalSetType} second = sets[b]
+    if by_upper:
+        return ${IntervalType}_upper_cmp(first.upper_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.upper_bounds[positions[b]], second.flags[positions[b]])
+    else:
+        return ${IntervalType}_lower_cmp(first.lower_bounds[positions[a]], first.flags[positions[a]], 
+                                         second.lower_bounds[positions[b]], second.flags[positions[b]])
+
+cdef int ${IntervalSetType}_sift_down(list sets, Py_ssize_t *positions, Py_ssize_t *heap, 
+                                     Py_ssize_t size, Py_ssize_t index, bint by_upper) except -1:
+    '''
+    Restore the heap property below index in a min-heap of indices into sets, ordered by the 
+    lower (or upper) bound of the interval at which each set's cursor in positions points.
+    '''
+    cdef Py_ssize_t child, top
+    while True:
+        child = 2 * index + 1
+        if child >= size:
+            return 0
+        if (child + 1 < size and 
+            ${IntervalSetType}_cursor_cmp(sets, positions, heap[child + 1], heap[child], by_upper) < 0):
+            child += 1
+        if ${IntervalSetType}_cursor_cmp(sets, positions, heap[child], heap[index], by_upper) >= 0:
+            return 0
+        top = heap[index]
+        heap[index] = heap[child]
+        heap[child] = top
+        index = child
+
+% if array_code:
+def ${IntervalSetType}_from_buffers(Py_ssize_t n, lower, upper, flags, byteorder=None):
+    '''
+    Construct an ${IntervalSetType} of n intervals whose storage is the given buffers of lower 
+    bounds, upper bounds and flags, without copying them.  This is used to load interval set 
+    files and to unpickle typed interval sets.  The bounds are in native byte order unless 
+    byteorder, which is 'little' or 'big' as in sys.byteorder, says otherwise, in which case 
+    they are copied and swapped.
+    '''
+    cdef ${IntervalSetType} result = ${IntervalSetType}.__new__(${IntervalSetType})
+    cdef array swapped
+    if byteorder is not None and byteorder != sys.byteorder:
+        swapped = array('${array_code}')
+        swapped.frombytes(memoryview(lower).cast('B'))
+        swapped.byteswap()
+        lower = swapped
+        swapped = array('${array_code}')
+        swapped.frombytes(memoryview(upper).cast('B'))
+        swapped.byteswap()
+        upper = swapped
+    cdef const ${c_type}[:] lower_view = memoryview(lower).cast('B').cast('${array_code}')
+    cdef const ${c_type}[:] upper_view = memoryview(upper).cast('B').cast('${array_code}')
+    cdef const unsigned char[:] flags_view = memoryview(flags).cast('B')
+    if lower_view.shape[0] != n or upper_view.shape[0] != n or flags_view.shape[0] != n:
+        raise ValueError('Expected buffers of %d intervals' % n)
+    result.storage = (lower_view.base, upper_view.base, flags_view.base)
+    result.n_intervals = n
+    if n > 0:
+        result.lower_bounds = <${c_type} *> &lower_view[0]
+        result.upper_bounds = <${c_type} *> &upper_view[0]
+        result.flags = <unsigned char *> &flags_view[0]
+    return result
+
+% endif
+cpdef ${IntervalSetType} ${IntervalSetType}_union_all(list sets):
+    '''
+    Return the union of all the given sets, merging them all at once with a heap ordered by 
+    the lower bound of each set's next interval.
+    '''
+    % if instrument:
+    cdef OperationTimer timer = OperationTimer('${IntervalSetType}_union_all')
+    % endif
+    cdef ${IntervalSetType} interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    sets = [interval_set for interval_set in sets if not interval_set.empty()]
+    k = len(sets)
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        total += interval_set.n_intervals
+    cdef ${IntervalSetType}Builder builder = ${IntervalSetType}Builder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            ${IntervalSetType}_sift_down(sets, positions, heap, size, i, False)
+        while size > 0:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(interval_set.lower_bounds[positions[i]], interval_set.upper_bounds[positions[i]], 
+                          interval_set.flags[positions[i]])
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                size -= 1
+                heap[0] = heap[size]
+            ${IntervalSetType}_sift_down(sets, positions, heap, size, 0, False)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cpdef ${IntervalSetType} ${IntervalSetType}_intersection_all(list sets):
+    '''
+    Return the intersection of all the given sets in a single sweep over all of them.  The 
+    intersection of the current intervals of the sets runs from the greatest of their lower 
+    bounds to the least of their upper bounds, which is found with a heap.  The set whose 
+    current interval ends first is then advanced.
+    '''
+    % if instrument:
+    cdef OperationTimer timer = OperationTimer('${IntervalSetType}_intersection_all')
+    % endif
+    cdef ${IntervalSetType} interval_set
+    cdef Py_ssize_t i, k, size, total = 0
+    cdef ${c_type} lower
+    cdef unsigned char lower_flags
+    k = len(sets)
+    if k == 0:
+        return ${IntervalSetType}(()).complement()
+    if k == 1:
+        return sets[0]
+    for interval_set in sets:
+        if interval_set.empty():
+            return interval_set
+        total += interval_set.n_intervals
+    interval_set = sets[0]
+    lower = interval_set.lower_bounds[0]
+    lower_flags = interval_set.flags[0] & LOWER_FLAGS
+    cdef ${IntervalSetType}Builder builder = ${IntervalSetType}Builder(total)
+    cdef Py_ssize_t *positions = <Py_ssize_t *> PyMem_Malloc(2 * k * sizeof(Py_ssize_t))
+    cdef Py_ssize_t *heap = positions + k
+    if positions == NULL and k > 0:
+        raise MemoryError()
+    try:
+        for i in range(k):
+            positions[i] = 0
+            heap[i] = i
+            interval_set = sets[i]
+            if ${IntervalType}_lower_cmp(interval_set.lower_bounds[0], interval_set.flags[0], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[0]
+                lower_flags = interval_set.flags[0] & LOWER_FLAGS
+        size = k
+        for i in range(k // 2 - 1, -1, -1):
+            ${IntervalSetType}_sift_down(sets, positions, heap, size, i, True)
+        while True:
+            i = heap[0]
+            interval_set = sets[i]
+            builder.merge(lower, interval_set.upper_bounds[positions[i]], 
+                          lower_flags | (interval_set.flags[positions[i]] & UPPER_FLAGS))
+            positions[i] += 1
+            if positions[i] == interval_set.n_intervals:
+                break
+            if ${IntervalType}_lower_cmp(interval_set.lower_bounds[positions[i]], interval_set.flags[positions[i]], 
+                                         lower, lower_flags) > 0:
+                lower = interval_set.lower_bounds[positions[i]]
+                lower_flags = interval_set.flags[positions[i]] & LOWER_FLAGS
+            ${IntervalSetType}_sift_down(sets, positions, heap, size, 0, True)
+    finally:
+        PyMem_Free(positions)
+    return builder.build()
+
+cdef class Mutable${IntervalSetType}:
+    '''
+    A set of disjoint ${IntervalType}s that can be changed in place.  The intervals are kept 
+    sorted in a list of blocks of bounded size, so that adding or discarding an interval 
+    takes O(log(n)) comparisons and moves O(block_size) intervals, plus the cost of removing 
+    any intervals it absorbs.  Queries other than contains are answered by an immutable 
+    snapshot, which is cached until the next change.
+    '''
+    def __init__(Mutable${IntervalSetType} self, tuple intervals=()):
+        self.reset(${IntervalSetType}_from_intervals(intervals))
+    
+    cdef int reset(Mutable${IntervalSetType} self, ${IntervalSetType} interval_set) except -1:
+        '''
+        Replace the contents of self with those of interval_set.
+        '''
+        cdef Py_ssize_t i, start
+        cdef ${IntervalSetType}Builder block
+        self.blocks = []
+        for start in range(0, max(interval_set.n_intervals, 1), block_size):
+            block = ${IntervalSetType}Builder(block_size)
+            for i in range(start, min(start + block_size, interval_set.n_intervals)):
+                block.append(interval_set.lower_bounds[i], interval_set.upper_bounds[i], 
+                             interval_set.flags[i])
+            self.blocks.append(block)
+        self.n_intervals = interval_set.n_intervals
+        self.frozen = interval_set
+        return 0
+    
+    cpdef ${IntervalSetType} freeze(Mutable${IntervalSetType} self):
+        '''
+        Return an immutable ${IntervalSetType} with the same intervals as self.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('Mutable${IntervalSetType}.freeze')
+        % endif
+        cdef ${IntervalSetType}Builder block, builder
+        cdef Py_ssize_t i
+        if self.frozen is None:
+            builder = ${IntervalSetType}Builder(self.n_intervals)
+            for block in self.blocks:
+                for i in range(block.size):
+                    builder.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            self.frozen = builder.build()
+        return self.frozen
+    
+    cdef int search(Mutable${IntervalSetType} self, ${c_type} lower, ${c_type} upper, unsigned char flags, 
+                    bint after, bint touching, Py_ssize_t *block_index, Py_ssize_t *position) except -1:
+        '''
+        Find the first interval that does not lie entirely below the query interval, or, if 
+        after is true, the first that lies entirely above it, counting intervals that only 
+        touch it as overlapping if touching is true.  Store its block and position in the 
+        block, which are the last block and its size if there is no such interval.
+        '''
+        cdef ${IntervalSetType}Builder block
+        cdef Py_ssize_t low = 0, high = len(self.blocks) - 1, i
+        while low < high:
+            i = (low + high) / 2
+            block = self.blocks[i]
+            if Mutable${IntervalSetType}_passed(block, block.size - 1, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        block = self.blocks[low]
+        block_index[0] = low
+        low = 0
+        high = block.size
+        while low < high:
+            i = (low + high) / 2
+            if Mutable${IntervalSetType}_passed(block, i, lower, upper, flags, after, touching):
+                high = i
+            else:
+                low = i + 1
+        position[0] = low
+        return 0
+    
+    cdef int replace(Mutable${IntervalSetType} self, Py_ssize_t first_block, Py_ssize_t first, 
+                     Py_ssize_t last_block, Py_ssize_t last, ${IntervalSetType}Builder replacement) except -1:
+        '''
+        Replace the intervals from position first in block first_block up to, but not including, 
+        position last in block last_block with the intervals in replacement.
+        '''
+        cdef ${IntervalSetType}Builder block = self.blocks[first_block]
+        cdef ${IntervalSetType}Builder other
+        cdef Py_ssize_t i, j, removed = 0
+        if first_block == last_block:
+            removed = last - first
+            block.remove(first, last)
+        else:
+            removed = block.size - first
+            block.remove(first, block.size)
+            for i in range(first_block + 1, last_block):
+                removed += (<${IntervalSetType}Builder> self.blocks[i]).size
+            other = self.blocks[last_block]
+            removed += last
+            other.remove(0, last)
+            del self.blocks[first_block + 1:last_block]
+        for i in range(replacement.size):
+            block.insert(first + i, replacement.lower_bounds[i], replacement.upper_bounds[i], 
+                         replacement.flags[i])
+        self.n_intervals += replacement.size - removed
+        self.frozen = None
+        # Keep the sizes of the changed blocks within bounds
+        if block.size > 2 * block_size:
+            other = ${IntervalSetType}Builder(block_size)
+            for i in range(block.size / 2, block.size):
+                other.append(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+            block.remove(block.size / 2, block.size)
+            self.blocks.insert(first_block + 1, other)
+        for i in (first_block + 1, first_block, first_block - 1):
+            if i >= 0 and i + 1 < len(self.blocks):
+                block = self.blocks[i]
+                other = self.blocks[i + 1]
+                if ((block.size < block_size / 4 or other.size < block_size / 4) and 
+                    block.size + other.size <= 2 * block_size):
+                    for j in range(other.size):
+                        block.append(other.lower_bounds[j], other.upper_bounds[j], other.flags[j])
+                    del self.blocks[i + 1]
+        return 0
+    
+    cpdef add(Mutable${IntervalSetType} self, ${IntervalType} interval):
+        '''
+        Add the elements of interval to self, fusing it with any intervals it overlaps or 
+        touches.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('Mutable${IntervalSetType}.add')
+        % endif
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef ${IntervalSetType}Builder block
+        cdef ${IntervalSetType}Builder replacement = ${IntervalSetType}Builder(1)
+        cdef ${c_type} lower = interval.lower_bound
+        cdef ${c_type} upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        if ${IntervalType}_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, True, &first_block, &first)
+        self.search(lower, upper, flags, True, True, &last_block, &last)
+        replacement.append(lower, upper, flags)
+        if first_block != last_block or first != last:
+            # Fuse with the first and last of the intervals being replaced
+            block = self.blocks[first_block]
+            replacement.merge(block.lower_bounds[first], block.upper_bounds[first], block.flags[first])
+            block = self.blocks[last_block if last > 0 else last_block - 1]
+            i = (last if last > 0 else block.size) - 1
+            replacement.merge(block.lower_bounds[i], block.upper_bounds[i], block.flags[i])
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef discard(Mutable${IntervalSetType} self, ${IntervalType} interval):
+        '''
+        Remove the elements of interval from self, splitting any interval that extends past it.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('Mutable${IntervalSetType}.discard')
+        % endif
+        cdef Py_ssize_t first_block, first, last_block, last, i
+        cdef ${IntervalSetType}Builder block
+        cdef ${IntervalSetType}Builder replacement = ${IntervalSetType}Builder(2)
+        cdef ${c_type} lower = interval.lower_bound
+        cdef ${c_type} upper = interval.upper_bound
+        cdef unsigned char flags = interval.flags
+        cdef unsigned char piece_flags
+        if ${IntervalType}_empty(lower, upper, flags):
+            return
+        self.search(lower, upper, flags, False, False, &first_block, &first)
+        self.search(lower, upper, flags, True, False, &last_block, &last)
+        if first_block == last_block and first == last:
+            return
+        block = self.blocks[first_block]
+        if flags & LOWER_BOUNDED:
+            # The part of the first overlapping interval below interval
+            piece_flags = ((block.flags[first] & LOWER_FLAGS) | UPPER_BOUNDED | 
+                           (0 if flags & LOWER_CLOSED else UPPER_CLOSED))
+            if not ${IntervalType}_empty(block.lower_bounds[first], lower, piece_flags):
+                replacement.append(block.lower_bounds[first], lower, piece_flags)
+        block = self.blocks[last_block if last > 0 else last_block - 1]
+        i = (last if last > 0 else block.size) - 1
+        if flags & UPPER_BOUNDED:
+            # The part of the last overlapping interval above interval
+            piece_flags = ((block.flags[i] & UPPER_FLAGS) | LOWER_BOUNDED | 
+                           (0 if flags & UPPER_CLOSED else LOWER_CLOSED))
+            if not ${IntervalType}_empty(upper, block.upper_bounds[i], piece_flags):
+                replacement.append(upper, block.upper_bounds[i], piece_flags)
+        self.replace(first_block, first, last_block, last, replacement)
+    
+    cpdef bool contains(Mutable${IntervalSetType} self, ${api_type} item):
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('Mutable${IntervalSetType}.contains')
+        % endif
+        cdef ${c_type} value = ${to_c('item')}
+        cdef Py_ssize_t block_index, position
+        cdef ${IntervalSetType}Builder block
+        self.search(value, value, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                    False, False, &block_index, &position)
+        block = self.blocks[block_index]
+        return position < block.size and ${IntervalType}_containment_cmp(block.lower_bounds[position], 
+                                                                         block.upper_bounds[position], 
+                                                                         block.flags[position], value) == 0
+    
+    def __contains__(Mutable${IntervalSetType} self, item):
+        return self.contains(item)
+    
+    def __ior__(Mutable${IntervalSetType} self, other):
+        cdef ${IntervalType} interval
+        for interval in other:
+            self.add(interval)
+        return self
+    
+    def __isub__(Mutable${IntervalSetType} self, other):
+        cdef ${IntervalType} interval
+        for interval in other:
+            self.discard(interval)
+        return self
+    
+    def __iand__(Mutable${IntervalSetType} self, other):
+        cdef ${IntervalSetType} interval_set
+        if isinstance(other, Mutable${IntervalSetType}):
+            interval_set = (<Mutable${IntervalSetType}> other).freeze()
+        elif isinstance(other, ${IntervalSetType}):
+            interval_set = other
+        else:
+            # Any other iterable of intervals, as for |= and -=
+            interval_set = ${IntervalSetType}_from_intervals(tuple(other))
+        # Discarding the complement would leave gaps holding no element of a discrete type 
+        # inside the remaining intervals, so the intersection is rebuilt as a whole
+        self.reset(self.freeze().intersection(interval_set))
+        return self
+    
+    def __richcmp__(Mutable${IntervalSetType} self, other, int op):
+        if isinstance(other, Mutable${IntervalSetType}):
+            other = (<Mutable${IntervalSetType}> other).freeze()
+        return PyObject_RichCompare(self.freeze(), other, op)
+    
+    __hash__ = None
+    
+    def __reduce__(Mutable${IntervalSetType} self):
+        return (self.__class__, (self.intervals,))
+    
+    def __iter__(Mutable${IntervalSetType} self):
+        return iter(self.freeze())
+    
+    def __str__(Mutable${IntervalSetType} self):
+        return str(self.freeze())
+    
+    def __repr__(Mutable${IntervalSetType} self):
+        return str(self)
+    
+    def __nonzero__(Mutable${IntervalSetType} self):
+        return self.n_intervals > 0
+    
+    @property
+    def intervals(Mutable${IntervalSetType} self):
+        return self.freeze().intervals
+    
+    def empty(Mutable${IntervalSetType} self):
+        return self.n_intervals == 0
+    
+    def lower_bounded(Mutable${IntervalSetType} self):
+        return self.freeze().lower_bounded()
+    
+    def upper_bounded(Mutable${IntervalSetType} self):
+        return self.freeze().upper_bounded()
+    
+    def lower_bound(Mutable${IntervalSetType} self):
+        return self.freeze().lower_bound()
+    
+    def upper_bound(Mutable${IntervalSetType} self):
+        return self.freeze().upper_bound()
+    
+    def contains_many(Mutable${IntervalSetType} self, points):
+        return self.freeze().contains_many(points)
+    
+    def locate(Mutable${IntervalSetType} self, points):
+        return self.freeze().locate(points)
+    
+    def subset(Mutable${IntervalSetType} self, other):
+        if isinstance(other, Mutable${IntervalSetType}):
+            other = (<Mutable${IntervalSetType}> other).freeze()
+        return self.freeze().subset(other)
+    % if array_code:
+    
+    def measure(Mutable${IntervalSetType} self):
+        return self.freeze().measure()
+    
+    def intersection_measure(Mutable${IntervalSetType} self, other):
+        if isinstance(other, Mutable${IntervalSetType}):
+            other = (<Mutable${IntervalSetType}> other).freeze()
+        return self.freeze().intersection_measure(other)
+    % endif
+
+cdef inline bint Mutable${IntervalSetType}_passed(${IntervalSetType}Builder block, Py_ssize_t i, 
+                                                  ${c_type} lower, ${c_type} upper, unsigned char flags, 
+                                                  bint after, bint touching):
+    '''
+    Return whether interval i of block is not entirely below the query interval or, if after 
+    is true, whether it is entirely above it.  If touching is true, intervals that touch 
+    the query interval without overlapping it count as overlapping it.
+    '''
+    cdef int cmp = ${IntervalType}_overlap_cmp(block.lower_bounds[i], block.upper_bounds[i], block.flags[i], 
+                                               lower, upper, flags)
+    if after:
+        return cmp == 1 and not (touching and block.lower_bounds[i] == upper and (flags & UPPER_BOUNDED) and 
+                                 (block.flags[i] & LOWER_BOUNDED) and 
+                                 ((block.flags[i] & LOWER_CLOSED) or (flags & UPPER_CLOSED)))
+    else:
+        return cmp != -1 or (touching and block.upper_bounds[i] == lower and (flags & LOWER_BOUNDED) and 
+                             (block.flags[i] & UPPER_BOUNDED) and 
+                             ((block.flags[i] & UPPER_CLOSED) or (flags & LOWER_CLOSED)))
+
+cdef class ${IntervalType}Index:
+    '''
+    A static collection of ${IntervalType}s, which may overlap and are identified by their 
+    position in the sequence the index was built from.  Queries return arrays of these 
+    positions in increasing order.  Intervals are sorted by lower bound, and an implicit 
+    binary tree over the sorted order records the interval with the greatest upper bound 
+    in each subtree, so the k intervals overlapping a query are found in O((k + 1) log(n)) 
+    time.
+    '''
+    def __init__(${IntervalType}Index self, tuple intervals):
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalType}Index.__init__')
+        % endif
+        cdef ${IntervalType} interval
+        cdef ${IntervalSetType}Builder raw = ${IntervalSetType}Builder(len(intervals))
+        for interval in intervals:
+            raw.append(interval.lower_bound, interval.upper_bound, interval.flags)
+        self.index(raw)
+        self.cached_intervals = intervals
+    
+    @staticmethod
+    def from_arrays(lower, upper, lower_closed=True, upper_closed=True, 
+                    lower_bounded=True, upper_bounded=True):
+        '''
+        Construct an ${IntervalType}Index from arrays of bounds and flags, which are 
+        interpreted as in ${IntervalSetType}.from_arrays.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalType}Index.from_arrays')
+        % endif
+        cdef ${IntervalType}Index result = ${IntervalType}Index.__new__(${IntervalType}Index)
+        result.index(${IntervalSetType}_raw_from_arrays(lower, upper, lower_closed, upper_closed, 
+                                                        lower_bounded, upper_bounded))
+        return result
+    
+    cdef int index(${IntervalType}Index self, ${IntervalSetType}Builder raw) except -1:
+        '''
+        Sort the intervals accumulated in raw and build the tree over them.
+        '''
+        cdef Py_ssize_t i, k, n = raw.size
+        cdef Py_ssize_t left, right
+        cdef ${IntervalSetType}Builder builder = ${IntervalSetType}Builder(n)
+        self.order_array = clone(index_template, n, False)
+        self.order = index_data(self.order_array)
+        % if array_code:
+        cdef ${IntervalType}Record *records = <${IntervalType}Record *> PyMem_Malloc(n * sizeof(${IntervalType}Record))
+        if records == NULL and n > 0:
+            raise MemoryError()
+        try:
+            for i in range(n):
+                records[i].lower = raw.lower_bounds[i]
+                records[i].upper = raw.upper_bounds[i]
+                records[i].flags = raw.flags[i]
+                records[i].index = i
+            qsort(records, n, sizeof(${IntervalType}Record), ${IntervalType}_record_cmp)
+            for i in range(n):
+                builder.append(records[i].lower, records[i].upper, records[i].flags)
+                self.order[i] = records[i].index
+        finally:
+            PyMem_Free(records)
+        % else:
+        cdef list order = list(range(n))
+        # Unbounded lower bounds sort first, and closed lower bounds before open ones at the same value
+        order.sort(key=lambda i: (1, raw.lower_bounds[i], not (raw.flags[i] & LOWER_CLOSED)) 
+                                 if raw.flags[i] & LOWER_BOUNDED else (0,))
+        for i in range(n):
+            k = order[i]
+            builder.append(raw.lower_bounds[k], raw.upper_bounds[k], raw.flags[k])
+            self.order[i] = k
+        % endif
+        # The sorted intervals are kept in the storage of an ${IntervalSetType}, although unlike 
+        # those of a set they may be empty or overlap
+        self.sorted_intervals = builder.build()
+        self.n_intervals = n
+        self.leaves = 1
+        while self.leaves < n:
+            self.leaves *= 2
+        self.tree_array = clone(index_template, 2 * self.leaves, False)
+        self.tree = index_data(self.tree_array)
+        # Empty intervals are left out of the tree, so they are never found
+        for i in range(self.leaves):
+            if i < n and not ${IntervalType}_empty(self.sorted_intervals.lower_bounds[i], 
+                                                   self.sorted_intervals.upper_bounds[i], 
+                                                   self.sorted_intervals.flags[i]):
+                self.tree[self.leaves + i] = i
+            else:
+                self.tree[self.leaves + i] = -1
+        for i in range(self.leaves - 1, 0, -1):
+            left = self.tree[2 * i]
+            right = self.tree[2 * i + 1]
+            if left < 0 or (right >= 0 and 
+                            ${IntervalType}_upper_cmp(self.sorted_intervals.upper_bounds[right], 
+                                                      self.sorted_intervals.flags[right], 
+                                                      self.sorted_intervals.upper_bounds[left], 
+                                                      self.sorted_intervals.flags[left]) > 0):
+                self.tree[i] = right
+            else:
+                self.tree[i] = left
+        return 0
+    
+    def __len__(${IntervalType}Index self):
+        return self.n_intervals
+    
+    @property
+    def intervals(${IntervalType}Index self):
+        '''
+        The indexed intervals, in the order the index was built from.
+        '''
+        cdef Py_ssize_t i
+        cdef list result
+        if self.cached_intervals is None:
+            result = [None] * self.n_intervals
+            for i, interval in enumerate(self.sorted_intervals.intervals):
+                result[self.order[i]] = interval
+            self.cached_intervals = tuple(result)
+        return self.cached_intervals
+    
+    def __reduce__(${IntervalType}Index self):
+        return (self.__class__, (self.intervals,))
+    
+    def __str__(${IntervalType}Index self):
+        return '${IntervalType}Index(%s)' % ', '.join(map(str, self.intervals))
+    
+    def __repr__(${IntervalType}Index self):
+        return str(self)
+    
+    cdef Py_ssize_t end(${IntervalType}Index self, ${c_type} upper, unsigned char flags):
+        '''
+        Use binary search to find the number of intervals, in sorted order, that do not lie 
+        entirely above the upper bound of the query.
+        '''
+        cdef Py_ssize_t i, low = 0, high = self.n_intervals
+        cdef ${IntervalSetType} intervals = self.sorted_intervals
+        while low < high:
+            i = (low + high) / 2
+            # Masking the flags restricts overlap_cmp to the lower bound of the interval 
+            # and the upper bound of the query
+            if ${IntervalType}_overlap_cmp(intervals.lower_bounds[i], intervals.upper_bounds[i], 
+                                           intervals.flags[i] & LOWER_FLAGS, upper, upper, 
+                                           flags & UPPER_FLAGS) == 1:
+                high = i
+            else:
+                low = i + 1
+        return low
+    
+    cdef int collect(${IntervalType}Index self, Py_ssize_t node, Py_ssize_t node_start, Py_ssize_t node_stop, 
+                     Py_ssize_t end, ${c_type} lower, ${c_type} upper, unsigned char flags, 
+                     array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals under node, among the first end in 
+        sorted order, that do not lie entirely below the lower bound of the query and share 
+        an element with it.  Subtrees whose greatest upper bound lies below the query are 
+        skipped.
+        '''
+        cdef Py_ssize_t k, middle
+        cdef ${IntervalSetType} intervals = self.sorted_intervals
+        if node_start >= end:
+            return 0
+        k = self.tree[node]
+        if k < 0 or ${IntervalType}_overlap_cmp(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                intervals.flags[k] & UPPER_FLAGS, lower, lower, 
+                                                flags & LOWER_FLAGS) == -1:
+            return 0
+        if node_stop - node_start == 1:
+            # Bounds that interleave may still leave no element in common
+            if not ${IntervalType}_intersection_empty(intervals.lower_bounds[k], intervals.upper_bounds[k], 
+                                                      intervals.flags[k], lower, upper, flags):
+                append_index(result, size, self.order[k])
+            return 0
+        middle = (node_start + node_stop) / 2
+        self.collect(2 * node, node_start, middle, end, lower, upper, flags, result, size)
+        self.collect(2 * node + 1, middle, node_stop, end, lower, upper, flags, result, size)
+        return 0
+    
+    cdef int query(${IntervalType}Index self, ${c_type} lower, ${c_type} upper, unsigned char flags, 
+                   array result, Py_ssize_t *size) except -1:
+        '''
+        Append to result the positions of the intervals that overlap the query interval, in 
+        increasing order.
+        '''
+        cdef Py_ssize_t start = size[0]
+        if ${IntervalType}_empty(lower, upper, flags):
+            return 0
+        self.collect(1, 0, self.leaves, self.end(upper, flags), lower, upper, flags, result, size)
+        qsort(index_data(result) + start, size[0] - start, sizeof(Py_ssize_t), index_cmp)
+        return 0
+    
+    cpdef array stab(${IntervalType}Index self, ${api_type} point):
+        '''
+        Return the positions of the intervals containing point.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalType}Index.stab')
+        % endif
+        cdef ${c_type} item = ${to_c('point')}
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(item, item, LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, result, &size)
+        resize(result, size)
+        return result
+    
+    cpdef array overlap(${IntervalType}Index self, ${IntervalType} interval):
+        '''
+        Return the positions of the intervals that overlap interval.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalType}Index.overlap')
+        % endif
+        cdef array result = clone(index_template, 0, False)
+        cdef Py_ssize_t size = 0
+        self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+        resize(result, size)
+        return result
+    
+    def stab_many(${IntervalType}Index self, points):
+        '''
+        Stab the index with each of points.  Return a pair of arrays of equal length, the 
+        first holding positions in points and the second the positions of the intervals 
+        containing them, ordered by position in points and then by interval position.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalType}Index.stab_many')
+        % endif
+        % if array_code:
+        cdef const ${c_type}[:] items = ${IntervalSetType}_values(points)
+        cdef Py_ssize_t n = items.shape[0]
+        % else:
+        cdef tuple items = tuple(points)
+        cdef Py_ssize_t n = len(items)
+        % endif
+        cdef Py_ssize_t i, start, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for i in range(n):
+            start = size
+            self.query(items[i], items[i], LOWER_CLOSED | UPPER_CLOSED | LOWER_BOUNDED | UPPER_BOUNDED, 
+                       result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+    
+    def overlap_many(${IntervalType}Index self, intervals):
+        '''
+        Query the index with each of intervals, which may be any iterable of ${IntervalType}s 
+        such as an ${IntervalSetType}.  Return a pair of arrays as in stab_many.
+        '''
+        % if instrument:
+        cdef OperationTimer timer = OperationTimer('${IntervalType}Index.overlap_many')
+        % endif
+        cdef ${IntervalType} interval
+        cdef Py_ssize_t i = 0, size = 0, query_size = 0
+        cdef array queries = clone(index_template, 0, False)
+        cdef array result = clone(index_template, 0, False)
+        for interval in intervals:
+            self.query(interval.lower_bound, interval.upper_bound, interval.flags, result, &size)
+            while query_size < size:
+                append_index(queries, &query_size, i)
+            i += 1
+        resize(queries, query_size)
+        resize(result, size)
+        return queries, result
+
+<% bounds = c_type + ' *' if array_code else 'list' %>
+cdef int ${IntervalType}_sweep_step(${bounds} lower1, ${bounds} upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                     Py_ssize_t i, ${bounds} lower2, ${bounds} upper2, unsigned char *flags2, 
+                                     Py_ssize_t *order2, Py_ssize_t *active2, Py_ssize_t *n_active2, bint swapped, 
+                                     IndexPairs *pairs) except -1${' nogil' if array_code else ''}:
+    '''
+    Pair interval i of the first side with each active interval of the second side that 
+    does not lie entirely below it, and drop those that do from the active intervals.  The 
+    active intervals all have lower bounds not greater than that of interval i, so they 
+    overlap it unless they lie below it, and then they lie below all later intervals too.
+    '''
+    cdef Py_ssize_t k, j, kept = 0
+    for k in range(n_active2[0]):
+        j = active2[k]
+        # Masking the flags restricts overlap_cmp to the upper bound of the active interval and 
+        # the lower bound of interval i
+        if ${IntervalType}_overlap_cmp(lower2[j], upper2[j], flags2[j] & UPPER_FLAGS, 
+                                       lower1[i], upper1[i], flags1[i] & LOWER_FLAGS) != -1:
+            # Bounds that interleave may still leave no element in common
+            if not ${IntervalType}_intersection_empty(lower1[i], upper1[i], flags1[i], 
+                                                      lower2[j], upper2[j], flags2[j]):
+                if swapped:
+                    append_pair(pairs, order2[j], order1[i])
+                else:
+                    append_pair(pairs, order1[i], order2[j])
+            active2[kept] = j
+            kept += 1
+    n_active2[0] = kept
+    return 0
+
+cdef int ${IntervalType}_sweep(${bounds} lower1, ${bounds} upper1, unsigned char *flags1, Py_ssize_t *order1, 
+                                Py_ssize_t n1, ${bounds} lower2, ${bounds} upper2, unsigned char *flags2, 
+                                Py_ssize_t *order2, Py_ssize_t n2, Py_ssize_t *active1, Py_ssize_t *active2, 
+                                IndexPairs *pairs) except -1${' nogil' if array_code else ''}:
+    '''
+    Merge two sequences of intervals sorted by lower bound, keeping for each side the 
+    intervals that may still overlap later intervals of the other side.
+    '''
+    cdef Py_ssize_t i = 0, j = 0, n_active1 = 0, n_active2 = 0
+    while i < n1 or j < n2:
+        if j == n2 or (i < n1 and ${IntervalType}_lower_cmp(lower1[i], flags1[i], lower2[j], flags2[j]) <= 0):
+            if not ${IntervalType}_empty(lower1[i], upper1[i], flags1[i]):
+                ${IntervalType}_sweep_step(lower1, upper1, flags1, order1, i, lower2, upper2, flags2, 
+                                           order2, active2, &n_active2, False, pairs)
+                active1[n_active1] = i
+                n_active1 += 1
+            i += 1
+        else:
+            if not ${IntervalType}_empty(lower2[j], upper2[j], flags2[j]):
+                ${IntervalType}_sweep_step(lower2, upper2, flags2, order2, j, lower1, upper1, flags1, 
+                                           order1, active1, &n_active1, True, pairs)
+                active2[n_active2] = j
+                n_active2 += 1
+            j += 1
+    return 0
+
+cpdef tuple ${IntervalType}_overlap_join(${IntervalType}Index left, ${IntervalType}Index right):
+    '''
+    Return a pair of arrays holding the positions in left and in right of every pair of 
+    overlapping intervals, in no particular order.
+    '''
+    % if instrument:
+    cdef OperationTimer timer = OperationTimer('${IntervalType}_overlap_join')
+    % endif
+    cdef ${IntervalSetType} left_intervals = left.sorted_intervals
+    cdef ${IntervalSetType} right_intervals = right.sorted_intervals
+    cdef IndexPairs pairs
+    pairs.first = NULL
+    pairs.second = NULL
+    pairs.size = 0
+    pairs.capacity = 0
+    cdef Py_ssize_t *active = <Py_ssize_t *> PyMem_Malloc((left.n_intervals + right.n_intervals) * sizeof(Py_ssize_t))
+    if active == NULL and left.n_intervals + right.n_intervals > 0:
+        raise MemoryError()
+    try:
+        % if array_code:
+        with nogil:
+            ${IntervalType}_sweep(left_intervals.lower_bounds, left_intervals.upper_bounds, 
+                                  left_intervals.flags, left.order, left.n_intervals, 
+                                  right_intervals.lower_bounds, right_intervals.upper_bounds, 
+                                  right_intervals.flags, right.order, right.n_intervals, 
+                                  active, active + left.n_intervals, &pairs)
+        % else:
+        ${IntervalType}_sweep(left_intervals.lower_bounds, left_intervals.upper_bounds, 
+                              left_intervals.flags, left.order, left.n_intervals, 
+                              right_intervals.lower_bounds, right_intervals.upper_bounds, 
+                              right_intervals.flags, right.order, right.n_intervals, 
+                              active, active + left.n_intervals, &pairs)
+        % endif
+        return index_pairs_to_arrays(&pairs)
+    finally:
+        PyMem_Free(active)
+        free(pairs.first)
+        free(pairs.second)
 
 % endfor
 
@@ -646,18 +2772,73 @@ class unbounded:
 cdef dict interval_type_dispatch = {}
 cdef dict interval_default_value_dispatch = {}
 cdef dict interval_set_type_dispatch = {}
-cdef dict interval_set_preprocessor_dispatch = {}
-% for IntervalType, c_type, p_type, default_value, dispatchable, IntervalSetType, has_adjacent, unit in type_tups:
+cdef dict interval_set_factory_dispatch = {}
+cdef dict interval_set_union_all_dispatch = {}
+cdef dict interval_set_intersection_all_dispatch = {}
+cdef dict interval_index_type_dispatch = {}
+cdef dict interval_mutable_set_type_dispatch = {}
+cdef dict interval_coalescer_dispatch = {}
+cdef dict interval_index_join_dispatch = {}
+% for IntervalType, c_type, p_type, default_value, dispatchable, IntervalSetType, has_adjacent, unit, array_code, converted in type_tups:
 % if dispatchable:
 interval_type_dispatch[${p_type}] = ${IntervalType}
 % endif
-interval_default_value_dispatch[${IntervalType}] = ${default_value}
+interval_default_value_dispatch[${IntervalType}] = ${'None' if converted else default_value}
 interval_set_type_dispatch[${IntervalType}] = ${IntervalSetType}
-interval_set_preprocessor_dispatch[${IntervalType}] = ${IntervalType}_preprocess_intervals
+interval_set_factory_dispatch[${IntervalType}] = ${IntervalSetType}_from_intervals
+interval_set_union_all_dispatch[${IntervalSetType}] = ${IntervalSetType}_union_all
+interval_set_intersection_all_dispatch[${IntervalSetType}] = ${IntervalSetType}_intersection_all
+interval_index_type_dispatch[${IntervalType}] = ${IntervalType}Index
+interval_mutable_set_type_dispatch[${IntervalType}] = Mutable${IntervalSetType}
+interval_coalescer_dispatch[${IntervalType}] = ${IntervalSetType}Coalescer
+interval_index_join_dispatch[${IntervalType}Index] = ${IntervalType}_overlap_join
 % endfor
 inverse_interval_type_dispatch = dict(map(tuple, map(reversed, interval_type_dispatch.items())))
+
+cdef bint datetime64_registered = False
+
+cdef int register_datetime64() except -1:
+    '''
+    Dispatch numpy.datetime64 to DatetimeInterval once numpy has been imported.  It is left 
+    out of inverse_interval_type_dispatch so that DatetimeInterval still maps back to datetime.
+    '''
+    global datetime64_registered
+    if not datetime64_registered:
+        numpy = sys.modules.get('numpy')
+        if numpy is not None:
+            interval_type_dispatch[numpy.datetime64] = DatetimeInterval
+            datetime64_registered = True
+    return 0
+
+inverse_interval_index_type_dispatch = dict(map(tuple, map(reversed, interval_index_type_dispatch.items())))
+cdef frozenset mutable_interval_set_types = frozenset(interval_mutable_set_type_dispatch.values())
+def _resolve_interval_type(intervals, interval_type):
+    '''
+    Return the interval class for the factories below.  The interval_type may be an interval 
+    class, a bound type such as float, or a bound of that type.  If it is None the class is 
+    that of intervals, which must all have the same type, or the default if there are none.
+    '''
+    register_datetime64()
+    if interval_type is None:
+        if intervals:
+            interval_cls = type(intervals[0])
+            for interval in intervals[1:]:
+                assert interval_cls is type(interval)
+        else:
+            interval_cls = ${type_tups[default_type_tup_index][0]}
+    elif interval_type in interval_default_value_dispatch:
+        interval_cls = interval_type
+    elif interval_type in interval_type_dispatch:
+        interval_cls = interval_type_dispatch[interval_type]
+    elif type(interval_type) in interval_type_dispatch:
+        interval_cls = interval_type_dispatch[type(interval_type)]
+    else:
+        interval_cls = ${type_tups[default_type_tup_index][0]}
+    return interval_cls
+
 def Interval(lower_bound=unbounded, upper_bound=unbounded, lower_closed=True, 
              upper_closed=True, interval_type=None):
+    register_datetime64()
     if interval_type is None:
         if lower_bound is not unbounded and type(lower_bound) in interval_type_dispatch:
             cls = interval_type_dispatch[type(lower_bound)]
@@ -665,14 +2846,8 @@ def Interval(lower_bound=unbounded, upper_bound=unbounded, lower_closed=True,
             cls = interval_type_dispatch[type(upper_bound)]
         else:
             cls = ${type_tups[default_type_tup_index][0]}
-    elif interval_type in inverse_interval_type_dispatch:
-        cls = interval_type
-    elif interval_type in interval_type_dispatch:
-        cls = interval_type_dispatch[interval_type]
-    elif type(interval_type) in interval_type_dispatch:
-        cls = interval_type_dispatch[type(interval_type)]
     else:
-        cls = ${type_tups[default_type_tup_index][0]}
+        cls = _resolve_interval_type((), interval_type)
     default_value = interval_default_value_dispatch[cls]
     return cls(lower_bound if lower_bound is not unbounded else default_value,
                upper_bound if upper_bound is not unbounded else default_value,
@@ -681,27 +2856,216 @@ def Interval(lower_bound=unbounded, upper_bound=unbounded, lower_closed=True,
 
 # Just a factory
 def IntervalSet(*intervals, interval_type=None):
+    interval_cls = _resolve_interval_type(intervals, interval_type)
+    interval_set_factory = interval_set_factory_dispatch[interval_cls]
+    return interval_set_factory(intervals)
+
+def coalesce(intervals, interval_type=None):
+    '''
+    Return an iterator over the coalesced intervals of an iterable of intervals or (lower, upper) 
+    pairs sorted by lower bound, which is consumed lazily.  If interval_type is not given, the 
+    type is chosen from the first item, as in Interval for pairs.
+    '''
+    intervals = iter(intervals)
     if interval_type is None:
-        if intervals:
-            interval_cls = type(intervals[0])
-            for interval in intervals[1:]:
-                assert interval_cls is type(interval)
-        else:
-            interval_cls = ${type_tups[default_type_tup_index][0]}
-    elif interval_type in inverse_interval_type_dispatch:
-        interval_cls = interval_type
-    elif interval_type in interval_type_dispatch:
-        interval_cls = interval_type_dispatch[interval_type]
-    elif type(interval_type) in interval_type_dispatch:
-        interval_cls = interval_type_dispatch[type(interval_type)]
-    else:
-        interval_cls = ${type_tups[default_type_tup_index][0]}
-    interval_set_type = interval_set_type_dispatch[interval_cls]
-    interval_set_preprocessor = interval_set_preprocessor_dispatch[interval_cls]
-    if intervals:
-        processed_intervals = interval_set_preprocessor(intervals)
-    else:
-        processed_intervals = tuple()
-    return interval_set_type(processed_intervals)
+        for first in intervals:
+            intervals = chain((first,), intervals)
+            if isinstance(first, BaseInterval):
+                interval_type = type(first)
+            elif first[0] is not unbounded:
+                interval_type = type(first[0])
+            else:
+                interval_type = type(first[1])
+            break
+    return interval_coalescer_dispatch[_resolve_interval_type((), interval_type)](intervals)
+
+def load_interval_set(path):
+    '''
+    Load an interval set written by the save method of a typed interval set.  The file is 
+    memory mapped and the set operates directly on the mapped pages, so only the pages that 
+    are used are ever read.
+    '''
+    with open(path, 'rb') as infile:
+        mapping = mmap(infile.fileno(), 0, access=ACCESS_READ)
+    if len(mapping) < file_header.size:
+        raise ValueError('%s is not an interval set file' % (path,))
+    magic, name, byteorder, itemsize, n = file_header.unpack(mapping[:file_header.size])
+    if magic != file_magic:
+        raise ValueError('%s is not an interval set file' % (path,))
+    if byteorder != sys.byteorder[0].encode():
+        raise ValueError('%s was written on a machine with a different byte order' % (path,))
+    name = name.rstrip(b'\0')
+    data = memoryview(mapping)[file_header.size:]
+    % for IntervalType, c_type, p_type, default_value, dispatchable, IntervalSetType, has_adjacent, unit, array_code, converted in type_tups:
+    % if array_code:
+    if name == b'${IntervalSetType}':
+        if itemsize != sizeof(${c_type}) or len(data) != n * (2 * sizeof(${c_type}) + 1):
+            raise ValueError('%s is truncated or corrupt' % (path,))
+        bounds_size = n * sizeof(${c_type})
+        return ${IntervalSetType}_from_buffers(n, data[:bounds_size], data[bounds_size:2*bounds_size], 
+                                               data[2*bounds_size:])
+    % endif
+    % endfor
+    raise ValueError('%s contains an unknown interval set type %r' % (path, name))
+
+def MutableIntervalSet(*intervals, interval_type=None):
+    '''
+    Construct a mutable interval set, with type chosen as in IntervalSet.
+    '''
+    interval_cls = _resolve_interval_type(intervals, interval_type)
+    return interval_mutable_set_type_dispatch[interval_cls](intervals)
 
+def IntervalIndex(*intervals, interval_type=None):
+    '''
+    Construct an index over intervals, which may overlap.  The type of the index is chosen 
+    from the intervals or interval_type as in IntervalSet.
+    '''
+    interval_cls = _resolve_interval_type(intervals, interval_type)
+    return interval_index_type_dispatch[interval_cls](intervals)
+
+def overlap_join(left, right, interval_type=None):
+    '''
+    Find every pair of overlapping intervals with one from left and one from right.  Each of 
+    left and right is an interval index or an iterable of intervals, which is indexed first.  
+    The interval_type is used as in IntervalSet if neither side determines it.  Return a 
+    pair of arrays of equal length holding the positions in left and in right of each 
+    overlapping pair, in no particular order.
+    '''
+    if type(left) not in interval_index_join_dispatch:
+        left = tuple(left)
+    if type(right) not in interval_index_join_dispatch:
+        right = tuple(right)
+    if interval_type is None:
+        for side in (left, right):
+            if type(side) in interval_index_join_dispatch:
+                interval_type = inverse_interval_index_type_dispatch[type(side)]
+                break
+            elif side:
+                interval_type = type(side[0])
+                break
+    if type(left) not in interval_index_join_dispatch:
+        left = IntervalIndex(*left, interval_type=interval_type)
+    if type(right) not in interval_index_join_dispatch:
+        right = IntervalIndex(*right, interval_type=interval_type)
+    return interval_index_join_dispatch[type(left)](left, right)
 
+cdef list frozen_sets(sets, dict dispatch):
+    '''
+    Return a list of sets with any mutable sets frozen, checking that the first has a type 
+    found in dispatch.
+    '''
+    sets = [interval_set.freeze() if type(interval_set) in mutable_interval_set_types else interval_set 
+            for interval_set in sets]
+    if sets and type(sets[0]) not in dispatch:
+        raise TypeError('Expected interval sets but got %r' % (sets[0],))
+    return sets
+
+def union_all(sets, interval_type=None):
+    '''
+    Return the union of an iterable of interval sets of the same type, which may be mutable.  
+    The interval_type is used as in IntervalSet to choose the type of the result if there are 
+    no sets.
+    '''
+    sets = frozen_sets(sets, interval_set_union_all_dispatch)
+    if not sets:
+        return IntervalSet(interval_type=interval_type)
+    return interval_set_union_all_dispatch[type(sets[0])](sets)
+
+def intersection_all(sets, interval_type=None):
+    '''
+    Return the intersection of an iterable of interval sets of the same type, which may be 
+    mutable.  If there are no sets the result is the whole space, with type chosen from 
+    interval_type as in IntervalSet.
+    '''
+    sets = frozen_sets(sets, interval_set_intersection_all_dispatch)
+    if not sets:
+        return IntervalSet(interval_type=interval_type).complement()
+    return interval_set_intersection_all_dispatch[type(sets[0])](sets)
+
+def evaluate_pairs(str operation, list lefts, list rights):
+    '''
+    Return the list of the results of the named operation applied to each pair of lefts and 
+    rights.  This is the unit of work sent to each worker by the batch functions.
+    '''
+    return [getattr(left, operation)(right) for left, right in zip(lefts, rights)]
+
+cdef list evaluate_batch(str operation, lefts, rights, workers, chunksize):
+    cdef list left_list = list(lefts)
+    cdef list right_list = list(rights)
+    cdef Py_ssize_t n = len(left_list)
+    if len(right_list) != n:
+        raise ValueError('lefts and rights must have the same length')
+    if workers is None:
+        workers = cpu_count() or 1
+    if workers <= 1 or n <= 1:
+        return evaluate_pairs(operation, left_list, right_list)
+    if chunksize is None:
+        chunksize = max(1, -(-n // (4 * workers)))
+    # Imported here as it pulls in multiprocessing, which slows down importing cyinterval
+    from concurrent.futures import ProcessPoolExecutor
+    starts = range(0, n, chunksize)
+    with ProcessPoolExecutor(workers) as executor:
+        results = executor.map(evaluate_pairs, repeat(operation), 
+                               [left_list[start:start + chunksize] for start in starts], 
+                               [right_list[start:start + chunksize] for start in starts])
+        return list(chain.from_iterable(results))
+
+def batch_intersection(lefts, rights, workers=None, chunksize=None):
+    '''
+    Return the list of the intersections of corresponding interval sets in lefts and rights, in 
+    input order.  The pairs are split into chunks of chunksize pairs which are evaluated by a 
+    pool of workers processes, defaulting to one per CPU.  Typed interval sets are sent to and 
+    from the workers as their bound and flag buffers.  With one worker the pairs are evaluated 
+    in this process.
+    '''
+    return evaluate_batch('intersection', lefts, rights, workers, chunksize)
+
+def batch_union(lefts, rights, workers=None, chunksize=None):
+    '''
+    Return the list of the unions of corresponding interval sets in lefts and rights, in input 
+    order.  The work is split across processes as in batch_intersection.
+    '''
+    return evaluate_batch('union', lefts, rights, workers, chunksize)
+
+def batch_minus(lefts, rights, workers=None, chunksize=None):
+    '''
+    Return the list of the differences of corresponding interval sets in lefts and rights, in 
+    input order.  The work is split across processes as in batch_intersection.
+    '''
+    return evaluate_batch('minus', lefts, rights, workers, chunksize)
+
+def stats():
+    '''
+    Return a dict of the counters kept when cyinterval is built with instrumentation (see 
+    setup.py --instrument), with keys:
+    
+    enabled: whether the counters are kept at all.  When it is False the rest are empty.
+    calls: the number of calls of each operation, keyed by class and method name.
+    time: the total time in seconds spent in each operation, including nested operations.
+    comparisons: the number of bound comparisons of each kind.
+    intervals_allocated: the number of interval objects created.
+    '''
+    % if instrument:
+    return {'enabled': True, 
+            'calls': dict(operation_calls), 
+            'time': dict(operation_times), 
+            'comparisons': {'lower_cmp': lower_cmp_count, 'upper_cmp': upper_cmp_count, 
+                            'overlap_cmp': overlap_cmp_count, 'containment_cmp': containment_cmp_count}, 
+            'intervals_allocated': intervals_allocated}
+    % else:
+    return {'enabled': False, 'calls': {}, 'time': {}, 'comparisons': {}, 'intervals_allocated': 0}
+    % endif
+
+def reset_stats():
+    '''
+    Set all the counters reported by stats to zero.
+    '''
+    % if instrument:
+    global lower_cmp_count, upper_cmp_count, overlap_cmp_count, containment_cmp_count, intervals_allocated
+    operation_calls.clear()
+    operation_times.clear()
+    lower_cmp_count = upper_cmp_count = overlap_cmp_count = containment_cmp_count = 0
+    intervals_allocated = 0
+    % else:
+    pass
+    % endif
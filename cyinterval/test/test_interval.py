@@ -1,7 +1,9 @@
-from datetime import date
-from cyinterval.cyinterval import Interval, DateInterval, IntInterval, FloatInterval, unbounded, ObjectInterval
+from datetime import date, datetime, timedelta, timezone
+from cyinterval.cyinterval import Interval, DateInterval, IntInterval, FloatInterval, unbounded, ObjectInterval,\
+    DatetimeInterval
 from nose.tools import assert_equal, assert_in, assert_not_in, assert_raises,\
     assert_false, assert_true
+import pickle
 
 def test_date_interval_factory():
     interval = Interval(date(2012,1,1), date(2012,4,15))
@@ -15,6 +17,24 @@ def test_date_interval_factory_upper_unbounded():
     assert_equal(interval.lower_bound, date(2012,1,1))
     assert_equal(interval.upper_bounded, False)
 
+def test_datetime_interval_factory():
+    interval = Interval(datetime(2012,1,1,12), datetime(2012,4,15))
+    assert isinstance(interval, DatetimeInterval)
+    assert_equal(interval.lower_bound, datetime(2012,1,1,12))
+    assert_equal(interval.upper_bound, datetime(2012,4,15))
+    assert_in(datetime(2012,1,1,12), interval)
+    assert_not_in(datetime(2012,1,1,11,59,59,999999), interval)
+    interval = Interval(datetime(2012,1,1,12,tzinfo=timezone(timedelta(hours=-5))))
+    assert_equal(interval.lower_bound, datetime(2012,1,1,17))
+    assert_equal(interval.upper_bound, None)
+    assert_equal(interval.upper_bounded, False)
+
+def test_unbounded_converted_interval_pickle():
+    for interval in [Interval(unbounded, date(2000,1,1)), Interval(date(2000,1,1)), 
+                     Interval(datetime(2000,1,1,12)), Interval(unbounded, datetime(2000,1,1,12))]:
+        assert_equal(interval.init_args()[0 if interval.upper_bounded else 1], None)
+        assert_equal(pickle.loads(pickle.dumps(interval)), interval)
+
 def test_int_interval_factory():
     interval = Interval(5, 10, upper_closed=False)
     assert isinstance(interval, IntInterval)
@@ -212,7 +232,14 @@ def test_richcmp():
     assert_true(interval2.richcmp(interval1, 4))
     assert_false(interval1.richcmp(interval2, 5))
     assert_true(interval2.richcmp(interval1, 5))
-    
+
+def test_hash():
+    interval1 = Interval(1.,2.)
+    assert_equal(hash(interval1), hash(Interval(1.,2.)))
+    interval2 = Interval(unbounded, 2., lower_closed=False, interval_type=float)
+    interval3 = Interval(unbounded, 2., lower_closed=True, interval_type=float)
+    assert_equal(interval2, interval3)
+    assert_equal(hash(interval2), hash(interval3))
     
 if __name__ == '__main__':
     import sys
@@ -0,0 +1,97 @@
+from cyinterval.cyinterval import Interval, IntervalIndex, FloatIntervalIndex, DateIntervalIndex,\
+    IntIntervalIndex, IntervalSet, unbounded, overlap_join, Int64Interval
+from nose.tools import assert_equal, assert_is, assert_list_equal
+from datetime import date
+import pickle
+import struct
+
+def test_float_interval_index_queries():
+    intervals = (Interval(0.,10.), Interval(2.,3.,upper_closed=False), Interval(5.,unbounded), 
+                 Interval(3.,3.,lower_closed=False), Interval(unbounded,1.,upper_closed=False))
+    index = IntervalIndex(*intervals)
+    assert_is(type(index), FloatIntervalIndex)
+    assert_equal(len(index), 5)
+    assert_equal(index.intervals, intervals)
+    assert_list_equal(list(index.stab(2.5)), [0, 1])
+    assert_list_equal(list(index.stab(3.)), [0])
+    assert_list_equal(list(index.stab(.5)), [0, 4])
+    assert_list_equal(list(index.stab(100.)), [2])
+    assert_list_equal(list(index.overlap(Interval(3.,5.))), [0, 2])
+    assert_list_equal(list(index.overlap(Interval(3.,5.,upper_closed=False))), [0])
+    assert_list_equal(list(index.overlap(Interval(unbounded,unbounded,interval_type=float))), [0, 1, 2, 4])
+
+def test_interval_index_batch_queries():
+    index = FloatIntervalIndex.from_arrays([0., 2., 5.], [10., 3., 6.], upper_closed=[True, False, True])
+    queries, positions = index.stab_many([2.5, 20., 5.])
+    assert_list_equal(list(queries), [0, 0, 2, 2])
+    assert_list_equal(list(positions), [0, 1, 0, 2])
+    queries, positions = index.overlap_many(IntervalSet(Interval(-1.,0.), Interval(3.,4.)))
+    assert_list_equal(list(queries), [0, 1])
+    assert_list_equal(list(positions), [0, 0])
+
+def test_interval_index_discrete_types():
+    index = IntervalIndex(Interval(1,2,lower_closed=False,upper_closed=False), Interval(1,3), 
+                          Interval(3,4,lower_closed=False))
+    assert_is(type(index), IntIntervalIndex)
+    assert_list_equal(list(index.overlap(Interval(2,3,upper_closed=False))), [1])
+    index = IntervalIndex(Interval(date(2012,1,1), date(2012,2,1)), Interval(date(2012,1,15), date(2012,1,20)))
+    assert_is(type(index), DateIntervalIndex)
+    assert_list_equal(list(index.stab(date(2012,1,16))), [0, 1])
+    assert_list_equal(list(index.stab(date(2012,1,31))), [0])
+
+def test_interval_index_discrete_gaps():
+    # [0, 2) and (1, 4) interleave but share no element of a discrete type
+    big = 2**40
+    day = date(2012,1,1).toordinal()
+    for value, interval_type in [(int, None), (lambda k: big + k, Int64Interval), 
+                                 (lambda k: date.fromordinal(day + k), None)]:
+        index = IntervalIndex(Interval(value(0), value(2), upper_closed=False, interval_type=interval_type), 
+                              Interval(value(1), value(3), interval_type=interval_type))
+        query = Interval(value(1), value(4), lower_closed=False, upper_closed=False, 
+                         interval_type=interval_type)
+        assert_list_equal(list(index.overlap(query)), [1])
+        queries, positions = index.overlap_many([query])
+        assert_list_equal(list(positions), [1])
+        query = Interval(value(-1), value(0), upper_closed=False, interval_type=interval_type)
+        assert_list_equal(list(index.overlap(query)), [])
+
+def test_interval_index_pickle():
+    index = IntervalIndex(Interval(0,10), Interval(5,15))
+    assert_equal(pickle.loads(pickle.dumps(index)).intervals, index.intervals)
+    index = IntervalIndex(Interval(unbounded, date(2012,1,1)), Interval(date(2012,3,1)))
+    assert_is(type(index), DateIntervalIndex)
+    assert_equal(pickle.loads(pickle.dumps(index)).intervals, index.intervals)
+
+def test_overlap_join():
+    left = [Interval(0.,1.), Interval(2.,5.), Interval(4.,4.,lower_closed=False)]
+    right = [Interval(1.,2.,lower_closed=False), Interval(4.5,10.), Interval(unbounded,0.)]
+    left_positions, right_positions = overlap_join(left, right)
+    assert_list_equal(sorted(zip(left_positions, right_positions)), [(0, 2), (1, 0), (1, 1)])
+    left_positions, right_positions = overlap_join(IntervalIndex(*right), left)
+    assert_list_equal(sorted(zip(left_positions, right_positions)), [(0, 1), (1, 1), (2, 0)])
+    assert_equal(left_positions.itemsize, struct.calcsize('n'))
+    left_positions, right_positions = overlap_join([], [], interval_type=int)
+    assert_equal(len(left_positions), 0)
+    assert_equal(len(right_positions), 0)
+
+def test_overlap_join_discrete_types():
+    day = date(2012,1,1).toordinal()
+    for value in [int, lambda k: date.fromordinal(day + k)]:
+        intervals = [Interval(value(lower), value(upper), lower_closed=lower_closed, upper_closed=upper_closed) 
+                     for lower in range(4) for upper in range(lower, 5) 
+                     for lower_closed in (True, False) for upper_closed in (True, False)]
+        intervals = [interval for interval in intervals if not interval.empty()]
+        left_positions, right_positions = overlap_join(intervals, intervals[::-1])
+        expected = [(i, j) for i, left in enumerate(intervals) for j, right in enumerate(intervals[::-1]) 
+                    if not left.intersection(right).empty()]
+        assert_list_equal(sorted(zip(left_positions, right_positions)), expected)
+
+if __name__ == '__main__':
+    import sys
+    import nose
+    # This code will run the test in this file.'
+    module_name = sys.modules[__name__].__file__
+
+    result = nose.run(argv=[sys.argv[0],
+                            module_name,
+                            '-s', '-v'])
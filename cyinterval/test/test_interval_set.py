@@ -1,9 +1,23 @@
 from cyinterval.cyinterval import Interval, IntervalSet, FloatIntervalSet, DateIntervalSet,\
-    unbounded, ObjectIntervalSet
+    unbounded, ObjectIntervalSet, IntIntervalSet, FloatInterval_preprocess_intervals, union_all,\
+    intersection_all, Int64Interval, Int64IntervalSet, DatetimeIntervalSet, MutableIntervalSet,\
+    MutableFloatIntervalSet, MutableIntIntervalSet, coalesce, load_interval_set,\
+    batch_intersection, batch_union, batch_minus, DatetimeInterval, inverse_interval_type_dispatch
+import cyinterval
+from nose import SkipTest
 from nose.tools import assert_equal, assert_is, assert_not_equal, assert_less,\
     assert_less_equal, assert_greater_equal, assert_in, assert_not_in,\
-    assert_raises, assert_list_equal
-from datetime import date
+    assert_raises, assert_list_equal, assert_true, assert_false
+from datetime import date, datetime, timedelta
+from array import array
+from operator import iand
+from concurrent.futures import ThreadPoolExecutor
+import os
+import pickle
+import struct
+import subprocess
+import sys
+import tempfile
 
 def test_float_interval_set_construction():
     interval_set = IntervalSet(Interval(0.,1.), Interval(2.,3.))
@@ -52,6 +66,25 @@ def test_interval_set_construction_fusion():
     assert_equal(len(interval_set.intervals), 1)
     assert_is(type(interval_set), FloatIntervalSet)
     
+def test_interval_set_construction_order():
+    intervals = [Interval(float(i), i + .5, lower_closed=bool(i % 2)) for i in range(20)]
+    interval_set = IntervalSet(*intervals)
+    assert_equal(interval_set.intervals, tuple(intervals))
+    assert_equal(IntervalSet(*reversed(intervals)), interval_set)
+    assert_equal(FloatInterval_preprocess_intervals(tuple(reversed(intervals))), tuple(intervals))
+
+def test_from_arrays():
+    interval_set = FloatIntervalSet.from_arrays(array('d', [1., 0., 5.]), array('d', [3., 1., 5.]), 
+                                                upper_closed=[True, False, False], lower_closed=[False, True, True])
+    assert_equal(interval_set, IntervalSet(Interval(0.,1.,upper_closed=False), Interval(1.,3.,lower_closed=False)))
+    interval_set = IntIntervalSet.from_arrays([3, 1, 10], [4, 2, 0], upper_bounded=[True, True, False])
+    assert_equal(interval_set, IntervalSet(Interval(1,2), Interval(3,4), Interval(10,unbounded)))
+    interval_set = DateIntervalSet.from_arrays([date(2014,12,3), date(2012,1,1)], [date(2015,3,17), date(2012,2,5)])
+    assert_equal(interval_set, IntervalSet(Interval(date(2012,1,1),date(2012,2,5)), Interval(date(2014,12,3),date(2015,3,17))))
+    assert_equal(FloatIntervalSet.from_arrays([], []), IntervalSet(interval_type=float))
+    assert_raises(ValueError, lambda: FloatIntervalSet.from_arrays([1.], [2., 3.]))
+    assert_raises(ValueError, lambda: FloatIntervalSet.from_arrays([1.], [2.], lower_closed=[True, False]))
+
 def test_intersection():
     interval_set1 = IntervalSet(Interval(0.,1.,upper_closed=False), Interval(1.,3.,lower_closed=False))
     interval_set2 = IntervalSet(Interval(.5,1.5))
@@ -62,6 +95,173 @@ def test_intersection():
     assert_equal(interval_set1.intersection(interval_set2).intervals,
                  tuple())
     
+def test_intersection_with_empty():
+    interval_set1 = IntervalSet(Interval(0.,1.))
+    interval_set2 = IntervalSet(interval_type=float)
+    assert_equal(interval_set1.intersection(interval_set2), interval_set2)
+    assert_equal(interval_set2.intersection(interval_set1), interval_set2)
+    assert_equal(interval_set1.minus(IntervalSet(Interval(unbounded, unbounded, interval_type=float))), 
+                 interval_set2)
+
+def test_subset():
+    interval_set1 = IntervalSet(Interval(5,6))
+    interval_set2 = IntervalSet(Interval(0,1), Interval(2,3))
+    assert_false(interval_set1.subset(interval_set2))
+    interval_set2 = IntervalSet(Interval(0,1), Interval(4,7))
+    assert_true(interval_set1.subset(interval_set2))
+    assert_false(interval_set2.subset(interval_set1))
+
+def test_int_interval_set_operations():
+    interval_set1 = IntervalSet(Interval(0,10), Interval(20,30,upper_closed=False))
+    interval_set2 = IntervalSet(Interval(5,25))
+    assert_is(type(interval_set1), IntIntervalSet)
+    assert_equal((interval_set1 & interval_set2).intervals, (Interval(5,10), Interval(20,25)))
+    assert_equal((interval_set1 | interval_set2).intervals, (Interval(0,30,upper_closed=False),))
+    assert_equal((interval_set1 - interval_set2).intervals, (Interval(0,5,upper_closed=False), 
+                                                             Interval(25,30,lower_closed=False,upper_closed=False)))
+    assert_equal(interval_set1.lower_bound(), 0)
+    assert_equal(interval_set1.upper_bound(), 30)
+    assert_in(29, interval_set1)
+    assert_not_in(30, interval_set1)
+
+def test_int64_interval_set_operations():
+    big = 2 ** 40
+    interval_set1 = IntervalSet(Interval(big, big + 10, interval_type=Int64Interval), 
+                                Interval(big + 11, big + 20, lower_closed=False, interval_type=Int64Interval))
+    interval_set2 = IntervalSet(Interval(big + 5, unbounded, interval_type=Int64Interval))
+    assert_is(type(interval_set1), Int64IntervalSet)
+    assert_equal(interval_set1.intervals, (Interval(big, big + 10, interval_type=Int64Interval), 
+                                           Interval(big + 11, big + 20, lower_closed=False, 
+                                                    interval_type=Int64Interval)))
+    assert_equal((interval_set1 & interval_set2).lower_bound(), big + 5)
+    assert_equal((interval_set1 | interval_set2).intervals, 
+                 (Interval(big, unbounded, interval_type=Int64Interval),))
+    assert_in(big + 20, interval_set1)
+    assert_not_in(big + 11, interval_set1)
+    assert_true(Interval(big, big + 1, lower_closed=False, upper_closed=False, 
+                         interval_type=Int64Interval).empty())
+
+def test_datetime_interval_set_operations():
+    interval_set1 = IntervalSet(Interval(datetime(2012,1,1), datetime(2012,1,2)), 
+                                Interval(datetime(2012,1,3,6), unbounded))
+    interval_set2 = IntervalSet(Interval(datetime(2012,1,1,12), datetime(2012,1,3,12), upper_closed=False))
+    assert_is(type(interval_set1), DatetimeIntervalSet)
+    assert_equal((interval_set1 & interval_set2).intervals, 
+                 (Interval(datetime(2012,1,1,12), datetime(2012,1,2)), 
+                  Interval(datetime(2012,1,3,6), datetime(2012,1,3,12), upper_closed=False)))
+    assert_equal(interval_set1.lower_bound(), datetime(2012,1,1))
+    assert_equal(interval_set1.upper_bound(), None)
+    assert_in(datetime(2012,1,1,23), interval_set1)
+    assert_not_in(datetime(2012,1,2,1), interval_set1)
+    assert_list_equal(list(interval_set1.locate([datetime(2012,1,2,1), datetime(2030,1,1)])), [-1, 1])
+
+def test_import_does_not_load_numpy_or_multiprocessing():
+    code = ('import sys, cyinterval.cyinterval; '
+            'sys.exit("numpy" in sys.modules or "concurrent.futures.process" in sys.modules)')
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert_equal(subprocess.call([sys.executable, '-c', code], cwd=root), 0)
+
+def test_datetime64_interval_set():
+    try:
+        import numpy
+    except ImportError:
+        raise SkipTest('numpy is not installed')
+    interval_set = DatetimeIntervalSet.from_arrays(numpy.array(['2012-01-01', '2012-02-01'], dtype='datetime64[D]'), 
+                                                   numpy.array(['2012-01-10', '2012-02-10'], dtype='datetime64[D]'))
+    assert_equal(interval_set, IntervalSet(Interval(datetime(2012,1,1), datetime(2012,1,10)), 
+                                           Interval(datetime(2012,2,1), datetime(2012,2,10))))
+    points = numpy.array(['2012-01-05T12:00', '2012-01-20T00:00', '2012-02-10T00:00'], dtype='datetime64[m]')
+    assert_list_equal(list(interval_set.contains_many(points)), [1, 0, 1])
+    assert_in(numpy.datetime64('2012-02-03'), interval_set)
+    assert_is(inverse_interval_type_dispatch[DatetimeInterval], datetime)
+    assert_is(type(Interval(numpy.datetime64('2012-01-01'), unbounded)), DatetimeInterval)
+    interval_set = DateIntervalSet.from_arrays(numpy.array(['2012-01-01', '2012-01-11'], dtype='datetime64[D]'), 
+                                               numpy.array(['2012-01-10', '2012-01-20'], dtype='datetime64[D]'))
+    assert_equal(interval_set, IntervalSet(Interval(date(2012,1,1), date(2012,1,10)), 
+                                           Interval(date(2012,1,11), date(2012,1,20))))
+    assert_list_equal(list(interval_set.contains_many(numpy.array(['2011-12-31', '2012-01-10'], dtype='datetime64[D]'))), 
+                      [0, 1])
+    assert_equal(interval_set.upper_bound(), date(2012,1,20))
+
+def test_measure():
+    interval_set1 = IntervalSet(Interval(0.,1.,upper_closed=False), Interval(2.,3.5))
+    interval_set2 = IntervalSet(Interval(.5,2.5))
+    assert_equal(interval_set1.measure(), 2.5)
+    assert_equal(interval_set1.intersection_measure(interval_set2), 1.)
+    assert_equal(IntervalSet(interval_type=float).measure(), 0.)
+    assert_equal(interval_set1.complement().measure(), float('inf'))
+    interval_set3 = IntervalSet(Interval(0,10), Interval(20,30,lower_closed=False,upper_closed=False))
+    assert_equal(interval_set3.measure(), 20)
+    assert_equal(interval_set3.intersection_measure(IntervalSet(Interval(5,unbounded))), 15)
+    assert_equal(interval_set3.intersection_measure(IntervalSet(Interval(10,21,lower_closed=False))), 1)
+    assert_equal(IntervalSet(Interval(-2**63, 2**63-1, interval_type=Int64Interval)).measure(), 2**64)
+    interval_set4 = IntervalSet(Interval(date(2012,1,1), date(2012,1,31)), Interval(date(2012,3,1), date(2012,3,2)))
+    assert_equal(interval_set4.measure(), 33)
+    interval_set5 = IntervalSet(Interval(datetime(2012,1,1), datetime(2012,1,2)))
+    assert_equal(interval_set5.measure(), timedelta(days=1))
+    assert_equal(interval_set5.intersection_measure(IntervalSet(Interval(datetime(2012,1,1,18)))), 
+                 timedelta(hours=6))
+    # No timedelta is infinite, so unbounded datetime sets measure as the float inf
+    unbounded_set = IntervalSet(Interval(datetime(2012,1,1,18)))
+    assert_is(type(unbounded_set.measure()), float)
+    assert_equal(unbounded_set.measure(), float('inf'))
+    assert_equal(unbounded_set.intersection_measure(unbounded_set), float('inf'))
+
+def test_mutable_interval_set():
+    interval_set = MutableIntervalSet(Interval(0.,1.), Interval(5.,6.))
+    assert_is(type(interval_set), MutableFloatIntervalSet)
+    interval_set.add(Interval(1.,2.,lower_closed=False))
+    interval_set.add(Interval(10.,11.))
+    assert_equal(interval_set.intervals, (Interval(0.,2.), Interval(5.,6.), Interval(10.,11.)))
+    interval_set.add(Interval(1.5,10.,upper_closed=False))
+    assert_equal(interval_set.intervals, (Interval(0.,11.),))
+    interval_set.discard(Interval(3.,4.,lower_closed=False))
+    assert_equal(interval_set.intervals, (Interval(0.,3.), Interval(4.,11.,lower_closed=False)))
+    assert_in(3., interval_set)
+    assert_not_in(4., interval_set)
+    assert_equal(interval_set.n_intervals, 2)
+    assert_equal(interval_set.measure(), 10.)
+    interval_set.discard(Interval(unbounded,unbounded,interval_type=float))
+    assert_true(interval_set.empty())
+    assert_equal(interval_set.freeze(), IntervalSet(interval_type=float))
+
+def test_mutable_interval_set_in_place_operators():
+    interval_set = MutableIntervalSet(Interval(0,10), Interval(20,30))
+    assert_is(type(interval_set), MutableIntIntervalSet)
+    interval_set |= IntervalSet(Interval(5,15), Interval(40,50))
+    assert_equal(interval_set, IntervalSet(Interval(0,15), Interval(20,30), Interval(40,50)))
+    interval_set -= IntervalSet(Interval(10,20,lower_closed=False), Interval(45,unbounded))
+    assert_equal(interval_set, IntervalSet(Interval(0,10), Interval(20,30,lower_closed=False), 
+                                           Interval(40,45,upper_closed=False)))
+    interval_set &= IntervalSet(Interval(5,25))
+    assert_equal(interval_set, IntervalSet(Interval(5,10), Interval(20,25,lower_closed=False)))
+    interval_set &= [Interval(7,22)]
+    assert_equal(interval_set, IntervalSet(Interval(7,10), Interval(20,22,lower_closed=False)))
+    assert_raises(TypeError, iand, interval_set, 5)
+    assert_raises(TypeError, iand, interval_set, IntervalSet(Interval(1.,2.)))
+    assert_equal(interval_set, IntervalSet(Interval(7,10), Interval(20,22,lower_closed=False)))
+    assert_raises(TypeError, hash, interval_set)
+    # A gap with no integer in it still splits the intersection, as for immutable sets
+    for lower, upper, value in [(0, 12, int), (date(2012,1,1), date(2012,1,13), 
+                                               lambda k: date(2012,1,1) + timedelta(days=k))]:
+        interval_set = MutableIntervalSet(Interval(lower, upper, lower_closed=False))
+        other = IntervalSet(Interval(unbounded, value(2)), Interval(value(3), value(10)))
+        expected = interval_set.freeze() & other
+        interval_set &= other
+        assert_equal(interval_set, expected)
+        assert_equal(interval_set.n_intervals, 2)
+
+def test_mutable_interval_set_many_updates():
+    added = tuple(Interval(i, i + 1) for i in range(0, 5000, 3)) + tuple(Interval(i + 1, i + 3) for i in range(0, 5000, 6))
+    interval_set = MutableIntervalSet(interval_type=int)
+    for interval in added:
+        interval_set.add(interval)
+    assert_equal(interval_set, IntervalSet(*added))
+    assert_equal(interval_set.n_intervals, 834)
+    interval_set.discard(Interval(100, 4900))
+    assert_equal(interval_set, IntervalSet(*added) - IntervalSet(Interval(100, 4900)))
+    assert_equal(interval_set.lower_bound(), 0)
+
 def test_union():
     interval_set1 = IntervalSet(Interval(0.,1.,upper_closed=False), Interval(1.,3.,lower_closed=False))
     interval_set2 = IntervalSet(Interval(.5,1.5))
@@ -89,6 +289,61 @@ def test_minus():
     assert_equal(interval_set2.minus(interval_set1).intervals,
                  (Interval(1.,1.),))
 
+def test_minus_sweep():
+    interval_set1 = IntervalSet(Interval(0.,10.), Interval(20.,30.), Interval(40.,unbounded))
+    interval_set2 = IntervalSet(Interval(unbounded,1.), Interval(2.,3.,lower_closed=False), Interval(5.,25.), 
+                                Interval(45.,50.))
+    assert_equal(interval_set1.minus(interval_set2).intervals, 
+                 (Interval(1.,2.,lower_closed=False), Interval(3.,5.,lower_closed=False,upper_closed=False), 
+                  Interval(25.,30.,lower_closed=False), Interval(40.,45.,upper_closed=False), 
+                  Interval(50.,unbounded,lower_closed=False)))
+    assert_equal(interval_set1.minus(interval_set1), IntervalSet(interval_type=float))
+    interval_set3 = IntervalSet(Interval(0,10))
+    interval_set4 = IntervalSet(Interval(0,5,upper_closed=False), Interval(5,10,lower_closed=False))
+    assert_equal((interval_set3 - interval_set4).intervals, (Interval(5,5),))
+    assert_equal(interval_set4 - interval_set3, IntervalSet(interval_type=int))
+    assert_equal((interval_set3 - IntervalSet(Interval(1,2,lower_closed=False))).intervals, 
+                 (Interval(0,1), Interval(2,10,lower_closed=False)))
+
+def test_symmetric_difference():
+    interval_set1 = IntervalSet(Interval(0.,1.,upper_closed=False), Interval(1.,3.,lower_closed=False))
+    interval_set2 = IntervalSet(Interval(.5,1.5))
+    assert_equal(interval_set1.symmetric_difference(interval_set2).intervals, 
+                 (Interval(0.,.5,upper_closed=False), Interval(1.,1.), Interval(1.5,3.,lower_closed=False)))
+    assert_equal(interval_set1 ^ interval_set2, (interval_set1 - interval_set2) | (interval_set2 - interval_set1))
+    assert_equal(interval_set1 ^ interval_set1, IntervalSet(interval_type=float))
+    assert_equal(interval_set1 ^ IntervalSet(interval_type=float), interval_set1)
+    interval_set3 = IntervalSet(Interval(0.,1.))
+    interval_set4 = IntervalSet(Interval(1.,2.,lower_closed=False))
+    assert_equal((interval_set3 ^ interval_set4).intervals, (Interval(0.,2.),))
+
+def test_union_all():
+    interval_sets = [IntervalSet(Interval(0.,1.,upper_closed=False), Interval(5.,6.)), 
+                     IntervalSet(Interval(1.,2.)), IntervalSet(interval_type=float), 
+                     IntervalSet(Interval(5.5,7.), Interval(10.,unbounded))]
+    assert_equal(union_all(interval_sets), 
+                 IntervalSet(Interval(0.,2.), Interval(5.,7.), Interval(10.,unbounded)))
+    assert_equal(union_all(interval_sets[:1]), interval_sets[0])
+    assert_equal(union_all([], interval_type=float), IntervalSet(interval_type=float))
+    mutable_sets = [MutableIntervalSet(*interval_set.intervals, interval_type=float) 
+                    for interval_set in interval_sets]
+    assert_equal(union_all(mutable_sets), union_all(interval_sets))
+    assert_equal(union_all(interval_sets[:2] + mutable_sets[2:]), union_all(interval_sets))
+    assert_raises(TypeError, union_all, [[Interval(0.,1.)]])
+
+def test_intersection_all():
+    interval_sets = [IntervalSet(Interval(0.,10.), Interval(20.,30.)), 
+                     IntervalSet(Interval(unbounded,25.,upper_closed=False)), 
+                     IntervalSet(Interval(5.,21.), Interval(24.,40.))]
+    assert_equal(intersection_all(interval_sets), 
+                 IntervalSet(Interval(5.,10.), Interval(20.,21.), Interval(24.,25.,upper_closed=False)))
+    assert_equal(intersection_all(interval_sets + [IntervalSet(interval_type=float)]), 
+                 IntervalSet(interval_type=float))
+    assert_equal(intersection_all([], interval_type=int), IntervalSet(Interval(unbounded, unbounded, interval_type=int)))
+    mutable_sets = [MutableIntervalSet(*interval_set.intervals) for interval_set in interval_sets]
+    assert_equal(intersection_all(mutable_sets), intersection_all(interval_sets))
+    assert_raises(TypeError, intersection_all, [5])
+
 def test_operators():
     interval_set1 = IntervalSet(Interval(0.,1.,upper_closed=False), Interval(1.,3.,lower_closed=False))
     interval_set2 = IntervalSet(Interval(.5,1.5))
@@ -105,6 +360,19 @@ def test_operators():
     assert_equal((~interval_set2) | interval_set2, IntervalSet(Interval(unbounded, unbounded, interval_type=float)))
     assert_equal(interval_set1 - interval_set2, IntervalSet(Interval(0.,.5,upper_closed=False), Interval(1.5,3.,lower_closed=False)))
 
+def test_hash():
+    interval_set1 = IntervalSet(Interval(0.,1.,upper_closed=False), Interval(1.,3.,lower_closed=False))
+    interval_set2 = IntervalSet(Interval(1.,3.,lower_closed=False), Interval(0.,1.,upper_closed=False))
+    assert_equal(hash(interval_set1), hash(interval_set2))
+    assert_equal(hash(interval_set1), hash(interval_set1))
+    assert_not_equal(hash(interval_set1), hash(IntervalSet(Interval(0.,3.))))
+    # The closedness of an unbounded side does not affect equality, so it must not affect the hash
+    interval_set3 = IntervalSet(Interval(unbounded,1.,lower_closed=False))
+    interval_set4 = IntervalSet(Interval(unbounded,1.,lower_closed=True))
+    assert_equal(interval_set3, interval_set4)
+    assert_equal(hash(interval_set3), hash(interval_set4))
+    assert_equal({interval_set1: 1}[interval_set2], 1)
+
 def test_default_type():
     interval_set = IntervalSet(Interval(unbounded, unbounded))
     assert_is(type(interval_set), ObjectIntervalSet)
@@ -121,10 +389,166 @@ def test_contains():
     assert_in(2, interval_set1) # int automatically cast as double
     assert_raises(TypeError, lambda: 'x' in interval_set1)
 
+def test_contains_many():
+    interval_set1 = IntervalSet(Interval(0.,1.,upper_closed=False), Interval(1.,3.,lower_closed=False))
+    points = [.3, 1., -0.00001, 3.000001, 2., 2]
+    expected = [interval_set1.contains(point) for point in points]
+    assert_list_equal(list(map(bool, interval_set1.contains_many(points))), expected)
+    assert_list_equal(list(map(bool, interval_set1.contains_many(array('d', sorted(points))))), 
+                      [interval_set1.contains(point) for point in sorted(points)])
+    interval_set2 = IntervalSet(Interval(date(2012,1,1),date(2012,2,5)), Interval(date(2014,12,3),date(2015,3,17)))
+    assert_list_equal(list(interval_set2.contains_many([date(2015,1,1), date(2013,1,1), date(2012,1,1)])), 
+                      [1, 0, 1])
+    assert_equal(len(IntervalSet(interval_type=int).contains_many([1, 2])), 2)
+
+def test_locate():
+    interval_set1 = IntervalSet(Interval(0.,1.,upper_closed=False), Interval(1.,3.,lower_closed=False), 
+                                Interval(5.,6.))
+    assert_list_equal(list(interval_set1.locate([5.5, 1., .5, 7.])), [2, -1, 0, -1])
+    assert_list_equal(list(interval_set1.locate([-1., .5, 2., 4., 5., 6.])), [-1, 0, 1, -1, 2, 2])
+    interval_set2 = IntervalSet(Interval(date(2012,1,1),date(2012,2,5)), Interval(date(2014,12,3),date(2015,3,17)))
+    assert_list_equal(list(interval_set2.locate([date(2015,1,1), date(2013,1,1), date(2012,1,1)])), 
+                      [1, -1, 0])
+    # Positions are Py_ssize_t, which long is not on 64 bit Windows
+    assert_equal(interval_set1.locate([1.]).itemsize, struct.calcsize('n'))
+    assert_equal(IntervalSet(interval_type=object).locate([1]).itemsize, struct.calcsize('n'))
+
 def test_iteration():
     interval_set1 = IntervalSet(Interval(0.,1.,upper_closed=False), Interval(1.,3.,lower_closed=False))
     assert_list_equal(list(interval_set1), [Interval(0.,1.,upper_closed=False), Interval(1.,3.,lower_closed=False)])
 
+def test_coalesce():
+    pairs = [(1, 3), (2, 5), (7, 8), (8, 9), (10, unbounded)]
+    coalesced = coalesce(iter(pairs))
+    assert_equal(next(coalesced), Interval(1, 5))
+    assert_list_equal(list(coalesced), [Interval(7, 9), Interval(10, unbounded)])
+    intervals = [Interval(0., 1., upper_closed=False), Interval(1., 2., lower_closed=False), 
+                 Interval(2., 3.), Interval(2., 2., upper_closed=False)]
+    assert_list_equal(list(coalesce(intervals)), 
+                      [Interval(0., 1., upper_closed=False), Interval(1., 3., lower_closed=False)])
+    assert_list_equal(list(coalesce([])), [])
+    assert_equal(IntIntervalSet.from_sorted(pairs), IntervalSet(*[Interval(*pair) for pair in pairs]))
+    assert_equal(DateIntervalSet.from_sorted([(date(2012, 1, 1), date(2012, 3, 1)), 
+                                              (date(2012, 2, 1), date(2012, 4, 1))]), 
+                 IntervalSet(Interval(date(2012, 1, 1), date(2012, 4, 1))))
+    assert_raises(ValueError, list, coalesce([(3., 4.), (1., 2.)]))
+
+def test_to_arrays():
+    interval_set = IntervalSet(Interval(1., 2.), Interval(3., unbounded, lower_closed=False))
+    lower, upper, lower_closed, upper_closed, lower_bounded, upper_bounded = interval_set.to_arrays()
+    assert_list_equal(list(lower), [1., 3.])
+    assert_list_equal(list(upper), [2., 0.])
+    assert_true(lower.readonly)
+    assert_list_equal(list(lower_closed), [1, 0])
+    assert_list_equal(list(upper_closed), [1, 1])
+    assert_list_equal(list(lower_bounded), [1, 1])
+    assert_list_equal(list(upper_bounded), [1, 0])
+    assert_equal(FloatIntervalSet.from_arrays(*interval_set.to_arrays()), interval_set)
+    date_set = IntervalSet(Interval(date(2012, 1, 1), date(2012, 2, 1)))
+    assert_list_equal(list(date_set.to_arrays()[0]), [date(2012, 1, 1).toordinal()])
+    assert_equal(DateIntervalSet.from_arrays(*date_set.to_arrays(), raw=True), date_set)
+    date_set = IntervalSet(Interval(date(2012, 1, 1), unbounded, upper_closed=False))
+    assert_equal(DateIntervalSet.from_arrays(*date_set.to_arrays(), raw=True), date_set)
+    datetime_set = IntervalSet(Interval(datetime(2012, 1, 1, 6), datetime(2012, 2, 1)))
+    assert_equal(DatetimeIntervalSet.from_arrays(*datetime_set.to_arrays(), raw=True), datetime_set)
+    assert_equal(len(IntervalSet(interval_type=int).to_arrays()[0]), 0)
+
+def test_save_and_load():
+    directory = tempfile.mkdtemp()
+    interval_sets = [IntervalSet(Interval(1., 2.), Interval(3., unbounded, lower_closed=False)), 
+                     IntervalSet(Interval(date(2012, 1, 1), date(2012, 2, 1))), 
+                     IntervalSet(Interval(datetime(2012, 1, 1, 6), datetime(2012, 2, 1))), 
+                     IntervalSet(interval_type=int)]
+    for i, interval_set in enumerate(interval_sets):
+        path = os.path.join(directory, '%d.cis' % i)
+        interval_set.save(path)
+        loaded = load_interval_set(path)
+        assert_is(type(loaded), type(interval_set))
+        assert_equal(loaded, interval_set)
+        assert_equal(loaded.intersection(interval_set), interval_set)
+    loaded = load_interval_set(os.path.join(directory, '0.cis'))
+    assert_true(loaded.contains(1.5))
+    assert_false(loaded.contains(3.))
+    path = os.path.join(directory, 'truncated.cis')
+    with open(path, 'wb') as outfile:
+        with open(os.path.join(directory, '0.cis'), 'rb') as infile:
+            outfile.write(infile.read()[:-1])
+    assert_raises(ValueError, load_interval_set, path)
+
+def test_pickle():
+    interval_sets = [IntervalSet(Interval(1., 2.), Interval(3., unbounded, lower_closed=False)), 
+                     IntervalSet(Interval(date(2012, 1, 1), date(2012, 2, 1))), 
+                     IntervalSet(Interval(1, 3), Interval(5, 8)), 
+                     IntervalSet(Interval('a', 'c')), 
+                     IntervalSet(interval_type=int)]
+    for interval_set in interval_sets:
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            assert_equal(pickle.loads(pickle.dumps(interval_set, protocol)), interval_set)
+    mutable_set = MutableIntervalSet(Interval(unbounded, date(2012, 1, 1)), Interval(date(2012, 3, 1)))
+    assert_equal(pickle.loads(pickle.dumps(mutable_set)), mutable_set)
+    # A pickle made on a machine of the other byte order is swapped when loaded
+    for interval_set in interval_sets[:3]:
+        constructor, args = interval_set.__reduce_ex__(2)
+        assert_equal(args[-1], sys.byteorder)
+        n, lower, upper, flags = args[:4]
+        swapped = []
+        for bounds in (lower, upper):
+            bounds = array(interval_set.to_arrays()[0].format, bounds)
+            bounds.byteswap()
+            swapped.append(bounds.tobytes())
+        other = 'big' if sys.byteorder == 'little' else 'little'
+        assert_equal(constructor(n, swapped[0], swapped[1], flags, other), interval_set)
+    if pickle.HIGHEST_PROTOCOL < 5:
+        raise SkipTest
+    buffers = []
+    data = pickle.dumps(interval_sets[0], 5, buffer_callback=buffers.append)
+    assert_equal(len(buffers), 3)
+    assert_equal(pickle.loads(data, buffers=buffers), interval_sets[0])
+
+def test_threaded_operations():
+    sets = [FloatIntervalSet.from_arrays(array('d', range(k, 10000, 7)), array('d', range(k + 3, 10003, 7))) 
+            for k in range(8)]
+    points = array('d', [i / 3. for i in range(30000)])
+    def work(k):
+        first, second = sets[k], sets[(k + 1) % len(sets)]
+        return (first.intersection(second), first.union(second), first.minus(second), 
+                first.symmetric_difference(second), first.contains_many(points), 
+                first.intersection_measure(second))
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(work, range(len(sets))))
+    assert_list_equal(results, list(map(work, range(len(sets)))))
+
+def test_batch_operations():
+    lefts = [IntervalSet(Interval(k, k + 10), Interval(k + 20, k + 25)) for k in range(20)]
+    rights = [IntervalSet(Interval(2 * k, 2 * k + 5)) for k in range(20)]
+    for batch, operation in [(batch_intersection, IntIntervalSet.intersection), 
+                             (batch_union, IntIntervalSet.union), 
+                             (batch_minus, IntIntervalSet.minus)]:
+        expected = list(map(operation, lefts, rights))
+        assert_list_equal(batch(lefts, rights, workers=1), expected)
+        assert_list_equal(batch(lefts, rights, workers=2, chunksize=3), expected)
+    assert_list_equal(batch_union([IntervalSet(Interval('a', 'b'))], [IntervalSet(Interval('c', 'd'))], 
+                                  workers=2), 
+                      [IntervalSet(Interval('a', 'b'), Interval('c', 'd'))])
+    assert_list_equal(batch_intersection([], [], workers=2), [])
+    assert_raises(ValueError, batch_intersection, lefts, rights[1:])
+
+def test_stats():
+    cyinterval.reset_stats()
+    interval_set = IntervalSet(Interval(1., 2.), Interval(3., 4.))
+    interval_set.intersection(IntervalSet(Interval(1.5, 3.5)))
+    result = cyinterval.stats()
+    if not result['enabled']:
+        # Built without instrumentation
+        assert_equal(result['calls'], {})
+        raise SkipTest
+    assert_equal(result['calls']['FloatIntervalSet.intersection'], 1)
+    assert_greater_equal(result['time']['FloatIntervalSet.intersection'], 0.)
+    assert_less(0, result['comparisons']['overlap_cmp'])
+    assert_less(0, result['intervals_allocated'])
+    cyinterval.reset_stats()
+    assert_equal(cyinterval.stats()['calls'], {})
+
 if __name__ == '__main__':
     import sys
     import nose
@@ -6,6 +6,26 @@ import os
 mako_templates=[(os.path.join('cyinterval', 'cyinterval.mako.pyx'), os.path.join('cyinterval', 'cyinterval.pyx')),
                       (os.path.join('cyinterval', 'cyinterval.mako.pxd'), os.path.join('cyinterval', 'cyinterval.pxd'))]
 
+# Instrumentation for cyinterval.stats is only generated when the templates are rendered 
+# with --instrument, so the default build has none of its overhead.  The instrumented sources 
+# are rendered under build rather than over the tracked ones, so that a later default build 
+# never compiles them by accident.
+instrument = False
+source_dir = 'cyinterval'
+if '--instrument' in sys.argv:
+    del sys.argv[sys.argv.index('--instrument')]
+    if '--makoize' not in sys.argv or '--cythonize' not in sys.argv:
+        sys.exit('--instrument requires --makoize and --cythonize')
+    instrument = True
+    source_dir = os.path.join('build', 'instrumented', 'cyinterval')
+    if not os.path.isdir(source_dir):
+        os.makedirs(source_dir)
+    # Makes build/instrumented a package root, so Cython finds the pxd and names the module 
+    # cyinterval.cyinterval
+    open(os.path.join(source_dir, '__init__.py'), 'a').close()
+    mako_templates = [(template_file, os.path.join(source_dir, os.path.basename(target_file))) 
+                      for template_file, target_file in mako_templates]
+
 if '--makoize' in sys.argv:
     from mako.lookup import TemplateLookup
     del sys.argv[sys.argv.index('--makoize')]
@@ -13,7 +33,7 @@ if '--makoize' in sys.argv:
     for template_file, target_file in mako_templates:
         template = lookup.get_template(template_file)
         with open(target_file, 'w') as outfile:
-            outfile.write(template.render())
+            outfile.write(template.render(instrument=instrument))
 
 # Determine whether to use Cython
 if '--cythonize' in sys.argv:
@@ -34,7 +54,7 @@ else:
     cmdclass = {'build_ext': build_ext}
 
 ext_modules = [Extension('cyinterval.cyinterval', 
-                         [os.path.join('cyinterval', 
+                         [os.path.join(source_dir, 
                                        'cyinterval.%s' % ext)])]
 
 
@@ -44,7 +64,7 @@ setup(name='cyinterval',
       author='Jason Rudy',
       author_email='jcrudy@gmail.com',
       url='https://github.com/jcrudy/cyinterval',
-      packages=find_packages(),
+      packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
       package_data={'cyinterval': ['cyinterval.pxd', 'cyinterval.pyx']},
       ext_modules = cythonize(ext_modules, compiler_directives=directives) if cythonize_switch else ext_modules,
       install_requires=[]